@@ -49,22 +49,20 @@ the types
 
 This example is low noise without any blending.  It should take about a minute
 to run and get a precise final shear estimate.  You should see that the
-recovered shear is unbiased.  Note that the uncertainty is greatly
-overestimated for this low-noise example, because the variations in g are due
-to variations in the response, and this variation goes away after calibratioin.
-A jackknife would be better.
+recovered shear is unbiased.  The uncertainty is from a jackknife, which
+captures the fact that the variations in g are dominated by variations in the
+response, and this variation goes away after calibration.
 
 The printout should look something like this
 
     > python metacal_select.py
 
-    noshear kept: 708/1000
-    1p kept: 708/1000
-    1m kept: 708/1000
-    S/N: 80882.1
-    R11: 0.325406
-    m: -0.000163905 +/- 0.0101938 (99.7% conf)
-    c: 2.47504e-06 +/- 5.17806e-06 (99.7% conf)
+    noshear kept: 691/1000
+    1p kept: 691/1000
+    1m kept: 691/1000
+    R11: 0.329901
+    m: -5.17301e-06 +/- 0.000530685 (99.7% conf)
+    c: 8.2244e-07
 """
 import numpy as np
 import ngmix
@@ -99,132 +97,89 @@ def main():
     # typically the off diagonal terms are negligible, and R11 and R22 are
     # usually consistent
     #
-    # We will just do R11 for simplicity and to speed up this example;
-    # typically the off diagonal terms are negligible, and R11 and R22 are
-    # usually consistent
+    # The accumulator applies the selection separately to the results for
+    # each shear type, and keeps sums rather than the results for each
+    # object.  The objects are assigned to jackknife patches in turn
+    #
+    # We also keep the S/N and second shape component of the selected
+    # noshear objects for the S/N and additive bias summary
 
-    dlist = []
+    acc = ngmix.metacal.MetacalAccumulator(
+        select=select,
+        types=['noshear', '1p', '1m'],
+        gname='e',
+    )
+
+    s2n_list = []
+    e2_list = []
 
     for i in progress(args.ntrial, miniters=10):
         obs = make_data(rng=rng, noise=args.noise, shear=shear_true)
 
         resdict, obsdict = boot.go(obs)
+        acc.add(resdict, obsdict=obsdict)
 
-        for stype, sres in resdict.items():
-            st = make_struct(res=sres, obs=obsdict[stype], shear_type=stype)
-            dlist.append(st)
+        nres = resdict['noshear']
+        if nres['flags'] == 0 and select(res=nres, obs=obsdict['noshear']):
+            s2n_list.append(nres['s2n'])
+            e2_list.append(nres['e'][1])
 
     print()
-    data = np.hstack(dlist)
-
-    # selections performed separately on each shear type
-    w = select(data=data, shear_type='noshear')
-    w_1p = select(data=data, shear_type='1p')
-    w_1m = select(data=data, shear_type='1m')
 
-    g = data['g'][w].mean(axis=0)
-    gerr = data['g'][w].std(axis=0) / np.sqrt(w.size)
-    g1_1p = data['g'][w_1p, 0].mean()
-    g1_1m = data['g'][w_1m, 0].mean()
-    R11 = (g1_1p - g1_1m)/0.02
+    res = acc.get_result()
+    for shear_type, nkept in res['nkept'].items():
+        print('%s kept: %d/%d' % (shear_type, nkept, res['nadd']))
 
-    shear = g / R11
-    shear_err = gerr / R11
+    R11 = res['R'][0]
+    shear = res['g'] / R11
 
     m = shear[0]/shear_true[0]-1
-    merr = shear_err[0]/shear_true[0]
+    merr = res['shear_err'][0]/shear_true[0]
 
-    s2n = data['s2n'][w].mean()
+    # R22 is not measured, so the additive bias uses R11
+    e2 = np.array(e2_list)
+    c = shear[1]
+    cerr = e2.std() / np.sqrt(e2.size) / R11
 
-    # note for this example, with the default noise, the error is hugely
+    s2n = np.mean(s2n_list)
+
+    # note for this example, with the default noise, the error on c is hugely
     # overestimated using std/sqrt(n).  This is because the variation in g is
     # dominated by variations in the response. But those variations are
-    # removed when the response is included.  A jackknife would capture the
-    # correct noise
+    # removed when the response is included.  The jackknife error used for m
+    # captures the correct noise
 
     print('S/N: %g' % s2n)
     print('R11: %g' % R11)
+    print('shear1: %g +/- %g' % (shear[0], res['shear_err'][0]))
     print('m: %g +/- %g (99.7%% conf)' % (m, merr*3))
-    print('c: %g +/- %g (99.7%% conf)' % (shear[1], shear_err[1]*3))
+    print('c: %g +/- %g (99.7%% conf)' % (c, cerr*3))
 
 
-def make_struct(res, obs, shear_type):
+def select(res, obs):
     """
-    make the data structure
+    select objects by size relative to the psf
 
     Parameters
     ----------
     res: dict
-        With keys 's2n', 'e', and 'T'
+        The result for one shear type, with key 'T'
     obs: ngmix.Observation
         The observation for this shear type
-    shear_type: str
-        The shear type
-
-    Returns
-    -------
-    1-element array with fields
-    """
-    dt = [
-        ('flags', 'i4'),
-        ('shear_type', 'U7'),
-        ('s2n', 'f8'),
-        ('g', 'f8', 2),
-        ('T', 'f8'),
-        ('Tpsf', 'f8'),
-    ]
-    data = np.zeros(1, dtype=dt)
-    data['shear_type'] = shear_type
-    data['flags'] = res['flags']
-
-    if res['flags'] == 0:
-        data['s2n'] = res['s2n']
-        # for moments we are actually measureing e, the elliptity
-        data['g'] = res['e']
-        data['T'] = res['T']
-    else:
-        data['s2n'] = np.nan
-        data['g'] = np.nan
-        data['T'] = np.nan
-        data['Tpsf'] = np.nan
-
-    # we only have one epoch and band, so we can get the psf T from the
-    # observation rather than averaging over epochs/bands
-    data['Tpsf'] = obs.psf.meta['result']['T']
-
-    return data
-
-
-def select(data, shear_type):
-    """
-    select the data by shear type and size
-
-    Parameters
-    ----------
-    data: array
-        The array with fields shear_type and T
-    shear_type: str
-        e.g. 'noshear', '1p', etc.
 
     Returns
     -------
-    array of indices
+    True if the object is kept
     """
     # raw moments, so the T is the post-psf T.  This the
     # selection is > 1.2 rather than something smaller like 0.5
     # for pre-psf T from one of the maximum likelihood fitters
+    #
+    # we only have one epoch and band, so we can get the psf T from the
+    # observation rather than averaging over epochs/bands
 
-    wtype, = np.where(
-        (data['shear_type'] == shear_type) &
-        (data['flags'] == 0)
-    )
-
-    w, = np.where(data['T'][wtype]/data['Tpsf'][wtype] > 1.2)
-
-    print('%s kept: %d/%d' % (shear_type, w.size, wtype.size))
-
-    w = wtype[w]
-    return w
+    Tpsf = obs.psf.meta['result']['T']
+    return res['T']/Tpsf > 1.2
 
 
 def make_data(rng, noise, shear):
@@ -59,3 +59,10 @@ from .observation import Observation, ObsList, MultiBandObsList
 from . import metacal
 from . import simobs
 from . import gaussap
+from . import catalog
+
+from . import jit
+from .jit import warmup
+
+from . import parallel
+from .parallel import set_num_threads, get_num_threads
@@ -10,7 +10,7 @@ from ..gmix.gmix_nb import (
 import ngmix.flags
 
 
-@njit
+@njit(nogil=True)
 def admom(confarray, wt, pixels, resarray):
     """
     run the adaptive moments algorithm
@@ -108,7 +108,7 @@ def admom(confarray, wt, pixels, resarray):
         res['flags'] = ngmix.flags.MAXITER
 
 
-@njit
+@njit(nogil=True)
 def admom_censums(wt, pixels, res):
     """
     do sums for determining the center
@@ -128,7 +128,7 @@ def admom_censums(wt, pixels, res):
         res['sums'][5] += wdata
 
 
-@njit
+@njit(nogil=True)
 def admom_momsums(wt, pixels, res):
     """
     do sums for calculating the weighted moments
@@ -175,7 +175,7 @@ def admom_momsums(wt, pixels, res):
                 res['sums_cov'][i, j] += w2*var*F[i]*F[j]
 
 
-@njit
+@njit(nogil=True)
 def deweight_moments(wt, Irr, Irc, Icc, res):
     """
     deweight a set of weighted moments
@@ -226,7 +226,7 @@ def deweight_moments(wt, Irr, Irc, Icc, res):
     )
 
 
-@njit
+@njit(nogil=True)
 def clear_result(res):
     """
     clear some fields in the result structure
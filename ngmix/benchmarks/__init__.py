@@ -0,0 +1,23 @@
+# flake8: noqa
+"""
+Benchmarks for the main fitting and measurement codes
+
+Run all benchmarks and write the results to a JSON file
+
+    python -m ngmix.benchmarks --output results.json
+
+or from python
+
+    import ngmix.benchmarks
+    results = ngmix.benchmarks.run_benchmarks(names=['fitter', 'em'])
+
+Compare the results from two runs, exiting with non-zero status if any
+benchmark is slower than the threshold
+
+    python -m ngmix.benchmarks --compare old.json new.json
+"""
+
+from . import core
+from .core import *
+
+from . import suite
@@ -0,0 +1,119 @@
+import argparse
+import sys
+
+from .core import (
+    get_benchmark_names,
+    run_benchmarks,
+    write_results,
+    read_results,
+    compare_results,
+    DEFAULT_MIN_TIME,
+    DEFAULT_REPEAT,
+    DEFAULT_THRESHOLD,
+)
+from . import suite  # noqa: F401, registers the benchmarks
+
+
+def get_args(args=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m ngmix.benchmarks',
+        description='run the ngmix benchmarks',
+    )
+    parser.add_argument(
+        '--names', nargs='+',
+        help='benchmarks to run, or prefixes of the names; default all',
+    )
+    parser.add_argument(
+        '--list', action='store_true',
+        help='list the benchmarks and exit',
+    )
+    parser.add_argument(
+        '--output', help='write the results to this JSON file',
+    )
+    parser.add_argument(
+        '--quick', action='store_true',
+        help='only run a single set of parameters for each benchmark',
+    )
+    parser.add_argument(
+        '--min-time', type=float, default=DEFAULT_MIN_TIME,
+        help='minimum time in seconds for each timing',
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=DEFAULT_REPEAT,
+        help='number of timings; the fastest is reported',
+    )
+    parser.add_argument(
+        '--seed', type=int, default=31415,
+        help='seed for making the data',
+    )
+    parser.add_argument(
+        '--compare', nargs=2, metavar=('OLD', 'NEW'),
+        help='compare two results files rather than running the benchmarks',
+    )
+    parser.add_argument(
+        '--threshold', type=float, default=DEFAULT_THRESHOLD,
+        help='fractional slowdown considered a regression',
+    )
+    return parser.parse_args(args)
+
+
+def compare(old_fname, new_fname, threshold):
+    """
+    print a comparison of two results files, returning the number of
+    regressions
+    """
+    comparison = compare_results(
+        read_results(old_fname),
+        read_results(new_fname),
+        threshold=threshold,
+    )
+
+    nregressed = 0
+    for comp in comparison:
+        if comp['regressed']:
+            nregressed += 1
+            status = 'REGRESSED'
+        else:
+            status = ''
+
+        print('%-50s %12.3f ms %12.3f ms %8.3f %s' % (
+            comp['key'],
+            comp['old_seconds_per_call'] * 1000,
+            comp['new_seconds_per_call'] * 1000,
+            comp['ratio'],
+            status,
+        ))
+
+    print('%d/%d regressed' % (nregressed, len(comparison)))
+    return nregressed
+
+
+def main(args=None):
+    args = get_args(args)
+
+    if args.list:
+        for name in get_benchmark_names():
+            print(name)
+        return 0
+
+    if args.compare is not None:
+        nregressed = compare(*args.compare, threshold=args.threshold)
+        return 1 if nregressed > 0 else 0
+
+    results = run_benchmarks(
+        names=args.names,
+        quick=args.quick,
+        min_time=args.min_time,
+        repeat=args.repeat,
+        seed=args.seed,
+        logfunc=print,
+    )
+
+    if args.output is not None:
+        write_results(results, args.output)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
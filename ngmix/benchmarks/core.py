@@ -0,0 +1,408 @@
+"""
+Running the benchmarks, reading and writing results, and comparing two sets
+of results to find regressions
+"""
+__all__ = [
+    'register',
+    'get_benchmark_names',
+    'run_benchmarks',
+    'run_benchmark',
+    'write_results',
+    'read_results',
+    'compare_results',
+]
+import datetime
+import itertools
+import json
+import platform
+import time
+import numpy as np
+
+# format of the results; change this if the output changes incompatibly
+RESULTS_VERSION = 1
+
+DEFAULT_MIN_TIME = 0.2
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.1
+
+# name: Benchmark
+BENCHMARKS = {}
+
+
+class BenchmarkSkipped(Exception):
+    """
+    raise during setup if a benchmark cannot be run, for example if an
+    optional dependency is missing
+    """
+
+
+class Benchmark(object):
+    """
+    A benchmark, with the setup function and the parameters over which to run
+    it
+
+    Parameters
+    ----------
+    name: str
+        The name of the benchmark
+    setup: callable
+        Called as setup(rng, **params), returning (func, nobj), where func is
+        the function with no arguments to time and nobj is the number of
+        objects processed in each call
+    params: dict
+        Each key is the name of a parameter, and each value a list of
+        parameter values.  The benchmark is run for all combinations
+    quick_params: dict, optional
+        The parameters to use for a quick run, default the first value of
+        each parameter
+    """
+    def __init__(self, name, setup, params, quick_params=None):
+        self.name = name
+        self.setup = setup
+        self.params = params
+
+        if quick_params is None:
+            quick_params = {key: vals[:1] for key, vals in params.items()}
+
+        self.quick_params = quick_params
+
+    def get_param_sets(self, quick=False):
+        """
+        get a list of dicts, one for each combination of the parameters
+        """
+        params = self.quick_params if quick else self.params
+
+        keys = sorted(params)
+        return [
+            dict(zip(keys, vals))
+            for vals in itertools.product(*[params[key] for key in keys])
+        ]
+
+
+def register(name, params, quick_params=None):
+    """
+    decorator to register a setup function as a benchmark.  See Benchmark
+    for the parameters
+    """
+
+    def decorator(setup):
+        if name in BENCHMARKS:
+            raise ValueError(f'benchmark {name} already registered')
+
+        BENCHMARKS[name] = Benchmark(
+            name=name, setup=setup, params=params, quick_params=quick_params,
+        )
+        return setup
+
+    return decorator
+
+
+def get_benchmark_names():
+    """
+    get a list of the registered benchmark names
+    """
+    return list(BENCHMARKS)
+
+
+def run_benchmarks(
+    names=None,
+    quick=False,
+    min_time=DEFAULT_MIN_TIME,
+    repeat=DEFAULT_REPEAT,
+    seed=31415,
+    logfunc=None,
+):
+    """
+    run a set of benchmarks
+
+    Parameters
+    ----------
+    names: list of str, optional
+        Names of the benchmarks to run, or prefixes of those names, e.g.
+        'fitter' to run all the maximum likelihood fitter benchmarks.
+        Default is to run all
+    quick: bool, optional
+        If True, only run a single set of parameters for each benchmark
+    min_time: float, optional
+        Minimum time in seconds for each timing, default 0.2
+    repeat: int, optional
+        Number of timings; the fastest is reported.  Default 3
+    seed: int, optional
+        Seed for the random number generator used to make the data
+    logfunc: callable, optional
+        Called with a message for each result, e.g. print
+
+    Returns
+    -------
+    results: dict
+        With the environment in 'meta' and a list of results for each
+        benchmark and set of parameters in 'results'.  See run_benchmark
+        for the entries.
+    """
+
+    if names is None:
+        names = get_benchmark_names()
+    else:
+        names = _match_names(names)
+
+    results = []
+    for name in names:
+        benchmark = BENCHMARKS[name]
+        for params in benchmark.get_param_sets(quick=quick):
+            rng = np.random.RandomState(seed)
+            res = run_benchmark(
+                benchmark, params, rng=rng, min_time=min_time, repeat=repeat,
+            )
+            results.append(res)
+
+            if logfunc is not None:
+                logfunc(_format_result(res))
+
+    return {
+        'meta': _get_meta(),
+        'results': results,
+    }
+
+
+def run_benchmark(
+    benchmark, params, rng, min_time=DEFAULT_MIN_TIME, repeat=DEFAULT_REPEAT,
+):
+    """
+    run a benchmark for a single set of parameters
+
+    Parameters
+    ----------
+    benchmark: Benchmark
+        The benchmark to run
+    params: dict
+        The parameters for the benchmark
+    rng: np.random.RandomState
+        Random number generator used to make the data
+    min_time: float, optional
+        Minimum time in seconds for each timing, default 0.2
+    repeat: int, optional
+        Number of timings; the fastest is reported.  Default 3
+
+    Returns
+    -------
+    result: dict
+        With entries
+
+        name: the benchmark name
+        params: the parameters
+        key: a unique string made from the name and parameters
+        status: 'ok' or 'skipped'
+        reason: the reason the benchmark was skipped, otherwise None
+        ncalls: number of calls in each timing
+        nobj: number of objects processed per call
+        seconds_per_call: fastest time per call
+        seconds_per_call_median: median over the timings
+        objects_per_second: nobj / seconds_per_call
+    """
+
+    res = {
+        'name': benchmark.name,
+        'params': params,
+        'key': get_key(benchmark.name, params),
+        'status': 'ok',
+        'reason': None,
+        'ncalls': 0,
+        'nobj': 0,
+        'seconds_per_call': None,
+        'seconds_per_call_median': None,
+        'objects_per_second': None,
+    }
+
+    try:
+        func, nobj = benchmark.setup(rng, **params)
+    except BenchmarkSkipped as err:
+        res['status'] = 'skipped'
+        res['reason'] = str(err)
+        return res
+
+    # the first call includes compiling any numba code
+    func()
+
+    ncalls = _get_ncalls(func, min_time)
+
+    times = []
+    for i in range(repeat):
+        tm0 = time.perf_counter()
+        for icall in range(ncalls):
+            func()
+        times.append((time.perf_counter() - tm0) / ncalls)
+
+    seconds_per_call = min(times)
+
+    res['ncalls'] = ncalls
+    res['nobj'] = nobj
+    res['seconds_per_call'] = seconds_per_call
+    res['seconds_per_call_median'] = float(np.median(times))
+    res['objects_per_second'] = nobj / seconds_per_call
+    return res
+
+
+def get_key(name, params):
+    """
+    get a unique key for a benchmark and set of parameters, e.g.
+    'fitter_exp[nepoch=1,stamp_size=32]'
+    """
+    pstr = ','.join('%s=%s' % (key, params[key]) for key in sorted(params))
+    return '%s[%s]' % (name, pstr)
+
+
+def write_results(results, fname):
+    """
+    write results from run_benchmarks to a JSON file
+
+    Parameters
+    ----------
+    results: dict
+        As returned by run_benchmarks
+    fname: str
+        Path to the output file
+    """
+    with open(fname, 'w') as fobj:
+        json.dump(results, fobj, indent=2, sort_keys=True)
+
+
+def read_results(fname):
+    """
+    read results written by write_results
+
+    Parameters
+    ----------
+    fname: str
+        Path to the file
+
+    Returns
+    -------
+    results: dict
+    """
+    with open(fname) as fobj:
+        results = json.load(fobj)
+
+    version = results.get('meta', {}).get('results_version')
+    if version != RESULTS_VERSION:
+        raise ValueError(
+            'expected results version %s, got %s' % (RESULTS_VERSION, version)
+        )
+
+    return results
+
+
+def compare_results(old, new, threshold=DEFAULT_THRESHOLD):
+    """
+    compare two sets of results
+
+    Parameters
+    ----------
+    old: dict
+        The reference results, as returned by run_benchmarks or read_results
+    new: dict
+        The new results
+    threshold: float, optional
+        A benchmark is considered to have regressed if the new time per call
+        is larger than the old by more than this fraction.  Default 0.1
+
+    Returns
+    -------
+    comparison: list of dict
+        One entry for each benchmark that ran in both, with entries key,
+        old_seconds_per_call, new_seconds_per_call, ratio new/old, and
+        regressed
+    """
+
+    old_results = {
+        res['key']: res for res in old['results'] if res['status'] == 'ok'
+    }
+
+    comparison = []
+    for res in new['results']:
+        key = res['key']
+        if res['status'] != 'ok' or key not in old_results:
+            continue
+
+        old_time = old_results[key]['seconds_per_call']
+        new_time = res['seconds_per_call']
+        ratio = new_time / old_time
+
+        comparison.append({
+            'key': key,
+            'old_seconds_per_call': old_time,
+            'new_seconds_per_call': new_time,
+            'ratio': ratio,
+            'regressed': ratio > 1 + threshold,
+        })
+
+    return comparison
+
+
+def _match_names(names):
+    all_names = get_benchmark_names()
+
+    matched = []
+    for name in names:
+        tmatched = [
+            tname for tname in all_names
+            if tname == name or tname.startswith(name)
+        ]
+        if len(tmatched) == 0:
+            raise ValueError(
+                'no benchmark matches %s; available are %s' % (
+                    name, all_names,
+                )
+            )
+
+        for tname in tmatched:
+            if tname not in matched:
+                matched.append(tname)
+
+    return matched
+
+
+def _get_ncalls(func, min_time):
+    """
+    get the number of calls needed for the total time to exceed min_time
+    """
+    ncalls = 1
+    while True:
+        tm0 = time.perf_counter()
+        for i in range(ncalls):
+            func()
+        tm = time.perf_counter() - tm0
+
+        if tm >= min_time:
+            return ncalls
+
+        if tm <= 0:
+            ncalls *= 10
+        else:
+            ncalls = max(ncalls + 1, int(ncalls * 1.2 * min_time / tm))
+
+
+def _get_meta():
+    import numba
+    from .._version import __version__
+
+    return {
+        'results_version': RESULTS_VERSION,
+        'ngmix_version': __version__,
+        'numpy_version': np.__version__,
+        'numba_version': numba.__version__,
+        'python_version': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'date': datetime.datetime.now().isoformat(),
+    }
+
+
+def _format_result(res):
+    if res['status'] != 'ok':
+        return '%-50s skipped: %s' % (res['key'], res['reason'])
+
+    return '%-50s %12.3f ms/call %12.1f obj/s' % (
+        res['key'],
+        res['seconds_per_call'] * 1000,
+        res['objects_per_second'],
+    )
@@ -0,0 +1,291 @@
+"""
+The benchmarks for the main fitting and measurement codes
+
+Each benchmark is a setup function, registered with the parameters over
+which it is run, that makes the data and returns a function to be timed
+along with the number of objects processed in each call
+"""
+import contextlib
+import io
+import os
+import tempfile
+import numpy as np
+
+from .core import register, BenchmarkSkipped
+from ..gmix import GMix, GMixModel
+from ..jacobian import DiagonalJacobian
+from ..observation import Observation, ObsList
+
+PIXEL_SCALE = 0.263
+PSF_MODEL = 'turb'
+PSF_T = 0.27
+OBJ_T = 0.3
+OBJ_FLUX = 100.0
+NOISE = 0.1
+
+STAMP_SIZES = [32, 64]
+NEPOCHS = [1, 4]
+
+
+def make_psf_obs(rng, stamp_size):
+    """
+    make a psf observation, with the gmix set
+
+    Parameters
+    ----------
+    rng: np.random.RandomState
+        For the noise
+    stamp_size: int
+        Size of the square image
+
+    Returns
+    -------
+    obs: ngmix.Observation
+    """
+
+    psf_noise = 1.0e-6
+    jacobian = _get_jacobian(stamp_size)
+    psf_gmix = GMixModel([0.0, 0.0, 0.0, 0.0, PSF_T, 1.0], PSF_MODEL)
+
+    image = psf_gmix.make_image((stamp_size, )*2, jacobian=jacobian)
+    image += rng.normal(scale=psf_noise, size=image.shape)
+
+    return Observation(
+        image,
+        weight=np.zeros(image.shape) + 1 / psf_noise**2,
+        jacobian=jacobian,
+        gmix=psf_gmix,
+    )
+
+
+def make_obs(rng, model, stamp_size, nepoch=None, extra_pars=None):
+    """
+    make a simulated observation of an object convolved with a psf
+
+    Parameters
+    ----------
+    rng: np.random.RandomState
+        For the offsets and noise
+    model: str
+        The model for the object, e.g. 'exp'
+    stamp_size: int
+        Size of the square images
+    nepoch: int, optional
+        If sent, an ObsList with this many epochs is returned, otherwise an
+        Observation
+    extra_pars: list, optional
+        Extra parameters for the model, e.g. fracdev for bdf, placed before
+        the flux
+
+    Returns
+    -------
+    obs, pars: ngmix.Observation or ngmix.ObsList, array
+        The observation(s) and the true parameters
+    """
+
+    if extra_pars is None:
+        extra_pars = []
+
+    cen = rng.uniform(low=-0.5, high=0.5, size=2) * PIXEL_SCALE
+    pars = np.array(
+        [cen[0], cen[1], 0.1, -0.05, OBJ_T] + list(extra_pars) + [OBJ_FLUX]
+    )
+    gm0 = GMixModel(pars, model)
+
+    obslist = ObsList()
+    for i in range(1 if nepoch is None else nepoch):
+        psf_obs = make_psf_obs(rng, stamp_size)
+        jacobian = _get_jacobian(stamp_size)
+
+        gm = gm0.convolve(psf_obs.gmix)
+        image = gm.make_image((stamp_size, )*2, jacobian=jacobian)
+        noise = rng.normal(scale=NOISE, size=image.shape)
+
+        obslist.append(
+            Observation(
+                image + noise,
+                weight=np.zeros(image.shape) + 1 / NOISE**2,
+                jacobian=jacobian,
+                psf=psf_obs,
+                noise=rng.normal(scale=NOISE, size=image.shape),
+            )
+        )
+
+    if nepoch is None:
+        return obslist[0], pars
+    else:
+        return obslist, pars
+
+
+def _get_jacobian(stamp_size):
+    cen = (stamp_size - 1) / 2
+    return DiagonalJacobian(row=cen, col=cen, scale=PIXEL_SCALE)
+
+
+def _get_guess(rng, pars):
+    guess = pars.copy()
+    guess[0:2] += rng.uniform(low=-0.01, high=0.01, size=2)
+    guess[2:4] += rng.uniform(low=-0.01, high=0.01, size=2)
+    guess[4:] *= rng.uniform(low=0.95, high=1.05, size=pars.size - 4)
+    return guess
+
+
+def _make_fitter_setup(model, extra_pars=None):
+
+    def setup(rng, stamp_size, nepoch):
+        from ..fitting import Fitter
+
+        obs, pars = make_obs(
+            rng, model, stamp_size, nepoch=nepoch, extra_pars=extra_pars,
+        )
+        guess = _get_guess(rng, pars)
+        fitter = Fitter(model=model)
+
+        def func():
+            fitter.go(obs=obs, guess=guess)
+
+        return func, 1
+
+    return setup
+
+
+for _model, _extra_pars in [
+    ('gauss', None), ('exp', None), ('dev', None), ('bdf', [0.5]),
+]:
+    register(
+        'fitter_%s' % _model,
+        params={'stamp_size': STAMP_SIZES, 'nepoch': NEPOCHS},
+    )(_make_fitter_setup(_model, extra_pars=_extra_pars))
+
+
+@register('em', params={'stamp_size': STAMP_SIZES, 'ngauss': [1, 3]})
+def em_setup(rng, stamp_size, ngauss):
+    from ..em import EMFitter, prep_obs
+
+    obs = make_psf_obs(rng, stamp_size)
+    obs_sky, sky = prep_obs(obs)
+
+    pars = []
+    for i in range(ngauss):
+        T = PSF_T * rng.uniform(low=0.5, high=1.5)
+        pars += [
+            1 / ngauss,
+            rng.uniform(low=-0.1, high=0.1),
+            rng.uniform(low=-0.1, high=0.1),
+            T / 2, 0.0, T / 2,
+        ]
+
+    guess = GMix(pars=pars)
+    fitter = EMFitter()
+
+    def func():
+        fitter.go(obs=obs_sky, guess=guess, sky=sky)
+
+    return func, 1
+
+
+@register('admom', params={'stamp_size': STAMP_SIZES})
+def admom_setup(rng, stamp_size):
+    from ..admom import AdmomFitter
+
+    obs, _ = make_obs(rng, 'exp', stamp_size)
+    fitter = AdmomFitter(rng=rng)
+    guess = OBJ_T + PSF_T
+
+    def func():
+        fitter.go(obs=obs, guess=guess)
+
+    return func, 1
+
+
+@register('gaussmom', params={'stamp_size': STAMP_SIZES})
+def gaussmom_setup(rng, stamp_size):
+    from ..gaussmom import GaussMom
+
+    obs, _ = make_obs(rng, 'exp', stamp_size)
+    fitter = GaussMom(fwhm=1.2)
+
+    def func():
+        fitter.go(obs=obs)
+
+    return func, 1
+
+
+def _make_prepsfmom_setup(kind):
+
+    def setup(rng, stamp_size):
+        from ..prepsfmom import KSigmaMom, PGaussMom
+
+        obs, _ = make_obs(rng, 'exp', stamp_size)
+        if kind == 'ksigma':
+            fitter = KSigmaMom(fwhm=2.0)
+        else:
+            fitter = PGaussMom(fwhm=2.0)
+
+        def func():
+            fitter.go(obs=obs)
+
+        return func, 1
+
+    return setup
+
+
+for _kind in ['ksigma', 'pgauss']:
+    register(
+        '%smom' % _kind, params={'stamp_size': STAMP_SIZES},
+    )(_make_prepsfmom_setup(_kind))
+
+
+@register(
+    'metacal',
+    params={'stamp_size': STAMP_SIZES, 'psf': ['gauss', 'fitgauss']},
+)
+def metacal_setup(rng, stamp_size, psf):
+    from ..metacal import get_all_metacal
+
+    obs, _ = make_obs(rng, 'exp', stamp_size)
+
+    def func():
+        get_all_metacal(obs=obs, psf=psf, rng=rng)
+
+    return func, 1
+
+
+@register(
+    'meds_read',
+    params={'stamp_size': [24, 48], 'nepoch': [1, 4]},
+)
+def meds_read_setup(rng, stamp_size, nepoch):
+    try:
+        from ..medsreaders import NGMixMEDS, MultiBandNGMixMEDS
+        from ..tests._fakemeds import make_fake_meds, CUTOUT_TYPES
+    except ImportError as err:
+        raise BenchmarkSkipped(str(err))
+
+    nobj = 20
+
+    # the file is removed when the last reference to the reader goes away,
+    # after the benchmark is run
+    tmpdir = tempfile.TemporaryDirectory()
+    fname = os.path.join(tmpdir.name, 'fake-meds.fits')
+
+    # the first cutout is the coadd, which the reader skips
+    with contextlib.redirect_stdout(io.StringIO()):
+        make_fake_meds(
+            fname,
+            rng,
+            box_size=stamp_size,
+            ncutout_max=nepoch + 1,
+            nobj=nobj,
+            cutout_types=CUTOUT_TYPES,
+        )
+
+    mlist = [NGMixMEDS(fname)]
+    reader = MultiBandNGMixMEDS(mlist)
+    reader._tmpdir = tmpdir
+
+    def func():
+        for iobj in range(reader.size):
+            reader.get_mbobs(iobj)
+
+    return func, reader.size
@@ -0,0 +1,311 @@
+"""
+Process all the objects in a set of MEDS files, optionally using a pool of
+processes
+
+The objects are split into chunks that are sent to the worker processes.
+Each worker opens the MEDS files once, and the results for each chunk are
+returned as a structured array, in the order of the input indices.
+
+Example
+-------
+
+    def fit(mbobs, rng):
+        res = bootstrap(mbobs, runner=runner, psf_runner=psf_runner)
+        return {'flags': res['flags'], 'pars': res['pars']}
+
+    dtype = [('flags', 'i4'), ('pars', 'f8', 6)]
+    data = ngmix.catalog.run_catalog(
+        ['meds-g.fits', 'meds-r.fits'], fit, dtype, nproc=8, seed=8312,
+    )
+"""
+__all__ = [
+    'run_catalog', 'iter_catalog', 'get_object_rng', 'MEDSReaderFactory',
+]
+import logging
+import multiprocessing
+import numpy as np
+
+from .flags import PROC_ERROR
+
+logger = logging.getLogger(__name__)
+
+# fields added to the user's output
+CATALOG_DTYPE = [
+    ('index', 'i8'),
+    ('proc_flags', 'i4'),
+]
+
+
+class MEDSReaderFactory(object):
+    """
+    Open a set of MEDS files, one per band, as a
+    ngmix.medsreaders.MultiBandNGMixMEDS.  This can be pickled and sent to
+    the worker processes, which then open the files themselves.
+
+    Parameters
+    ----------
+    meds_files: str or sequence of str
+        The MEDS files, one for each band
+    """
+    def __init__(self, meds_files):
+        if isinstance(meds_files, str):
+            meds_files = [meds_files]
+
+        self.meds_files = list(meds_files)
+
+    def __call__(self):
+        from .medsreaders import MultiBandNGMixMEDS, NGMixMEDS
+
+        mlist = [NGMixMEDS(fname) for fname in self.meds_files]
+        return MultiBandNGMixMEDS(mlist)
+
+
+def run_catalog(
+    source,
+    func,
+    dtype,
+    indices=None,
+    nproc=1,
+    chunksize=None,
+    seed=None,
+    weight_type='weight',
+):
+    """
+    Process the objects in a set of MEDS files, returning a single array with
+    the results.  See iter_catalog for the parameters
+
+    Returns
+    -------
+    data: array
+        The results for all objects
+    """
+
+    output_dtype = _get_output_dtype(dtype)
+    chunks = list(iter_catalog(
+        source, func, dtype,
+        indices=indices,
+        nproc=nproc,
+        chunksize=chunksize,
+        seed=seed,
+        weight_type=weight_type,
+    ))
+
+    if len(chunks) == 0:
+        return np.zeros(0, dtype=output_dtype)
+
+    return np.concatenate(chunks)
+
+
+def iter_catalog(
+    source,
+    func,
+    dtype,
+    indices=None,
+    nproc=1,
+    chunksize=None,
+    seed=None,
+    weight_type='weight',
+):
+    """
+    Process the objects in a set of MEDS files, yielding the results for each
+    chunk of objects as they are available, in the order of the indices
+
+    Parameters
+    ----------
+    source: str, sequence of str, or callable
+        The MEDS files, one for each band, or a callable with no arguments
+        that returns the reader.  The reader must have a size attribute and a
+        get_mbobs(iobj, weight_type=) method, as for
+        ngmix.medsreaders.MultiBandNGMixMEDS.  If it has a close method, it
+        is called when the reader is no longer needed in this process.  With
+        nproc > 1 the callable is
+        sent to the workers, so must be picklable, e.g. a module level
+        function or a MEDSReaderFactory
+    func: callable
+        Function called for each object as func(mbobs, rng), where mbobs is
+        the ngmix.MultiBandObsList for the object and rng is a
+        np.random.RandomState for that object.  It should return a dict or
+        structured array row with entries for the fields in dtype; missing
+        entries are set to zero
+    dtype: numpy dtype or list
+        The dtype of the results from func.  The fields 'index' and
+        'proc_flags' are added; proc_flags has ngmix.flags.PROC_ERROR set if
+        an exception was raised while reading or processing the object
+    indices: array, optional
+        Indices of the objects to process, default all
+    nproc: int, optional
+        Number of processes to use, default 1, in which case the objects are
+        processed in this process
+    chunksize: int, optional
+        Number of objects in each chunk sent to a worker.  Default is to make
+        about four chunks per process
+    seed: int, optional
+        The seed for the random number generators.  The generator for each
+        object is seeded from both this seed and the object index, so the
+        results do not depend on the number of processes or chunk size.
+        Default is a random seed
+    weight_type: str, optional
+        The weight type to send to get_mbobs, default 'weight'
+
+    Yields
+    ------
+    data: array
+        The results for each chunk
+    """
+
+    if callable(source):
+        reader_factory = source
+    else:
+        reader_factory = MEDSReaderFactory(source)
+
+    if nproc < 1:
+        raise ValueError('nproc must be >= 1, got %s' % nproc)
+
+    if chunksize is not None and chunksize < 1:
+        raise ValueError('chunksize must be >= 1, got %s' % chunksize)
+
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    worker_args = (reader_factory, func, dtype, seed, weight_type)
+
+    if nproc == 1:
+        # the worker's reader is also used to get the number of objects
+        worker = _CatalogWorker(*worker_args)
+        try:
+            indices = _get_indices(indices, worker.reader)
+            for chunk in _get_chunks(indices, nproc, chunksize):
+                yield worker.process(chunk)
+        finally:
+            _close_reader(worker.reader)
+    else:
+        if indices is None:
+            reader = reader_factory()
+            try:
+                indices = _get_indices(indices, reader)
+            finally:
+                _close_reader(reader)
+        else:
+            indices = _get_indices(indices, None)
+
+        chunks = _get_chunks(indices, nproc, chunksize)
+
+        with multiprocessing.Pool(
+            nproc, initializer=_init_worker, initargs=worker_args,
+        ) as pool:
+            for data in pool.imap(_process_chunk, chunks):
+                yield data
+
+
+def get_object_rng(seed, index):
+    """
+    Get the random number generator for an object
+
+    Parameters
+    ----------
+    seed: int
+        The overall seed
+    index: int
+        The index of the object
+
+    Returns
+    -------
+    rng: np.random.RandomState
+    """
+    seed_seq = np.random.SeedSequence([seed, index])
+    return np.random.RandomState(np.random.MT19937(seed_seq))
+
+
+def _get_indices(indices, reader):
+    """
+    get the indices to process, all objects in the reader by default
+    """
+    if indices is None:
+        return np.arange(reader.size)
+    else:
+        return np.array(indices, ndmin=1, dtype='i8')
+
+
+def _get_chunks(indices, nproc, chunksize):
+    """
+    split the indices into chunks, about four per process by default
+    """
+    if chunksize is None:
+        chunksize = max(1, int(np.ceil(indices.size / (4 * nproc))))
+
+    return [
+        indices[beg:beg + chunksize]
+        for beg in range(0, indices.size, chunksize)
+    ]
+
+
+def _close_reader(reader):
+    """
+    close the reader if it supports it
+    """
+    close = getattr(reader, 'close', None)
+    if close is not None:
+        close()
+
+
+def _get_output_dtype(dtype):
+    return np.dtype(CATALOG_DTYPE + np.dtype(dtype).descr)
+
+
+class _CatalogWorker(object):
+    """
+    Process chunks of objects, holding the reader open
+    """
+    def __init__(self, reader_factory, func, dtype, seed, weight_type):
+        self.reader = reader_factory()
+        self.func = func
+        self.dtype = np.dtype(dtype)
+        self.output_dtype = _get_output_dtype(dtype)
+        self.seed = seed
+        self.weight_type = weight_type
+
+    def process(self, indices):
+        """
+        process the objects, returning the results in a structured array
+        """
+        data = np.zeros(len(indices), dtype=self.output_dtype)
+
+        for i, index in enumerate(indices):
+            data['index'][i] = index
+
+            try:
+                mbobs = self.reader.get_mbobs(
+                    index, weight_type=self.weight_type,
+                )
+                rng = get_object_rng(self.seed, index)
+                res = self.func(mbobs, rng)
+
+                for name in self.dtype.names:
+                    if _has_field(res, name):
+                        data[name][i] = res[name]
+
+            except Exception:
+                logger.exception('error processing object %d', index)
+                data['proc_flags'][i] = PROC_ERROR
+
+        return data
+
+
+def _has_field(res, name):
+    if isinstance(res, np.void):
+        return name in res.dtype.names
+    else:
+        return name in res
+
+
+# the worker used by each process in the pool
+_WORKER = None
+
+
+def _init_worker(reader_factory, func, dtype, seed, weight_type):
+    global _WORKER
+    _WORKER = _CatalogWorker(reader_factory, func, dtype, seed, weight_type)
+
+
+def _process_chunk(indices):
+    return _WORKER.process(indices)
@@ -3,16 +3,23 @@ Fit an image with a gaussian mixture using the EM algorithm
 """
 __all__ = [
     'run_em', 'prep_image', 'prep_obs', 'EMResult', 'EMFitter',
-    'EMFitterFixCen', 'EMFitterFluxOnly',
+    'EMFitterFixCen', 'EMFitterFixCov', 'EMFitterFluxOnly',
 ]
 import logging
 import numpy as np
 
 from ..gexceptions import GMixRangeError
 from ..observation import Observation
-from ..gmix import GMix, GMixModel
+from ..pixels import get_pixels_dtype
+from ..gmix import GMix, GMixModel, pack_gmixes
 from ..flags import EM_RANGE_ERROR, EM_MAXITER
-from .em_nb import em_run, em_run_fixcen, em_run_fixcov, em_run_fluxonly
+from .em_nb import (
+    em_run, em_run_fixcen, em_run_fixcov, em_run_fluxonly,
+    em_run_accel, em_run_fixcen_accel, em_run_fixcov_accel,
+    em_run_fluxonly_accel,
+    em_run_batch, em_run_batch_parallel,
+    EM_BATCH_FULL, EM_BATCH_FIXCEN, EM_BATCH_FIXCOV, EM_BATCH_FLUXONLY,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -49,6 +56,8 @@ def run_em(obs, guess, sky=None, fixcen=False, fixcov=False, fluxonly=False, **k
         default 0.001
     vary_sky: bool
         If True, fit for the sky level
+    accelerate: bool, optional
+        If True, use SQUAREM acceleration, default False
 
     Returns
     -------
@@ -92,11 +101,13 @@ def prep_obs(obs):
             imsky,
             jacobian=obs.jacobian,
             psf=obs.psf,
+            pixels_layout=obs.pixels_layout,
         )
     else:
         newobs = Observation(
             imsky,
             jacobian=obs.jacobian,
+            pixels_layout=obs.pixels_layout,
         )
 
     return newobs, sky
@@ -118,16 +129,23 @@ def prep_image(im0):
     """
     im = im0.copy()
 
+    sky = _get_prep_sky(im)
+    im += sky
+
+    return im, sky
+
+
+def _get_prep_sky(im):
+    """
+    get the sky to add to the image so there are no pixels < 0
+    """
     # need no zero pixels and sky value
     im_min = im.min()
     im_max = im.max()
 
     desired_minval = 0.001 * (im_max - im_min)
 
-    sky = desired_minval - im_min
-    im += sky
-
-    return im, sky
+    return desired_minval - im_min
 
 
 class EMResult(dict):
@@ -222,17 +240,24 @@ class EMFitter(object):
         default 0.001
     vary_sky: bool
         If True, fit for the sky level
+    accelerate: bool, optional
+        If True, extrapolate the EM steps using the SQUAREM scheme, which
+        typically converges in a fraction of the passes over the pixels.
+        The number of iterations is then the number of passes over the
+        pixels, and miniter may be reduced.  Default False
     """
     def __init__(self,
                  miniter=40,
                  maxiter=500,
                  tol=DEFAULT_TOL,
-                 vary_sky=False):
+                 vary_sky=False,
+                 accelerate=False):
 
         self.miniter = miniter
         self.maxiter = maxiter
         self.tol = tol
         self.vary_sky = vary_sky
+        self.accelerate = accelerate
         self._set_runner()
 
     def go(self, obs, guess, sky=None):
@@ -251,39 +276,34 @@ class EMFitter(object):
             true sky in the image is zero, and the prep_obs code is used to set a
             sky such that there are no negative pixels.
         """
+        return self._go(obs, guess, sky, self.miniter)
+
+    def _go(self, obs, guess, sky, miniter):
+        """
+        run the em algorithm with the specified minimum number of iterations
+        """
 
         if not isinstance(obs, Observation):
             raise ValueError('input obs must be an instance of Observation')
 
-        if sky is None:
-            obs_sky, sky = prep_obs(obs)
-        else:
-            obs_sky = obs
+        pixels, sky, val_offset, fill_zero_weight = _get_fit_pixels(obs, sky)
 
-        # makes a copy
-        if not obs_sky.has_psf() or not obs_sky.psf.has_gmix():
-            logger.debug('NO PSF SET')
-            gmix_psf = GMixModel([0., 0., 0., 0., 0., 1.0], 'gauss')
-        else:
-            gmix_psf = obs_sky.psf.gmix
-            gmix_psf.set_flux(1.0)
+        # the pixels are only modified when filling zero weight pixels
+        if fill_zero_weight:
+            pixels = pixels.copy()
 
-        conf = self._make_conf(obs_sky)
+        gmix_psf = _get_psf_gmix(obs)
+
+        conf = self._make_conf(obs)
+        conf['miniter'] = miniter
         conf['sky'] = sky
+        conf['val_offset'] = val_offset
 
         gm_to_fit = guess.copy()
         gm_conv_to_fit = gm_to_fit.convolve(gmix_psf)
 
         sums = self._make_sums(len(gm_to_fit))
 
-        pixels = obs_sky.pixels.copy()
-
-        if np.any(pixels['ierr'] <= 0.0):
-            fill_zero_weight = True
-        else:
-            fill_zero_weight = False
-
-        flags = 0
         try:
             numiter, fdiff, sky = self._runner(
                 conf,
@@ -300,19 +320,7 @@ class EMFitter(object):
             gm = GMix(pars=pars)
             gm_conv = GMix(pars=pars_conv)
 
-            if numiter >= self.maxiter:
-                flags = EM_MAXITER
-                message = 'maxit'
-            else:
-                message = 'OK'
-
-            result = {
-                'flags': flags,
-                'numiter': numiter,
-                'fdiff': fdiff,
-                'sky': sky,
-                'message': message,
-            }
+            result = self._get_result(numiter, fdiff, sky)
 
         except (GMixRangeError, ZeroDivisionError) as err:
             gm = None
@@ -326,6 +334,249 @@ class EMFitter(object):
 
         return EMResult(obs=obs, result=result, gm=gm, gm_conv=gm_conv)
 
+    def go_batch(self, obs_list, guesses, sky=None, parallel=False):
+        """
+        Run the em algorithm for a set of observations, e.g. psf stamps, in
+        a single call to a compiled kernel
+
+        The pixels and mixtures for all observations are packed into
+        contiguous arrays, avoiding the per-call overhead of go.  The results
+        are the same as calling go for each observation.
+
+        parameters
+        ----------
+        obs_list: sequence of Observation
+            The observations to fit.  All must have the same pixels layout.
+        guesses: GMix or sequence of GMix
+            The starting guess for each observation, or a single guess to
+            use for all.  These should be *before* psf convolution.
+        sky: number or sequence, optional
+            The sky value for each image, or a single value for all.  If
+            you don't send this, the sky is set for each image as for go.
+        parallel: bool, optional
+            If True, fit the observations using multiple threads, as set by
+            numba.set_num_threads.  Default False
+
+        Returns
+        -------
+        results: list of EMResult
+            The result for each observation, with flags set for failed fits
+        """
+        nobj = len(obs_list)
+
+        if isinstance(guesses, GMix):
+            guesses = [guesses] * nobj
+        elif len(guesses) != nobj:
+            raise ValueError(
+                'got %d guesses for %d observations' % (len(guesses), nobj)
+            )
+
+        if sky is None or np.ndim(sky) == 0:
+            input_skies = np.full(nobj, np.nan if sky is None else sky)
+        else:
+            input_skies = np.array(sky, dtype='f8')
+            if input_skies.size != nobj:
+                raise ValueError(
+                    'got %d sky values for %d observations' % (
+                        input_skies.size, nobj,
+                    )
+                )
+
+        confs = np.zeros(nobj, dtype=_em_conf_dtype)
+        confs['tol'] = self.tol
+        confs['miniter'] = self.miniter
+        confs['maxiter'] = self.maxiter
+        confs['vary_sky'] = self.vary_sky
+
+        fill_zero_weight = np.zeros(nobj, dtype=bool)
+        pixels_list = []
+        psf_gmixes = []
+        conv_sizes = np.zeros(nobj + 1, dtype='i8')
+
+        for i, obs in enumerate(obs_list):
+            if not isinstance(obs, Observation):
+                raise ValueError(
+                    'input obs must be an instance of Observation'
+                )
+
+            (
+                pixels, confs['sky'][i], confs['val_offset'][i],
+                fill_zero_weight[i],
+            ) = _get_fit_pixels(obs, input_skies[i])
+            if i > 0 and pixels.dtype != pixels_list[0].dtype:
+                raise ValueError(
+                    'all observations must have the same pixels layout'
+                )
+            pixels_list.append(pixels)
+
+            gmix_psf = _get_psf_gmix(obs)
+            psf_gmixes.append(gmix_psf)
+            conv_sizes[i+1] = len(guesses[i]) * len(gmix_psf)
+
+        pixels, pixel_starts = _pack_pixels(pixels_list)
+        gmix_data, gmix_starts = pack_gmixes(guesses)
+        psf_data, psf_starts = pack_gmixes(psf_gmixes)
+
+        conv_starts = conv_sizes.cumsum()
+        conv_data = np.zeros(conv_starts[-1], dtype=gmix_data.dtype)
+
+        # the full sums have the fields needed by all the fitters
+        sums = np.zeros(gmix_data.size, dtype=_sums_dtype)
+
+        numiter = np.zeros(nobj, dtype='i4')
+        fdiff = np.zeros(nobj)
+        skies = np.zeros(nobj)
+        errors = np.zeros(nobj, dtype=bool)
+
+        if parallel:
+            runner = em_run_batch_parallel
+        else:
+            runner = em_run_batch
+
+        runner(
+            self._batch_kind,
+            self.accelerate,
+            confs,
+            pixels,
+            pixel_starts,
+            sums,
+            gmix_data,
+            gmix_starts,
+            psf_data,
+            psf_starts,
+            conv_data,
+            conv_starts,
+            fill_zero_weight,
+            numiter,
+            fdiff,
+            skies,
+            errors,
+        )
+
+        results = []
+        for i, obs in enumerate(obs_list):
+            if errors[i]:
+                # the kernel cannot tell the type of the exception, so fit
+                # the observation again as for go, which flags range errors
+                # and lets any other error propagate
+                results.append(
+                    self._go(obs, guesses[i], input_skies[i], self.miniter)
+                )
+                continue
+
+            gm = _unpack_gmix(gmix_data, gmix_starts, i)
+            gm_conv = _unpack_gmix(conv_data, conv_starts, i)
+            result = self._get_result(numiter[i], fdiff[i], skies[i])
+
+            results.append(
+                EMResult(obs=obs, result=result, gm=gm, gm_conv=gm_conv)
+            )
+
+        return results
+
+    def go_warm(self, obs_list, guess, sky=None, positions=None,
+                warm_miniter=None):
+        """
+        Run the em algorithm for a sequence of observations of similar
+        objects, e.g. psf stamps at a grid of positions, starting each fit
+        from the converged mixture for the previous observation
+
+        Neighbouring psf stamps have nearly the same mixture, so the warm
+        started fits converge in far fewer iterations than starting from the
+        guess each time.  If a warm started fit fails, the observation is
+        fit again starting from the guess, and the next observation is
+        started from the last successful fit.
+
+        parameters
+        ----------
+        obs_list: sequence of Observation
+            The observations to fit, ordered such that neighbouring
+            observations are similar, e.g. stamps ordered by position.
+        guess: GMix
+            A gaussian mixture (GMix or child class) representing a starting
+            guess for the first observation, and for any that fail with a
+            warm start.  This should be *before* psf convolution.
+        sky: number or sequence, optional
+            The sky value for each image, or a single value for all.  If
+            you don't send this, the sky is set for each image as for go.
+        positions: array, optional
+            The positions of the observations, e.g. the row and column of
+            each stamp on the image, with shape [nobj, ndim].  If sent, the
+            observations are fit in nearest neighbour order, starting with
+            the first, rather than in the order of obs_list.
+        warm_miniter: number, optional
+            The minimum number of iterations for the warm started fits.  The
+            default miniter of 40 is often more than a warm started fit
+            needs, so set this lower to take advantage of the good starting
+            point.  Default is the miniter for the fitter.
+
+        Returns
+        -------
+        results: list of EMResult
+            The result for each observation, in the order of obs_list.  The
+            results have an extra entry 'warm', True if the fit was warm
+            started.
+        """
+        nobj = len(obs_list)
+
+        if sky is None or np.ndim(sky) == 0:
+            skies = [sky] * nobj
+        else:
+            skies = sky
+            if len(skies) != nobj:
+                raise ValueError(
+                    'got %d sky values for %d observations' % (
+                        len(skies), nobj,
+                    )
+                )
+
+        if positions is None:
+            order = np.arange(nobj)
+        else:
+            order = _get_warm_order(positions, nobj)
+
+        if warm_miniter is None:
+            warm_miniter = self.miniter
+
+        results = [None] * nobj
+        warm_guess = None
+
+        for i in order:
+            res = None
+            if warm_guess is not None:
+                res = self._go(obs_list[i], warm_guess, skies[i], warm_miniter)
+                res['warm'] = True
+
+            if res is None or res['flags'] != 0:
+                res = self._go(obs_list[i], guess, skies[i], self.miniter)
+                res['warm'] = False
+
+            if res['flags'] == 0:
+                warm_guess = res.get_gmix()
+
+            results[i] = res
+
+        return results
+
+    def _get_result(self, numiter, fdiff, sky):
+        """
+        get the result dict for a successful run
+        """
+        if numiter >= self.maxiter:
+            flags = EM_MAXITER
+            message = 'maxit'
+        else:
+            flags = 0
+            message = 'OK'
+
+        return {
+            'flags': flags,
+            'numiter': numiter,
+            'fdiff': fdiff,
+            'sky': sky,
+            'message': message,
+        }
+
     def _make_sums(self, ngauss):
         """
         make the sum structure
@@ -346,8 +597,13 @@ class EMFitter(object):
 
         return conf
 
+    _batch_kind = EM_BATCH_FULL
+
     def _set_runner(self):
-        self._runner = em_run
+        if self.accelerate:
+            self._runner = em_run_accel
+        else:
+            self._runner = em_run
 
 
 class EMFitterFixCen(EMFitter):
@@ -365,6 +621,11 @@ class EMFitterFixCen(EMFitter):
         default 0.001
     vary_sky: bool
         If True, fit for the sky level
+    accelerate: bool, optional
+        If True, extrapolate the EM steps using the SQUAREM scheme, which
+        typically converges in a fraction of the passes over the pixels.
+        The number of iterations is then the number of passes over the
+        pixels, and miniter may be reduced.  Default False
     """
 
     def _make_sums(self, ngauss):
@@ -373,8 +634,13 @@ class EMFitterFixCen(EMFitter):
         """
         return np.zeros(ngauss, dtype=_sums_dtype_fixcen)
 
+    _batch_kind = EM_BATCH_FIXCEN
+
     def _set_runner(self):
-        self._runner = em_run_fixcen
+        if self.accelerate:
+            self._runner = em_run_fixcen_accel
+        else:
+            self._runner = em_run_fixcen
 
 
 class EMFitterFixCov(EMFitter):
@@ -392,6 +658,11 @@ class EMFitterFixCov(EMFitter):
         default 0.001
     vary_sky: bool
         If True, fit for the sky level
+    accelerate: bool, optional
+        If True, extrapolate the EM steps using the SQUAREM scheme, which
+        typically converges in a fraction of the passes over the pixels.
+        The number of iterations is then the number of passes over the
+        pixels, and miniter may be reduced.  Default False
     """
 
     def _make_sums(self, ngauss):
@@ -400,8 +671,13 @@ class EMFitterFixCov(EMFitter):
         """
         return np.zeros(ngauss, dtype=_sums_dtype_fixcov)
 
+    _batch_kind = EM_BATCH_FIXCOV
+
     def _set_runner(self):
-        self._runner = em_run_fixcov
+        if self.accelerate:
+            self._runner = em_run_fixcov_accel
+        else:
+            self._runner = em_run_fixcov
 
 
 class EMFitterFluxOnly(EMFitterFixCen):
@@ -420,13 +696,19 @@ class EMFitterFluxOnly(EMFitterFixCen):
         default 0.001
     vary_sky: bool
         If True, fit for the sky level
+    accelerate: bool, optional
+        If True, extrapolate the EM steps using the SQUAREM scheme, which
+        typically converges in a fraction of the passes over the pixels.
+        The number of iterations is then the number of passes over the
+        pixels, and miniter may be reduced.  Default False
     """
 
     def __init__(self,
                  miniter=20,
                  maxiter=500,
                  tol=DEFAULT_TOL,
-                 vary_sky=False):
+                 vary_sky=False,
+                 accelerate=False):
         """
         over-riding because we want a different default miniter
         """
@@ -435,10 +717,16 @@ class EMFitterFluxOnly(EMFitterFixCen):
             maxiter=maxiter,
             tol=tol,
             vary_sky=vary_sky,
+            accelerate=accelerate,
         )
 
+    _batch_kind = EM_BATCH_FLUXONLY
+
     def _set_runner(self):
-        self._runner = em_run_fluxonly
+        if self.accelerate:
+            self._runner = em_run_fluxonly_accel
+        else:
+            self._runner = em_run_fluxonly
 
     def _make_sums(self, ngauss):
         """
@@ -447,11 +735,134 @@ class EMFitterFluxOnly(EMFitterFixCen):
         return np.zeros(ngauss, dtype=_sums_dtype_fluxonly)
 
 
+def _get_psf_gmix(obs):
+    """
+    get a copy of the psf mixture with unit flux, or a single gaussian with
+    zero size if there is no psf
+    """
+    # makes a copy
+    if not obs.has_psf() or not obs.psf.has_gmix():
+        logger.debug('NO PSF SET')
+        gmix_psf = GMixModel([0., 0., 0., 0., 0., 1.0], 'gauss')
+    else:
+        gmix_psf = obs.psf.gmix
+        gmix_psf.set_flux(1.0)
+
+    return gmix_psf
+
+
+def _get_warm_order(positions, nobj):
+    """
+    get the order in which to fit the observations in go_warm, starting with
+    the first and moving each time to the nearest observation not yet fit
+    """
+    positions = np.array(positions, dtype='f8', ndmin=2)
+    if positions.shape[0] != nobj:
+        raise ValueError(
+            'got %d positions for %d observations' % (
+                positions.shape[0], nobj,
+            )
+        )
+
+    order = np.zeros(nobj, dtype='i8')
+    if nobj == 0:
+        return order
+
+    done = np.zeros(nobj, dtype=bool)
+
+    current = 0
+    for i in range(nobj):
+        order[i] = current
+        done[current] = True
+        if i == nobj - 1:
+            break
+
+        dist2 = ((positions - positions[current])**2).sum(axis=1)
+        dist2[done] = np.inf
+        current = dist2.argmin()
+
+    return order
+
+
+def _get_fit_pixels(obs, sky):
+    """
+    get the pixels to fit, avoiding making a new observation with prep_obs
+    where possible
+
+    Parameters
+    ----------
+    obs: Observation
+        The observation to fit
+    sky: float
+        The sky, or None or nan to set it as for prep_obs
+
+    Returns
+    -------
+    pixels, sky, val_offset, fill_zero_weight
+        The pixels, which are not a copy, the sky, the value to add to the
+        pixel values in the fit and whether to fill zero weight pixels
+    """
+    if sky is None or np.isnan(sky):
+        # prep_obs does not keep the weight, so all pixels are used.  The
+        # pixels are not stored for observations with store_pixels=False
+        obs_pixels = obs.pixels
+        if obs_pixels is not None and obs_pixels.size == obs.image.size:
+            pixels = obs_pixels
+            sky = _get_prep_sky(obs.image)
+            val_offset = sky
+        else:
+            obs_sky, sky = prep_obs(obs)
+            pixels = obs_sky.pixels
+            val_offset = 0.0
+
+        fill_zero_weight = False
+    else:
+        pixels = obs.pixels
+        val_offset = 0.0
+        fill_zero_weight = obs.has_zero_weight_pixels()
+
+    return pixels, sky, val_offset, fill_zero_weight
+
+
+def _pack_pixels(pixels_list):
+    """
+    pack the pixels for a set of observations into a new array
+
+    Returns
+    -------
+    pixels, starts: array, array
+        The packed pixels and the offsets of the pixels for each observation
+    """
+    sizes = np.zeros(len(pixels_list) + 1, dtype='i8')
+    for i, pixels in enumerate(pixels_list):
+        sizes[i+1] = pixels.size
+
+    starts = sizes.cumsum()
+
+    if len(pixels_list) > 0:
+        pixels = np.concatenate(pixels_list)
+    else:
+        pixels = np.zeros(0, dtype=get_pixels_dtype())
+
+    return pixels, starts
+
+
+def _unpack_gmix(gmix_data, starts, i):
+    """
+    get a GMix holding a copy of mixture i from packed data
+    """
+    data = gmix_data[starts[i]:starts[i+1]]
+    gm = GMix(ngauss=data.size)
+    gm.get_data()[:] = data
+    return gm
+
+
 _em_conf_dtype = [
     ('tol', 'f8'),
     ('maxiter', 'i4'),
     ('miniter', 'i4'),
     ('sky', 'f8'),
+    ('val_offset', 'f8'),
     ('vary_sky', 'bool'),
 ]
 _em_conf_dtype = np.dtype(_em_conf_dtype, align=True)
@@ -1,5 +1,5 @@
 import numpy as np
-from numba import njit
+from numba import njit, prange
 from ..gexceptions import GMixRangeError
 from ..gmix.gmix_nb import (
     gauss2d_set,
@@ -9,10 +9,10 @@ from ..gmix.gmix_nb import (
     gmix_eval_pixel_fast,
     GMIX_LOW_DETVAL,
 )
-from ..fastexp_nb import fexp
+from ..fastexp_nb import fexp, FASTEXP_MAX_CHI2
 
 
-@njit
+@njit(nogil=True)
 def em_run(conf,
            pixels,
            sums,
@@ -33,6 +33,8 @@ def em_run(conf,
             miniter: minimum number of iterations
             maxiter: maximum number of iterations
             sky: the sky, or guess for sky if fitting for it
+            val_offset: value added to the pixel values, e.g. the sky
+                set by prep_obs
             vary_sky: True if fitting for the sky
 
     pixels: pixel array
@@ -66,6 +68,7 @@ def em_run(conf,
     npix = pixels.size
 
     sky = conf['sky']
+    val_offset = conf['val_offset']
 
     elogL_last = -9999.9e9
 
@@ -76,9 +79,10 @@ def em_run(conf,
 
         clear_sums(sums)
         set_logtau_logdet(gmix_conv, taudata)
+        set_chi2_bounds(gmix_conv, taudata)
 
         if fill_zero_weight:
-            fill_zero_weight_pixels(gmix_conv, pixels, sky)
+            fill_zero_weight_pixels(gmix_conv, pixels, sky, val_offset)
 
         for pixel in pixels:
 
@@ -87,15 +91,16 @@ def em_run(conf,
                 taudata,
             )
 
+            val = pixel['val'] + val_offset
             gtot = gsum + sky
             if gtot == 0.0:
                 raise GMixRangeError('gtot == 0')
 
             elogL += tlogL
 
-            skysum += sky*pixel['val']/gtot
+            skysum += sky*val/gtot
 
-            do_sums(sums, pixel, gtot)
+            do_sums(sums, val, gtot)
 
         gmix_set_from_sums(
             gmix,
@@ -127,7 +132,7 @@ def em_run(conf,
     return numiter, frac_diff, sky
 
 
-@njit
+@njit(nogil=True)
 def clear_sums(sums):
     """
     set all sums to zero
@@ -157,7 +162,7 @@ def clear_sums(sums):
     sums['v2sum'][:] = 0.0
 
 
-@njit
+@njit(nogil=True)
 def do_scratch_sums(pixel, gmix_conv, sums, ngauss_psf, taudata):
     """
     do the basic sums for this pixel, using scratch space in the sums struct
@@ -212,19 +217,25 @@ def do_scratch_sums(pixel, gmix_conv, sums, ngauss_psf, taudata):
             # in practice we have co-centric gaussians even after psf
             # convolution, so we could move these to the outer loop
 
+            # the value is zero outside the box holding the region with
+            # chi2 < FASTEXP_MAX_CHI2, so skip the gaussian
             vdiff = v - gauss['row']
-            udiff = u - gauss['col']
+            v2 = vdiff*vdiff
+            if v2 >= ttau['v2max']:
+                continue
 
+            udiff = u - gauss['col']
             u2 = udiff*udiff
-            v2 = vdiff*vdiff
+            if u2 >= ttau['u2max']:
+                continue
+
             uv = udiff*vdiff
 
             chi2 = gauss['dcc']*v2 + gauss['drr']*u2 - 2.0*gauss['drc']*uv
+            if not (chi2 < FASTEXP_MAX_CHI2 and chi2 >= 0.0):
+                continue
 
-            if chi2 < 25.0 and chi2 >= 0.0:
-                val = gauss['pnorm']*fexp(-0.5*chi2) * pixel['area']
-            else:
-                val = 0.0
+            val = gauss['pnorm']*fexp(-0.5*chi2) * pixel['area']
 
             tsums['gi'] += val
             gsum += val
@@ -246,8 +257,8 @@ def do_scratch_sums(pixel, gmix_conv, sums, ngauss_psf, taudata):
     return gsum, logL
 
 
-@njit
-def do_sums(sums, pixel, gtot):
+@njit(nogil=True)
+def do_sums(sums, val, gtot):
     """
     do the sums based on the scratch values
 
@@ -255,13 +266,13 @@ def do_sums(sums, pixel, gtot):
     ----------
     sums: sums structure
         With dtype _sums_dtype
-    pixel: pixel structure
-        Dtype should be ngmix.pixels._pixels_dtype
+    val: float
+        The pixel value, including any offset
     gtot: float
         The sum over gaussian values
     """
 
-    factor = pixel['val']/gtot
+    factor = val/gtot
 
     n_gauss = sums.size
     for i in range(n_gauss):
@@ -281,7 +292,7 @@ def do_sums(sums, pixel, gtot):
         tsums['v2sum'] += tsums['tv2sum']*factor
 
 
-@njit
+@njit(nogil=True)
 def gmix_set_from_sums(gmix,
                        gmix_psf,
                        gmix_conv,
@@ -354,7 +365,7 @@ def gmix_set_from_sums(gmix,
     gmix_set_norms(gmix_conv)
 
 
-@njit
+@njit(nogil=True)
 def em_run_fixcen(conf,
                   pixels,
                   sums,
@@ -375,6 +386,8 @@ def em_run_fixcen(conf,
             miniter: minimum number of iterations
             maxiter: maximum number of iterations
             sky: the sky, or guess for sky if fitting for it
+            val_offset: value added to the pixel values, e.g. the sky
+                set by prep_obs
             vary_sky: True if fitting for the sky
 
     pixels: pixel array
@@ -408,6 +421,7 @@ def em_run_fixcen(conf,
     npix = pixels.size
 
     sky = conf['sky']
+    val_offset = conf['val_offset']
 
     elogL_last = -9999.9e9
 
@@ -418,9 +432,10 @@ def em_run_fixcen(conf,
 
         clear_sums_fixcen(sums)
         set_logtau_logdet(gmix_conv, taudata)
+        set_chi2_bounds(gmix_conv, taudata)
 
         if fill_zero_weight:
-            fill_zero_weight_pixels(gmix_conv, pixels, sky)
+            fill_zero_weight_pixels(gmix_conv, pixels, sky, val_offset)
 
         for pixel in pixels:
 
@@ -429,15 +444,16 @@ def em_run_fixcen(conf,
                 taudata,
             )
 
+            val = pixel['val'] + val_offset
             gtot = gsum + sky
             if gtot == 0.0:
                 raise GMixRangeError('gtot == 0')
 
             elogL += tlogL
 
-            skysum += sky*pixel['val']/gtot
+            skysum += sky*val/gtot
 
-            do_sums_fixcen(sums, pixel, gtot)
+            do_sums_fixcen(sums, val, gtot)
 
         gmix_set_from_sums_fixcen(
             gmix,
@@ -469,7 +485,7 @@ def em_run_fixcen(conf,
     return numiter, frac_diff, sky
 
 
-@njit
+@njit(nogil=True)
 def do_scratch_sums_fixcen(pixel, gmix_conv, sums, ngauss_psf, taudata):
     """
     do the basic sums for this pixel, using scratch space in the sums struct
@@ -522,19 +538,25 @@ def do_scratch_sums_fixcen(pixel, gmix_conv, sums, ngauss_psf, taudata):
             # in practice we have co-centric gaussians even after psf
             # convolution, so we could move these to the outer loop
 
+            # the value is zero outside the box holding the region with
+            # chi2 < FASTEXP_MAX_CHI2, so skip the gaussian
             vdiff = v - gauss['row']
-            udiff = u - gauss['col']
+            v2 = vdiff*vdiff
+            if v2 >= ttau['v2max']:
+                continue
 
+            udiff = u - gauss['col']
             u2 = udiff*udiff
-            v2 = vdiff*vdiff
+            if u2 >= ttau['u2max']:
+                continue
+
             uv = udiff*vdiff
 
             chi2 = gauss['dcc']*v2 + gauss['drr']*u2 - 2.0*gauss['drc']*uv
+            if not (chi2 < FASTEXP_MAX_CHI2 and chi2 >= 0.0):
+                continue
 
-            if chi2 < 25.0 and chi2 >= 0.0:
-                val = gauss['pnorm']*fexp(-0.5*chi2) * pixel['area']
-            else:
-                val = 0.0
+            val = gauss['pnorm']*fexp(-0.5*chi2) * pixel['area']
 
             tsums['gi'] += val
             gsum += val
@@ -553,8 +575,8 @@ def do_scratch_sums_fixcen(pixel, gmix_conv, sums, ngauss_psf, taudata):
     return gsum, logL
 
 
-@njit
-def do_sums_fixcen(sums, pixel, gtot):
+@njit(nogil=True)
+def do_sums_fixcen(sums, val, gtot):
     """
     do the sums based on the scratch values
 
@@ -562,13 +584,13 @@ def do_sums_fixcen(sums, pixel, gtot):
     ----------
     sums: sums structure
         With dtype _sums_dtype_fixcen
-    pixel: pixel structure
-        Dtype should be ngmix.pixels._pixels_dtype
+    val: float
+        The pixel value, including any offset
     gtot: float
         The sum over gaussian values
     """
 
-    factor = pixel['val']/gtot
+    factor = val/gtot
 
     n_gauss = sums.size
     for i in range(n_gauss):
@@ -584,7 +606,7 @@ def do_sums_fixcen(sums, pixel, gtot):
         tsums['v2sum'] += tsums['tv2sum']*factor
 
 
-@njit
+@njit(nogil=True)
 def gmix_set_from_sums_fixcen(gmix,
                               gmix_psf,
                               gmix_conv,
@@ -655,7 +677,7 @@ def gmix_set_from_sums_fixcen(gmix,
     gmix_set_norms(gmix_conv)
 
 
-@njit
+@njit(nogil=True)
 def set_logtau_logdet(gmix, sums):
     """
     set log(tau) and log(det) for every gaussian
@@ -675,7 +697,29 @@ def set_logtau_logdet(gmix, sums):
         tsums['logdet'] = np.log(gauss['det'])
 
 
-@njit
+@njit(nogil=True)
+def set_chi2_bounds(gmix, taudata):
+    """
+    set the squared half widths of the box around each gaussian that holds
+    the region with chi2 < FASTEXP_MAX_CHI2, outside of which the gaussian
+    evaluates to zero
+
+    Parameters
+    -----------
+    gmix: ngmix.Gmix
+        gaussian Mixture
+    taudata: array
+        Array with dtype _tau_dtype
+    """
+
+    for i in range(gmix.size):
+        gauss = gmix[i]
+        ttau = taudata[i]
+        ttau['v2max'] = FASTEXP_MAX_CHI2*gauss['irr']
+        ttau['u2max'] = FASTEXP_MAX_CHI2*gauss['icc']
+
+
+@njit(nogil=True)
 def clear_sums_fixcen(sums):
     """
     set all sums to zero
@@ -699,7 +743,7 @@ def clear_sums_fixcen(sums):
 
 
 # start fixcov
-@njit
+@njit(nogil=True)
 def em_run_fixcov(
     conf,
     pixels,
@@ -722,6 +766,8 @@ def em_run_fixcov(
             miniter: minimum number of iterations
             maxiter: maximum number of iterations
             sky: the sky, or guess for sky if fitting for it
+            val_offset: value added to the pixel values, e.g. the sky
+                set by prep_obs
             vary_sky: True if fitting for the sky
 
     pixels: pixel array
@@ -755,6 +801,7 @@ def em_run_fixcov(
     npix = pixels.size
 
     sky = conf['sky']
+    val_offset = conf['val_offset']
 
     elogL_last = -9999.9e9
 
@@ -765,9 +812,10 @@ def em_run_fixcov(
 
         clear_sums_fixcov(sums)
         set_logtau_logdet(gmix_conv, taudata)
+        set_chi2_bounds(gmix_conv, taudata)
 
         if fill_zero_weight:
-            fill_zero_weight_pixels(gmix_conv, pixels, sky)
+            fill_zero_weight_pixels(gmix_conv, pixels, sky, val_offset)
 
         for pixel in pixels:
 
@@ -776,15 +824,16 @@ def em_run_fixcov(
                 taudata,
             )
 
+            val = pixel['val'] + val_offset
             gtot = gsum + sky
             if gtot == 0.0:
                 raise GMixRangeError('gtot == 0')
 
             elogL += tlogL
 
-            skysum += sky*pixel['val']/gtot
+            skysum += sky*val/gtot
 
-            do_sums_fixcov(sums, pixel, gtot)
+            do_sums_fixcov(sums, val, gtot)
 
         gmix_set_from_sums_fixcov(
             gmix,
@@ -816,7 +865,7 @@ def em_run_fixcov(
     return numiter, frac_diff, sky
 
 
-@njit
+@njit(nogil=True)
 def clear_sums_fixcov(sums):
     """
     set all sums to zero
@@ -838,7 +887,7 @@ def clear_sums_fixcov(sums):
     sums['vsum'][:] = 0.0
 
 
-@njit
+@njit(nogil=True)
 def do_scratch_sums_fixcov(pixel, gmix_conv, sums, ngauss_psf, taudata):
     """
     do the basic sums for this pixel, using scratch space in the sums struct
@@ -890,19 +939,25 @@ def do_scratch_sums_fixcov(pixel, gmix_conv, sums, ngauss_psf, taudata):
             # in practice we have co-centric gaussians even after psf
             # convolution, so we could move these to the outer loop
 
+            # the value is zero outside the box holding the region with
+            # chi2 < FASTEXP_MAX_CHI2, so skip the gaussian
             vdiff = v - gauss['row']
-            udiff = u - gauss['col']
+            v2 = vdiff*vdiff
+            if v2 >= ttau['v2max']:
+                continue
 
+            udiff = u - gauss['col']
             u2 = udiff*udiff
-            v2 = vdiff*vdiff
+            if u2 >= ttau['u2max']:
+                continue
+
             uv = udiff*vdiff
 
             chi2 = gauss['dcc']*v2 + gauss['drr']*u2 - 2.0*gauss['drc']*uv
+            if not (chi2 < FASTEXP_MAX_CHI2 and chi2 >= 0.0):
+                continue
 
-            if chi2 < 25.0 and chi2 >= 0.0:
-                val = gauss['pnorm']*fexp(-0.5*chi2) * pixel['area']
-            else:
-                val = 0.0
+            val = gauss['pnorm']*fexp(-0.5*chi2) * pixel['area']
 
             tsums['gi'] += val
             gsum += val
@@ -920,8 +975,8 @@ def do_scratch_sums_fixcov(pixel, gmix_conv, sums, ngauss_psf, taudata):
     return gsum, logL
 
 
-@njit
-def do_sums_fixcov(sums, pixel, gtot):
+@njit(nogil=True)
+def do_sums_fixcov(sums, val, gtot):
     """
     do the sums based on the scratch values
 
@@ -929,13 +984,13 @@ def do_sums_fixcov(sums, pixel, gtot):
     ----------
     sums: sums structure
         With dtype _sums_dtype
-    pixel: pixel structure
-        Dtype should be ngmix.pixels._pixels_dtype
+    val: float
+        The pixel value, including any offset
     gtot: float
         The sum over gaussian values
     """
 
-    factor = pixel['val']/gtot
+    factor = val/gtot
 
     n_gauss = sums.size
     for i in range(n_gauss):
@@ -951,7 +1006,7 @@ def do_sums_fixcov(sums, pixel, gtot):
         tsums['vsum'] += tsums['tvsum']*factor
 
 
-@njit
+@njit(nogil=True)
 def gmix_set_from_sums_fixcov(
     gmix,
     gmix_psf,
@@ -1002,7 +1057,7 @@ def gmix_set_from_sums_fixcov(
 # end fixcov
 
 
-@njit
+@njit(nogil=True)
 def em_run_fluxonly(
     conf,
     pixels,
@@ -1024,6 +1079,8 @@ def em_run_fluxonly(
             miniter: minimum number of iterations
             maxiter: maximum number of iterations
             sky: the sky, or guess for sky if fitting for it
+            val_offset: value added to the pixel values, e.g. the sky
+                set by prep_obs
             vary_sky: True if fitting for the sky
 
     pixels: pixel array
@@ -1050,11 +1107,16 @@ def em_run_fluxonly(
     gmix_set_norms(gmix_conv)
     ngauss_psf = gmix_psf.size
 
+    # only the fluxes vary, so the bounds do not change
+    taudata = np.zeros(gmix_conv.size, dtype=_tau_dtype)
+    set_chi2_bounds(gmix_conv, taudata)
+
     tol = conf['tol']
 
     npix = pixels.size
 
     sky = conf['sky']
+    val_offset = conf['val_offset']
 
     p_last = gmix['p'].sum()
 
@@ -1063,20 +1125,23 @@ def em_run_fluxonly(
         clear_sums_fluxonly(sums)
 
         if fill_zero_weight:
-            fill_zero_weight_pixels(gmix_conv, pixels, sky)
+            fill_zero_weight_pixels(gmix_conv, pixels, sky, val_offset)
 
         for pixel in pixels:
 
             # this fills some fields of sums, as well as return
-            gsum = do_scratch_sums_fluxonly(pixel, gmix_conv, sums, ngauss_psf)
+            gsum = do_scratch_sums_fluxonly(
+                pixel, gmix_conv, sums, ngauss_psf, taudata,
+            )
 
+            val = pixel['val'] + val_offset
             gtot = gsum + sky
             if gtot == 0.0:
                 raise GMixRangeError("gtot == 0")
 
-            skysum += sky*pixel['val']/gtot
+            skysum += sky*val/gtot
 
-            do_sums_fluxonly(sums, pixel, gtot)
+            do_sums_fluxonly(sums, val, gtot)
 
         gmix_set_from_sums_fluxonly(
             gmix,
@@ -1106,8 +1171,8 @@ def em_run_fluxonly(
     return numiter, frac_diff, sky
 
 
-@njit
-def do_scratch_sums_fluxonly(pixel, gmix_conv, sums, ngauss_psf):
+@njit(nogil=True)
+def do_scratch_sums_fluxonly(pixel, gmix_conv, sums, ngauss_psf, taudata):
     """
     do the basic sums for this pixel, using
     scratch space in the sums struct
@@ -1122,6 +1187,8 @@ def do_scratch_sums_fluxonly(pixel, gmix_conv, sums, ngauss_psf):
         With dtype _sums_dtype_fluxonly
     ngauss_psf: int
         Number of gaussians in psf
+    taudata: tau data struct
+        With dtype _tau_dtype, only the chi2 bounds are used
 
     Returns
     -------
@@ -1146,23 +1213,30 @@ def do_scratch_sums_fluxonly(pixel, gmix_conv, sums, ngauss_psf):
 
         for i in range(start, end):
             gauss = gmix_conv[i]
+            ttau = taudata[i]
 
             # in practice we have co-centric gaussians even after psf
             # convolution, so we could move these to the outer loop
 
-            vdiff = v-gauss['row']
-            udiff = u-gauss['col']
+            # the value is zero outside the box holding the region with
+            # chi2 < FASTEXP_MAX_CHI2, so skip the gaussian
+            vdiff = v - gauss['row']
+            v2 = vdiff*vdiff
+            if v2 >= ttau['v2max']:
+                continue
 
+            udiff = u - gauss['col']
             u2 = udiff*udiff
-            v2 = vdiff*vdiff
+            if u2 >= ttau['u2max']:
+                continue
+
             uv = udiff*vdiff
 
             chi2 = gauss['dcc']*v2 + gauss['drr']*u2 - 2.0*gauss['drc']*uv
+            if not (chi2 < FASTEXP_MAX_CHI2 and chi2 >= 0.0):
+                continue
 
-            if chi2 < 25.0 and chi2 >= 0.0:
-                val = gauss['pnorm']*fexp(-0.5*chi2) * pixel['area']
-            else:
-                val = 0.0
+            val = gauss['pnorm']*fexp(-0.5*chi2) * pixel['area']
 
             tsums['gi'] += val
             gsum += val
@@ -1170,8 +1244,8 @@ def do_scratch_sums_fluxonly(pixel, gmix_conv, sums, ngauss_psf):
     return gsum
 
 
-@njit
-def do_sums_fluxonly(sums, pixel, gtot):
+@njit(nogil=True)
+def do_sums_fluxonly(sums, val, gtot):
     """
     do the sums based on the scratch values
 
@@ -1179,13 +1253,13 @@ def do_sums_fluxonly(sums, pixel, gtot):
     ----------
     sums: sums structure
         With dtype _sums_dtype_fluxonly
-    pixel: pixel structure
-        Dtype should be ngmix.pixels._pixels_dtype
+    val: float
+        The pixel value, including any offset
     gtot: float
         The sum over gaussian values
     """
 
-    factor = pixel['val']/gtot
+    factor = val/gtot
 
     n_gauss = sums.size
     for i in range(n_gauss):
@@ -1197,7 +1271,7 @@ def do_sums_fluxonly(sums, pixel, gtot):
         tsums['pnew'] += wtau
 
 
-@njit
+@njit(nogil=True)
 def gmix_set_from_sums_fluxonly(
     gmix,
     gmix_psf,
@@ -1241,7 +1315,7 @@ def gmix_set_from_sums_fluxonly(
     gmix_set_norms(gmix_conv)
 
 
-@njit
+@njit(nogil=True)
 def clear_sums_fluxonly(sums):
     """
     set all sums to zero
@@ -1257,7 +1331,7 @@ def clear_sums_fluxonly(sums):
     sums['pnew'][:] = 0.0
 
 
-@njit
+@njit(nogil=True)
 def gmix_get_moms(gmix):
     """
     get row, col, irr, irc, icc, psum
@@ -1294,8 +1368,8 @@ def gmix_get_moms(gmix):
     return row, col, irr, irc, icc, psum
 
 
-@njit
-def fill_zero_weight_pixels(gmix, pixels, sky):
+@njit(nogil=True)
+def fill_zero_weight_pixels(gmix, pixels, sky, val_offset=0.0):
     """
     fill zero weight pixels with the model
 
@@ -1307,16 +1381,1379 @@ def fill_zero_weight_pixels(gmix, pixels, sky):
         The pixels to be modified
     sky: float
         Value of the sky in the pixels
+    val_offset: float, optional
+        Value added to the pixel values by the caller, subtracted from the
+        filled values.  Default 0
     """
 
     for pixel in pixels:
         if pixel['ierr'] <= 0.0:
             val = gmix_eval_pixel_fast(gmix, pixel)
-            pixel['val'] = sky + val
+            pixel['val'] = sky + val - val_offset
+
+
+# start accelerated EM
+
+@njit(nogil=True)
+def em_run_accel(conf,
+                 pixels,
+                 sums,
+                 gmix,
+                 gmix_psf,
+                 gmix_conv,
+                 fill_zero_weight=False):
+    """
+    run the EM algorithm with SQUAREM acceleration, Varadhan & Roland
+    (2008, Scand. J. Stat. 35, 335)
+
+    Each cycle takes three EM steps from theta0 to theta1, theta2 and
+    theta3, and extrapolates along r = theta1 - theta0 and
+    v = theta2 - 2 theta1 + theta0 to
+
+        theta' = theta0 - 2 alpha r + alpha^2 v,  alpha = -|r|/|v|
+
+    An EM step is taken from theta', and the result is kept if the
+    likelihood at theta' is at least that at theta2, otherwise the cycle
+    continues from theta3.  If theta' is not a valid mixture the step
+    length is reduced toward alpha = -1, which gives theta2, in which case
+    the cycle continues from theta3 without the extra step.
+
+    The step length is limited to |alpha| <= step_max, starting at 1.
+    step_max is increased by a factor of 4 each time a step of that length
+    is accepted and decreased by the same factor after a rejection, as in
+    the SQUAREM R package.
+
+    Convergence is tested between consecutive EM steps as for em_run, never
+    across an extrapolation.
+
+    Parameters
+    ----------
+    conf: array
+        Should have fields
+
+            tol: The fractional change in the log likelihood that implies
+                convergence
+            miniter: minimum number of passes over the pixels
+            maxiter: maximum number of passes over the pixels
+            sky: the sky, or guess for sky if fitting for it
+            val_offset: value added to the pixel values, e.g. the sky
+                set by prep_obs
+            vary_sky: True if fitting for the sky
+
+    pixels: pixel array
+        for the image/jacobian
+    sums: array with fields
+        The sums array, a type _sums_dtype
+    gmix: gauss2d array
+        The initial mixture.  The final result is also stored in this array.
+    gmix_psf: gauss2d array
+        Single gaussian psf
+    gmix_conv: gauss2d array
+        Convolved gmix
+    fill_zero_weight: bool
+        If True, fill the zero weight pixels with the model on
+        each iteration
+
+    Returns
+    -------
+    numiter, frac_diff, sky
+        number of passes over the pixels, fractional difference in log
+        likelihood between the last two EM steps, and sky.  The sky may have
+        been fit for.
+    """
+
+    gmix_set_norms(gmix_conv)
+
+    taudata = np.zeros(gmix_conv.size, dtype=_tau_dtype)
+
+    tol = conf['tol']
+    miniter = conf['miniter']
+    maxiter = conf['maxiter']
+    vary_sky = conf['vary_sky']
+
+    sky = conf['sky']
+    val_offset = conf['val_offset']
+
+    gmix0 = gmix.copy()
+    gmix1 = gmix.copy()
+    gmix2 = gmix.copy()
+    gmix3 = gmix.copy()
+
+    numiter = 0
+    frac_diff = np.inf
+    stat_last = 0.0
+    have_last = False
+    step_max = 1.0
+
+    while numiter < maxiter:
+
+        # first EM step, theta0 -> theta1
+        gmix_copy_pars(gmix0, gmix)
+        sky0 = sky
+
+        stat, _, sky = em_step(
+            pixels, sums, gmix, gmix_psf, gmix_conv, taudata,
+            sky, val_offset, vary_sky, fill_zero_weight,
+        )
+        numiter += 1
+
+        if have_last:
+            frac_diff = _get_frac_diff(stat, stat_last)
+            if numiter >= miniter and frac_diff < tol:
+                break
+
+        stat_last = stat
+        have_last = True
+
+        if numiter >= maxiter:
+            break
+
+        # second EM step, theta1 -> theta2
+        gmix_copy_pars(gmix1, gmix)
+        sky1 = sky
+
+        stat, _, sky = em_step(
+            pixels, sums, gmix, gmix_psf, gmix_conv, taudata,
+            sky, val_offset, vary_sky, fill_zero_weight,
+        )
+        numiter += 1
+
+        frac_diff = _get_frac_diff(stat, stat_last)
+        if numiter >= miniter and frac_diff < tol:
+            break
+
+        stat_last = stat
+
+        if numiter >= maxiter:
+            break
+
+        # third EM step, theta2 -> theta3, giving the likelihood at theta2
+        # for the safeguard
+        gmix_copy_pars(gmix2, gmix)
+        sky2 = sky
+
+        stat, loglike2, sky = em_step(
+            pixels, sums, gmix, gmix_psf, gmix_conv, taudata,
+            sky, val_offset, vary_sky, fill_zero_weight,
+        )
+        numiter += 1
+
+        frac_diff = _get_frac_diff(stat, stat_last)
+        if numiter >= miniter and frac_diff < tol:
+            break
+
+        stat_last = stat
+
+        if numiter >= maxiter:
+            break
+
+        gmix_copy_pars(gmix3, gmix)
+        sky3 = sky
+
+        alpha, sky = _squarem_extrapolate(
+            gmix, gmix0, gmix1, gmix2, sky0, sky1, sky2, vary_sky, step_max,
+        )
+
+        if alpha == -1.0:
+            # theta' is theta2, for which the EM step was already taken;
+            # accept it and continue from theta3
+            if alpha == -step_max:
+                step_max *= _SQUAREM_STEP_FACTOR
+
+            gmix_copy_pars(gmix, gmix3)
+            sky = sky3
+            gmix_convolve_fill(gmix_conv, gmix, gmix_psf)
+            gmix_set_norms(gmix_conv)
+            continue
+
+        gmix_convolve_fill(gmix_conv, gmix, gmix_psf)
+        gmix_set_norms(gmix_conv)
+
+        # EM step from the extrapolated mixture, which gives a log
+        # likelihood of -inf if the mixture is not valid for the data
+        stat, loglike, sky = em_step(
+            pixels, sums, gmix, gmix_psf, gmix_conv, taudata,
+            sky, val_offset, vary_sky, fill_zero_weight,
+            raise_errors=False,
+        )
+        numiter += 1
+
+        if loglike >= loglike2:
+            if alpha == -step_max:
+                step_max *= _SQUAREM_STEP_FACTOR
+
+            # the next EM step is taken from the result of this one
+            stat_last = stat
+        else:
+            # reject the extrapolation and continue from theta3, which
+            # follows the step from theta2 for the convergence test
+            step_max = max(1.0, step_max/_SQUAREM_STEP_FACTOR)
+
+            gmix_copy_pars(gmix, gmix3)
+            sky = sky3
+            gmix_convolve_fill(gmix_conv, gmix, gmix_psf)
+            gmix_set_norms(gmix_conv)
+
+    # we have modified the mixture and not set the norms, and we don't want to
+    # set them for the pre-psf mixture
+
+    gmix['norm_set'][:] = 0
+
+    return numiter, frac_diff, sky
+
+
+@njit(nogil=True)
+def em_run_fixcen_accel(conf,
+                        pixels,
+                        sums,
+                        gmix,
+                        gmix_psf,
+                        gmix_conv,
+                        fill_zero_weight=False):
+    """
+    run the EM algorithm with fixed positions and SQUAREM acceleration
+
+    See em_run_accel for the algorithm, parameters and return values. The
+    sums array has type _sums_dtype_fixcen
+    """
+
+    gmix_set_norms(gmix_conv)
+
+    taudata = np.zeros(gmix_conv.size, dtype=_tau_dtype)
+
+    tol = conf['tol']
+    miniter = conf['miniter']
+    maxiter = conf['maxiter']
+    vary_sky = conf['vary_sky']
+
+    sky = conf['sky']
+    val_offset = conf['val_offset']
+
+    gmix0 = gmix.copy()
+    gmix1 = gmix.copy()
+    gmix2 = gmix.copy()
+    gmix3 = gmix.copy()
+
+    numiter = 0
+    frac_diff = np.inf
+    stat_last = 0.0
+    have_last = False
+    step_max = 1.0
+
+    while numiter < maxiter:
+
+        # first EM step, theta0 -> theta1
+        gmix_copy_pars(gmix0, gmix)
+        sky0 = sky
+
+        stat, _, sky = em_step_fixcen(
+            pixels, sums, gmix, gmix_psf, gmix_conv, taudata,
+            sky, val_offset, vary_sky, fill_zero_weight,
+        )
+        numiter += 1
+
+        if have_last:
+            frac_diff = _get_frac_diff(stat, stat_last)
+            if numiter >= miniter and frac_diff < tol:
+                break
+
+        stat_last = stat
+        have_last = True
+
+        if numiter >= maxiter:
+            break
+
+        # second EM step, theta1 -> theta2
+        gmix_copy_pars(gmix1, gmix)
+        sky1 = sky
+
+        stat, _, sky = em_step_fixcen(
+            pixels, sums, gmix, gmix_psf, gmix_conv, taudata,
+            sky, val_offset, vary_sky, fill_zero_weight,
+        )
+        numiter += 1
+
+        frac_diff = _get_frac_diff(stat, stat_last)
+        if numiter >= miniter and frac_diff < tol:
+            break
+
+        stat_last = stat
+
+        if numiter >= maxiter:
+            break
+
+        # third EM step, theta2 -> theta3, giving the likelihood at theta2
+        # for the safeguard
+        gmix_copy_pars(gmix2, gmix)
+        sky2 = sky
+
+        stat, loglike2, sky = em_step_fixcen(
+            pixels, sums, gmix, gmix_psf, gmix_conv, taudata,
+            sky, val_offset, vary_sky, fill_zero_weight,
+        )
+        numiter += 1
+
+        frac_diff = _get_frac_diff(stat, stat_last)
+        if numiter >= miniter and frac_diff < tol:
+            break
+
+        stat_last = stat
+
+        if numiter >= maxiter:
+            break
+
+        gmix_copy_pars(gmix3, gmix)
+        sky3 = sky
+
+        alpha, sky = _squarem_extrapolate(
+            gmix, gmix0, gmix1, gmix2, sky0, sky1, sky2, vary_sky, step_max,
+        )
+
+        if alpha == -1.0:
+            # theta' is theta2, for which the EM step was already taken;
+            # accept it and continue from theta3
+            if alpha == -step_max:
+                step_max *= _SQUAREM_STEP_FACTOR
+
+            gmix_copy_pars(gmix, gmix3)
+            sky = sky3
+            gmix_convolve_fill(gmix_conv, gmix, gmix_psf)
+            gmix_set_norms(gmix_conv)
+            continue
+
+        gmix_convolve_fill(gmix_conv, gmix, gmix_psf)
+        gmix_set_norms(gmix_conv)
+
+        # EM step from the extrapolated mixture, which gives a log
+        # likelihood of -inf if the mixture is not valid for the data
+        stat, loglike, sky = em_step_fixcen(
+            pixels, sums, gmix, gmix_psf, gmix_conv, taudata,
+            sky, val_offset, vary_sky, fill_zero_weight,
+            raise_errors=False,
+        )
+        numiter += 1
+
+        if loglike >= loglike2:
+            if alpha == -step_max:
+                step_max *= _SQUAREM_STEP_FACTOR
+
+            # the next EM step is taken from the result of this one
+            stat_last = stat
+        else:
+            # reject the extrapolation and continue from theta3, which
+            # follows the step from theta2 for the convergence test
+            step_max = max(1.0, step_max/_SQUAREM_STEP_FACTOR)
+
+            gmix_copy_pars(gmix, gmix3)
+            sky = sky3
+            gmix_convolve_fill(gmix_conv, gmix, gmix_psf)
+            gmix_set_norms(gmix_conv)
+
+    # we have modified the mixture and not set the norms, and we don't want to
+    # set them for the pre-psf mixture
+
+    gmix['norm_set'][:] = 0
+
+    return numiter, frac_diff, sky
+
+
+@njit(nogil=True)
+def em_run_fixcov_accel(conf,
+                        pixels,
+                        sums,
+                        gmix,
+                        gmix_psf,
+                        gmix_conv,
+                        fill_zero_weight=False):
+    """
+    run the EM algorithm with fixed covariances and SQUAREM acceleration
+
+    See em_run_accel for the algorithm, parameters and return values. The
+    sums array has type _sums_dtype_fixcov
+    """
+
+    gmix_set_norms(gmix_conv)
+
+    taudata = np.zeros(gmix_conv.size, dtype=_tau_dtype)
+
+    tol = conf['tol']
+    miniter = conf['miniter']
+    maxiter = conf['maxiter']
+    vary_sky = conf['vary_sky']
+
+    sky = conf['sky']
+    val_offset = conf['val_offset']
+
+    gmix0 = gmix.copy()
+    gmix1 = gmix.copy()
+    gmix2 = gmix.copy()
+    gmix3 = gmix.copy()
+
+    numiter = 0
+    frac_diff = np.inf
+    stat_last = 0.0
+    have_last = False
+    step_max = 1.0
+
+    while numiter < maxiter:
+
+        # first EM step, theta0 -> theta1
+        gmix_copy_pars(gmix0, gmix)
+        sky0 = sky
+
+        stat, _, sky = em_step_fixcov(
+            pixels, sums, gmix, gmix_psf, gmix_conv, taudata,
+            sky, val_offset, vary_sky, fill_zero_weight,
+        )
+        numiter += 1
+
+        if have_last:
+            frac_diff = _get_frac_diff(stat, stat_last)
+            if numiter >= miniter and frac_diff < tol:
+                break
+
+        stat_last = stat
+        have_last = True
+
+        if numiter >= maxiter:
+            break
+
+        # second EM step, theta1 -> theta2
+        gmix_copy_pars(gmix1, gmix)
+        sky1 = sky
+
+        stat, _, sky = em_step_fixcov(
+            pixels, sums, gmix, gmix_psf, gmix_conv, taudata,
+            sky, val_offset, vary_sky, fill_zero_weight,
+        )
+        numiter += 1
+
+        frac_diff = _get_frac_diff(stat, stat_last)
+        if numiter >= miniter and frac_diff < tol:
+            break
+
+        stat_last = stat
+
+        if numiter >= maxiter:
+            break
+
+        # third EM step, theta2 -> theta3, giving the likelihood at theta2
+        # for the safeguard
+        gmix_copy_pars(gmix2, gmix)
+        sky2 = sky
+
+        stat, loglike2, sky = em_step_fixcov(
+            pixels, sums, gmix, gmix_psf, gmix_conv, taudata,
+            sky, val_offset, vary_sky, fill_zero_weight,
+        )
+        numiter += 1
+
+        frac_diff = _get_frac_diff(stat, stat_last)
+        if numiter >= miniter and frac_diff < tol:
+            break
+
+        stat_last = stat
+
+        if numiter >= maxiter:
+            break
+
+        gmix_copy_pars(gmix3, gmix)
+        sky3 = sky
+
+        alpha, sky = _squarem_extrapolate(
+            gmix, gmix0, gmix1, gmix2, sky0, sky1, sky2, vary_sky, step_max,
+        )
+
+        if alpha == -1.0:
+            # theta' is theta2, for which the EM step was already taken;
+            # accept it and continue from theta3
+            if alpha == -step_max:
+                step_max *= _SQUAREM_STEP_FACTOR
+
+            gmix_copy_pars(gmix, gmix3)
+            sky = sky3
+            gmix_convolve_fill(gmix_conv, gmix, gmix_psf)
+            gmix_set_norms(gmix_conv)
+            continue
+
+        gmix_convolve_fill(gmix_conv, gmix, gmix_psf)
+        gmix_set_norms(gmix_conv)
+
+        # EM step from the extrapolated mixture, which gives a log
+        # likelihood of -inf if the mixture is not valid for the data
+        stat, loglike, sky = em_step_fixcov(
+            pixels, sums, gmix, gmix_psf, gmix_conv, taudata,
+            sky, val_offset, vary_sky, fill_zero_weight,
+            raise_errors=False,
+        )
+        numiter += 1
+
+        if loglike >= loglike2:
+            if alpha == -step_max:
+                step_max *= _SQUAREM_STEP_FACTOR
+
+            # the next EM step is taken from the result of this one
+            stat_last = stat
+        else:
+            # reject the extrapolation and continue from theta3, which
+            # follows the step from theta2 for the convergence test
+            step_max = max(1.0, step_max/_SQUAREM_STEP_FACTOR)
+
+            gmix_copy_pars(gmix, gmix3)
+            sky = sky3
+            gmix_convolve_fill(gmix_conv, gmix, gmix_psf)
+            gmix_set_norms(gmix_conv)
+
+    # we have modified the mixture and not set the norms, and we don't want to
+    # set them for the pre-psf mixture
+
+    gmix['norm_set'][:] = 0
+
+    return numiter, frac_diff, sky
+
+
+@njit(nogil=True)
+def em_run_fluxonly_accel(conf,
+                          pixels,
+                          sums,
+                          gmix,
+                          gmix_psf,
+                          gmix_conv,
+                          fill_zero_weight=False):
+    """
+    run the EM algorithm, allowing only fluxes to vary, with SQUAREM
+    acceleration
+
+    See em_run_accel for the algorithm, parameters and return values. The
+    sums array has type _sums_dtype_fluxonly, and convergence is tested
+    using the fractional change in the total flux
+    """
+
+    gmix_set_norms(gmix_conv)
+
+    taudata = np.zeros(gmix_conv.size, dtype=_tau_dtype)
+
+    # only the fluxes vary, so the bounds do not change
+    set_chi2_bounds(gmix_conv, taudata)
+
+    tol = conf['tol']
+    miniter = conf['miniter']
+    maxiter = conf['maxiter']
+    vary_sky = conf['vary_sky']
+
+    sky = conf['sky']
+    val_offset = conf['val_offset']
+
+    gmix0 = gmix.copy()
+    gmix1 = gmix.copy()
+    gmix2 = gmix.copy()
+    gmix3 = gmix.copy()
+
+    numiter = 0
+    frac_diff = np.inf
+    stat_last = 0.0
+    have_last = False
+    step_max = 1.0
+
+    while numiter < maxiter:
+
+        # first EM step, theta0 -> theta1
+        gmix_copy_pars(gmix0, gmix)
+        sky0 = sky
+
+        stat, _, sky = em_step_fluxonly(
+            pixels, sums, gmix, gmix_psf, gmix_conv, taudata,
+            sky, val_offset, vary_sky, fill_zero_weight,
+        )
+        numiter += 1
+
+        if have_last:
+            frac_diff = _get_frac_diff(stat, stat_last)
+            if numiter >= miniter and frac_diff < tol:
+                break
+
+        stat_last = stat
+        have_last = True
+
+        if numiter >= maxiter:
+            break
+
+        # second EM step, theta1 -> theta2
+        gmix_copy_pars(gmix1, gmix)
+        sky1 = sky
+
+        stat, _, sky = em_step_fluxonly(
+            pixels, sums, gmix, gmix_psf, gmix_conv, taudata,
+            sky, val_offset, vary_sky, fill_zero_weight,
+        )
+        numiter += 1
+
+        frac_diff = _get_frac_diff(stat, stat_last)
+        if numiter >= miniter and frac_diff < tol:
+            break
+
+        stat_last = stat
+
+        if numiter >= maxiter:
+            break
+
+        # third EM step, theta2 -> theta3, giving the likelihood at theta2
+        # for the safeguard
+        gmix_copy_pars(gmix2, gmix)
+        sky2 = sky
+
+        stat, loglike2, sky = em_step_fluxonly(
+            pixels, sums, gmix, gmix_psf, gmix_conv, taudata,
+            sky, val_offset, vary_sky, fill_zero_weight,
+        )
+        numiter += 1
+
+        frac_diff = _get_frac_diff(stat, stat_last)
+        if numiter >= miniter and frac_diff < tol:
+            break
+
+        stat_last = stat
+
+        if numiter >= maxiter:
+            break
+
+        gmix_copy_pars(gmix3, gmix)
+        sky3 = sky
+
+        alpha, sky = _squarem_extrapolate(
+            gmix, gmix0, gmix1, gmix2, sky0, sky1, sky2, vary_sky, step_max,
+        )
+
+        if alpha == -1.0:
+            # theta' is theta2, for which the EM step was already taken;
+            # accept it and continue from theta3
+            if alpha == -step_max:
+                step_max *= _SQUAREM_STEP_FACTOR
+
+            gmix_copy_pars(gmix, gmix3)
+            sky = sky3
+            gmix_convolve_fill(gmix_conv, gmix, gmix_psf)
+            gmix_set_norms(gmix_conv)
+            continue
+
+        gmix_convolve_fill(gmix_conv, gmix, gmix_psf)
+        gmix_set_norms(gmix_conv)
+
+        # EM step from the extrapolated mixture, which gives a log
+        # likelihood of -inf if the mixture is not valid for the data
+        stat, loglike, sky = em_step_fluxonly(
+            pixels, sums, gmix, gmix_psf, gmix_conv, taudata,
+            sky, val_offset, vary_sky, fill_zero_weight,
+            raise_errors=False,
+        )
+        numiter += 1
+
+        if loglike >= loglike2:
+            if alpha == -step_max:
+                step_max *= _SQUAREM_STEP_FACTOR
+
+            # the next EM step is taken from the result of this one
+            stat_last = stat
+        else:
+            # reject the extrapolation and continue from theta3, which
+            # follows the step from theta2 for the convergence test
+            step_max = max(1.0, step_max/_SQUAREM_STEP_FACTOR)
+
+            gmix_copy_pars(gmix, gmix3)
+            sky = sky3
+            gmix_convolve_fill(gmix_conv, gmix, gmix_psf)
+            gmix_set_norms(gmix_conv)
+
+    # we have modified the mixture and not set the norms, and we don't want to
+    # set them for the pre-psf mixture
+
+    gmix['norm_set'][:] = 0
+
+    return numiter, frac_diff, sky
+
+
+@njit(nogil=True)
+def _get_frac_diff(stat, stat_last):
+    """
+    fractional difference in the convergence statistic
+    """
+    if stat == 0.0:
+        raise GMixRangeError('elogL == 0')
+
+    return abs((stat - stat_last)/stat)
+
+
+@njit(nogil=True)
+def _squarem_extrapolate(gmix, gmix0, gmix1, gmix2, sky0, sky1, sky2,
+                         vary_sky, step_max):
+    """
+    set the extrapolated SQUAREM mixture in gmix
+
+    The fluxes are scaled by the total flux of gmix0 when finding the step
+    length, so they are on a similar scale to the positions and moments
+
+    Returns
+    -------
+    alpha, sky:
+        The step length used and the extrapolated sky.  For alpha = -1
+        gmix holds gmix2.
+    """
+    pscale = 1.0/gmix0['p'].sum()
+
+    rsum = vsum = 0.0
+    for i in range(gmix.size):
+        g0 = gmix0[i]
+        g1 = gmix1[i]
+        g2 = gmix2[i]
+
+        rsum, vsum = _squarem_add_sums(
+            rsum, vsum, g0['p']*pscale, g1['p']*pscale, g2['p']*pscale,
+        )
+        rsum, vsum = _squarem_add_sums(
+            rsum, vsum, g0['row'], g1['row'], g2['row'],
+        )
+        rsum, vsum = _squarem_add_sums(
+            rsum, vsum, g0['col'], g1['col'], g2['col'],
+        )
+        rsum, vsum = _squarem_add_sums(
+            rsum, vsum, g0['irr'], g1['irr'], g2['irr'],
+        )
+        rsum, vsum = _squarem_add_sums(
+            rsum, vsum, g0['irc'], g1['irc'], g2['irc'],
+        )
+        rsum, vsum = _squarem_add_sums(
+            rsum, vsum, g0['icc'], g1['icc'], g2['icc'],
+        )
+
+    if vary_sky:
+        rsum, vsum = _squarem_add_sums(
+            rsum, vsum, sky0*pscale, sky1*pscale, sky2*pscale,
+        )
+
+    if vsum == 0.0 or rsum <= vsum:
+        # alpha >= -1, no gain over theta2
+        gmix_copy_pars(gmix, gmix2)
+        return -1.0, sky2
+
+    alpha = max(-np.sqrt(rsum/vsum), -step_max)
+
+    for _ in range(_SQUAREM_MAX_BACKTRACK):
+        ok = True
+        for i in range(gmix.size):
+            g0 = gmix0[i]
+            g1 = gmix1[i]
+            g2 = gmix2[i]
+
+            p = _squarem_par(alpha, g0['p'], g1['p'], g2['p'])
+            row = _squarem_par(alpha, g0['row'], g1['row'], g2['row'])
+            col = _squarem_par(alpha, g0['col'], g1['col'], g2['col'])
+            irr = _squarem_par(alpha, g0['irr'], g1['irr'], g2['irr'])
+            irc = _squarem_par(alpha, g0['irc'], g1['irc'], g2['irc'])
+            icc = _squarem_par(alpha, g0['icc'], g1['icc'], g2['icc'])
+
+            det = irr*icc - irc**2
+            if p <= 0.0 or irr <= 0.0 or icc <= 0.0 or det < GMIX_LOW_DETVAL:
+                ok = False
+                break
+
+            gauss2d_set(gmix[i], p, row, col, irr, irc, icc)
+
+        sky = _squarem_par(alpha, sky0, sky1, sky2)
+        if vary_sky and sky < 0.0:
+            ok = False
+
+        if ok:
+            return alpha, sky
+
+        alpha = 0.5*(alpha - 1.0)
+
+    gmix_copy_pars(gmix, gmix2)
+    return -1.0, sky2
+
+
+@njit(nogil=True)
+def _squarem_add_sums(rsum, vsum, x0, x1, x2):
+    """
+    add the squares of r and v for a single parameter
+    """
+    r = x1 - x0
+    v = x2 - x1 - r
+    return rsum + r**2, vsum + v**2
+
+
+@njit(nogil=True)
+def _squarem_par(alpha, x0, x1, x2):
+    """
+    extrapolate a single parameter
+    """
+    r = x1 - x0
+    v = x2 - x1 - r
+    return x0 - 2*alpha*r + alpha**2*v
+
+
+@njit(nogil=True)
+def gmix_copy_pars(gmix, gmix_in):
+    """
+    copy the parameters of gmix_in into gmix, clearing the normalizations
+
+    Parameters
+    ----------
+    gmix: gauss2d array
+        The mixture to set
+    gmix_in: gauss2d array
+        The mixture to copy
+    """
+    for i in range(gmix.size):
+        gauss = gmix_in[i]
+        gauss2d_set(
+            gmix[i],
+            gauss['p'],
+            gauss['row'],
+            gauss['col'],
+            gauss['irr'],
+            gauss['irc'],
+            gauss['icc'],
+        )
+
+
+@njit(nogil=True)
+def em_step(pixels,
+            sums,
+            gmix,
+            gmix_psf,
+            gmix_conv,
+            taudata,
+            sky,
+            val_offset,
+            vary_sky,
+            fill_zero_weight,
+            raise_errors=True):
+    """
+    take a single step of the EM algorithm, updating gmix and gmix_conv
+
+    Parameters
+    ----------
+    pixels: pixel array
+        for the image/jacobian
+    sums: array with fields
+        The sums array, a type _sums_dtype
+    gmix: gauss2d array
+        The current mixture, updated in place
+    gmix_psf: gauss2d array
+        Single gaussian psf
+    gmix_conv: gauss2d array
+        Convolved gmix, with norms set
+    taudata: tau data struct
+        With dtype _tau_dtype
+    sky: float
+        The current sky
+    val_offset: float
+        Value added to the pixel values
+    vary_sky: bool
+        True if fitting for the sky
+    fill_zero_weight: bool
+        If True, fill the zero weight pixels with the model
+    raise_errors: bool, optional
+        If False, return a log likelihood of -inf for a mixture that is not
+        valid for the data, leaving the mixture unchanged, rather than
+        raising a GMixRangeError.  Default True
+
+    Returns
+    -------
+    elogL, loglike, sky
+        The expected log likelihood used for convergence tests and the
+        log likelihood sum(im*log(model) - model), both for the input
+        mixture, and the new sky
+    """
+    ngauss_psf = gmix_psf.size
+
+    elogL = 0.0
+    loglike = 0.0
+    skysum = 0.0
+
+    clear_sums(sums)
+    set_logtau_logdet(gmix_conv, taudata)
+    set_chi2_bounds(gmix_conv, taudata)
+
+    if fill_zero_weight:
+        fill_zero_weight_pixels(gmix_conv, pixels, sky, val_offset)
+
+    for pixel in pixels:
+
+        gsum, tlogL = do_scratch_sums(
+            pixel, gmix_conv, sums, ngauss_psf,
+            taudata,
+        )
+
+        val = pixel['val'] + val_offset
+        gtot = gsum + sky
+        if gtot <= 0.0:
+            if raise_errors:
+                raise GMixRangeError('gtot <= 0')
+            return elogL, -np.inf, sky
+
+        elogL += tlogL
+        loglike += val*np.log(gtot) - gtot
+
+        skysum += sky*val/gtot
+
+        do_sums(sums, val, gtot)
+
+    if not raise_errors and np.any(sums['pnew'] <= 0.0):
+        return elogL, -np.inf, sky
+
+    gmix_set_from_sums(
+        gmix,
+        gmix_psf,
+        gmix_conv,
+        sums,
+    )
+
+    if vary_sky:
+        sky = skysum/pixels.size
+
+    return elogL, loglike, sky
+
+
+@njit(nogil=True)
+def em_step_fixcen(pixels,
+                   sums,
+                   gmix,
+                   gmix_psf,
+                   gmix_conv,
+                   taudata,
+                   sky,
+                   val_offset,
+                   vary_sky,
+                   fill_zero_weight,
+                   raise_errors=True):
+    """
+    take a single step of the EM algorithm with fixed positions, updating
+    gmix and gmix_conv
+
+    See em_step for the parameters and return values, the sums have
+    type _sums_dtype_fixcen
+    """
+    ngauss_psf = gmix_psf.size
+
+    elogL = 0.0
+    loglike = 0.0
+    skysum = 0.0
+
+    clear_sums_fixcen(sums)
+    set_logtau_logdet(gmix_conv, taudata)
+    set_chi2_bounds(gmix_conv, taudata)
+
+    if fill_zero_weight:
+        fill_zero_weight_pixels(gmix_conv, pixels, sky, val_offset)
+
+    for pixel in pixels:
+
+        gsum, tlogL = do_scratch_sums_fixcen(
+            pixel, gmix_conv, sums, ngauss_psf,
+            taudata,
+        )
+
+        val = pixel['val'] + val_offset
+        gtot = gsum + sky
+        if gtot <= 0.0:
+            if raise_errors:
+                raise GMixRangeError('gtot <= 0')
+            return elogL, -np.inf, sky
+
+        elogL += tlogL
+        loglike += val*np.log(gtot) - gtot
+
+        skysum += sky*val/gtot
+
+        do_sums_fixcen(sums, val, gtot)
+
+    if not raise_errors and np.any(sums['pnew'] <= 0.0):
+        return elogL, -np.inf, sky
+
+    gmix_set_from_sums_fixcen(
+        gmix,
+        gmix_psf,
+        gmix_conv,
+        sums,
+    )
+
+    if vary_sky:
+        sky = skysum/pixels.size
+
+    return elogL, loglike, sky
+
+
+@njit(nogil=True)
+def em_step_fixcov(pixels,
+                   sums,
+                   gmix,
+                   gmix_psf,
+                   gmix_conv,
+                   taudata,
+                   sky,
+                   val_offset,
+                   vary_sky,
+                   fill_zero_weight,
+                   raise_errors=True):
+    """
+    take a single step of the EM algorithm with fixed covariances, updating
+    gmix and gmix_conv
+
+    See em_step for the parameters and return values, the sums have
+    type _sums_dtype_fixcov
+    """
+    ngauss_psf = gmix_psf.size
+
+    elogL = 0.0
+    loglike = 0.0
+    skysum = 0.0
+
+    clear_sums_fixcov(sums)
+    set_logtau_logdet(gmix_conv, taudata)
+    set_chi2_bounds(gmix_conv, taudata)
+
+    if fill_zero_weight:
+        fill_zero_weight_pixels(gmix_conv, pixels, sky, val_offset)
+
+    for pixel in pixels:
+
+        gsum, tlogL = do_scratch_sums_fixcov(
+            pixel, gmix_conv, sums, ngauss_psf,
+            taudata,
+        )
+
+        val = pixel['val'] + val_offset
+        gtot = gsum + sky
+        if gtot <= 0.0:
+            if raise_errors:
+                raise GMixRangeError('gtot <= 0')
+            return elogL, -np.inf, sky
+
+        elogL += tlogL
+        loglike += val*np.log(gtot) - gtot
+
+        skysum += sky*val/gtot
 
+        do_sums_fixcov(sums, val, gtot)
+
+    if not raise_errors and np.any(sums['pnew'] <= 0.0):
+        return elogL, -np.inf, sky
+
+    gmix_set_from_sums_fixcov(
+        gmix,
+        gmix_psf,
+        gmix_conv,
+        sums,
+    )
+
+    if vary_sky:
+        sky = skysum/pixels.size
+
+    return elogL, loglike, sky
+
+
+@njit(nogil=True)
+def em_step_fluxonly(pixels,
+                     sums,
+                     gmix,
+                     gmix_psf,
+                     gmix_conv,
+                     taudata,
+                     sky,
+                     val_offset,
+                     vary_sky,
+                     fill_zero_weight,
+                     raise_errors=True):
+    """
+    take a single step of the EM algorithm allowing only the fluxes to vary,
+    updating gmix and gmix_conv
+
+    See em_step for the parameters, the sums have type _sums_dtype_fluxonly
+    and only the chi2 bounds in taudata are used, which do not change
+
+    Returns
+    -------
+    psum, loglike, sky
+        The total flux used for convergence tests and the log likelihood
+        sum(im*log(model) - model), both for the input mixture, and the new
+        sky
+    """
+    ngauss_psf = gmix_psf.size
+
+    psum = gmix['p'].sum()
+    loglike = 0.0
+    skysum = 0.0
+
+    clear_sums_fluxonly(sums)
+
+    if fill_zero_weight:
+        fill_zero_weight_pixels(gmix_conv, pixels, sky, val_offset)
+
+    for pixel in pixels:
+
+        gsum = do_scratch_sums_fluxonly(
+            pixel, gmix_conv, sums, ngauss_psf, taudata,
+        )
+
+        val = pixel['val'] + val_offset
+        gtot = gsum + sky
+        if gtot <= 0.0:
+            if raise_errors:
+                raise GMixRangeError('gtot <= 0')
+            return psum, -np.inf, sky
+
+        loglike += val*np.log(gtot) - gtot
+
+        skysum += sky*val/gtot
+
+        do_sums_fluxonly(sums, val, gtot)
+
+    if not raise_errors and np.any(sums['pnew'] <= 0.0):
+        return psum, -np.inf, sky
+
+    gmix_set_from_sums_fluxonly(
+        gmix,
+        gmix_psf,
+        gmix_conv,
+        sums,
+    )
+
+    if vary_sky:
+        sky = skysum/pixels.size
+
+    return psum, loglike, sky
+
+# end accelerated EM
+
+
+# start batch
+
+@njit(nogil=True)
+def em_run_batch(kind,
+                 accelerate,
+                 confs,
+                 pixels,
+                 pixel_starts,
+                 sums,
+                 gmix_data,
+                 gmix_starts,
+                 psf_data,
+                 psf_starts,
+                 conv_data,
+                 conv_starts,
+                 fill_zero_weight,
+                 numiter,
+                 frac_diff,
+                 skies,
+                 errors):
+    """
+    run the EM algorithm for a set of stamps
+
+    Parameters
+    ----------
+    kind: int
+        The fitter to run, one of EM_BATCH_FULL, EM_BATCH_FIXCEN,
+        EM_BATCH_FIXCOV or EM_BATCH_FLUXONLY
+    accelerate: bool
+        If True use the SQUAREM accelerated fitters
+    confs: array
+        The configuration for each stamp, see em_run
+    pixels: pixel array
+        The pixels for all stamps, packed end to end.  The pixels for stamp
+        i are pixels[pixel_starts[i]:pixel_starts[i+1]]
+    pixel_starts: array
+        The offsets of the pixels for each stamp
+    sums: array with fields
+        The sums arrays for all stamps, a type _sums_dtype, with the same
+        offsets as gmix_data
+    gmix_data: gauss2d array
+        The initial mixtures packed end to end.  The mixture for stamp i is
+        gmix_data[gmix_starts[i]:gmix_starts[i+1]].  The final results are
+        also stored in this array.
+    gmix_starts: array
+        The offsets of the mixtures
+    psf_data: gauss2d array
+        The psf mixtures, with offsets psf_starts
+    psf_starts: array
+        The offsets of the psf mixtures
+    conv_data: gauss2d array
+        Space for the convolved mixtures, with offsets conv_starts
+    conv_starts: array
+        The offsets of the convolved mixtures
+    fill_zero_weight: bool array
+        If True, fill the zero weight pixels of the stamp with the model on
+        each iteration
+    numiter, frac_diff, skies: arrays
+        Filled with the results of em_run for each stamp
+    errors: bool array
+        Set to True for stamps where the fit raised an exception.  numba
+        cannot catch specific exception types, so the caller should run these
+        fits again to find the error
+    """
+    nobj = confs.size
+    for iobj in range(nobj):
+        _em_run_batch_one(
+            iobj, kind, accelerate, confs, pixels, pixel_starts, sums,
+            gmix_data, gmix_starts, psf_data, psf_starts, conv_data,
+            conv_starts, fill_zero_weight, numiter, frac_diff, skies, errors,
+        )
+
+
+@njit(parallel=True, nogil=True)
+def em_run_batch_parallel(kind,
+                          accelerate,
+                          confs,
+                          pixels,
+                          pixel_starts,
+                          sums,
+                          gmix_data,
+                          gmix_starts,
+                          psf_data,
+                          psf_starts,
+                          conv_data,
+                          conv_starts,
+                          fill_zero_weight,
+                          numiter,
+                          frac_diff,
+                          skies,
+                          errors):
+    """
+    run the EM algorithm for a set of stamps, with the stamps distributed
+    over threads.  See em_run_batch for the parameters
+    """
+    nobj = confs.size
+    for iobj in prange(nobj):
+        _em_run_batch_one(
+            iobj, kind, accelerate, confs, pixels, pixel_starts, sums,
+            gmix_data, gmix_starts, psf_data, psf_starts, conv_data,
+            conv_starts, fill_zero_weight, numiter, frac_diff, skies, errors,
+        )
+
+
+@njit(nogil=True)
+def _em_run_batch_one(iobj,
+                      kind,
+                      accelerate,
+                      confs,
+                      pixels,
+                      pixel_starts,
+                      sums,
+                      gmix_data,
+                      gmix_starts,
+                      psf_data,
+                      psf_starts,
+                      conv_data,
+                      conv_starts,
+                      fill_zero_weight,
+                      numiter,
+                      frac_diff,
+                      skies,
+                      errors):
+    """
+    run the EM algorithm for a single stamp of a batch
+
+    The exception is caught here rather than in the loop over stamps, which
+    would stop numba from running the loop in parallel.  Any exception is
+    caught, since numba cannot match specific types, so the caller must
+    check the stamps flagged in errors
+    """
+    gstart = gmix_starts[iobj]
+    gend = gmix_starts[iobj+1]
+
+    gmix = gmix_data[gstart:gend]
+    gmix_psf = psf_data[psf_starts[iobj]:psf_starts[iobj+1]]
+    gmix_conv = conv_data[conv_starts[iobj]:conv_starts[iobj+1]]
+    tpixels = pixels[pixel_starts[iobj]:pixel_starts[iobj+1]]
+    tsums = sums[gstart:gend]
+
+    try:
+        numiter[iobj], frac_diff[iobj], skies[iobj] = _em_run_kind(
+            kind, accelerate, confs[iobj], tpixels, tsums,
+            gmix, gmix_psf, gmix_conv, fill_zero_weight[iobj],
+        )
+    except Exception:
+        errors[iobj] = True
+
+
+@njit(nogil=True)
+def _em_run_kind(kind,
+                 accelerate,
+                 conf,
+                 pixels,
+                 sums,
+                 gmix,
+                 gmix_psf,
+                 gmix_conv,
+                 fill_zero_weight):
+    """
+    run the EM fitter of the given kind.  The sums must have type _sums_dtype,
+    which holds the fields needed by all the fitters
+    """
+    gmix_convolve_fill(gmix_conv, gmix, gmix_psf)
+
+    if kind == EM_BATCH_FIXCEN:
+        if accelerate:
+            return em_run_fixcen_accel(
+                conf, pixels, sums, gmix, gmix_psf, gmix_conv,
+                fill_zero_weight=fill_zero_weight,
+            )
+        else:
+            return em_run_fixcen(
+                conf, pixels, sums, gmix, gmix_psf, gmix_conv,
+                fill_zero_weight=fill_zero_weight,
+            )
+    elif kind == EM_BATCH_FIXCOV:
+        if accelerate:
+            return em_run_fixcov_accel(
+                conf, pixels, sums, gmix, gmix_psf, gmix_conv,
+                fill_zero_weight=fill_zero_weight,
+            )
+        else:
+            return em_run_fixcov(
+                conf, pixels, sums, gmix, gmix_psf, gmix_conv,
+                fill_zero_weight=fill_zero_weight,
+            )
+    elif kind == EM_BATCH_FLUXONLY:
+        if accelerate:
+            return em_run_fluxonly_accel(
+                conf, pixels, sums, gmix, gmix_psf, gmix_conv,
+                fill_zero_weight=fill_zero_weight,
+            )
+        else:
+            return em_run_fluxonly(
+                conf, pixels, sums, gmix, gmix_psf, gmix_conv,
+                fill_zero_weight=fill_zero_weight,
+            )
+    else:
+        if accelerate:
+            return em_run_accel(
+                conf, pixels, sums, gmix, gmix_psf, gmix_conv,
+                fill_zero_weight=fill_zero_weight,
+            )
+        else:
+            return em_run(
+                conf, pixels, sums, gmix, gmix_psf, gmix_conv,
+                fill_zero_weight=fill_zero_weight,
+            )
+
+# end batch
+
+
+EM_BATCH_FULL = 0
+EM_BATCH_FIXCEN = 1
+EM_BATCH_FIXCOV = 2
+EM_BATCH_FLUXONLY = 3
+
+_SQUAREM_MAX_BACKTRACK = 10
+_SQUAREM_STEP_FACTOR = 4.0
 
 _tau_dtype = [
     ('logtau', 'f8'),
     ('logdet', 'f8'),
+
+    # squared half widths of the box holding chi2 < FASTEXP_MAX_CHI2
+    ('v2max', 'f8'),
+    ('u2max', 'f8'),
 ]
 _tau_dtype = np.dtype(_tau_dtype)
@@ -27,7 +27,7 @@ _EXP_IVALS, _EXP_LOOKUP = _make_exp_lookup(
 _EXP_I0 = _EXP_IVALS[0]
 
 
-@njit
+@njit(nogil=True)
 def exp3(x):
     """
     fast exponential
@@ -51,7 +51,7 @@ def exp3(x):
     return expval
 
 
-@njit
+@njit(nogil=True)
 def exp4(x):
     """
     fast exponential
@@ -76,7 +76,7 @@ def exp4(x):
     return expval
 
 
-@njit
+@njit(nogil=True)
 def exp5(x):
     """
     fast exponential
@@ -8,7 +8,9 @@ import logging
 from .leastsqbound import run_leastsq
 from .. import gmix
 from ..defaults import DEFAULT_LM_PARS
-from .results import FitModel, CoellipFitModel, PSFFluxFitModel
+from .results import (
+    FitModel, CoellipFitModel, PSFFluxFitModel, _check_fit_model,
+)
 
 LOGGER = logging.getLogger(__name__)
 
@@ -20,17 +22,23 @@ class Fitter(object):
     Parameters
     ----------
     model: str
-        The model to fit
+        The model to fit.  The 'cm' model is not supported
     prior: ngmix prior
         A prior for fitting
     fit_pars: dict
         Parameters to send to the leastsq fitting routine
+    use_jacobian: bool, optional
+        If True, send the analytic jacobian of the model to the leastsq
+        routine, rather than having it estimate the jacobian with finite
+        differences.  This requires fewer model evaluations.  Default False
     """
 
-    def __init__(self, model, prior=None, fit_pars=None):
+    def __init__(self, model, prior=None, fit_pars=None, use_jacobian=False):
         self.prior = prior
         self.model = gmix.get_model_num(model)
         self.model_name = gmix.get_model_name(self.model)
+        _check_fit_model(self.model_name)
+        self.use_jacobian = use_jacobian
 
         if fit_pars is not None:
             self.fit_pars = fit_pars.copy()
@@ -57,12 +65,17 @@ class Fitter(object):
 
         fit_model = self._make_fit_model(obs=obs, guess=guess)
 
+        fit_pars = self.fit_pars
+        if self.use_jacobian:
+            fit_pars = fit_pars.copy()
+            fit_pars['Dfun'] = fit_model.calc_jacobian
+
         result = run_leastsq(
             fit_model.calc_fdiff,
             guess=guess,
             n_prior_pars=fit_model.n_prior_pars,
             bounds=fit_model.bounds,
-            **self.fit_pars
+            **fit_pars
         )
 
         fit_model.set_fit_result(result)
@@ -86,11 +99,17 @@ class CoellipFitter(Fitter):
         A prior for fitting
     fit_pars: dict
         Parameters to send to the leastsq fitting routine
+    use_jacobian: bool, optional
+        If True, send the analytic jacobian of the model to the leastsq
+        routine. Default False
     """
 
-    def __init__(self, ngauss, prior=None, fit_pars=None):
+    def __init__(self, ngauss, prior=None, fit_pars=None, use_jacobian=False):
         self._ngauss = ngauss
-        super().__init__(model="coellip", prior=prior, fit_pars=fit_pars)
+        super().__init__(
+            model="coellip", prior=prior, fit_pars=fit_pars,
+            use_jacobian=use_jacobian,
+        )
 
     def _make_fit_model(self, obs, guess):
         return CoellipFitModel(
@@ -2,13 +2,26 @@ __all__ = ['FitModel', 'CoellipFitModel', 'PSFFluxFitModel']
 import copy
 import numpy as np
 from .. import gmix
+from .. import parallel
 from ..gexceptions import GMixRangeError
 from ..defaults import PDEF, CDEF, LOWVAL, BIGVAL
 from ..observation import Observation, ObsList, get_mb_obs
-from ..gmix.gmix_nb import gmix_convolve_fill, fill_fdiff
+from ..gmix.gmix_nb import (
+    fill_fdiff,
+    fill_fdiff_parallel,
+    fill_fdiff_derivs,
+    fill_gmix_packed,
+    fill_fdiff_packed,
+    get_loglike_packed,
+    _gmix_fill_codes,
+)
+from ..gmix.render import pack_gmixes
 from ..gmix import GMixList, MultiBandGMixList
 from ..flags import ZERO_DOF, DIV_ZERO, BAD_VAR
 
+# stand-in for the psf when calculating derivatives of unconvolved models
+_UNIT_PSF_DATA = gmix.GMix(pars=[1.0, 0.0, 0.0, 1.0, 0.0, 1.0]).get_data()
+
 
 class FitModel(dict):
     """
@@ -29,6 +42,7 @@ class FitModel(dict):
         self.prior = prior
         self.model = gmix.get_model_num(model)
         self.model_name = gmix.get_model_name(self.model)
+        _check_fit_model(self.model_name)
         self['model'] = self.model_name
 
         self._set_obs(obs)
@@ -173,22 +187,28 @@ class FitModel(dict):
             npix = 0
 
             self._fill_gmix_all(pars)
-            for band in range(self.nband):
 
-                obs_list = self.obs[band]
-                gmix_list = self._gmix_all[band]
+            if parallel.use_parallel(self._max_npix):
+                for band in range(self.nband):
 
-                for obs, gm in zip(obs_list, gmix_list):
+                    obs_list = self.obs[band]
+                    gmix_list = self._gmix_all[band]
+
+                    for obs, gm in zip(obs_list, gmix_list):
 
-                    res = gm.get_loglike(obs, more=more)
+                        res = gm.get_loglike(obs, more=True)
 
-                    if more:
                         lnprob += res["loglike"]
                         s2n_numer += res["s2n_numer"]
                         s2n_denom += res["s2n_denom"]
                         npix += res["npix"]
-                    else:
-                        lnprob += res
+            else:
+                lnprob, s2n_numer, s2n_denom, npix = get_loglike_packed(
+                    self._gmix_data,
+                    self._gmix_starts,
+                    self._pixels,
+                    self._pixel_starts,
+                )
 
             # total over all bands
             lnprob += ln_priors
@@ -297,54 +317,87 @@ class FitModel(dict):
         self._gmix_all0 = gmix_all0
         self._gmix_all = gmix_all
 
-    def _convolve_gmix(self, gm, gm0, psf_gmix):
-        """
-        norms get set
-        """
-        gmix_convolve_fill(gm._data, gm0._data, psf_gmix._data)
-
-    def _fill_gmix_all(self, pars):
+    def _make_workspace(self):
         """
-        input pars are in linear space
+        Pack the pixels and mixtures for all observations into contiguous
+        arrays, so the mixtures and fdiff can be filled in a single call to a
+        compiled kernel.
 
-        Fill the list of lists of gmix objects for the given parameters
+        The GMix objects in the lists are modified to hold views into the
+        packed arrays, so they are kept up to date.  The unconvolved mixtures
+        for all observations in a band share the same data
         """
 
-        if not self.dopsf:
-            self._fill_gmix_all_nopsf(pars)
-            return
-
-        for band, obs_list in enumerate(self.obs):
-            gmix_list0 = self._gmix_all0[band]
-            gmix_list = self._gmix_all[band]
-
-            band_pars = self.get_band_pars(pars=pars, band=band)
-
-            for i, obs in enumerate(obs_list):
-
-                psf_gmix = obs.psf.gmix
-
-                gm0 = gmix_list0[i]
-                gm = gmix_list[i]
+        # this is cached in the MultiBandObsList, so is only built once when
+        # the same observations are fit repeatedly
+        self._pixels, self._pixel_starts, self._obs_band = (
+            self.obs.get_packed_pixels()
+        )
+        self._max_npix = np.diff(self._pixel_starts).max()
+
+        psf_gmix_list = []
+        if self.dopsf:
+            for obs_list in self.obs:
+                for obs in obs_list:
+                    psf_gmix_list.append(obs.psf.gmix)
+
+        self._psf_data, self._psf_starts = pack_gmixes(psf_gmix_list)
+
+        gm0_list = [self._gmix_all0[band][0] for band in range(self.nband)]
+        model_name = gm0_list[0]._model_name
+        if model_name not in _gmix_fill_codes:
+            raise ValueError("model '%s' not supported" % model_name)
+        self._fill_code = _gmix_fill_codes[model_name]
+        self._band_pars = np.array(
+            [gm0._pars for gm0 in gm0_list], dtype='f8',
+        )
+        self._gm0_data, self._gm0_starts = pack_gmixes(gm0_list)
 
-                gm0._fill(band_pars)
-                self._convolve_gmix(gm, gm0, psf_gmix)
+        gmix_list = [gm for gmix_list in self._gmix_all for gm in gmix_list]
+        self._gmix_data, self._gmix_starts = pack_gmixes(gmix_list)
 
-    def _fill_gmix_all_nopsf(self, pars):
+        for band in range(self.nband):
+            beg, end = self._gm0_starts[band:band+2]
+            for gm0 in self._gmix_all0[band]:
+                gm0._data = self._gm0_data[beg:end]
+                gm0._pars = self._band_pars[band]
+
+        for i, gm in enumerate(gmix_list):
+            beg, end = self._gmix_starts[i:i+2]
+            gm._data = self._gmix_data[beg:end]
+            if not self.dopsf:
+                gm._pars = self._band_pars[self._obs_band[i]]
+
+    def _fill_band_pars(self, pars):
         """
-        Fill the list of lists of gmix objects for the given parameters
+        fill the parameters for each band
         """
+        for band in range(self.nband):
+            self._band_pars[band, :] = self.get_band_pars(
+                pars=pars, band=band,
+            )
 
-        for band, obs_list in enumerate(self.obs):
-            gmix_list = self._gmix_all[band]
-
-            band_pars = self.get_band_pars(pars=pars, band=band)
-
-            for i, obs in enumerate(obs_list):
+    def _fill_gmix_all(self, pars):
+        """
+        input pars are in linear space
 
-                gm = gmix_list[i]
+        Fill the list of lists of gmix objects for the given parameters
+        """
 
-                gm._fill(band_pars)
+        self._fill_band_pars(pars)
+
+        fill_gmix_packed(
+            self._fill_code,
+            self._band_pars,
+            self._obs_band,
+            self._gm0_data,
+            self._gm0_starts,
+            self._psf_data,
+            self._psf_starts,
+            self._gmix_data,
+            self._gmix_starts,
+            self.dopsf,
+        )
 
     def _get_priors(self, pars):
         """
@@ -370,6 +423,7 @@ class FitModel(dict):
         try:
             # this can raise GMixRangeError
             self._init_gmix_all(guess)
+            self._make_workspace()
             self._make_gmix_list()
         except ZeroDivisionError:
             raise GMixRangeError("got zero division")
@@ -416,7 +470,7 @@ class FitModel(dict):
         for band in range(self.nband):
             obs_list = self.obs[band]
             for obs in obs_list:
-                pixels_list.append(obs._pixels)
+                pixels_list.append(obs.pixels)
 
         self._pixels_list = pixels_list
 
@@ -436,35 +490,192 @@ class FitModel(dict):
 
         self._gmix_data_list = gmix_data_list
 
-    def calc_fdiff(self, pars):
+    def calc_fdiff(self, pars, out=None):
         """
         vector with (model-data)/error.
 
         The npars elements contain -ln(prior)
+
+        Parameters
+        ----------
+        pars: array-like
+            Array-like of parameters
+        out: array, optional
+            Array of size fdiff_size to fill.  If not sent a new array is
+            created.  Do not send this when the function is used by leastsq,
+            which keeps references to the returned arrays
+
+        Returns
+        -------
+        fdiff: array
         """
 
-        # we cannot keep sending existing array into leastsq, don't know why
-        fdiff = np.zeros(self.fdiff_size)
+        if out is None:
+            fdiff = np.zeros(self.fdiff_size)
+        else:
+            # the priors can fill fewer than n_prior_pars elements, leaving
+            # unused elements at the end of the array
+            fdiff = out
+            fdiff[:self.n_prior_pars] = 0.0
+            fdiff[self.totpix:] = 0.0
 
         try:
 
-            # all norms are set after fill
-            self._fill_gmix_all(pars)
-
             start = self._fill_priors(pars=pars, fdiff=fdiff)
 
-            for pixels, gm in zip(self._pixels_list, self._gmix_data_list):
-                fill_fdiff(
-                    gm, pixels, fdiff, start,
+            if parallel.use_parallel(self._max_npix):
+                self._calc_fdiff_parallel(pars, fdiff, start)
+            else:
+                self._fill_band_pars(pars)
+
+                # fills the mixtures and fdiff for all observations in a
+                # single call; all norms are set after fill
+                fill_fdiff_packed(
+                    self._fill_code,
+                    self._band_pars,
+                    self._obs_band,
+                    self._gm0_data,
+                    self._gm0_starts,
+                    self._psf_data,
+                    self._psf_starts,
+                    self._gmix_data,
+                    self._gmix_starts,
+                    self.dopsf,
+                    self._pixels,
+                    self._pixel_starts,
+                    fdiff,
+                    start,
                 )
 
-                start += pixels.size
-
         except GMixRangeError:
             fdiff[:] = LOWVAL
 
         return fdiff
 
+    def _calc_fdiff_parallel(self, pars, fdiff, start):
+        """
+        fill fdiff one observation at a time, using the threaded kernels for
+        the large images
+        """
+
+        # all norms are set after fill
+        self._fill_gmix_all(pars)
+
+        for pixels, gm in zip(self._pixels_list, self._gmix_data_list):
+            if parallel.use_parallel(pixels.size):
+                parallel.set_launch_threads()
+                fill_fdiff_parallel(gm, pixels, fdiff, start)
+            else:
+                fill_fdiff(gm, pixels, fdiff, start)
+
+            start += pixels.size
+
+    def calc_jacobian(self, pars):
+        """
+        The jacobian of the fdiff vector, d(fdiff)/d(pars), for use as the
+        Dfun in LM fitting.
+
+        The derivatives of the model are calculated analytically.  Those of the
+        priors are calculated using finite differences, which is fast since no
+        pixels are involved.
+
+        Parameters
+        ----------
+        pars: array-like
+            Array-like of parameters
+
+        Returns
+        -------
+        fjac: array
+            Array with shape (fdiff_size, npars)
+        """
+
+        fjac = np.zeros((self.fdiff_size, self.npars))
+
+        try:
+
+            # all norms are set after fill
+            self._fill_gmix_all(pars)
+
+            start = self._fill_prior_derivs(pars=pars, fjac=fjac)
+
+            for band in range(self.nband):
+
+                ipars = self._get_band_ipars(band)
+
+                if self.dopsf:
+                    gm0 = self._gmix_all0[band][0]
+                else:
+                    gm0 = self._gmix_all[band][0]
+
+                dgmix = gm0.get_derivs()
+
+                obs_list = self.obs[band]
+                gmix_list = self._gmix_all[band]
+                for obs, gm in zip(obs_list, gmix_list):
+
+                    if self.dopsf:
+                        psf_data = obs.psf.gmix.get_data()
+                    else:
+                        psf_data = _UNIT_PSF_DATA
+
+                    pixels = obs.pixels
+                    fill_fdiff_derivs(
+                        gm.get_data(), dgmix, psf_data, pixels, fjac, start,
+                        ipars,
+                    )
+
+                    start += pixels.size
+
+        except GMixRangeError:
+            fjac[:, :] = 0.0
+
+        return fjac
+
+    def _get_band_ipars(self, band):
+        """
+        get the index into the full parameter array for each of the
+        parameters for the specified band
+        """
+        ipars = np.arange(gmix.get_model_npars(self.model))
+        ipars[-1] += band
+        return ipars
+
+    def _fill_prior_derivs(self, pars, fjac, step=1.0e-6):
+        """
+        Fill the derivatives of the priors at the beginning of the jacobian,
+        using finite differences.
+
+        ret the position after last par, as for _fill_priors
+        """
+
+        if self.prior is None:
+            return 0
+
+        fdiff0 = np.zeros(self.n_prior_pars)
+        nprior = self.prior.fill_fdiff(pars, fdiff0)
+
+        tfdiff = np.zeros(self.n_prior_pars)
+        tpars = np.array(pars, dtype='f8', copy=True)
+
+        for ipar in range(self.npars):
+            h = step * max(1.0, abs(pars[ipar]))
+
+            # try a backward difference if we hit a boundary
+            try:
+                tpars[ipar] = pars[ipar] + h
+                self.prior.fill_fdiff(tpars, tfdiff)
+            except GMixRangeError:
+                h = -h
+                tpars[ipar] = pars[ipar] + h
+                self.prior.fill_fdiff(tpars, tfdiff)
+
+            tpars[ipar] = pars[ipar]
+
+            fjac[:nprior, ipar] = (tfdiff[:nprior] - fdiff0[:nprior]) / h
+
+        return nprior
+
     def _fill_priors(self, pars, fdiff):
         """
         Fill priors at the beginning of the array.
@@ -485,6 +696,18 @@ class FitModel(dict):
         return nprior
 
 
+def _check_fit_model(model_name):
+    """
+    check the model can be fit.  The cm model needs fixed fracdev and
+    TdByTe, which cannot be sent to the fitter
+    """
+    if model_name == 'cm':
+        raise ValueError(
+            "model 'cm' is not supported for fitting; it needs fixed "
+            "fracdev and TdByTe.  Fit the 'bdf' model instead"
+        )
+
+
 class CoellipFitModel(FitModel):
     """
     A class to represent a fitting a coelliptical gaussians model, the result
@@ -533,6 +756,12 @@ class CoellipFitModel(FitModel):
 
         return pars.copy()
 
+    def _get_band_ipars(self, band):
+        """
+        single band, all parameters are used
+        """
+        return np.arange(self.npars)
+
 
 class PSFFluxFitModel(dict):
     """
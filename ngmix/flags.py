@@ -20,6 +20,9 @@ EIG_NOTFINITE = 2 ** 13
 DIV_ZERO = 2 ** 14  # division by zero
 ZERO_DOF = 2 ** 15  # dof zero so can't do chi^2/dof
 
+# an unexpected exception was raised while processing an object
+PROC_ERROR = 2 ** 16
+
 # these mappings keep the API the same
 EM_RANGE_ERROR = GMIX_RANGE_ERROR
 EM_MAXITER = MAXITER
@@ -52,6 +55,7 @@ NAME_MAP = {
 
     DIV_ZERO: 'divide by zero',
     ZERO_DOF: 'degrees of freedom for it is zero (no chi^2/dof possible)',
+    PROC_ERROR: 'exception raised during processing',
 }
 
 
@@ -8,3 +8,6 @@ from .gmix_lists import *
 
 from . import gmix_nb
 from . import render_nb
+
+from . import render
+from .render import *
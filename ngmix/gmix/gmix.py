@@ -18,16 +18,21 @@ from ..jacobian import Jacobian, UnitJacobian
 from ..shape import Shape, e1e2_to_g1g2
 from .. import shape
 from .. import moments
+from .. import parallel
 
 from ..gmix import gmix_nb
 from ..gmix.gmix_nb import (
     _gmix_fill_functions,
+    _gmix_fill_derivs_functions,
     gmix_set_norms,
     gmix_convolve_fill,
     get_cm_Tfactor,
     get_loglike,
+    get_loglike_parallel,
     fill_fdiff,
+    fill_fdiff_parallel,
     get_model_s2n_sum,
+    get_model_s2n_sum_parallel,
 )
 
 from .render_nb import render
@@ -634,9 +639,12 @@ class GMix(object):
             )
 
         gm = self.get_data()
-        fill_fdiff(
-            gm, obs._pixels, fdiff, start,
-        )
+        pixels = obs.pixels
+        if parallel.use_parallel(pixels.size):
+            parallel.set_launch_threads()
+            fill_fdiff_parallel(gm, pixels, fdiff, start)
+        else:
+            fill_fdiff(gm, pixels, fdiff, start)
 
     def get_weighted_moments(self, obs, maxrad):
         """
@@ -686,11 +694,18 @@ class GMix(object):
             res = resarray[0]
 
         wt_gm = self.get_data()
+        pixels = obs.pixels
 
         # this will add to the sums
-        gmix_nb.get_weighted_sums(
-            wt_gm, obs.pixels, res, maxrad,
-        )
+        if parallel.use_parallel(pixels.size):
+            parallel.set_launch_threads()
+            gmix_nb.get_weighted_sums_parallel(
+                wt_gm, pixels, res, maxrad, parallel.get_nchunks(pixels.size),
+            )
+        else:
+            gmix_nb.get_weighted_sums(
+                wt_gm, pixels, res, maxrad,
+            )
         return res
 
     def get_model_s2n_sum(self, obs):
@@ -711,8 +726,16 @@ class GMix(object):
         """
 
         gm = self.get_data()
+        pixels = obs.pixels
+
+        if parallel.use_parallel(pixels.size):
+            parallel.set_launch_threads()
+            s2n_sum = get_model_s2n_sum_parallel(
+                gm, pixels, parallel.get_nchunks(pixels.size),
+            )
+        else:
+            s2n_sum = get_model_s2n_sum(gm, pixels)
 
-        s2n_sum = get_model_s2n_sum(gm, obs.pixels)
         return s2n_sum
 
     def get_model_s2n(self, obs):
@@ -749,7 +772,15 @@ class GMix(object):
         """
 
         gm = self.get_data()
-        res = get_loglike(gm, obs._pixels)
+        pixels = obs.pixels
+
+        if parallel.use_parallel(pixels.size):
+            parallel.set_launch_threads()
+            res = get_loglike_parallel(
+                gm, pixels, parallel.get_nchunks(pixels.size),
+            )
+        else:
+            res = get_loglike(gm, pixels)
 
         res = pack_to_dict(res) if more else res[0]
 
@@ -848,6 +879,9 @@ class GMix(object):
             raise ValueError("bad model: '%s'" % self._model_name)
 
         self._fill_func = _gmix_fill_functions[self._model_name]
+        self._fill_derivs_func = _gmix_fill_derivs_functions.get(
+            self._model_name, None,
+        )
 
     def __len__(self):
         return self._ngauss
@@ -909,6 +943,40 @@ class GMixModel(GMix):
         gmix = GMixModel(self._pars, self._model_name)
         return gmix
 
+    def get_derivs(self):
+        """
+        Get the derivatives of the gaussians with respect to the model
+        parameters, at the current parameters
+
+        Returns
+        -------
+        dgmix: array
+            Array with shape (ngauss, npars, 6), holding the derivatives of p,
+            row, col, irr, irc, icc for each gaussian with respect to each
+            parameter
+        """
+        dgmix = np.zeros((self._ngauss, self._npars, 6))
+        self.fill_derivs(dgmix)
+        return dgmix
+
+    def fill_derivs(self, dgmix):
+        """
+        Fill the derivatives of the gaussians with respect to the model
+        parameters, at the current parameters.  See get_derivs
+
+        parameters
+        ----------
+        dgmix: array
+            Array with shape (ngauss, npars, 6)
+        """
+        if self._fill_derivs_func is None:
+            raise ValueError(
+                "derivatives not supported for model "
+                "'%s'" % self._model_name
+            )
+
+        self._fill_derivs_func(dgmix, self._pars)
+
     def set_cen(self, row, col):
         """
         Move the mixture to a new center
@@ -969,6 +1037,20 @@ class GMixCM(GMixModel):
             gm, self._fracdev, self._TdByTe, self._Tfactor, self._pars,
         )
 
+    def fill_derivs(self, dgmix):
+        """
+        Fill the derivatives of the gaussians with respect to the model
+        parameters, at the current parameters.  See get_derivs
+
+        parameters
+        ----------
+        dgmix: array
+            Array with shape (ngauss, npars, 6)
+        """
+        self._fill_derivs_func(
+            dgmix, self._fracdev, self._TdByTe, self._Tfactor, self._pars,
+        )
+
     def __repr__(self):
         rep = super(GMixCM, self).__repr__()
         rep = [
@@ -1,6 +1,6 @@
 import numpy
 from numpy import array, nan
-from numba import njit
+from numba import njit, prange
 from ..fastexp_nb import fexp, FASTEXP_MAX_CHI2
 
 # need to make this a pure python exception
@@ -9,7 +9,7 @@ from ..gexceptions import GMixRangeError
 GMIX_LOW_DETVAL = 1.0e-200
 
 
-@njit
+@njit(nogil=True)
 def gmix_eval_pixel_fast(gmix, pixel):
     """
     evaluate a single gaussian mixture, using the
@@ -23,7 +23,7 @@ def gmix_eval_pixel_fast(gmix, pixel):
     return model_val
 
 
-@njit
+@njit(nogil=True)
 def gauss2d_eval_pixel_fast(gauss, pixel):
     """
     evaluate a 2-d gaussian at the specified location, using
@@ -54,7 +54,7 @@ def gauss2d_eval_pixel_fast(gauss, pixel):
     return model_val
 
 
-@njit
+@njit(nogil=True)
 def gauss2d_eval_pixel(gauss, pixel):
     """
     evaluate a 2-d gaussian at the specified location
@@ -83,7 +83,7 @@ def gauss2d_eval_pixel(gauss, pixel):
     return model_val
 
 
-@njit
+@njit(nogil=True)
 def gmix_eval_pixel(gmix, pixel):
     """
     evaluate a single gaussian mixture
@@ -96,7 +96,7 @@ def gmix_eval_pixel(gmix, pixel):
     return model_val
 
 
-@njit
+@njit(nogil=True)
 def gmix_get_cen(gmix):
     """
     get the center of the gaussian mixture, as well as
@@ -121,7 +121,7 @@ def gmix_get_cen(gmix):
     return row, col, psum
 
 
-@njit
+@njit(nogil=True)
 def gmix_get_e1e2T(gmix):
     """
     get e1,e2,T for the gaussian mixture
@@ -164,7 +164,7 @@ def gmix_get_e1e2T(gmix):
     return e1, e2, T
 
 
-@njit
+@njit(nogil=True)
 def gmix_set_norms(gmix):
     """
     set all norms for gaussians in the input gaussian mixture
@@ -178,7 +178,7 @@ def gmix_set_norms(gmix):
         gauss2d_set_norm(gauss)
 
 
-@njit
+@njit(nogil=True)
 def gauss2d_set_norm(gauss):
     """
     set the normalization, and nromalized variances
@@ -209,7 +209,7 @@ def gauss2d_set_norm(gauss):
     gauss["norm_set"] = 1
 
 
-@njit
+@njit(nogil=True)
 def gauss2d_set(gauss, p, row, col, irr, irc, icc):
     """
     set the gaussian, clearing normalizations
@@ -295,7 +295,7 @@ _pvals_gauss = array([1.0])
 _fvals_gauss = array([1.0])
 
 
-@njit
+@njit(nogil=True)
 def gmix_fill_simple(gmix, pars, fvals, pvals):
     """
     fill a simple (6 parameter) gaussian mixture model
@@ -331,7 +331,7 @@ def gmix_fill_simple(gmix, pars, fvals, pvals):
         )
 
 
-@njit
+@njit(nogil=True)
 def gmix_fill_exp(gmix, pars):
     """
     fill an exponential model
@@ -339,7 +339,7 @@ def gmix_fill_exp(gmix, pars):
     gmix_fill_simple(gmix, pars, _fvals_exp, _pvals_exp)
 
 
-@njit
+@njit(nogil=True)
 def gmix_fill_dev(gmix, pars):
     """
     fill a dev model
@@ -347,7 +347,7 @@ def gmix_fill_dev(gmix, pars):
     gmix_fill_simple(gmix, pars, _fvals_dev, _pvals_dev)
 
 
-@njit
+@njit(nogil=True)
 def gmix_fill_turb(gmix, pars):
     """
     fill a turbulent psf model
@@ -355,7 +355,7 @@ def gmix_fill_turb(gmix, pars):
     gmix_fill_simple(gmix, pars, _fvals_turb, _pvals_turb)
 
 
-@njit
+@njit(nogil=True)
 def gmix_fill_gauss(gmix, pars):
     """
     fill a gaussian model
@@ -363,7 +363,7 @@ def gmix_fill_gauss(gmix, pars):
     gmix_fill_simple(gmix, pars, _fvals_gauss, _pvals_gauss)
 
 
-@njit
+@njit(nogil=True)
 def gmix_fill_coellip(gmix, pars):
     """
     fill a coelliptical model
@@ -396,7 +396,7 @@ def gmix_fill_coellip(gmix, pars):
         )
 
 
-@njit
+@njit(nogil=True)
 def gmix_fill_full(gmix, pars):
     """
     fill a "full" gmix model, parameters are specified
@@ -418,7 +418,7 @@ def gmix_fill_full(gmix, pars):
         )
 
 
-@njit
+@njit(nogil=True)
 def gmix_fill_cm(gmix, fracdev, TdByTe, Tfactor, pars):
     """
     fill a composite model
@@ -457,7 +457,7 @@ def gmix_fill_cm(gmix, fracdev, TdByTe, Tfactor, pars):
         )
 
 
-@njit
+@njit(nogil=True)
 def gmix_fill_bd(gmix, pars):
     """
     fill a bulge plus disk model
@@ -503,7 +503,7 @@ def gmix_fill_bd(gmix, pars):
         )
 
 
-@njit
+@njit(nogil=True)
 def gmix_fill_bdf(gmix, pars):
     """
     fill a composite model with fixed Td/Te=1 but fracdev
@@ -549,7 +549,7 @@ def gmix_fill_bdf(gmix, pars):
         )
 
 
-@njit
+@njit(nogil=True)
 def get_cm_Tfactor(fracdev, TdByTe):
     """
     get the factor needed to convert T to the T needed
@@ -584,6 +584,67 @@ def get_cm_Tfactor(fracdev, TdByTe):
     return Tfactor
 
 
+# codes for the models filled by gmix_fill_model, for kernels that fill
+# mixtures for any model.  The cm model needs extra parameters and is not
+# included
+GMIX_FILL_EXP = 0
+GMIX_FILL_DEV = 1
+GMIX_FILL_TURB = 2
+GMIX_FILL_GAUSS = 3
+GMIX_FILL_BD = 4
+GMIX_FILL_BDF = 5
+GMIX_FILL_COELLIP = 6
+GMIX_FILL_FULL = 7
+
+_gmix_fill_codes = {
+    "exp": GMIX_FILL_EXP,
+    "dev": GMIX_FILL_DEV,
+    "turb": GMIX_FILL_TURB,
+    "gauss": GMIX_FILL_GAUSS,
+    "bd": GMIX_FILL_BD,
+    "bdf": GMIX_FILL_BDF,
+    "coellip": GMIX_FILL_COELLIP,
+    "full": GMIX_FILL_FULL,
+}
+
+
+@njit(nogil=True)
+def gmix_fill_model(fill_code, gmix, pars):
+    """
+    fill a mixture for the model with the given code
+
+    Branching on a code rather than sending the fill function lets the
+    kernels that call this be cached on disk
+
+    parameters
+    ----------
+    fill_code: int
+        The code for the model, e.g. GMIX_FILL_EXP
+    gmix: gaussian mixture
+        The mixture to fill
+    pars: array
+        The parameters for the model
+    """
+    if fill_code == GMIX_FILL_EXP:
+        gmix_fill_exp(gmix, pars)
+    elif fill_code == GMIX_FILL_DEV:
+        gmix_fill_dev(gmix, pars)
+    elif fill_code == GMIX_FILL_TURB:
+        gmix_fill_turb(gmix, pars)
+    elif fill_code == GMIX_FILL_GAUSS:
+        gmix_fill_gauss(gmix, pars)
+    elif fill_code == GMIX_FILL_BD:
+        gmix_fill_bd(gmix, pars)
+    elif fill_code == GMIX_FILL_BDF:
+        gmix_fill_bdf(gmix, pars)
+    elif fill_code == GMIX_FILL_COELLIP:
+        gmix_fill_coellip(gmix, pars)
+    elif fill_code == GMIX_FILL_FULL:
+        gmix_fill_full(gmix, pars)
+    else:
+        raise ValueError("bad fill code")
+
+
 _gmix_fill_functions = {
     "exp": gmix_fill_exp,
     "dev": gmix_fill_dev,
@@ -597,7 +658,331 @@ _gmix_fill_functions = {
 }
 
 
-@njit
+# Derivatives of the gaussians in a mixture with respect to the model
+# parameters, used for the analytic jacobian in LM fitting.  The arrays
+# have shape (ngauss, npars, 6) where the last dimension holds the
+# derivatives of p, row, col, irr, irc, icc
+
+@njit(nogil=True)
+def g1g2_to_e1e2_derivs(g1, g2):
+    """
+    convert g to e and get the derivatives de/dg
+
+    returns
+    -------
+    e1, e2, de1/dg1, de1/dg2, de2/dg1, de2/dg2
+    """
+
+    gsq = g1 * g1 + g2 * g2
+    if gsq >= 1:
+        raise GMixRangeError("g >= 1")
+
+    # e = tanh(2 atanh(g)) = 2 g/(1 + g^2)
+    ifac = 1.0 / (1.0 + gsq)
+    fac = 2.0 * ifac
+
+    e1 = fac * g1
+    e2 = fac * g2
+
+    de1dg1 = fac - 2.0 * fac * ifac * g1 * g1
+    de2dg2 = fac - 2.0 * fac * ifac * g2 * g2
+    de1dg2 = -2.0 * fac * ifac * g1 * g2
+
+    return e1, e2, de1dg1, de1dg2, de1dg2, de2dg2
+
+
+@njit(nogil=True)
+def gauss2d_set_derivs(dgauss, a, b, T, e1, e2, ederivs, iflux):
+    """
+    set the derivatives for a gaussian with flux fraction a and T
+    fraction b, for the standard parameters row, col, g1, g2, T in the
+    first five slots and the flux in slot iflux
+
+    parameters
+    ----------
+    dgauss: array
+        shape (npars, 6)
+    a: float
+        The gaussian has p = flux*a
+    b: float
+        The gaussian has T_i = T*b
+    T: float
+        The T parameter
+    e1, e2: float
+        The ellipticity
+    ederivs: tuple
+        de1/dg1, de1/dg2, de2/dg1, de2/dg2
+    iflux: int
+        Index of the flux parameter
+    """
+
+    de1dg1, de1dg2, de2dg1, de2dg2 = ederivs
+
+    T_i_2 = 0.5 * T * b
+
+    dgauss[0, 1] = 1.0
+    dgauss[1, 2] = 1.0
+
+    dgauss[2, 3] = -T_i_2 * de1dg1
+    dgauss[2, 4] = T_i_2 * de2dg1
+    dgauss[2, 5] = T_i_2 * de1dg1
+
+    dgauss[3, 3] = -T_i_2 * de1dg2
+    dgauss[3, 4] = T_i_2 * de2dg2
+    dgauss[3, 5] = T_i_2 * de1dg2
+
+    dgauss[4, 3] = 0.5 * b * (1 - e1)
+    dgauss[4, 4] = 0.5 * b * e2
+    dgauss[4, 5] = 0.5 * b * (1 + e1)
+
+    dgauss[iflux, 0] = a
+
+
+@njit(nogil=True)
+def gmix_fill_derivs_simple(dgmix, pars, fvals, pvals):
+    """
+    fill the derivatives for a simple (6 parameter) gaussian mixture model
+    """
+
+    T = pars[4]
+
+    e1, e2, de1dg1, de1dg2, de2dg1, de2dg2 = g1g2_to_e1e2_derivs(
+        pars[2], pars[3],
+    )
+    ederivs = (de1dg1, de1dg2, de2dg1, de2dg2)
+
+    dgmix[:, :, :] = 0.0
+    for i in range(dgmix.shape[0]):
+        gauss2d_set_derivs(
+            dgmix[i], pvals[i], fvals[i], T, e1, e2, ederivs, 5,
+        )
+
+
+@njit(nogil=True)
+def gmix_fill_derivs_exp(dgmix, pars):
+    """
+    fill the derivatives for an exponential model
+    """
+    gmix_fill_derivs_simple(dgmix, pars, _fvals_exp, _pvals_exp)
+
+
+@njit(nogil=True)
+def gmix_fill_derivs_dev(dgmix, pars):
+    """
+    fill the derivatives for a dev model
+    """
+    gmix_fill_derivs_simple(dgmix, pars, _fvals_dev, _pvals_dev)
+
+
+@njit(nogil=True)
+def gmix_fill_derivs_turb(dgmix, pars):
+    """
+    fill the derivatives for a turbulent psf model
+    """
+    gmix_fill_derivs_simple(dgmix, pars, _fvals_turb, _pvals_turb)
+
+
+@njit(nogil=True)
+def gmix_fill_derivs_gauss(dgmix, pars):
+    """
+    fill the derivatives for a gaussian model
+    """
+    gmix_fill_derivs_simple(dgmix, pars, _fvals_gauss, _pvals_gauss)
+
+
+@njit(nogil=True)
+def gmix_fill_derivs_coellip(dgmix, pars):
+    """
+    fill the derivatives for a coelliptical model
+
+    [cen1,cen2,g1,g2,T1,T2,...,F1,F2...]
+    """
+
+    e1, e2, de1dg1, de1dg2, de2dg1, de2dg2 = g1g2_to_e1e2_derivs(
+        pars[2], pars[3],
+    )
+    ederivs = (de1dg1, de1dg2, de2dg1, de2dg2)
+
+    n_gauss = dgmix.shape[0]
+
+    dgmix[:, :, :] = 0.0
+    for i in range(n_gauss):
+        dgauss = dgmix[i]
+
+        # use the generic setter with T=T_i, then move the T derivatives
+        # to the slot for this gaussian
+        gauss2d_set_derivs(
+            dgauss, 1.0, 1.0, pars[4 + i], e1, e2, ederivs, 4 + n_gauss + i,
+        )
+
+        for j in range(3, 6):
+            dT = dgauss[4, j]
+            dgauss[4, j] = 0.0
+            dgauss[4 + i, j] = dT
+
+
+@njit(nogil=True)
+def gmix_fill_derivs_cm(dgmix, fracdev, TdByTe, Tfactor, pars):
+    """
+    fill the derivatives for a composite model
+    """
+
+    T = pars[4]
+    ifracdev = 1.0 - fracdev
+
+    e1, e2, de1dg1, de1dg2, de2dg1, de2dg2 = g1g2_to_e1e2_derivs(
+        pars[2], pars[3],
+    )
+    ederivs = (de1dg1, de1dg2, de2dg1, de2dg2)
+
+    dgmix[:, :, :] = 0.0
+    for i in range(16):
+        if i < 6:
+            p = _pvals_exp[i] * ifracdev
+            f = _fvals_exp[i]
+        else:
+            p = _pvals_dev[i - 6] * fracdev
+            f = _fvals_dev[i - 6] * TdByTe
+
+        gauss2d_set_derivs(dgmix[i], p, Tfactor * f, T, e1, e2, ederivs, 5)
+
+
+@njit(nogil=True)
+def gmix_fill_derivs_bd(dgmix, pars):
+    """
+    fill the derivatives for a bulge plus disk model
+    """
+
+    T = pars[4]
+    lTrat = pars[5]
+    fracdev = pars[6]
+    flux = pars[7]
+
+    TdByTe = 10.0 ** lTrat
+    dTdByTe = TdByTe * numpy.log(10.0)
+
+    Tfactor = get_cm_Tfactor(fracdev, TdByTe)
+    dTfactor_dfracdev, dTfactor_dTdByTe = _get_cm_Tfactor_derivs(
+        Tfactor, TdByTe,
+    )
+    dTfactor_dlTrat = fracdev * dTfactor_dTdByTe * dTdByTe
+
+    ifracdev = 1.0 - fracdev
+
+    e1, e2, de1dg1, de1dg2, de2dg1, de2dg2 = g1g2_to_e1e2_derivs(
+        pars[2], pars[3],
+    )
+    ederivs = (de1dg1, de1dg2, de2dg1, de2dg2)
+
+    dgmix[:, :, :] = 0.0
+    for i in range(16):
+        if i < 6:
+            p = _pvals_exp[i] * ifracdev
+            f = _fvals_exp[i]
+            dp_dfracdev = -_pvals_exp[i]
+            df_dlTrat = 0.0
+        else:
+            p = _pvals_dev[i - 6] * fracdev
+            f = _fvals_dev[i - 6] * TdByTe
+            dp_dfracdev = _pvals_dev[i - 6]
+            df_dlTrat = _fvals_dev[i - 6] * dTdByTe
+
+        dgauss = dgmix[i]
+        gauss2d_set_derivs(dgauss, p, Tfactor * f, T, e1, e2, ederivs, 7)
+
+        db_dlTrat = dTfactor_dlTrat * f + Tfactor * df_dlTrat
+        db_dfracdev = dTfactor_dfracdev * f
+
+        dgauss[5, 3] = 0.5 * T * db_dlTrat * (1 - e1)
+        dgauss[5, 4] = 0.5 * T * db_dlTrat * e2
+        dgauss[5, 5] = 0.5 * T * db_dlTrat * (1 + e1)
+
+        dgauss[6, 0] = flux * dp_dfracdev
+        dgauss[6, 3] = 0.5 * T * db_dfracdev * (1 - e1)
+        dgauss[6, 4] = 0.5 * T * db_dfracdev * e2
+        dgauss[6, 5] = 0.5 * T * db_dfracdev * (1 + e1)
+
+
+@njit(nogil=True)
+def gmix_fill_derivs_bdf(dgmix, pars):
+    """
+    fill the derivatives for a composite model with fixed Td/Te=1 but
+    fracdev varying
+    """
+
+    TdByTe = 1.0
+
+    T = pars[4]
+    fracdev = pars[5]
+    flux = pars[6]
+
+    Tfactor = get_cm_Tfactor(fracdev, TdByTe)
+    dTfactor_dfracdev, _ = _get_cm_Tfactor_derivs(Tfactor, TdByTe)
+
+    ifracdev = 1.0 - fracdev
+
+    e1, e2, de1dg1, de1dg2, de2dg1, de2dg2 = g1g2_to_e1e2_derivs(
+        pars[2], pars[3],
+    )
+    ederivs = (de1dg1, de1dg2, de2dg1, de2dg2)
+
+    dgmix[:, :, :] = 0.0
+    for i in range(16):
+        if i < 6:
+            p = _pvals_exp[i] * ifracdev
+            f = _fvals_exp[i]
+            dp_dfracdev = -_pvals_exp[i]
+        else:
+            p = _pvals_dev[i - 6] * fracdev
+            f = _fvals_dev[i - 6] * TdByTe
+            dp_dfracdev = _pvals_dev[i - 6]
+
+        dgauss = dgmix[i]
+        gauss2d_set_derivs(dgauss, p, Tfactor * f, T, e1, e2, ederivs, 6)
+
+        db_dfracdev = dTfactor_dfracdev * f
+
+        dgauss[5, 0] = flux * dp_dfracdev
+        dgauss[5, 3] = 0.5 * T * db_dfracdev * (1 - e1)
+        dgauss[5, 4] = 0.5 * T * db_dfracdev * e2
+        dgauss[5, 5] = 0.5 * T * db_dfracdev * (1 + e1)
+
+
+@njit(nogil=True)
+def _get_cm_Tfactor_derivs(Tfactor, TdByTe):
+    """
+    get the derivatives of the Tfactor with respect to fracdev and
+    TdByTe; the latter must still be multiplied by fracdev
+    """
+
+    exp_sum = 0.0
+    for i in range(6):
+        exp_sum += _pvals_exp[i] * _fvals_exp[i]
+
+    dev_sum = 0.0
+    for i in range(10):
+        dev_sum += _pvals_dev[i] * _fvals_dev[i]
+
+    Tfactor2 = Tfactor * Tfactor
+    dTfactor_dfracdev = -Tfactor2 * (dev_sum * TdByTe - exp_sum)
+    dTfactor_dTdByTe = -Tfactor2 * dev_sum
+
+    return dTfactor_dfracdev, dTfactor_dTdByTe
+
+
+_gmix_fill_derivs_functions = {
+    "exp": gmix_fill_derivs_exp,
+    "dev": gmix_fill_derivs_dev,
+    "turb": gmix_fill_derivs_turb,
+    "gauss": gmix_fill_derivs_gauss,
+    "cm": gmix_fill_derivs_cm,
+    "bd": gmix_fill_derivs_bd,
+    "bdf": gmix_fill_derivs_bdf,
+    "coellip": gmix_fill_derivs_coellip,
+}
+
+
+@njit(nogil=True)
 def gmix_convolve_fill(self, gmix, psf):
     """
     fill the gaussian mixture with the convolution of gmix0,
@@ -640,7 +1025,7 @@ def gmix_convolve_fill(self, gmix, psf):
             itot += 1
 
 
-@njit
+@njit(nogil=True)
 def g1g2_to_e1e2(g1, g2):
     """
     convert g to e
@@ -669,7 +1054,7 @@ def g1g2_to_e1e2(g1, g2):
     return e1, e2
 
 
-@njit
+@njit(nogil=True)
 def get_weighted_sums(wt, pixels, res, maxrad):
     """
     Do sums for calculating the weighted moments.
@@ -725,7 +1110,7 @@ def get_weighted_sums(wt, pixels, res, maxrad):
                     res["sums_cov"][i, j] += w2 * var * F[i] * F[j]
 
 
-@njit
+@njit(nogil=True)
 def get_loglike(gmix, pixels):
     """
     get the log likelihood
@@ -778,7 +1163,7 @@ def get_loglike(gmix, pixels):
     return loglike, s2n_numer, s2n_denom, npix
 
 
-@njit
+@njit(nogil=True)
 def fill_fdiff(gmix, pixels, fdiff, start):
     """
     fill fdiff array (model-data)/err
@@ -804,7 +1189,131 @@ def fill_fdiff(gmix, pixels, fdiff, start):
         fdiff[start + ipixel] = (model_val - pixel["val"]) * pixel["ierr"]
 
 
-@njit
+@njit(nogil=True)
+def fill_fdiff_derivs(gmix, dgmix, psf, pixels, fjac, start, ipars):
+    """
+    fill the derivatives of the fdiff array (model-data)/err with respect to
+    the parameters, the jacobian used by LM
+
+    The fast exponential is used, consistent with fill_fdiff
+
+    parameters
+    ----------
+    gmix: gaussian mixture
+        The convolved mixture, as filled by gmix_convolve_fill
+    dgmix: array
+        Derivatives of the p, row, col, irr, irc, icc of each gaussian in the
+        unconvolved mixture with respect to the parameters, shape
+        (ngauss, npars, 6)
+    psf: gaussian mixture
+        The psf used for the convolution.  For an unconvolved model send
+        a single gaussian with non-zero p
+    pixels: array if pixel structs
+        u,v,val,ierr
+    fjac: array
+        Array to fill, shape (fdiff size, total number of parameters).
+        Values are added to the existing array
+    start: int
+        Starting row in fjac
+    ipars: array
+        The column in fjac for each of the npars parameters
+    """
+
+    if gmix["norm_set"][0] == 0:
+        gmix_set_norms(gmix)
+
+    n_pixels = pixels.shape[0]
+    n_gauss = dgmix.shape[0]
+    psf_n_gauss = psf.size
+    npars = ipars.size
+
+    psf_psum = 0.0
+    for ipsf in range(psf_n_gauss):
+        psf_psum += psf[ipsf]["p"]
+
+    # fraction of the flux in each psf gaussian
+    psf_pfrac = numpy.zeros(psf_n_gauss)
+    for ipsf in range(psf_n_gauss):
+        psf_pfrac[ipsf] = psf[ipsf]["p"] / psf_psum
+
+    # Most of the derivatives are zero, e.g. the center only affects row and
+    # col, so keep a sparse list of the non-zero ones
+    nmax = n_gauss * npars * 6
+    sp_beg = numpy.zeros(n_gauss + 1, dtype=numpy.int64)
+    sp_col = numpy.zeros(nmax, dtype=numpy.int64)
+    sp_q = numpy.zeros(nmax, dtype=numpy.int64)
+    sp_val = numpy.zeros(nmax)
+
+    nnz = 0
+    for igauss in range(n_gauss):
+        sp_beg[igauss] = nnz
+        for ipar in range(npars):
+            for q in range(6):
+                val = dgmix[igauss, ipar, q]
+                if val != 0.0:
+                    sp_col[nnz] = ipars[ipar]
+                    sp_q[nnz] = q
+                    sp_val[nnz] = val
+                    nnz += 1
+    sp_beg[n_gauss] = nnz
+
+    # derivatives of the model with respect to p, row, col, irr, irc, icc of
+    # an unconvolved gaussian, summed over the psf gaussians
+    dmodel = numpy.zeros(6)
+
+    for ipixel in range(n_pixels):
+        pixel = pixels[ipixel]
+        jrow = start + ipixel
+
+        v = pixel["v"]
+        u = pixel["u"]
+        fac = pixel["area"] * pixel["ierr"]
+
+        itot = 0
+        for igauss in range(n_gauss):
+
+            dmodel[:] = 0.0
+            for ipsf in range(psf_n_gauss):
+                gauss = gmix[itot]
+                itot += 1
+
+                vdiff = v - gauss["row"]
+                udiff = u - gauss["col"]
+
+                dcc = gauss["dcc"]
+                drr = gauss["drr"]
+                drc = gauss["drc"]
+
+                chi2 = (
+                    dcc * vdiff * vdiff
+                    + drr * udiff * udiff
+                    - 2.0 * drc * vdiff * udiff
+                )
+
+                if chi2 < FASTEXP_MAX_CHI2 and chi2 >= 0.0:
+                    dp = gauss["norm"] * fexp(-0.5 * chi2) * fac
+                    val = gauss["p"] * dp
+
+                    # note drr*dcc - drc*drc = 1/det
+                    idet = drr * dcc - drc * drc
+                    chi2m1 = chi2 - 1.0
+
+                    dmodel[0] += dp * psf_pfrac[ipsf]
+                    dmodel[1] += val * (dcc * vdiff - drc * udiff)
+                    dmodel[2] += val * (drr * udiff - drc * vdiff)
+                    dmodel[3] += 0.5 * val * (
+                        dcc * chi2m1 - udiff * udiff * idet
+                    )
+                    dmodel[4] += val * (udiff * vdiff * idet - drc * chi2m1)
+                    dmodel[5] += 0.5 * val * (
+                        drr * chi2m1 - vdiff * vdiff * idet
+                    )
+
+            for i in range(sp_beg[igauss], sp_beg[igauss + 1]):
+                fjac[jrow, sp_col[i]] += dmodel[sp_q[i]] * sp_val[i]
+
+
+@njit(nogil=True)
 def get_model_s2n_sum(gmix, pixels):
     """
     get the model s/n sum.
@@ -839,3 +1348,371 @@ def get_model_s2n_sum(gmix, pixels):
         s2n_sum += model_val * model_val * ivar
 
     return s2n_sum
+
+
+@njit(nogil=True)
+def fill_gmix_packed(
+    fill_code,
+    band_pars,
+    obs_band,
+    gm0_data,
+    gm0_starts,
+    psf_data,
+    psf_starts,
+    gmix_data,
+    gmix_starts,
+    dopsf,
+):
+    """
+    fill the mixtures for a set of observations, with the data for all
+    mixtures packed into contiguous arrays
+
+    parameters
+    ----------
+    fill_code: int
+        The code for the model, see gmix_fill_model
+    band_pars: array
+        The parameters for each band, shape (nband, npars_band)
+    obs_band: array
+        The band for each observation
+    gm0_data: gaussian mixtures
+        The unconvolved mixture for each band.  Only used if dopsf is True
+    gm0_starts: array
+        The mixture for band i is gm0_data[gm0_starts[i]:gm0_starts[i+1]]
+    psf_data: gaussian mixtures
+        The psf for each observation.  Only used if dopsf is True
+    psf_starts: array
+        The psf for observation i is psf_data[psf_starts[i]:psf_starts[i+1]]
+    gmix_data: gaussian mixtures
+        The mixture for each observation, to be filled
+    gmix_starts: array
+        The mixture for observation i is
+        gmix_data[gmix_starts[i]:gmix_starts[i+1]]
+    dopsf: bool
+        If True, fill the unconvolved mixture for each band and convolve with
+        the psf for each observation, otherwise fill the mixtures for the
+        observations directly
+    """
+
+    if dopsf:
+        for band in range(band_pars.shape[0]):
+            gm0 = gm0_data[gm0_starts[band]:gm0_starts[band+1]]
+            gmix_fill_model(fill_code, gm0, band_pars[band])
+
+    for iobs in range(obs_band.size):
+        band = obs_band[iobs]
+        gm = gmix_data[gmix_starts[iobs]:gmix_starts[iobs+1]]
+
+        if dopsf:
+            gm0 = gm0_data[gm0_starts[band]:gm0_starts[band+1]]
+            psf = psf_data[psf_starts[iobs]:psf_starts[iobs+1]]
+            gmix_convolve_fill(gm, gm0, psf)
+        else:
+            gmix_fill_model(fill_code, gm, band_pars[band])
+
+
+@njit(nogil=True)
+def fill_fdiff_packed(
+    fill_code,
+    band_pars,
+    obs_band,
+    gm0_data,
+    gm0_starts,
+    psf_data,
+    psf_starts,
+    gmix_data,
+    gmix_starts,
+    dopsf,
+    pixels,
+    pixel_starts,
+    fdiff,
+    start,
+):
+    """
+    fill the mixtures for a set of observations and the fdiff array
+    (model-data)/err for all of them
+
+    See fill_gmix_packed for most of the parameters
+
+    parameters
+    ----------
+    pixels: array if pixel structs
+        The pixels for all observations
+    pixel_starts: array
+        The pixels for observation i are
+        pixels[pixel_starts[i]:pixel_starts[i+1]]
+    fdiff: array
+        Array to fill
+    start: int
+        Starting position in fdiff
+    """
+
+    fill_gmix_packed(
+        fill_code, band_pars, obs_band, gm0_data, gm0_starts,
+        psf_data, psf_starts, gmix_data, gmix_starts, dopsf,
+    )
+
+    for iobs in range(obs_band.size):
+        gm = gmix_data[gmix_starts[iobs]:gmix_starts[iobs+1]]
+        beg = pixel_starts[iobs]
+        end = pixel_starts[iobs+1]
+
+        fill_fdiff(gm, pixels[beg:end], fdiff, start + beg)
+
+
+@njit(nogil=True)
+def get_loglike_packed(gmix_data, gmix_starts, pixels, pixel_starts):
+    """
+    get the log likelihood summed over a set of observations, with the
+    mixtures and pixels packed into contiguous arrays
+
+    parameters
+    ----------
+    gmix_data: gaussian mixtures
+        The mixture for each observation
+    gmix_starts: array
+        The mixture for observation i is
+        gmix_data[gmix_starts[i]:gmix_starts[i+1]]
+    pixels: array if pixel structs
+        The pixels for all observations
+    pixel_starts: array
+        The pixels for observation i are
+        pixels[pixel_starts[i]:pixel_starts[i+1]]
+
+    returns
+    -------
+    loglike, s2n_numer, s2n_denom, npix
+    """
+
+    loglike = s2n_numer = s2n_denom = 0.0
+    npix = 0
+
+    for iobs in range(gmix_starts.size - 1):
+        gm = gmix_data[gmix_starts[iobs]:gmix_starts[iobs+1]]
+        beg = pixel_starts[iobs]
+        end = pixel_starts[iobs+1]
+
+        res = get_loglike(gm, pixels[beg:end])
+
+        loglike += res[0]
+        s2n_numer += res[1]
+        s2n_denom += res[2]
+        npix += res[3]
+
+    return loglike, s2n_numer, s2n_denom, npix
+
+
+@njit(nogil=True)
+def get_chunk_range(ichunk, nchunks, n):
+    """
+    get the range [beg, end) of chunk ichunk when splitting n items into
+    nchunks nearly equal chunks
+    """
+    beg = (ichunk * n) // nchunks
+    end = ((ichunk + 1) * n) // nchunks
+    return beg, end
+
+
+@njit(parallel=True, nogil=True)
+def get_loglike_parallel(gmix, pixels, nchunks):
+    """
+    get the log likelihood, with the pixels split into chunks that are
+    processed in parallel.  See get_loglike for details
+
+    The sums for each chunk are added in order, so the result depends only on
+    the number of chunks, not the number of threads
+
+    parameters
+    ----------
+    gmix: gaussian mixture
+        See gmix.py
+    pixels: array if pixel structs
+        u,v,val,ierr
+    nchunks: int
+        Number of chunks
+
+    returns
+    -------
+    loglike, s2n_numer, s2n_denom, npix
+    """
+
+    if gmix["norm_set"][0] == 0:
+        gmix_set_norms(gmix)
+
+    n_pixels = pixels.shape[0]
+    sums = numpy.zeros((nchunks, 3))
+
+    for ichunk in prange(nchunks):
+        beg, end = get_chunk_range(ichunk, nchunks, n_pixels)
+
+        loglike = s2n_numer = s2n_denom = 0.0
+        for ipixel in range(beg, end):
+            pixel = pixels[ipixel]
+
+            model_val = gmix_eval_pixel_fast(gmix, pixel)
+
+            ivar = pixel["ierr"] * pixel["ierr"]
+            val = pixel["val"]
+            diff = model_val - val
+
+            loglike += diff * diff * ivar
+
+            s2n_numer += val * model_val * ivar
+            s2n_denom += model_val * model_val * ivar
+
+        sums[ichunk, 0] = loglike
+        sums[ichunk, 1] = s2n_numer
+        sums[ichunk, 2] = s2n_denom
+
+    loglike = s2n_numer = s2n_denom = 0.0
+    for ichunk in range(nchunks):
+        loglike += sums[ichunk, 0]
+        s2n_numer += sums[ichunk, 1]
+        s2n_denom += sums[ichunk, 2]
+
+    loglike *= -0.5
+
+    return loglike, s2n_numer, s2n_denom, n_pixels
+
+
+@njit(parallel=True, nogil=True)
+def fill_fdiff_parallel(gmix, pixels, fdiff, start):
+    """
+    fill fdiff array (model-data)/err, with the pixels processed in parallel.
+    See fill_fdiff for details
+    """
+
+    if gmix["norm_set"][0] == 0:
+        gmix_set_norms(gmix)
+
+    n_pixels = pixels.shape[0]
+    for ipixel in prange(n_pixels):
+        pixel = pixels[ipixel]
+
+        model_val = gmix_eval_pixel_fast(gmix, pixel)
+        fdiff[start + ipixel] = (model_val - pixel["val"]) * pixel["ierr"]
+
+
+@njit(parallel=True, nogil=True)
+def get_model_s2n_sum_parallel(gmix, pixels, nchunks):
+    """
+    get the model s/n sum, with the pixels split into chunks that are
+    processed in parallel.  See get_model_s2n_sum for details
+
+    parameters
+    ----------
+    gmix: gaussian mixture
+        See gmix.py
+    pixels: array if pixel structs
+        u,v,val,ierr
+    nchunks: int
+        Number of chunks
+
+    returns
+    -------
+    s2n_sum: float
+        sum to calculate s/n
+    """
+
+    if gmix["norm_set"][0] == 0:
+        gmix_set_norms(gmix)
+
+    n_pixels = pixels.shape[0]
+    sums = numpy.zeros(nchunks)
+
+    for ichunk in prange(nchunks):
+        beg, end = get_chunk_range(ichunk, nchunks, n_pixels)
+
+        s2n_sum = 0.0
+        for ipixel in range(beg, end):
+            pixel = pixels[ipixel]
+
+            model_val = gmix_eval_pixel_fast(gmix, pixel)
+            ivar = pixel["ierr"] * pixel["ierr"]
+
+            s2n_sum += model_val * model_val * ivar
+
+        sums[ichunk] = s2n_sum
+
+    s2n_sum = 0.0
+    for ichunk in range(nchunks):
+        s2n_sum += sums[ichunk]
+
+    return s2n_sum
+
+
+@njit(parallel=True, nogil=True)
+def get_weighted_sums_parallel(wt, pixels, res, maxrad, nchunks):
+    """
+    Do sums for calculating the weighted moments, with the pixels split into
+    chunks that are processed in parallel.  See get_weighted_sums for details
+
+    Parameters
+    ----------
+    wt: array
+        The gaussian mixture with dtype ngmix.gmix.gmix._gauss2d_dtype
+    pixels: array
+        Array of pixels
+    res: array
+        The result array
+    maxrad: float
+        Maximum radius in u, v coordinates
+    nchunks: int
+        Number of chunks
+    """
+
+    maxrad2 = maxrad ** 2
+
+    vcen = wt["row"][0]
+    ucen = wt["col"][0]
+
+    n_pixels = pixels.size
+
+    # wsum, npix, sums and sums_cov for each chunk
+    chunk_wsum = numpy.zeros(nchunks)
+    chunk_npix = numpy.zeros(nchunks, dtype=numpy.int64)
+    chunk_sums = numpy.zeros((nchunks, 6))
+    chunk_sums_cov = numpy.zeros((nchunks, 6, 6))
+
+    for ichunk in prange(nchunks):
+        beg, end = get_chunk_range(ichunk, nchunks, n_pixels)
+
+        F = numpy.zeros(6)
+        for i_pixel in range(beg, end):
+
+            pixel = pixels[i_pixel]
+
+            vmod = pixel["v"] - vcen
+            umod = pixel["u"] - ucen
+
+            rad2 = umod * umod + vmod * vmod
+            if rad2 < maxrad2:
+
+                weight = gmix_eval_pixel(wt, pixel)
+                var = 1.0 / (pixel["ierr"] * pixel["ierr"])
+
+                wdata = weight * pixel["val"]
+                w2 = weight * weight
+
+                F[0] = pixel["v"]
+                F[1] = pixel["u"]
+                F[2] = umod * umod - vmod * vmod
+                F[3] = 2 * vmod * umod
+                F[4] = rad2
+                F[5] = 1.0
+
+                chunk_wsum[ichunk] += weight
+                chunk_npix[ichunk] += 1
+
+                for i in range(6):
+                    chunk_sums[ichunk, i] += wdata * F[i]
+                    for j in range(6):
+                        chunk_sums_cov[ichunk, i, j] += w2 * var * F[i] * F[j]
+
+    for ichunk in range(nchunks):
+        res["wsum"] += chunk_wsum[ichunk]
+        res["npix"] += chunk_npix[ichunk]
+        for i in range(6):
+            res["sums"][i] += chunk_sums[ichunk, i]
+            for j in range(6):
+                res["sums_cov"][i, j] += chunk_sums_cov[ichunk, i, j]
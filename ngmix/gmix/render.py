@@ -0,0 +1,153 @@
+__all__ = ['pack_gmixes', 'render_batch']
+
+import numpy as np
+from ..jacobian import Jacobian, UnitJacobian
+from ..pixels import make_coords
+from .gmix import GMix, _gauss2d_dtype
+from . import render_nb
+
+
+def pack_gmixes(gmixes):
+    """
+    Pack the data for a set of mixtures into a single array, for use with
+    render_batch
+
+    Parameters
+    ----------
+    gmixes: sequence of ngmix.GMix objects
+        The mixtures to pack
+
+    Returns
+    -------
+    gmix_data, starts: array, array
+        The gaussians for all mixtures, packed end to end, and the offsets of
+        each mixture in that array; the data for mixture i is
+        gmix_data[starts[i]:starts[i+1]]
+    """
+
+    ngauss = np.zeros(len(gmixes) + 1, dtype='i8')
+    data_list = []
+    for i, gm in enumerate(gmixes):
+        if not isinstance(gm, GMix):
+            raise ValueError(f'expected GMix, got {type(gm)}')
+        ngauss[i+1] = len(gm)
+        data_list.append(gm.get_data())
+
+    starts = ngauss.cumsum()
+
+    dtype = np.dtype(_gauss2d_dtype)
+    if len(data_list) > 0:
+        # concatenating the raw bytes is much faster than concatenating
+        # structured arrays
+        gmix_data = np.concatenate(
+            [data.view('u1') for data in data_list]
+        ).view(dtype)
+    else:
+        gmix_data = np.zeros(0, dtype=dtype)
+
+    return gmix_data, starts
+
+
+def render_batch(
+    gmix_data, starts, dims, jacobians=None, fast_exp=False, parallel=False,
+):
+    """
+    Render a set of mixtures into a stack of images, in a single call to
+    a compiled kernel
+
+    The pixel coordinates are calculated once for each distinct jacobian, so
+    it is efficient to send the same jacobian for many objects
+
+    Parameters
+    ----------
+    gmix_data: array
+        The gaussians for all mixtures, packed end to end, e.g. from
+        pack_gmixes. The normalizations are set in place if needed
+    starts: array
+        The offsets of each mixture in gmix_data, with an extra element at the
+        end; the data for mixture i is gmix_data[starts[i]:starts[i+1]]
+    dims: 2-element sequence
+        dimensions [nrows, ncols] of each image
+    jacobians: Jacobian or sequence of Jacobian, optional
+        A single jacobian for all images or one for each.  Default is a unit
+        jacobian centered in the image
+    fast_exp: bool, optional
+        use fast, approximate exp function
+    parallel: bool, optional
+        If True, render the objects using multiple threads, as set by
+        numba.set_num_threads. Default False
+
+    Returns
+    -------
+    images: array
+        The images, shape (nobj, nrows, ncols)
+    """
+
+    dims = np.array(dims, ndmin=1, dtype='i8')
+    if dims.size != 2:
+        raise ValueError(
+            "images must have two dimensions, got %s" % str(dims)
+        )
+
+    starts = np.atleast_1d(np.asarray(starts, dtype='i8'))
+    nobj = starts.size - 1
+    if nobj < 0 or starts[0] != 0 or starts[-1] != gmix_data.size:
+        raise ValueError(
+            'starts must begin with 0 and end with the size of gmix_data'
+        )
+    if np.any(np.diff(starts) < 0):
+        raise ValueError('starts must be non-decreasing')
+
+    if jacobians is None:
+        cen = (dims - 1.0) / 2.0
+        jacobians = UnitJacobian(row=cen[0], col=cen[1])
+
+    if isinstance(jacobians, Jacobian):
+        jacobians = [jacobians] * nobj
+    elif len(jacobians) != nobj:
+        raise ValueError(
+            'got %d jacobians for %d objects' % (len(jacobians), nobj)
+        )
+
+    coords, icoords = _get_batch_coords(dims, jacobians)
+
+    images = np.zeros((nobj, dims[0] * dims[1]), dtype='f8')
+
+    if parallel:
+        render_func = render_nb.render_batch_parallel
+    else:
+        render_func = render_nb.render_batch
+
+    if nobj > 0:
+        render_func(gmix_data, starts, coords, icoords, images, fast_exp)
+
+    return images.reshape(nobj, dims[0], dims[1])
+
+
+def _get_batch_coords(dims, jacobians):
+    """
+    get the coords for each distinct jacobian, and the index into the coords
+    for each object
+    """
+
+    icoords = np.zeros(len(jacobians), dtype='i8')
+    coords_list = []
+    index = {}
+
+    for i, jacobian in enumerate(jacobians):
+        if not isinstance(jacobian, Jacobian):
+            raise ValueError(f'expected Jacobian, got {type(jacobian)}')
+
+        key = jacobian._data.tobytes()
+        if key not in index:
+            index[key] = len(coords_list)
+            coords_list.append(make_coords(dims, jacobian))
+
+        icoords[i] = index[key]
+
+    if len(coords_list) > 0:
+        coords = np.vstack(coords_list)
+    else:
+        coords = make_coords(dims, UnitJacobian(row=0, col=0))[np.newaxis]
+
+    return coords, icoords
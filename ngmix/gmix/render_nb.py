@@ -1,4 +1,4 @@
-from numba import njit
+from numba import njit, prange
 from .gmix_nb import (
     gmix_eval_pixel,
     gmix_eval_pixel_fast,
@@ -6,7 +6,7 @@ from .gmix_nb import (
 )
 
 
-@njit
+@njit(nogil=True)
 def render(gmix, coords, image, fast_exp=0):
     """
     render the gaussian mixture in the image
@@ -34,3 +34,45 @@ def render(gmix, coords, image, fast_exp=0):
     else:
         for icoord in range(n_coords):
             image[icoord] += gmix_eval_pixel(gmix, coords[icoord])
+
+
+@njit(nogil=True)
+def render_batch(gmix_data, starts, coords, icoords, images, fast_exp=0):
+    """
+    render a set of gaussian mixtures, each in its own image
+
+    parameters
+    ----------
+    gmix_data:
+        Array of gaussians for all mixtures, packed end to end
+    starts: array
+        The mixture for object i is gmix_data[starts[i]:starts[i+1]]
+    coords: 2-d array of coords
+        The coords for each distinct jacobian, shape (ncoords, npixels)
+    icoords: array
+        The index into coords for each object
+    images:
+        The images to fill, shape (nobj, npixels)
+    fast_exp: integer, optional
+        1 for fast
+    """
+
+    nobj = images.shape[0]
+    for iobj in range(nobj):
+        gmix = gmix_data[starts[iobj]:starts[iobj+1]]
+        render(gmix, coords[icoords[iobj]], images[iobj], fast_exp)
+
+
+@njit(parallel=True, nogil=True)
+def render_batch_parallel(
+    gmix_data, starts, coords, icoords, images, fast_exp=0,
+):
+    """
+    render a set of gaussian mixtures, each in its own image, with the objects
+    distributed over threads.  See render_batch for the parameters
+    """
+
+    nobj = images.shape[0]
+    for iobj in prange(nobj):
+        gmix = gmix_data[starts[iobj]:starts[iobj+1]]
+        render(gmix, coords[icoords[iobj]], images[iobj], fast_exp)
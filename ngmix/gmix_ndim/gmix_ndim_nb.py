@@ -2,7 +2,7 @@ import numpy
 from numba import njit
 
 
-@njit
+@njit(nogil=True)
 def gmixnd_get_prob(log_pnorms,
                     means,
                     icovars,
@@ -70,7 +70,7 @@ def gmixnd_get_prob(log_pnorms,
     return retval
 
 
-@njit
+@njit(nogil=True)
 def gmixnd_get_prob_component(log_pnorms,
                               means,
                               icovars,
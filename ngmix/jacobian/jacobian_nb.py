@@ -1,7 +1,7 @@
 from numba import njit
 
 
-@njit
+@njit(nogil=True)
 def jacobian_get_vu(jacob, row, col):
     """
     convert row,col to v,u using the input jacobian
@@ -16,7 +16,7 @@ def jacobian_get_vu(jacob, row, col):
     return v, u
 
 
-@njit
+@njit(nogil=True)
 def jacobian_get_rowcol(jacob, v, u):
     """
     convert v,u to row,col using the input jacobian
@@ -31,7 +31,7 @@ def jacobian_get_rowcol(jacob, v, u):
     return row, col
 
 
-@njit
+@njit(nogil=True)
 def jacobian_get_area(jacob):
     """
     get the pixel area
@@ -0,0 +1,249 @@
+"""
+Control of the numba compilation of the ngmix kernels
+
+By default numba compiles each kernel the first time it is called, in every
+process.  For short-lived jobs this compilation can take longer than the
+processing itself.  Two tools are provided here
+
+    - turn_on_numba_caching: write the compiled kernels to disk, so that later
+      processes load them instead of compiling.  This can also be turned on by
+      setting the NGMIX_NUMBA_CACHE_DIR environment variable before importing
+      ngmix.
+    - warmup: eagerly compile the kernels used by the fitters, e.g. at the
+      start of a job rather than during the first fit.
+"""
+__all__ = [
+    'turn_on_numba_caching',
+    'turn_off_numba_caching',
+    'get_jit_functions',
+    'warmup',
+]
+import os
+import importlib
+import numpy as np
+
+import numba
+from numba.core.caching import NullCache
+from numba.core.registry import CPUDispatcher
+
+from . import gmix
+from .gexceptions import GMixRangeError
+
+NUMBA_CACHE_ENV = 'NGMIX_NUMBA_CACHE_DIR'
+
+# modules holding @njit kernels
+JIT_MODULES = [
+    'ngmix.fastexp_nb',
+    'ngmix.jacobian.jacobian_nb',
+    'ngmix.pixels.pixels_nb',
+    'ngmix.gmix.gmix_nb',
+    'ngmix.gmix.render_nb',
+    'ngmix.gmix_ndim.gmix_ndim_nb',
+    'ngmix.em.em_nb',
+    'ngmix.admom.admom_nb',
+    'ngmix.prepsfmom',
+    'ngmix.metacal.kspace_nb',
+]
+
+DEFAULT_WARMUP_MODELS = ('gauss', 'exp', 'dev', 'bdf')
+DEFAULT_WARMUP_FITTERS = ('lm', 'em', 'admom', 'gaussmom', 'prepsfmom')
+
+USE_NUMBA_CACHE = False
+
+
+def turn_on_numba_caching(cache_dir=None):
+    """
+    Save compiled kernels to disk and load them in later processes
+
+    This must be called before the kernels are first used in the process;
+    kernels that are already compiled are not written to the cache.
+
+    The cache is managed by numba, which writes the files atomically, so it is
+    safe for many processes to share the same cache directory.  Note numba only
+    checks the modification time of the file holding the kernel itself, so the
+    cache should be cleared when ngmix is upgraded in place.
+
+    Parameters
+    ----------
+    cache_dir: str, optional
+        Directory in which to write the cache.  If not sent, the
+        NUMBA_CACHE_DIR setting of numba is used, which defaults to
+        __pycache__ directories next to the ngmix source files
+    """
+    global USE_NUMBA_CACHE
+
+    if cache_dir is not None:
+        cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # the environment variable is inherited by worker processes
+        os.environ['NUMBA_CACHE_DIR'] = cache_dir
+        numba.config.CACHE_DIR = cache_dir
+
+    for func in get_jit_functions():
+        func.enable_caching()
+
+    USE_NUMBA_CACHE = True
+
+
+def turn_off_numba_caching():
+    """
+    Stop loading and saving compiled kernels to disk.  Kernels already compiled
+    in this process remain available
+    """
+    global USE_NUMBA_CACHE
+
+    for func in get_jit_functions():
+        func._cache = NullCache()
+
+    USE_NUMBA_CACHE = False
+
+
+def get_jit_functions():
+    """
+    Get a list of all the numba compiled kernels in ngmix
+
+    Returns
+    -------
+    list of numba dispatchers
+    """
+    funcs = []
+    for modname in JIT_MODULES:
+        mod = importlib.import_module(modname)
+        for name in sorted(vars(mod)):
+            obj = getattr(mod, name)
+            if (
+                isinstance(obj, CPUDispatcher)
+                and obj.py_func.__module__ == modname
+                and not any(obj is func for func in funcs)
+            ):
+                funcs.append(obj)
+
+    return funcs
+
+
+def warmup(models=DEFAULT_WARMUP_MODELS, fitters=DEFAULT_WARMUP_FITTERS):
+    """
+    Compile the kernels used by the fitters by running them on a small
+    simulated observation.
+
+    Parameters
+    ----------
+    models: sequence of str, optional
+        Models to compile for the 'lm' fitter, default
+        ('gauss', 'exp', 'dev', 'bdf').  Can also be 'turb', 'bd' and
+        'coellip'
+    fitters: sequence of str, optional
+        The fitters to compile, any of 'lm' for the Fitter, 'em' for the
+        EMFitter and its variants, 'admom' for the AdmomFitter, 'gaussmom' for
+        GaussMom and 'prepsfmom' for KSigmaMom and PGaussMom.  Default is all
+        of them
+    """
+
+    for fitter in fitters:
+        if fitter not in DEFAULT_WARMUP_FITTERS:
+            raise ValueError(
+                'bad fitter for warmup: %s, expected one of '
+                '%s' % (fitter, DEFAULT_WARMUP_FITTERS)
+            )
+
+    obs = _make_warmup_obs()
+
+    if 'lm' in fitters:
+        for model in models:
+            _warmup_lm(obs, model)
+
+    if 'em' in fitters:
+        _warmup_em(obs)
+
+    if 'admom' in fitters:
+        from .admom import AdmomFitter
+        AdmomFitter().go(obs.psf, guess=obs.psf.gmix)
+        AdmomFitter().go(obs, guess=obs.psf.gmix)
+
+    if 'gaussmom' in fitters:
+        from .gaussmom import GaussMom
+        GaussMom(fwhm=1.2).go(obs)
+
+    if 'prepsfmom' in fitters:
+        from .prepsfmom import KSigmaMom, PGaussMom
+        for cls in (KSigmaMom, PGaussMom):
+            cls(fwhm=1.2).go(obs)
+            cls(fwhm=1.2).go(obs.psf, no_psf=True)
+
+
+def _warmup_lm(obs, model):
+    from .fitting import Fitter, CoellipFitter
+
+    if model == 'coellip':
+        fitter = CoellipFitter(ngauss=2)
+        guess = np.array([0.0, 0.0, 0.0, 0.0, 0.2, 0.1, 0.5, 0.5])
+    elif model in ['gauss', 'exp', 'dev', 'turb']:
+        fitter = Fitter(model=model)
+        guess = np.array([0.0, 0.0, 0.0, 0.0, 0.2, 1.0])
+    elif model == 'bdf':
+        fitter = Fitter(model=model)
+        guess = np.array([0.0, 0.0, 0.0, 0.0, 0.2, 0.5, 1.0])
+    elif model == 'bd':
+        fitter = Fitter(model=model)
+        guess = np.array([0.0, 0.0, 0.0, 0.0, 0.2, 0.0, 0.5, 1.0])
+    else:
+        raise ValueError('bad model for warmup: %s' % model)
+
+    fitter.go(obs, guess)
+
+    # also the psf fit, which has no psf
+    if model in ['gauss', 'coellip']:
+        fitter.go(obs.psf, guess)
+
+
+def _warmup_em(obs):
+    from .em.em import (
+        EMFitter, EMFitterFixCen, EMFitterFixCov, EMFitterFluxOnly,
+    )
+
+    psf_guess = obs.psf.gmix.copy()
+
+    # galaxy with a psf
+    guess = gmix.GMixModel([0.0, 0.0, 0.0, 0.0, 0.2, 1.0], 'gauss')
+
+    for cls in (EMFitter, EMFitterFixCen, EMFitterFixCov, EMFitterFluxOnly):
+        fitter = cls(miniter=2, maxiter=2)
+        for tobs, tguess in [(obs.psf, psf_guess), (obs, guess)]:
+            try:
+                fitter.go(tobs, tguess)
+            except GMixRangeError:
+                pass
+
+
+def _make_warmup_obs():
+    from .jacobian import DiagonalJacobian
+    from .observation import Observation
+
+    dims = (15, 15)
+    cen = (np.array(dims) - 1) / 2
+    jacobian = DiagonalJacobian(row=cen[0], col=cen[1], scale=0.263)
+
+    psf_gmix = gmix.GMixModel([0.0, 0.0, 0.0, 0.0, 0.27, 1.0], 'gauss')
+    psf_im = psf_gmix.make_image(dims, jacobian=jacobian)
+    psf_obs = Observation(
+        psf_im,
+        weight=np.ones(dims),
+        jacobian=jacobian,
+        gmix=psf_gmix,
+    )
+
+    gm0 = gmix.GMixModel([0.0, 0.0, 0.1, 0.0, 0.2, 100.0], 'exp')
+    gm = gm0.convolve(psf_gmix)
+    im = gm.make_image(dims, jacobian=jacobian)
+
+    return Observation(
+        im,
+        weight=np.ones(dims),
+        jacobian=jacobian,
+        psf=psf_obs,
+    )
+
+
+if os.environ.get(NUMBA_CACHE_ENV, '') != '':
+    turn_on_numba_caching(cache_dir=os.environ[NUMBA_CACHE_ENV])
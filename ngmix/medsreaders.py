@@ -29,6 +29,8 @@ class MultiBandNGMixMEDS(object):
         Get a list of `MultiBandObsList` for all or a set of objects.
     get_mbobs(iobj, weight_type='weight')
         Get a `MultiBandObsList` for a given object.
+    close()
+        Close the MEDS files.
     """
     def __init__(self, mlist):
         self.mlist = mlist
@@ -46,6 +48,12 @@ class MultiBandNGMixMEDS(object):
         """
         return self.mlist[0].size
 
+    def close(self):
+        """Close the MEDS files for all bands.
+        """
+        for m in self.mlist:
+            m.close()
+
     def get_mbobs_list(self, indices=None, weight_type='weight'):
         """Get a list of `MultiBandObsList` for all or a set of objects.
 
@@ -1,6 +1,11 @@
 # flake8: noqa
 
 from .metacal import *
+from .kspace import *
+from .psfcache import *
+from .accumulator import *
+from .results import *
+from .prepsfmom import *
 from .bootstrap import *
 from .defaults import *
 from .convenience import *
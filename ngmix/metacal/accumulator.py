@@ -0,0 +1,233 @@
+"""
+accumulate the metacal response and mean shear from a stream of results,
+without keeping the results for each object
+"""
+import numpy as np
+
+from .defaults import DEFAULT_STEP, METACAL_MINIMAL_TYPES
+
+__all__ = ['MetacalAccumulator']
+
+DEFAULT_NPATCH = 100
+
+# pairs of sheared types used for the response of each shear component
+RESPONSE_TYPES = (('1p', '1m'), ('2p', '2m'))
+
+
+class MetacalAccumulator(object):
+    """
+    Accumulate the sums needed for the metacal response and mean shear from
+    the result dicts returned by metacal_bootstrap, one object at a time
+
+    The selection is applied separately to the result for each metacal type,
+    and the response is calculated from the mean shapes of the objects
+    selected in the sheared branches, so it includes the selection
+    response
+
+        R11 = (<g1>_1p - <g1>_1m)/(2 step)
+        R22 = (<g2>_2p - <g2>_2m)/(2 step)
+
+    and the shear is <g>_noshear/R.  R22 is nan if 2p and 2m are not
+    accumulated.
+
+    Only sums are kept, for each of npatch jackknife patches, so the memory
+    used does not depend on the number of objects.  Accumulators from
+    different processes can be combined with merge.
+
+    Parameters
+    ----------
+    select: callable, optional
+        A function called as select(res=res, obs=obs) for the result of each
+        metacal type, returning True if the object should be kept.  obs is
+        the metacal observation for the type if an obsdict is sent to add,
+        otherwise None.  Results with non-zero flags are always rejected.
+    types: list of str, optional
+        The metacal types to accumulate, default
+        ['noshear', '1p', '1m', '2p', '2m']
+    step: float, optional
+        The shear step used for metacal, default 0.01
+    gname: str, optional
+        The name of the shape in the result, default 'g'.  Use 'e' for the
+        moments measurers.
+    npatch: int, optional
+        Number of jackknife patches, default 100
+    """
+    def __init__(
+        self,
+        select=None,
+        types=None,
+        step=DEFAULT_STEP,
+        gname='g',
+        npatch=DEFAULT_NPATCH,
+    ):
+        if types is None:
+            types = METACAL_MINIMAL_TYPES
+
+        if 'noshear' not in types:
+            raise ValueError('noshear must be in the types, got %s' % types)
+
+        if npatch < 1:
+            raise ValueError('npatch must be at least 1, got %s' % npatch)
+
+        self.select = select
+        self.types = list(types)
+        self.step = step
+        self.gname = gname
+        self.npatch = npatch
+
+        self.reset()
+
+    def reset(self):
+        """
+        reset the sums to zero
+        """
+        ntypes = len(self.types)
+        self.nadd = 0
+        self.counts = np.zeros((self.npatch, ntypes), dtype='i8')
+        self.gsums = np.zeros((self.npatch, ntypes, 2))
+
+    def add(self, resdict, obsdict=None, patch=None):
+        """
+        add the results for an object
+
+        Parameters
+        ----------
+        resdict: dict
+            The results keyed by metacal type, as returned by
+            metacal_bootstrap
+        obsdict: dict, optional
+            The metacal observations keyed by type, sent to the select
+            function
+        patch: int, optional
+            The jackknife patch for this object, e.g. based on its position
+            on the sky.  If not sent the objects are assigned to the patches
+            in turn.
+        """
+        if patch is None:
+            patch = self.nadd % self.npatch
+        elif patch < 0 or patch >= self.npatch:
+            raise ValueError(
+                'patch must be in [0, %d), got %s' % (self.npatch, patch)
+            )
+
+        for itype, type in enumerate(self.types):
+            res = resdict[type]
+            if res['flags'] != 0:
+                continue
+
+            if self.select is not None:
+                obs = None if obsdict is None else obsdict[type]
+                if not self.select(res=res, obs=obs):
+                    continue
+
+            self.counts[patch, itype] += 1
+            self.gsums[patch, itype] += res[self.gname]
+
+        self.nadd += 1
+
+    def merge(self, other):
+        """
+        add the sums from another accumulator, e.g. one filled in another
+        process
+
+        Parameters
+        ----------
+        other: MetacalAccumulator
+            The accumulator to merge, with the same types, step, gname and
+            number of patches
+        """
+        if (
+            other.types != self.types
+            or other.step != self.step
+            or other.gname != self.gname
+            or other.npatch != self.npatch
+        ):
+            raise ValueError(
+                'accumulators must have the same types, step, gname '
+                'and npatch'
+            )
+
+        self.nadd += other.nadd
+        self.counts += other.counts
+        self.gsums += other.gsums
+
+    def get_nkept(self):
+        """
+        get the number of objects kept for each type
+
+        Returns
+        -------
+        nkept: dict
+            The number kept, keyed by type
+        """
+        counts = self.counts.sum(axis=0)
+        return {
+            type: counts[itype] for itype, type in enumerate(self.types)
+        }
+
+    def get_result(self):
+        """
+        get the response and mean shear
+
+        Returns
+        -------
+        result: dict
+            With entries
+
+            R: the diagonal response [R11, R22]
+            g: the mean shape of the noshear objects
+            shear: the mean shear g/R
+            shear_err: the jackknife error on the shear, using the
+                patches that hold objects
+            nkept: the number kept for each type
+            nadd: the number of objects added
+        """
+        counts = self.counts.sum(axis=0)
+        gsums = self.gsums.sum(axis=0)
+
+        R, g, shear = self._get_shear(counts, gsums)
+
+        # delete one jackknife over the non-empty patches
+        w, = np.where(self.counts.sum(axis=1) > 0)
+        if w.size > 1:
+            _, _, jshear = self._get_shear(
+                counts[np.newaxis] - self.counts[w],
+                gsums[np.newaxis] - self.gsums[w],
+            )
+            jmean = jshear.mean(axis=0)
+            shear_err = np.sqrt(
+                (w.size - 1) / w.size * ((jshear - jmean)**2).sum(axis=0)
+            )
+        else:
+            shear_err = np.full(2, np.nan)
+
+        return {
+            'R': R,
+            'g': g,
+            'shear': shear,
+            'shear_err': shear_err,
+            'nkept': self.get_nkept(),
+            'nadd': self.nadd,
+        }
+
+    def _get_shear(self, counts, gsums):
+        """
+        get R, g and shear from sums with shapes [..., ntypes] and
+        [..., ntypes, 2]
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            gmeans = gsums / counts[..., np.newaxis]
+
+            g = gmeans[..., self.types.index('noshear'), :]
+
+            R = np.full(g.shape, np.nan)
+            for i, (ptype, mtype) in enumerate(RESPONSE_TYPES):
+                if ptype in self.types and mtype in self.types:
+                    R[..., i] = (
+                        gmeans[..., self.types.index(ptype), i]
+                        - gmeans[..., self.types.index(mtype), i]
+                    ) / (2 * self.step)
+
+            shear = g / R
+
+        return R, g, shear
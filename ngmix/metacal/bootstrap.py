@@ -1,5 +1,8 @@
 from .convenience import get_all_metacal
-from ..bootstrap import bootstrap
+from .psfcache import get_digest
+from .results import get_metacal_array
+from ..bootstrap import remove_failed_psf_obs
+from ..observation import ObsList, MultiBandObsList
 
 __all__ = ['MetacalBootstrapper', 'metacal_bootstrap']
 
@@ -22,17 +25,31 @@ class MetacalBootstrapper(object):
     rng: numpy.random.RandomState
         Random state for generating noise fields.  Not needed if metacal if
         using the noise field in the observations
+    executor: concurrent.futures.Executor, optional
+        If sent, run the fits for the metacal types concurrently using this
+        executor.  See metacal_bootstrap
+    as_array: bool, optional
+        If True, return the results as a structured array.  See
+        metacal_bootstrap
+    array_fields: list, optional
+        The result fields to copy when as_array is True
     **metacal_kws:  keywords
         Keywords to send to get_all_metacal
     """
     def __init__(self, runner, psf_runner, ignore_failed_psf=True,
                  rng=None,
+                 executor=None,
+                 as_array=False,
+                 array_fields=None,
                  **metacal_kws):
         self.runner = runner
         self.psf_runner = psf_runner
         self.ignore_failed_psf = ignore_failed_psf
         self.metacal_kws = metacal_kws
         self.rng = rng
+        self.executor = executor
+        self.as_array = as_array
+        self.array_fields = array_fields
 
     def go(self, obs):
         """
@@ -49,6 +66,9 @@ class MetacalBootstrapper(object):
             psf_runner=self.psf_runner,
             ignore_failed_psf=self.ignore_failed_psf,
             rng=self.rng,
+            executor=self.executor,
+            as_array=self.as_array,
+            array_fields=self.array_fields,
             **self.metacal_kws
         )
 
@@ -66,6 +86,9 @@ def metacal_bootstrap(
     psf_runner=None,
     ignore_failed_psf=True,
     rng=None,
+    executor=None,
+    as_array=False,
+    array_fields=None,
     **metacal_kws
 ):
     """
@@ -87,6 +110,22 @@ def metacal_bootstrap(
     rng: numpy.random.RandomState
         Random state for generating noise fields.  Not needed if metacal if
         using the noise field in the observations
+    executor: concurrent.futures.Executor, optional
+        If sent, the fits for the metacal types are submitted to this executor
+        and run concurrently.  The numba kernels used by the fitters release
+        the GIL, so a ThreadPoolExecutor gives a speedup for fits dominated by
+        the kernels; a ProcessPoolExecutor can be used otherwise.  With
+        threads the runners are shared between the fits, so random numbers
+        used by the guessers are drawn in an unpredictable order.  With
+        processes the runners are copied to the workers.  The psf fits are
+        always run in the calling process
+    as_array: bool, optional
+        If True, return the results as a structured array of length one made
+        with get_metacal_array, rather than a dict, with columns such as
+        mcal_g_1p.  The array holds no references to the observations
+    array_fields: list, optional
+        The result fields to copy when as_array is True, default
+        DEFAULT_RESULT_FIELDS.  See get_metacal_dtype
     **metacal_kws:  keywords
         Keywords to send to get_all_metacal
 
@@ -94,7 +133,7 @@ def metacal_bootstrap(
     -------
     resdict, obsdict
         resdict is keyed by the metacal types (e.g. '1p') and holds results
-        for each
+        for each, or is a structured array if as_array is True
 
         obsdict is keyed by the metacal types and holds the metacal observations
 
@@ -102,18 +141,85 @@ def metacal_bootstrap(
     ------------
     the obs.psf.meta['result'] and the obs.psf.gmix may be set if a psf runner
     is sent and the internal fitter has a get_gmix method.  gmix are only set
-    for successful fits
+    for successful fits.  Each distinct psf observation is only fit once, and
+    the result is shared by all metacal types with the same psf; the types
+    other than 1p_psf, 1m_psf, 2p_psf and 2m_psf normally have the same psf
     """
 
     obsdict = get_all_metacal(obs=obs, rng=rng, **metacal_kws)
 
+    if psf_runner is not None:
+        _fit_metacal_psfs(obsdict=obsdict, psf_runner=psf_runner)
+    else:
+        ignore_failed_psf = False
+
     resdict = {}
 
-    for key, tobs in obsdict.items():
-        resdict[key] = bootstrap(
-            obs=tobs, runner=runner, psf_runner=psf_runner,
-            ignore_failed_psf=ignore_failed_psf,
-        )
-        # resdict[key] = runner.get_result()
+    if executor is None:
+        for key, tobs in obsdict.items():
+            resdict[key] = _bootstrap_type(tobs, runner, ignore_failed_psf)
+    else:
+        futures = {
+            key: executor.submit(
+                _bootstrap_type, tobs, runner, ignore_failed_psf,
+            )
+            for key, tobs in obsdict.items()
+        }
+        for key, future in futures.items():
+            resdict[key] = future.result()
+
+    if as_array:
+        resdict = get_metacal_array(resdict, fields=array_fields)
 
     return resdict, obsdict
+
+
+def _bootstrap_type(obs, runner, ignore_failed_psf):
+    if ignore_failed_psf:
+        obs = remove_failed_psf_obs(obs=obs)
+
+    return runner.go(obs=obs)
+
+
+def _fit_metacal_psfs(obsdict, psf_runner):
+    """
+    run the psf runner on the psf observations of all the metacal types.
+    Most types share the same reconvolved psf, so each distinct psf
+    observation is fit once and the result and gmix are copied to the
+    others
+    """
+    fit_psfs = {}
+
+    for tobs in obsdict.values():
+        for obs in _iter_obs(tobs):
+            psf_obs = obs.psf if obs.has_psf() else obs
+            key = _get_psf_fit_key(psf_obs)
+
+            fit_psf_obs = fit_psfs.get(key)
+            if fit_psf_obs is None:
+                psf_runner.go(obs=obs)
+                fit_psfs[key] = psf_obs
+            else:
+                if 'result' in fit_psf_obs.meta:
+                    psf_obs.meta['result'] = fit_psf_obs.meta['result']
+                if fit_psf_obs.has_gmix():
+                    psf_obs.gmix = fit_psf_obs.gmix
+
+
+def _get_psf_fit_key(psf_obs):
+    """
+    the fit depends on the image, weight and jacobian, including the center
+    """
+    return get_digest(
+        psf_obs.image, psf_obs.weight, psf_obs.jacobian.get_data(),
+    )
+
+
+def _iter_obs(obs):
+    if isinstance(obs, MultiBandObsList):
+        for obslist in obs:
+            yield from obslist
+    elif isinstance(obs, ObsList):
+        yield from obs
+    else:
+        yield obs
@@ -9,6 +9,9 @@ from ..observation import Observation, ObsList, MultiBandObsList
 from .metacal import (
     MetacalDilatePSF, MetacalGaussPSF, MetacalFitGaussPSF, MetacalAnalyticPSF,
 )
+from .kspace import MetacalFFTGaussPSF, MetacalFFTFitGaussPSF
+
+BACKENDS = ('galsim', 'fft')
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +24,7 @@ def get_all_metacal(
     rng=None,
     use_noise_image=False,
     types=None,
+    backend='galsim',
 ):
     """
     Get all combinations of metacal images in a dict
@@ -65,6 +69,11 @@ def get_all_metacal(
         Otherwise, the default is the full possible set listed in
         ['noshear','1p','1m','2p','2m',
          '1p_psf','1m_psf','2p_psf','2m_psf']
+    backend: str, optional
+        'galsim' to make the images with galsim, or 'fft' to use FFTs
+        without galsim, which is faster.  The 'fft' backend only supports
+        psf='gauss' and 'fitgauss', and requires the psf to have the same
+        jacobian matrix as the image.  Default 'galsim'
 
     returns
     -------
@@ -77,12 +86,24 @@ def get_all_metacal(
         simular for 1p_psf etc.
     """
 
+    if backend not in BACKENDS:
+        raise ValueError(
+            'backend should be one of %s, got %s' % (BACKENDS, backend)
+        )
+
+    if backend == 'fft' and psf not in ('gauss', 'fitgauss'):
+        raise ValueError(
+            "the fft backend supports psf 'gauss' or 'fitgauss', "
+            "got %s" % psf
+        )
+
     if fixnoise:
         odict = _get_all_metacal_fixnoise(
             obs, step=step, rng=rng,
             use_noise_image=use_noise_image,
             psf=psf,
             types=types,
+            backend=backend,
         )
     else:
         logger.debug("    not doing fixnoise")
@@ -90,6 +111,7 @@ def get_all_metacal(
             obs, step=step, rng=rng,
             psf=psf,
             types=types,
+            backend=backend,
         )
 
     return odict
@@ -101,38 +123,63 @@ def _get_all_metacal(
     rng=None,
     psf=None,
     types=None,
+    backend='galsim',
+    noise_obs=None,
 ):
     """
     internal routine
 
     get all metacal
+
+    If noise_obs is sent, the metacal images for the noise are made along
+    with those for obs, rotated back and added to them, see
+    _get_all_metacal_fixnoise
     """
     if isinstance(obs, Observation):
 
-        if psf == 'dilate':
-            m = MetacalDilatePSF(obs)
+        kw = {'noise_obs': noise_obs}
+        if backend == 'fft':
+            if psf == 'gauss':
+                m = MetacalFFTGaussPSF(obs=obs, rng=rng, **kw)
+            else:
+                m = MetacalFFTFitGaussPSF(obs=obs, rng=rng, **kw)
+        elif psf == 'dilate':
+            m = MetacalDilatePSF(obs, **kw)
         else:
 
             if psf == 'gauss':
-                m = MetacalGaussPSF(obs=obs, rng=rng)
+                m = MetacalGaussPSF(obs=obs, rng=rng, **kw)
             elif psf == 'fitgauss':
-                m = MetacalFitGaussPSF(obs=obs, rng=rng)
+                m = MetacalFitGaussPSF(obs=obs, rng=rng, **kw)
             else:
-                m = MetacalAnalyticPSF(obs=obs, psf=psf, rng=rng)
+                m = MetacalAnalyticPSF(obs=obs, psf=psf, rng=rng, **kw)
 
-        odict = m.get_all(step=step, types=types)
+        if noise_obs is None:
+            odict = m.get_all(step=step, types=types)
+        else:
+            odict, noise_odict = m.get_all(step=step, types=types)
+            for type, mobs in odict.items():
+                nobs = noise_odict[type]
+
+                # rotate back, which is 3 more rotations
+                _rotate_obs_image_square(nobs, k=3)
+                _doadd_single_obs(mobs, nobs)
 
     elif isinstance(obs, MultiBandObsList):
         odict = _make_metacal_mb_obs_list_dict(
             mb_obs_list=obs, step=step, rng=rng,
             psf=psf,
             types=types,
+            backend=backend,
+            noise_obs=noise_obs,
         )
     elif isinstance(obs, ObsList):
         odict = _make_metacal_obs_list_dict(
             obs, step, rng=rng,
             psf=psf,
             types=types,
+            backend=backend,
+            noise_obs=noise_obs,
         )
     else:
         raise ValueError("obs must be Observation, ObsList, "
@@ -141,12 +188,18 @@ def _get_all_metacal(
     return odict
 
 
-def _make_metacal_mb_obs_list_dict(mb_obs_list, step, rng=None, **kw):
+def _make_metacal_mb_obs_list_dict(
+    mb_obs_list, step, rng=None, noise_obs=None, **kw
+):
+
+    if noise_obs is None:
+        noise_obs = [None]*len(mb_obs_list)
 
     new_dict = None
-    for obs_list in mb_obs_list:
+    for obs_list, noise_obs_list in zip(mb_obs_list, noise_obs):
         odict = _make_metacal_obs_list_dict(
-            obs_list=obs_list, step=step, rng=rng, **kw,
+            obs_list=obs_list, step=step, rng=rng, noise_obs=noise_obs_list,
+            **kw,
         )
 
         if new_dict is None:
@@ -158,11 +211,19 @@ def _make_metacal_mb_obs_list_dict(mb_obs_list, step, rng=None, **kw):
     return new_dict
 
 
-def _make_metacal_obs_list_dict(obs_list, step, rng=None, **kw):
+def _make_metacal_obs_list_dict(
+    obs_list, step, rng=None, noise_obs=None, **kw
+):
+
+    if noise_obs is None:
+        noise_obs = [None]*len(obs_list)
+
     odict = None
-    for obs in obs_list:
+    for obs, tnoise_obs in zip(obs_list, noise_obs):
 
-        todict = _get_all_metacal(obs, step=step, rng=rng, **kw)
+        todict = _get_all_metacal(
+            obs, step=step, rng=rng, noise_obs=tnoise_obs, **kw
+        )
 
         if odict is None:
             odict = _init_obs_list_dict(todict.keys())
@@ -194,6 +255,7 @@ def _get_all_metacal_fixnoise(
     use_noise_image=False,
     psf=None,
     types=None,
+    backend='galsim',
 ):
     """
     internal routine
@@ -210,49 +272,15 @@ def _get_all_metacal_fixnoise(
     # rotate by 90
     _rotate_obs_image_square(noise_obs, k=1)
 
-    obsdict = _get_all_metacal(
+    # the metacal images for the noise are made along with those for the
+    # image, sharing the psf products, and added to them
+    return _get_all_metacal(
         obs, step=step, rng=rng,
         psf=psf,
         types=types,
+        backend=backend,
+        noise_obs=noise_obs,
     )
-    noise_obsdict = _get_all_metacal(
-        noise_obs, step=step, rng=rng,
-        psf=psf,
-        types=types,
-    )
-
-    for type in obsdict:
-
-        imbobs = obsdict[type]
-        nmbobs = noise_obsdict[type]
-
-        # rotate back, which is 3 more rotations
-        _rotate_obs_image_square(nmbobs, k=3)
-
-        if isinstance(imbobs, Observation):
-            _doadd_single_obs(imbobs, nmbobs)
-
-        elif isinstance(imbobs, ObsList):
-            for iobs in range(len(imbobs)):
-
-                obs = imbobs[iobs]
-                nobs = nmbobs[iobs]
-
-                _doadd_single_obs(obs, nobs)
-
-        elif isinstance(imbobs, MultiBandObsList):
-            for imb in range(len(imbobs)):
-                iolist = imbobs[imb]
-                nolist = nmbobs[imb]
-
-                for iobs in range(len(iolist)):
-
-                    obs = iolist[iobs]
-                    nobs = nolist[iobs]
-
-                    _doadd_single_obs(obs, nobs)
-
-    return obsdict
 
 
 def _rotate_obs_image_square(obs, k=1):
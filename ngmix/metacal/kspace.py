@@ -0,0 +1,685 @@
+"""
+metacal images made with FFTs, without galsim
+
+The image and psf are transformed once.  The deconvolved image is the ratio
+of the transforms, which is sheared by evaluating it at transformed k, using
+quintic interpolation of the transforms of the image and psf as galsim does,
+and reconvolved by a round gaussian
+"""
+import copy
+import numpy as np
+from scipy import fft
+
+from ..gexceptions import GMixRangeError
+from ..shape import Shape
+from .defaults import DEFAULT_STEP, METACAL_MINIMAL_TYPES
+from .metacal import _check_shape, _check_noise_obs, _get_fitgauss_sigma
+from .kspace_nb import interp_kimages
+
+__all__ = ['MetacalFFTGaussPSF', 'MetacalFFTFitGaussPSF']
+
+# the images are zero padded by this factor before transforming, so the
+# transforms can be interpolated accurately
+PAD_FACTOR = 4
+
+# the same defaults as galsim for deconvolution; the inverse of the psf is
+# limited where the psf is below KVALUE_ACCURACY*flux and set to zero beyond
+# the k where the psf last exceeds MAXK_THRESHOLD*flux
+KVALUE_ACCURACY = 1.0e-5
+MAXK_THRESHOLD = 1.0e-3
+
+# points within this fraction of maxk are treated as beyond it, otherwise
+# whether points on the boundary are kept depends on roundoff
+MAXK_RTOL = 1.0e-10
+
+# the output images are made on a grid smaller than the padded grid by this
+# factor.  This is enough to avoid wrapping of the reconvolved image, and
+# the unsheared transforms are still sampled exactly
+OUT_FACTOR = 2
+
+
+class MetacalFFTGaussPSF(object):
+    """
+    Create manipulated images for use in metacalibration, using FFTs rather
+    than galsim.  The reconvolution kernel is a round gaussian generated
+    based on the input psf, as for MetacalGaussPSF
+
+    The psf image must have the same pixel scale and orientation as the
+    image, that is the same jacobian matrix; the centers can differ.  The
+    images are centered on their true centers, as for galsim
+
+    Parameters
+    ----------
+    obs: ngmix.Observation
+        The observation must have a psf observation set, holding
+        the psf image
+    rng: numpy.random.RandomState, optional
+        Optional random number generator for adding a small amount of noise to
+        the gaussian psf image
+    noise_obs: ngmix.Observation, optional
+        An observation of noise, e.g. the rotated noise used for fixnoise,
+        with the same image shape and jacobian as obs; the psf of obs is
+        used for both.  Its metacal images are made in the same transforms
+        as those for obs, sharing the psf deconvolution and reconvolution,
+        and get_all returns a tuple of the dicts for obs and noise_obs
+
+    examples
+    --------
+
+    mc = MetacalFFTGaussPSF(obs)
+
+    # observations used to calculate R
+
+    sh1m=ngmix.Shape(-0.01,  0.00 )
+    sh1p=ngmix.Shape( 0.01,  0.00 )
+
+    R_obs1m = mc.get_obs_galshear(sh1m)
+    R_obs1p = mc.get_obs_galshear(sh1p)
+
+    # you can also get an unsheared, just convolved obs
+    R_obs1p, R_obs_unsheared = mc.get_obs_galshear(sh1p, get_unsheared=True)
+    """
+
+    def __init__(self, obs, rng=None, noise_obs=None):
+
+        self.obs = obs
+        self.noise_obs = noise_obs
+
+        if not obs.has_psf():
+            raise ValueError("observation must have a psf observation set")
+
+        self.rng = rng
+
+        self._set_jacobian()
+        _check_noise_obs(obs, noise_obs)
+        self._setup_psf_noise()
+        self._set_kimages()
+        self._set_target_sigma()
+
+        self._dkimage_cache = {}
+        self._target_kimage_cache = {}
+        self._psf_cache = {}
+
+    def get_all(self, step=DEFAULT_STEP, types=None):
+        """
+        Get metacal images in a dict for the requested image types
+
+        parameters
+        ----------
+        step: float
+            The shear step value to use for metacal. Default 0.01
+        types: list
+            Types to get.  Default is the full possible set listed in
+            METACAL_MINIMAL_TYPES = ['noshear','1p','1m','2p','2m']
+
+        returns
+        -------
+        A dictionary with all the relevant metacaled images, e.g.
+            with dict keys:
+                noshear -> (0, 0)
+                1p -> ( shear, 0)
+                1m -> (-shear, 0)
+                2p -> ( 0,  shear)
+                2m -> ( 0, -shear)
+
+        If noise_obs was sent, a tuple of dicts for obs and noise_obs is
+        returned
+        """
+
+        types = self._get_types(types)
+        odicts = self._get_odicts(step, types)
+
+        if self.noise_obs is None:
+            return odicts[0]
+        else:
+            return tuple(odicts)
+
+    def get_all_steps(self, steps, types=None):
+        """
+        Get metacal images for each of a set of shear steps.  The transforms
+        of the image and psf, and the deconvolved transform of the unsheared
+        image, are shared between the steps
+
+        parameters
+        ----------
+        steps: sequence of float
+            The shear step values
+        types: list
+            Types to get, see get_all
+
+        returns
+        -------
+        A dictionary keyed by step holding the dicts returned by get_all.
+        If noise_obs was sent, a tuple of such dictionaries for obs and
+        noise_obs is returned
+        """
+
+        types = self._get_types(types)
+
+        stepdicts = [{} for obs in self._get_obslist()]
+        for step in steps:
+            odicts = self._get_odicts(step, types)
+            for stepdict, odict in zip(stepdicts, odicts):
+                stepdict[step] = odict
+
+        if self.noise_obs is None:
+            return stepdicts[0]
+        else:
+            return tuple(stepdicts)
+
+    def _get_types(self, types):
+        if types is None:
+            types = copy.deepcopy(METACAL_MINIMAL_TYPES)
+        else:
+            for t in types:
+                assert t in METACAL_MINIMAL_TYPES, 'bad metacal type: %s' % t
+            types = list(types)
+
+        # as for the galsim version, noshear comes with 1p
+        if 'noshear' in types and '1p' not in types:
+            types.append('1p')
+
+        return types
+
+    def _get_odicts(self, step, types):
+        """
+        get a dict of metacal observations for each of the observations
+        """
+        shdict = {
+            '1m': Shape(-step, 0.0),
+            '1p': Shape(+step, 0.0),
+            '2m': Shape(0.0, -step),
+            '2p': Shape(0.0, +step),
+        }
+
+        odicts = [{} for obs in self._get_obslist()]
+        for type in types:
+            if type == 'noshear':
+                continue
+
+            if type == '1p':
+                obslist, obslist_noshear = self._get_obslist_galshear(
+                    shdict[type],
+                    get_unsheared=True,
+                )
+                for odict, obs in zip(odicts, obslist_noshear):
+                    odict['noshear'] = obs
+            else:
+                obslist = self._get_obslist_galshear(shdict[type])
+
+            for odict, obs in zip(odicts, obslist):
+                odict[type] = obs
+
+        return odicts
+
+    def get_obs_galshear(self, shear, get_unsheared=False):
+        """
+        This is the case where we shear the image, for calculating R
+
+        parameters
+        ----------
+        shear: ngmix.Shape
+            The shear to apply
+
+        get_unsheared: bool
+            Get an observation only convolved by the target psf, not
+            sheared
+        """
+        if get_unsheared:
+            obslist, uobslist = self._get_obslist_galshear(
+                shear, get_unsheared=True,
+            )
+            return obslist[0], uobslist[0]
+        else:
+            return self._get_obslist_galshear(shear)[0]
+
+    def _get_obslist_galshear(self, shear, get_unsheared=False):
+        """
+        get the sheared observations for obs and, if sent, noise_obs
+        """
+        _check_shape(shear)
+
+        dilation = _get_dilation(shear)
+        psf_image = self.get_target_psf_image(dilation)
+
+        obslist = self._get_obslist()
+
+        images = self._get_target_images(dilation, shear=shear)
+        newobslist = [
+            self._make_obs(image, psf_image, obs=obs)
+            for image, obs in zip(images, obslist)
+        ]
+
+        if get_unsheared:
+            uimages = self._get_target_images(dilation, shear=None)
+            uobslist = [
+                self._make_obs(uimage, psf_image, obs=obs)
+                for uimage, obs in zip(uimages, obslist)
+            ]
+            return newobslist, uobslist
+        else:
+            return newobslist
+
+    def get_target_image(self, dilation, shear=None):
+        """
+        get the deconvolved image, possibly sheared, and convolved by the
+        dilated target psf
+
+        parameters
+        ----------
+        dilation: float
+            The dilation of the target psf
+        shear: ngmix.Shape, optional
+            The shear to apply
+
+        returns
+        -------
+        image: array
+        """
+        return self._get_target_images(dilation, shear=shear)[0]
+
+    def _get_target_images(self, dilation, shear=None):
+        """
+        get the target images for obs and, if sent, noise_obs, transforming
+        them together
+        """
+        kimages = self._get_deconv_kimages(shear) * self._get_target_kimage(
+            dilation,
+        )
+
+        rimages = fft.irfft2(kimages, s=(self._nout, self._nout))
+
+        return rimages[
+            :, self._out_rows[:, np.newaxis], self._out_cols[np.newaxis, :]
+        ]
+
+    def get_target_psf_image(self, dilation):
+        """
+        get the image of the dilated target psf, drawn at the true center of
+        the psf image
+
+        parameters
+        ----------
+        dilation: float
+            The dilation of the target psf
+
+        returns
+        -------
+        image: array
+        """
+        if dilation not in self._psf_cache:
+            psfobs = self.obs.psf
+            sigma = self.target_sigma * dilation
+
+            nrow, ncol = psfobs.image.shape
+            rows, cols = np.mgrid[0:nrow, 0:ncol]
+            rows = rows - (nrow - 1)/2
+            cols = cols - (ncol - 1)/2
+
+            jac = _get_jacobian_matrix(psfobs.jacobian)
+            u = jac[0, 0]*cols + jac[0, 1]*rows
+            v = jac[1, 0]*cols + jac[1, 1]*rows
+
+            norm = self.psf_flux * abs(np.linalg.det(jac))/(2*np.pi*sigma**2)
+            self._psf_cache[dilation] = norm * np.exp(
+                -0.5*(u**2 + v**2)/sigma**2
+            )
+
+        return self._psf_cache[dilation]
+
+    def _get_deconv_kimages(self, shear):
+        """
+        get the transforms of the deconvolved images on the output grid,
+        possibly sheared, with shape [nimage, nrow, ncol]
+        """
+        if shear is None:
+            key = None
+        else:
+            _check_shape(shear)
+            key = (shear.g1, shear.g2)
+
+        if key in self._dkimage_cache:
+            return self._dkimage_cache[key]
+
+        krow, kcol = self._out_krow, self._out_kcol
+
+        if shear is None:
+            qrow = krow + kcol*0
+            qcol = kcol + krow*0
+        else:
+            # the transform of the sheared image at k is the transform of the
+            # image at M k, with M = J^T S^T J^-T in pixel coordinates
+            mat = self._jac.T.dot(
+                _get_shear_matrix(shear).T
+            ).dot(self._jinv.T)
+
+            qcol = mat[0, 0]*kcol + mat[0, 1]*krow
+            qrow = mat[1, 0]*kcol + mat[1, 1]*krow
+
+        # the inverse of the psf is zero beyond maxk, so the transforms are
+        # only needed within it
+        ksq = self._get_world_ksq(qrow, qcol)
+        w = np.where(ksq <= self._psf_maxk**2*(1 - MAXK_RTOL))
+        qrow, qcol = qrow[w], qcol[w]
+
+        if shear is None:
+            # the output grid is a subset of the padded grid
+            ratio = self._npad//self._nout
+            rows = (self._out_irow[w[0], 0]*ratio) % self._npad
+            cols = self._out_icol[0, w[1]]*ratio
+            kimages = self._kimages[:, rows, cols]
+        else:
+            scale = self._npad/(2*np.pi)
+            kimages = np.zeros(
+                (self._kimages.shape[0], qrow.size), dtype=np.complex128,
+            )
+            interp_kimages(self._kimages, qrow*scale, qcol*scale, kimages)
+
+        # the psf is last
+        image_k, psf_k = kimages[:-1], kimages[-1]
+
+        min_acc = KVALUE_ACCURACY * self.psf_flux
+        inv_psf_k = np.zeros(psf_k.shape, dtype=np.complex128)
+        inv_psf_k[:] = 1.0/min_acc
+        wgood = np.where(np.abs(psf_k) > min_acc)
+        inv_psf_k[wgood] = 1.0/psf_k[wgood]
+
+        # put the psf at the true center of the image
+        drow, dcol = self._image_offset - self._psf_offset
+        phase = np.exp(-1j*(qrow*drow + qcol*dcol))
+
+        dkimages = np.zeros(
+            (image_k.shape[0], ) + ksq.shape, dtype=np.complex128,
+        )
+        dkimages[:, w[0], w[1]] = image_k * (inv_psf_k * phase)
+
+        self._dkimage_cache[key] = dkimages
+        return dkimages
+
+    def _get_target_kimage(self, dilation):
+        """
+        get the transform of the target psf on the output grid, including
+        the phase to draw the image at its true center
+        """
+        if dilation not in self._target_kimage_cache:
+            sigma = self.target_sigma * dilation
+            self._target_kimage_cache[dilation] = (
+                self.psf_flux
+                * np.exp(-0.5*self._out_ksq*sigma**2)
+                * self._out_phase
+            )
+
+        return self._target_kimage_cache[dilation]
+
+    def _get_world_ksq(self, krow, kcol):
+        """
+        get |k|^2 in world coordinates for k in pixel coordinates
+        """
+        jinv = self._jinv
+        ku = jinv[0, 0]*kcol + jinv[1, 0]*krow
+        kv = jinv[0, 1]*kcol + jinv[1, 1]*krow
+        return ku**2 + kv**2
+
+    def _set_jacobian(self):
+        self._jac = _get_jacobian_matrix(self.obs.jacobian)
+        self._jinv = np.linalg.inv(self._jac)
+
+        psf_jac = _get_jacobian_matrix(self.obs.psf.jacobian)
+        if not np.allclose(psf_jac, self._jac, rtol=1.0e-6, atol=0):
+            raise ValueError(
+                'the psf and image must have the same jacobian matrix '
+                'for FFT metacal'
+            )
+
+    def _get_obslist(self):
+        """
+        get a list of the observations for which images are made
+        """
+        if self.noise_obs is None:
+            return [self.obs]
+        else:
+            return [self.obs, self.noise_obs]
+
+    def _set_kimages(self):
+        """
+        transform the padded images and psf together, with the psf last
+        """
+        image = self.obs.image
+        psf_image = self.obs.psf.image
+
+        nmax = max(image.shape + psf_image.shape)
+        self._npad = _get_good_fft_size(PAD_FACTOR * nmax)
+
+        self._kimages = fft.fft2(
+            np.array(
+                [_embed(obs.image, self._npad) for obs in self._get_obslist()]
+                + [_embed(psf_image, self._npad)]
+            ),
+        )
+        self._image_offset = _get_center_offset(image.shape)
+        self._psf_offset = _get_center_offset(psf_image.shape)
+
+        # the output grid, half plane for the real transform
+        nout = self._nout = self._npad//OUT_FACTOR
+        irow = np.rint(fft.fftfreq(nout)*nout).astype('i8')
+        self._out_irow = irow[:, np.newaxis]
+        self._out_icol = np.arange(nout//2 + 1)[np.newaxis, :]
+        self._out_krow = 2*np.pi*self._out_irow/nout
+        self._out_kcol = 2*np.pi*self._out_icol/nout
+        self._out_ksq = self._get_world_ksq(self._out_krow, self._out_kcol)
+
+        drow, dcol = self._image_offset
+        self._out_phase = np.exp(
+            1j*(self._out_krow*drow + self._out_kcol*dcol)
+        )
+
+        # the output image is centered at index 0
+        nrow, ncol = image.shape
+        self._out_rows = (np.arange(nrow) - nrow//2) % nout
+        self._out_cols = (np.arange(ncol) - ncol//2) % nout
+
+        self._set_psf_maxk()
+
+    def _set_psf_maxk(self):
+        """
+        the maxk of the psf as calculated by galsim for an interpolated
+        image: one step beyond the last square ring of the padded transform
+        with a value above MAXK_THRESHOLD*flux, converted to world
+        coordinates using the largest scale of the jacobian
+        """
+        psf_image = self.obs.psf.image
+        npad = _get_good_fft_size(PAD_FACTOR * max(psf_image.shape))
+
+        if npad == self._npad:
+            psf_k = np.abs(self._kimages[-1, :, :npad//2 + 1])
+        else:
+            psf_k = np.abs(fft.rfft2(_embed(psf_image, npad)))
+
+        irow = np.abs(fft.fftfreq(npad) * npad)[:, np.newaxis]
+        icol = (fft.rfftfreq(npad) * npad)[np.newaxis, :]
+        ring = np.maximum(irow, icol)
+
+        w = np.where(psf_k > MAXK_THRESHOLD * self.psf_flux)
+        if w[0].size == 0:
+            raise GMixRangeError('psf has no power above threshold')
+
+        maxk = (ring[w].max() + 1) * 2*np.pi/npad
+
+        max_scale = np.linalg.svd(self._jac, compute_uv=False).max()
+        self._psf_maxk = maxk / max_scale
+
+    def _set_target_sigma(self):
+        """
+        the same algorithm as _get_gauss_target_psf: find the smallest k where
+        the psf falls below 1% of its flux, and use a gaussian that falls to
+        0.3% there
+        """
+        small_kval = 1.e-2
+        smaller_kval = 3.e-3
+
+        # the psf is real, so the half plane suffices
+        npad = self._npad
+        krow = 2*np.pi*fft.fftfreq(npad)[:, np.newaxis]
+        kcol = 2*np.pi*fft.rfftfreq(npad)[np.newaxis, :]
+
+        drow, dcol = self._psf_offset
+        kpsf_r = (
+            self._kimages[-1, :, :npad//2 + 1]
+            * np.exp(-1j*(krow*drow + kcol*dcol))
+        ).real
+
+        ksq = self._get_world_ksq(krow, kcol)
+        w = np.where(kpsf_r < small_kval * self.psf_flux)
+        if w[0].size == 0:
+            # psf is undersampled; use the highest k available
+            ksq_max = ksq.max()
+        else:
+            ksq_max = ksq[w].min()
+
+        sigma_sq = -2. * np.log(smaller_kval) / ksq_max
+        self.target_sigma = np.sqrt(sigma_sq)
+
+    def _setup_psf_noise(self):
+        pim = self.obs.psf.image
+        self.psf_flux = pim.sum()
+
+        self.psf_noise = pim.max()/50000.0
+
+        if self.rng is not None:
+            self.psf_noise_image = self.rng.normal(
+                size=pim.shape,
+                scale=self.psf_noise,
+            )
+        else:
+            self.psf_noise_image = None
+
+        self.psf_weight = pim * 0 + 1.0/self.psf_noise**2
+
+    def _make_psf_obs(self, psf_image):
+
+        psf_im = psf_image.copy()
+
+        if self.psf_noise_image is not None:
+            psf_im += self.psf_noise_image
+
+        new_psf_obs = self.obs.psf.copy()
+        with new_psf_obs.writeable():
+            new_psf_obs.image[:, :] = psf_im
+            new_psf_obs.weight[:, :] = self.psf_weight
+
+            # Reset the center on the jacobian.
+            # We drew the model psf as the exact center
+            cen = (np.array(psf_im.shape) - 1.0)/2.0
+            new_psf_obs.jacobian.set_cen(row=cen[0], col=cen[1])
+
+        return new_psf_obs
+
+    def _make_obs(self, image, psf_image, obs=None):
+        """
+        Make new Observation objects with the new image and psf.  The
+        observation copied defaults to obs
+        """
+
+        if obs is None:
+            obs = self.obs
+
+        newobs = obs.copy()
+        newobs.image = image
+        newobs.psf = self._make_psf_obs(psf_image)
+        return newobs
+
+
+class MetacalFFTFitGaussPSF(MetacalFFTGaussPSF):
+    """
+    Create manipulated images for use in metacalibration, using FFTs rather
+    than galsim.  The reconvolution kernel is a gaussian generated based a fit
+    to the input psf, as for MetacalFitGaussPSF
+
+    Parameters
+    ----------
+    obs: ngmix.Observation
+        Observation on which to run metacal
+    rng: numpy.random.RandomState
+        Random number generator.  Used to generate guesses for the fit, and for
+        adding a small amount of noise to the psf image.
+    noise_obs: ngmix.Observation, optional
+        An observation of noise, see MetacalFFTGaussPSF
+    """
+    def __init__(self, obs, rng=None, noise_obs=None):
+        if rng is None:
+            raise ValueError('send an rng to MetacalFFTFitGaussPSF')
+        super().__init__(obs=obs, rng=rng, noise_obs=noise_obs)
+
+    def _set_target_sigma(self):
+        self.target_sigma = _get_fitgauss_sigma(self.obs.psf, self.rng)
+
+
+def _get_jacobian_matrix(jacobian):
+    """
+    get the matrix taking (col, row) offsets to (u, v)
+    """
+    return np.array([
+        [jacobian.dudcol, jacobian.dudrow],
+        [jacobian.dvdcol, jacobian.dvdrow],
+    ])
+
+
+def _get_shear_matrix(shear):
+    """
+    matrix of the shear in (u, v), as applied by galsim
+    """
+    g1, g2 = shear.g1, shear.g2
+    gsq = g1**2 + g2**2
+    if gsq >= 1:
+        raise GMixRangeError('g >= 1: %s' % np.sqrt(gsq))
+
+    return np.array([
+        [1 + g1, g2],
+        [g2, 1 - g1],
+    ]) / np.sqrt(1 - gsq)
+
+
+def _get_dilation(shear):
+    """
+    dilation = 1.0 + 2.0*|g|, see metacal._do_dilate
+    """
+    g = np.sqrt(shear.g1**2 + shear.g2**2)
+    return 1.0 + 2.0*g
+
+
+def _get_center_offset(shape):
+    """
+    offset of the true center from the pixel placed at the origin of the
+    transform
+    """
+    return np.array([
+        dim//2 - (dim - 1)/2 for dim in shape
+    ])
+
+
+def _embed(image, npad):
+    """
+    zero pad the image, with the central pixel at index zero
+    """
+    nrow, ncol = image.shape
+    rows = (np.arange(nrow) - nrow//2) % npad
+    cols = (np.arange(ncol) - ncol//2) % npad
+
+    padded = np.zeros((npad, npad))
+    padded[np.ix_(rows, cols)] = image
+    return padded
+
+
+def _get_good_fft_size(n):
+    """
+    get the smallest size of the form 2^n or 3*2^n that is at least n, as
+    galsim does
+    """
+    size = 2
+    while size < n:
+        size *= 2
+
+    if 3*size//4 >= n:
+        size = 3*size//4
+
+    return size
@@ -0,0 +1,110 @@
+import numpy as np
+from numba import njit
+
+# support of the quintic interpolant
+QUINTIC_NTAP = 6
+
+
+@njit(nogil=True)
+def quintic(x):
+    """
+    the quintic interpolant of Bernstein & Gruen 2014, as used by galsim for
+    interpolating k space images
+
+    Parameters
+    ----------
+    x: float
+        Distance from the sample, in units of the grid spacing
+
+    Returns
+    -------
+    weight: float
+    """
+    x = abs(x)
+    if x <= 1.0:
+        return 1.0 + x*x*x*(-95.0/12.0 + x*(23.0/2.0 + x*(-55.0/12.0)))
+    elif x <= 2.0:
+        return (x - 1.0)*(x - 2.0)*(
+            -23.0/4.0 + x*(29.0/2.0 + x*(-83.0/8.0 + x*(55.0/24.0)))
+        )
+    elif x <= 3.0:
+        return (x - 2.0)*(x - 3.0)*(x - 3.0)*(
+            -9.0/4.0 + x*(25.0/12.0 + x*(-11.0/24.0))
+        )
+    else:
+        return 0.0
+
+
+@njit(nogil=True)
+def interp_kimages(kimages, urow, ucol, out):
+    """
+    interpolate a set of k space images, sharing the same grid, using the
+    quintic interpolant.  The images are periodic, with the layout used by
+    numpy and scipy fft2
+
+    Parameters
+    ----------
+    kimages: array
+        Complex array with shape [nimage, nrow, ncol]
+    urow, ucol: arrays
+        1-d arrays of positions at which to interpolate, in units of the grid
+        spacing
+    out: array
+        Complex array with shape [nimage, urow.size] to hold the result
+    """
+    nimage, nrow, ncol = kimages.shape
+    ntap = QUINTIC_NTAP
+
+    wrow = np.zeros(ntap)
+    wcol = np.zeros(ntap)
+    rows = np.zeros(ntap, dtype=np.int64)
+    cols = np.zeros(ntap, dtype=np.int64)
+
+    for i in range(urow.size):
+        row0 = np.floor(urow[i])
+        col0 = np.floor(ucol[i])
+
+        _fill_weights(urow[i] - row0, wrow)
+        _fill_weights(ucol[i] - col0, wcol)
+        _fill_indices(int(row0) - 2, nrow, rows)
+        _fill_indices(int(col0) - 2, ncol, cols)
+
+        for iimage in range(nimage):
+            val = 0.0j
+            for irtap in range(ntap):
+                krow = rows[irtap]
+
+                rowval = 0.0j
+                for ictap in range(ntap):
+                    rowval += wcol[ictap] * kimages[iimage, krow, cols[ictap]]
+
+                val += wrow[irtap] * rowval
+
+            out[iimage, i] = val
+
+
+@njit(nogil=True)
+def _fill_weights(frac, weights):
+    """
+    fill the quintic weights for the six samples around a point, where frac
+    is the distance of the point from the third sample, 0 <= frac < 1
+    """
+    weights[0] = quintic(frac + 2.0)
+    weights[1] = quintic(frac + 1.0)
+    weights[2] = quintic(frac)
+    weights[3] = quintic(1.0 - frac)
+    weights[4] = quintic(2.0 - frac)
+    weights[5] = quintic(3.0 - frac)
+
+
+@njit(nogil=True)
+def _fill_indices(start, n, indices):
+    """
+    fill the indices of consecutive samples, wrapping periodically
+    """
+    index = start % n
+    for i in range(indices.size):
+        indices[i] = index
+        index += 1
+        if index == n:
+            index = 0
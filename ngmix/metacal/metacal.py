@@ -12,10 +12,12 @@ from ..gexceptions import GMixRangeError, BootPSFFailure
 from ..shape import Shape
 from .. import moments
 from .defaults import DEFAULT_STEP, METACAL_TYPES, METACAL_MINIMAL_TYPES
+from . import psfcache
 
 
 __all__ = [
     'MetacalDilatePSF', 'MetacalGaussPSF', 'MetacalFitGaussPSF', 'MetacalAnalyticPSF',
+    'KSpaceDrawer',
 ]
 
 logger = logging.getLogger(__name__)
@@ -37,11 +39,7 @@ def turn_off_galsim_caching():
 
 def _galsim_stuff(img, wcs, xinterp):
     if USE_GALSIM_CACHE:
-        return _cached_galsim_stuff(
-            tuple(tuple(ii) for ii in img),
-            repr(wcs),
-            xinterp,
-        )
+        return _cached_galsim_stuff(_ImageKey(img, wcs), xinterp)
     else:
         return _galsim_stuff_impl(img, wcs, xinterp)
 
@@ -54,9 +52,25 @@ def _galsim_stuff_impl(img, wcs, xinterp):
 
 
 @lru_cache(maxsize=128)
-def _cached_galsim_stuff(img, wcs_repr, xinterp):
-    import galsim  # noqa
-    return _galsim_stuff_impl(np.array(img), eval(wcs_repr), xinterp)
+def _cached_galsim_stuff(image_key, xinterp):
+    return _galsim_stuff_impl(image_key.img, image_key.wcs, xinterp)
+
+
+class _ImageKey(object):
+    """
+    an image and wcs for use as a cache key, compared using a digest of the
+    image and the wcs matrix rather than the full contents
+    """
+    def __init__(self, img, wcs):
+        self.img = img
+        self.wcs = wcs
+        self.digest = psfcache.get_digest(img, wcs.getMatrix())
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __eq__(self, other):
+        return self.digest == other.digest
 
 
 class MetacalDilatePSF(object):
@@ -68,6 +82,11 @@ class MetacalDilatePSF(object):
     obs: ngmix.Observation
         The observation must have a psf observation set, holding
         the psf image
+    noise_obs: ngmix.Observation, optional
+        An observation of noise, e.g. the rotated noise used for fixnoise,
+        with the same image shape and jacobian as obs.  Its metacal images
+        are made reusing the psf products for obs, and get_all returns a
+        tuple of the dicts for obs and noise_obs
 
     examples
     --------
@@ -96,17 +115,24 @@ class MetacalDilatePSF(object):
     Rpsf_obs2p = mc.get_obs_psfshear(sh2p)
     """
 
-    def __init__(self, obs):
+    # the kind of products in the psf cache, see ngmix.metacal.psfcache
+    _psf_cache_kind = 'dilate'
+
+    def __init__(self, obs, noise_obs=None):
 
         self.obs = obs
+        self.noise_obs = noise_obs
 
         if not obs.has_psf():
             raise ValueError("observation must have a psf observation set")
 
+        _check_noise_obs(obs, noise_obs)
+
         self._set_pixel()
         self._set_interp()
+        self._psf_cache = self._get_psf_cache()
         self._set_data()
-        self._psf_cache = {}
+        self._kdrawer = KSpaceDrawer(self.image)
 
     def get_all(self, step=DEFAULT_STEP, types=None):
         """
@@ -135,20 +161,72 @@ class MetacalDilatePSF(object):
                 1m -> (-shear, 0)
                 2p -> ( 0,  shear)
                 2m -> ( 0, -shear)
+
+        If noise_obs was sent, a tuple of dicts for obs and noise_obs is
+        returned
+        """
+
+        types = self._get_types(types)
+        odict = self._get_odict(step, types)
+
+        if self.noise_obs is not None:
+            noise_odict = self._get_noise_metacal()._get_odict(step, types)
+            return odict, noise_odict
+
+        return odict
+
+    def get_all_steps(self, steps, types=None):
         """
+        Get metacal images for each of a set of shear steps.  The setup, the
+        deconvolved image and the k space image of the unsheared image are
+        shared between the steps
 
+        parameters
+        ----------
+        steps: sequence of float
+            The shear step values
+        types: list
+            Types to get, see get_all
+
+        returns
+        -------
+        A dictionary keyed by step holding the dicts returned by get_all.
+        If noise_obs was sent, a tuple of such dictionaries for obs and
+        noise_obs is returned
+        """
+
+        types = self._get_types(types)
+        odicts = {step: self._get_odict(step, types) for step in steps}
+
+        if self.noise_obs is not None:
+            noise_mc = self._get_noise_metacal()
+            noise_odicts = {
+                step: noise_mc._get_odict(step, types) for step in steps
+            }
+            return odicts, noise_odicts
+
+        return odicts
+
+    def _get_types(self, types):
+        """
+        check the types, and add 1p if noshear is requested since we get both
+        of those at once
+        """
         if types is None:
             types = copy.deepcopy(METACAL_TYPES)
         else:
             for t in types:
                 assert t in METACAL_TYPES, 'bad metacal type: %s' % t
 
-        # we add 1p here if we want noshear since we get both of those
-        # at once below
-
         if 'noshear' in types and '1p' not in types:
             types.append('1p')
 
+        return types
+
+    def _get_odict(self, step, types):
+        """
+        get the dict of metacal observations for the types
+        """
         shdict = {}
 
         # galshear keys
@@ -190,6 +268,18 @@ class MetacalDilatePSF(object):
 
         return odict
 
+    def _get_noise_metacal(self):
+        """
+        get a metacal object for noise_obs, sharing the psf products and
+        target psfs of this one
+        """
+        noise_mc = copy.copy(self)
+        noise_mc.obs = self.noise_obs
+        noise_mc.noise_obs = None
+        noise_mc._set_data()
+        noise_mc._kdrawer = KSpaceDrawer(noise_mc.image)
+        return noise_mc
+
     def get_obs_galshear(self, shear, get_unsheared=False):
         """
         This is the case where we shear the image, for calculating R
@@ -313,9 +403,15 @@ class MetacalDilatePSF(object):
 
     def _get_psf_key(self, shear, doshear):
         """
-        need full g1 and g2 in key to support psf shearing
+        need full g1 and g2 in key to support psf shearing.  Otherwise the
+        psf is only dilated, by an amount that depends on |g|, so the same
+        psf is used for all the galaxy shears
         """
-        return '%s-%s-%s' % (doshear, shear.g1, shear.g2)
+        if doshear:
+            return '%s-%s-%s' % (doshear, shear.g1, shear.g2)
+        else:
+            g = np.sqrt(shear.g1**2 + shear.g2**2)
+            return '%s-%s' % (doshear, g)
 
     def get_target_image(self, psf_obj, shear=None):
         """
@@ -335,18 +431,24 @@ class MetacalDilatePSF(object):
         galsim image object
         """
 
-        imconv = self._get_target_gal_obj(psf_obj, shear=shear)
+        # the k space images of the deconvolved image, for each shear, and
+        # of the psf are kept by the drawer, so each is only drawn once
+        # for all the metacal types
+
+        if shear is not None:
+            shim_nopsf = self.get_sheared_image_nopsf(shear)
+            gal_key = ('gal', shear.g1, shear.g2)
+        else:
+            shim_nopsf = self.image_int_nopsf
+            gal_key = ('gal', None, None)
 
-        ny, nx = self.image.array.shape
+        psf_key = ('psf', id(psf_obj))
 
         try:
-            newim = imconv.drawImage(
-                nx=nx,
-                ny=ny,
-                wcs=self.image.wcs,
-                dtype=np.float64,
-                method='no_pixel',
-            )
+            newim = self._kdrawer.draw([
+                (gal_key, shim_nopsf),
+                (psf_key, psf_obj),
+            ])
         except RuntimeError as err:
             # argh, galsim uses generic exceptions
             raise GMixRangeError("galsim error: '%s'" % str(err))
@@ -402,24 +504,49 @@ class MetacalDilatePSF(object):
         self.image = image
         self.image_int = image_int
 
+        if 'psf_data' not in self._psf_cache:
+            self._psf_cache['psf_data'] = self._get_psf_data()
+
+        (
+            self.psf_image, self.psf_int, psf_int_inv, self.psf_int_nopix,
+        ) = self._psf_cache['psf_data']
+
+        # deconvolved galaxy image, psf+pixel removed
+        self.image_int_nopsf = galsim.Convolve(self.image_int,
+                                               psf_int_inv)
+
+    def _get_psf_data(self):
+        """
+        create the galsim objects for the psf
+        """
+        import galsim
+
         psf_image, psf_int = _galsim_stuff(
-            obs.psf.image.copy(),
+            self.obs.psf.image.copy(),
             self.get_psf_wcs(),
             self.interp,
         )
-        self.psf_image = psf_image
 
         # this can be used to deconvolve the psf from the galaxy image
         psf_int_inv = galsim.Deconvolve(psf_int)
 
-        # deconvolved galaxy image, psf+pixel removed
-        self.image_int_nopsf = galsim.Convolve(self.image_int,
-                                               psf_int_inv)
-
         # interpolated psf deconvolved from pixel.  This is what
         # we dilate, shear, etc and reconvolve the image by
-        self.psf_int_nopix = galsim.Convolve([psf_int, self.pixel_inv])
-        self.psf_int = psf_int
+        psf_int_nopix = galsim.Convolve([psf_int, self.pixel_inv])
+
+        return psf_image, psf_int, psf_int_inv, psf_int_nopix
+
+    def _get_psf_cache(self):
+        """
+        get the dict to hold the psf products.  When psf caching is on, see
+        ngmix.metacal.turn_on_psf_caching, it is shared with other objects
+        with the same psf
+        """
+        cache = psfcache.get_psf_cache()
+        if cache is None or self._psf_cache_kind is None:
+            return {}
+        else:
+            return cache.get_products(self._psf_cache_kind, self.obs)
 
     def get_wcs(self):
         """
@@ -492,6 +619,8 @@ class MetacalGaussPSF(MetacalDilatePSF):
     rng: numpy.random.RandomState, optional
         Optional random number generator for adding a small amount of noise to
         the gaussian psf image
+    noise_obs: ngmix.Observation, optional
+        An observation of noise, see MetacalDilatePSF
 
     examples
     --------
@@ -514,9 +643,11 @@ class MetacalGaussPSF(MetacalDilatePSF):
     R_obs1m, R_obs1m_unsheared = mc.get_obs_galshear(sh1p, get_unsheared=True)
     """
 
-    def __init__(self, obs, rng=None):
+    _psf_cache_kind = 'gauss'
+
+    def __init__(self, obs, rng=None, noise_obs=None):
 
-        super().__init__(obs=obs)
+        super().__init__(obs=obs, noise_obs=noise_obs)
         self.rng = rng
         self._setup_psf_noise()
 
@@ -541,15 +672,21 @@ class MetacalGaussPSF(MetacalDilatePSF):
                 1m -> (-shear, 0)
                 2p -> ( 0,  shear)
                 2m -> ( 0, -shear)
+
+        If noise_obs was sent, a tuple of dicts for obs and noise_obs is
+        returned
         """
 
+        return super().get_all(step=step, types=types)
+
+    def _get_types(self, types):
         if types is None:
             types = copy.deepcopy(METACAL_MINIMAL_TYPES)
         else:
             for t in types:
                 assert t in METACAL_MINIMAL_TYPES, 'bad metacal type: %s' % t
 
-        return super().get_all(step=step, types=types)
+        return super()._get_types(types)
 
     def _setup_psf_noise(self):
         pim = self.obs.psf.image
@@ -577,10 +714,14 @@ class MetacalGaussPSF(MetacalDilatePSF):
 
         assert doshear is False, 'no shearing gauss psf'
 
-        gauss_psf = _get_gauss_target_psf(
-            self.psf_int,
-            flux=self.psf_flux,
-        )
+        # the undilated target is the same for all steps
+        if 'gauss_psf' not in self._psf_cache:
+            self._psf_cache['gauss_psf'] = _get_gauss_target_psf(
+                self.psf_int,
+                flux=self.psf_flux,
+            )
+
+        gauss_psf = self._psf_cache['gauss_psf']
         psf_grown = _do_dilate(gauss_psf, shear)
         return psf_grown
 
@@ -616,6 +757,8 @@ class MetacalFitGaussPSF(MetacalGaussPSF):
     rng: numpy.random.RandomState
         Random number generator.  Used to generate guesses for the fit, and for
         adding a small amount of noise to the psf image.
+    noise_obs: ngmix.Observation, optional
+        An observation of noise, see MetacalDilatePSF
 
     examples
     --------
@@ -638,8 +781,10 @@ class MetacalFitGaussPSF(MetacalGaussPSF):
     # you can also get an unsheared, just convolved obs
     R_obs1m, R_obs1m_unsheared = mc.get_obs_galshear(sh1p, get_unsheared=True)
     """
-    def __init__(self, obs, rng=None):
-        super().__init__(obs=obs, rng=rng)
+    _psf_cache_kind = 'fitgauss'
+
+    def __init__(self, obs, rng=None, noise_obs=None):
+        super().__init__(obs=obs, rng=rng, noise_obs=noise_obs)
         if rng is None:
             raise ValueError('send an rng to MetacalFitGaussPSF')
         self._do_psf_fit()
@@ -659,75 +804,16 @@ class MetacalFitGaussPSF(MetacalGaussPSF):
 
     def _do_psf_fit(self):
         """
-        do the gaussian fit.
-
-        try the following in order
-            - adaptive moments
-            - maximim likelihood
-            - see if there is already a gmix object
-
-
-        if the above all fail, rase BootPSFFailure
+        do the gaussian fit, see _get_fitgauss_sigma
         """
         import galsim
 
-        from ..admom import AdmomFitter
-        from ..guessers import GMixPSFGuesser, SimplePSFGuesser
-        from ..runners import run_psf_fitter
-        from ..fitting import Fitter
-
-        psfobs = self.obs.psf
-
-        ntry = 4
-        guesser = GMixPSFGuesser(rng=self.rng, ngauss=1)
-
-        # try adaptive moments first
-        fitter = AdmomFitter(rng=self.rng)
-
-        res = run_psf_fitter(obs=psfobs, fitter=fitter, guesser=guesser, ntry=ntry)
-
-        if res['flags'] == 0:
-            e1, e2 = res['e']
-            T = res['T']
-        else:
-            # try maximum likelihood
-
-            lm_pars = {
-                'maxfev': 2000,
-                'ftol': 1.0e-05,
-                'xtol': 1.0e-05,
-            }
-
-            fitter = Fitter(model='gauss', fit_pars=lm_pars)
-            guesser = SimplePSFGuesser(rng=self.rng)
-
-            res = run_psf_fitter(
-                obs=psfobs, fitter=fitter, guesser=guesser, ntry=ntry,
-                set_result=False,
+        if 'fitgauss_sigma' not in self._psf_cache:
+            self._psf_cache['fitgauss_sigma'] = _get_fitgauss_sigma(
+                self.obs.psf, self.rng,
             )
 
-            if res['flags'] == 0:
-                psf_gmix = res.get_gmix()
-            else:
-
-                # see if there was already a gmix that we might use instead
-                if psfobs.has_gmix() and len(psfobs.gmix) == 1:
-                    psf_gmix = psfobs.gmix.copy()
-                else:
-                    # ok, just raise and exception
-                    raise BootPSFFailure('failed to fit psf '
-                                         'for MetacalFitGaussPSF')
-            try:
-                e1, e2, T = psf_gmix.get_e1e2T()
-            except GMixRangeError as err:
-                logger.info('%s', err)
-                raise BootPSFFailure(
-                    'could not get e1,e2 from psf fit for MetacalFitGaussPSF'
-                )
-
-        dilation = _get_ellip_dilation(e1, e2, T)
-        T_dilated = T*dilation
-        sigma = np.sqrt(T_dilated/2.0)
+        sigma = self._psf_cache['fitgauss_sigma']
 
         self.gauss_psf = galsim.Gaussian(
             sigma=sigma,
@@ -750,6 +836,8 @@ class MetacalAnalyticPSF(MetacalGaussPSF):
     rng: numpy.random.RandomState
         Optional random number generator for adding a small amount of noise to
         the gaussian psf image
+    noise_obs: ngmix.Observation, optional
+        An observation of noise, see MetacalDilatePSF
 
     examples
     --------
@@ -771,9 +859,12 @@ class MetacalAnalyticPSF(MetacalGaussPSF):
     # you can also get an unsheared, just convolved obs
     R_obs1m, R_obs1m_unsheared = mc.get_obs_galshear(sh1p, get_unsheared=True)
     """
-    def __init__(self, obs, psf, rng=None):
+    # the target depends on the input psf object, so is not shared
+    _psf_cache_kind = None
+
+    def __init__(self, obs, psf, rng=None, noise_obs=None):
         import galsim
-        super().__init__(obs=obs, rng=rng)
+        super().__init__(obs=obs, rng=rng, noise_obs=noise_obs)
 
         assert isinstance(psf, galsim.GSObject)
         self.psf_obj = psf
@@ -790,6 +881,188 @@ class MetacalAnalyticPSF(MetacalGaussPSF):
         return psf_grown
 
 
+class KSpaceDrawer(object):
+    """
+    Draw convolutions of galsim objects by multiplying the k space images of
+    the factors.  The k space image of each factor is kept, so factors
+    shared between convolutions, such as the deconvolved galaxy image or the
+    reconvolution psf for the different metacal types, are only drawn once.
+
+    The result is the same as drawImage(nx=nx, ny=ny, wcs=wcs,
+    method='no_pixel') on the convolution, which goes through the same steps
+    but draws each factor every time
+
+    Parameters
+    ----------
+    image: galsim.Image
+        The image defining the shape and the wcs of the drawn images.  The
+        wcs must be uniform, e.g. from Jacobian.get_galsim_wcs()
+    """
+    def __init__(self, image):
+        import galsim
+
+        ny, nx = image.array.shape
+        bounds = galsim.BoundsI(1, nx, 1, ny)
+
+        self.wcs = image.wcs
+        self.local_wcs = image.wcs.local()
+
+        # the profile is centered on the true center of the image, and
+        # drawn onto a view with the nominal center at zero
+        self.offset = bounds.true_center - bounds.center
+        self.imview = galsim.ImageD(
+            bounds.shift(-bounds.center), scale=1.0,
+        )
+
+        self._kimage_cache = {}
+
+    def draw(self, factors):
+        """
+        draw the convolution of the input objects
+
+        Parameters
+        ----------
+        factors: list
+            List of (key, obj) for the objects to be convolved. The key is
+            any hashable that identifies the object and is used to find its
+            k space image if it was already drawn.  The first object is
+            drawn with the centering offset
+
+        Returns
+        -------
+        image: galsim.Image
+        """
+        import galsim
+
+        objs = [obj for _, obj in factors]
+        prof = self._to_image(galsim.Convolve(objs), offset=True)
+
+        kimage, wrap_size = prof.drawFFT_makeKImage(self.imview)
+        grid_key = (wrap_size, kimage.array.shape, kimage.scale)
+
+        for i, (key, obj) in enumerate(factors):
+            kim = self._get_kimage(
+                key, obj, kimage, grid_key, offset=(i == 0),
+            )
+            if i == 0:
+                kimage.array[:, :] = kim.array
+            else:
+                kimage.array[:, :] *= kim.array
+
+        prof.drawFFT_finish(
+            self.imview, kimage, wrap_size, add_to_image=False,
+        )
+
+        return galsim.Image(self.imview.array.copy(), wcs=self.wcs)
+
+    def clear(self):
+        """
+        clear the k space images
+        """
+        self._kimage_cache.clear()
+
+    def _get_kimage(self, key, obj, kimage, grid_key, offset):
+        import galsim
+
+        cache_key = (key, grid_key, offset)
+
+        if cache_key not in self._kimage_cache:
+            kim = galsim.ImageCD(kimage.bounds, scale=kimage.scale)
+            self._to_image(obj, offset=offset)._drawKImage(kim)
+
+            # we keep a reference to the object so that keys made from its id
+            # stay unique
+            self._kimage_cache[cache_key] = (obj, kim)
+
+        return self._kimage_cache[cache_key][1]
+
+    def _to_image(self, obj, offset):
+        if offset:
+            return self.local_wcs.profileToImage(obj, offset=self.offset)
+        else:
+            return self.local_wcs.profileToImage(obj)
+
+
+def _get_fitgauss_sigma(psfobs, rng):
+    """
+    fit a gaussian to the psf and get the sigma of the round, dilated
+    gaussian used for reconvolution
+
+    try the following in order
+        - adaptive moments
+        - maximim likelihood
+        - see if there is already a gmix object
+
+    if the above all fail, rase BootPSFFailure
+
+    Parameters
+    ----------
+    psfobs: ngmix.Observation
+        The psf observation
+    rng: np.random.RandomState
+        Used to generate guesses for the fit
+
+    Returns
+    -------
+    sigma: float
+    """
+    from ..admom import AdmomFitter
+    from ..guessers import GMixPSFGuesser, SimplePSFGuesser
+    from ..runners import run_psf_fitter
+    from ..fitting import Fitter
+
+    ntry = 4
+    guesser = GMixPSFGuesser(rng=rng, ngauss=1)
+
+    # try adaptive moments first
+    fitter = AdmomFitter(rng=rng)
+
+    res = run_psf_fitter(obs=psfobs, fitter=fitter, guesser=guesser, ntry=ntry)
+
+    if res['flags'] == 0:
+        e1, e2 = res['e']
+        T = res['T']
+    else:
+        # try maximum likelihood
+
+        lm_pars = {
+            'maxfev': 2000,
+            'ftol': 1.0e-05,
+            'xtol': 1.0e-05,
+        }
+
+        fitter = Fitter(model='gauss', fit_pars=lm_pars)
+        guesser = SimplePSFGuesser(rng=rng)
+
+        res = run_psf_fitter(
+            obs=psfobs, fitter=fitter, guesser=guesser, ntry=ntry,
+            set_result=False,
+        )
+
+        if res['flags'] == 0:
+            psf_gmix = res.get_gmix()
+        else:
+
+            # see if there was already a gmix that we might use instead
+            if psfobs.has_gmix() and len(psfobs.gmix) == 1:
+                psf_gmix = psfobs.gmix.copy()
+            else:
+                # ok, just raise and exception
+                raise BootPSFFailure('failed to fit psf '
+                                     'for MetacalFitGaussPSF')
+        try:
+            e1, e2, T = psf_gmix.get_e1e2T()
+        except GMixRangeError as err:
+            logger.info('%s', err)
+            raise BootPSFFailure(
+                'could not get e1,e2 from psf fit for MetacalFitGaussPSF'
+            )
+
+    dilation = _get_ellip_dilation(e1, e2, T)
+    T_dilated = T*dilation
+    return np.sqrt(T_dilated/2.0)
+
+
 def _get_ellip_dilation(e1, e2, T):
     """
     when making a new image after shearing, we need to dilate the PSF to hide
@@ -835,6 +1108,34 @@ def _do_dilate(obj, shear):
     return obj.dilate(dilation)
 
 
+def _check_noise_obs(obs, noise_obs):
+    """
+    ensure the noise observation, if sent, matches the observation in image
+    shape and jacobian matrix
+    """
+    if noise_obs is None:
+        return
+
+    if noise_obs.image.shape != obs.image.shape:
+        raise ValueError(
+            'noise_obs image shape %s does not match %s' % (
+                noise_obs.image.shape, obs.image.shape,
+            )
+        )
+
+    jac, noise_jac = [
+        np.array([
+            tobs.jacobian.dudcol, tobs.jacobian.dudrow,
+            tobs.jacobian.dvdcol, tobs.jacobian.dvdrow,
+        ])
+        for tobs in (obs, noise_obs)
+    ]
+    if not np.allclose(noise_jac, jac, rtol=1.0e-6, atol=0):
+        raise ValueError(
+            'noise_obs must have the same jacobian matrix as obs'
+        )
+
+
 def _check_shape(shape):
     """
     ensure the input is an instantiation of ngmix.Shape
@@ -0,0 +1,252 @@
+"""
+pre-psf moments of metacal sheared images, measured directly in k space
+
+The pre-psf moments of an image are the sum of its deconvolved transform
+F(k)/P(k) against a kernel W(k), so the target psf used for metacal
+cancels.  The transform of the image sheared by the shear matrix A is
+F(A k)/P(A k), and summing it against W(k) is the same as summing F(k)/P(k)
+against W(A^{-1} k).  The moments for all the metacal types are thus found
+from a single transform of the image and psf, evaluating the kernels on
+sheared frequencies, with no interpolation or reconvolution.
+
+For fixnoise the noise image is rotated by 90 degrees, sheared and rotated
+back.  The rotation flips the sign of the M+ and Mx kernels, so the noise
+moments are found using the same sheared kernels as for the image.
+"""
+import numpy as np
+
+from .defaults import DEFAULT_STEP, METACAL_MINIMAL_TYPES
+from .. import simobs
+from ..moments import make_mom_result
+from ..prepsfmom import (
+    _check_obs_and_get_psf_obs,
+    _get_target_dim,
+    _get_kernels,
+    _zero_pad_and_compute_fft_maybe_cached,
+    _deconvolve_im_psf_inplace,
+    _compute_cen_phase_shift,
+    _measure_moments_fft_numba,
+)
+
+__all__ = ['MetacalPrePSFMom', 'MetacalKSigmaMom', 'MetacalPGaussMom']
+
+# the shear for each type, in units of the step
+TYPE_SHEARS = {
+    'noshear': (0.0, 0.0),
+    '1p': (1.0, 0.0),
+    '1m': (-1.0, 0.0),
+    '2p': (0.0, 1.0),
+    '2m': (0.0, -1.0),
+}
+
+
+class MetacalPrePSFMom(object):
+    """
+    Measure pre-psf moments of the metacal sheared images of an observation,
+    without making the images.
+
+    The results are the same as making metacal images with a round target
+    psf and measuring them with PrePSFMom, up to the treatment of the psf
+    deconvolution at high k.  The noise in the image is deconvolved and
+    sheared in the same way, so fixnoise is needed as for metacal.
+
+    This class is not meant to be used directly. Instead use either
+    `MetacalKSigmaMom` or `MetacalPGaussMom`.
+
+    Parameters
+    ----------
+    fwhm : float
+        The approximate real-space FWHM of the kernel, see PrePSFMom
+    kernel : str
+        The kernel to use. Either `ksigma` or `pgauss` or `gauss`.
+    pad_factor : int, optional
+        The factor by which to pad the FFTs used for the image. Default is 4.
+    ap_rad : float, optional
+        The apodization radius for the stamp in pixels. Default 1.5
+    fwhm_smooth : float, optional
+        If non-zero, additional Gaussian smoothing applied to the object
+        before computing the moments.
+    step : float, optional
+        The shear step value to use for metacal. Default 0.01
+    types : list, optional
+        Types to measure, from ['noshear', '1p', '1m', '2p', '2m'], which is
+        the default
+    fixnoise : bool, optional
+        If True, add the moments of a rotated and sheared noise field to
+        cancel the shear of the noise in the image, as for metacal fixnoise.
+        Default True
+    rng : numpy.random.RandomState, optional
+        Random state for generating the noise field, needed if fixnoise is
+        True and use_noise_image is False
+    use_noise_image : bool, optional
+        If True, use the noise image in the observation for fixnoise rather
+        than generating one.  Default False
+    """
+    def __init__(
+        self, fwhm, kernel, pad_factor=4, ap_rad=1.5, fwhm_smooth=0,
+        step=DEFAULT_STEP, types=None, fixnoise=True, rng=None,
+        use_noise_image=False,
+    ):
+        if kernel not in ['ksigma', 'gauss', 'pgauss']:
+            raise ValueError(
+                "The kernel '%s' for MetacalPrePSFMom is not "
+                "recognized!" % kernel
+            )
+
+        if types is None:
+            types = METACAL_MINIMAL_TYPES
+        else:
+            for t in types:
+                assert t in METACAL_MINIMAL_TYPES, 'bad metacal type: %s' % t
+
+        if fixnoise and not use_noise_image and rng is None:
+            raise ValueError('send an rng for fixnoise')
+
+        self.fwhm = fwhm
+        self.kernel = kernel
+        self.pad_factor = pad_factor
+        self.ap_rad = ap_rad
+        self.fwhm_smooth = fwhm_smooth
+        self.step = step
+        self.types = list(types)
+        self.fixnoise = fixnoise
+        self.rng = rng
+        self.use_noise_image = use_noise_image
+
+    def go(self, obs):
+        """
+        Measure the pre-psf moments for each metacal type
+
+        Parameters
+        ----------
+        obs : ngmix.Observation
+            The observation to measure, with a psf set.  The image data must
+            be square and the psf must have the same jacobian matrix.
+
+        Returns
+        -------
+        resdict: dict
+            The moments results, keyed by metacal type
+        """
+        psf_obs = _check_obs_and_get_psf_obs(obs, False)
+
+        target_dim = _get_target_dim(obs, psf_obs, self.pad_factor)
+        eff_pad_factor = target_dim / obs.image.shape[0]
+
+        kim, im_row, im_col = _zero_pad_and_compute_fft_maybe_cached(
+            obs.image, obs.jacobian.row0, obs.jacobian.col0, target_dim,
+            self.ap_rad,
+        )
+        kpsf_im, psf_im_row, psf_im_col = (
+            _zero_pad_and_compute_fft_maybe_cached(
+                psf_obs.image,
+                psf_obs.jacobian.row0, psf_obs.jacobian.col0,
+                target_dim,
+                0,
+            )
+        )
+
+        msk = obs.weight > 0
+        tot_var = np.sum(1.0 / obs.weight[msk])
+
+        if self.fixnoise:
+            knoise_im = self._get_noise_kimage(obs, target_dim)
+            # the noise field has the same variance as the image
+            tot_var *= 2
+        else:
+            knoise_im = None
+
+        # the phase is the same for all shears
+        cen_phase = _compute_cen_phase_shift(
+            im_row - psf_im_row, im_col - psf_im_col, target_dim,
+        )
+
+        resdict = {}
+        for type in self.types:
+            resdict[type] = self._meas_type(
+                type, kim, kpsf_im, knoise_im, cen_phase, tot_var,
+                obs.jacobian, eff_pad_factor,
+            )
+
+        return resdict
+
+    def _meas_type(
+        self, type, kim, kpsf_im, knoise_im, cen_phase, tot_var, jacobian,
+        eff_pad_factor,
+    ):
+        dim = kim.shape[0]
+        g1, g2 = [self.step * s for s in TYPE_SHEARS[type]]
+
+        kernels = _get_kernels(
+            self.kernel, dim, self.fwhm, jacobian, self.fwhm_smooth,
+            g1=g1, g2=g2,
+        )
+        msk = kernels['msk']
+        phase = cen_phase[msk]
+
+        tkim, tkpsf_im, _ = _deconvolve_im_psf_inplace(
+            kim[msk],
+            kpsf_im[msk],
+            np.abs(kpsf_im[0, 0]),
+        )
+        tkim *= phase
+
+        if knoise_im is not None:
+            tknoise_im = knoise_im[msk] / tkpsf_im
+            tknoise_im *= phase
+
+            # the flux and size kernels are unchanged by the rotation of
+            # the noise, the shear kernels change sign
+            kim_plus = tkim + tknoise_im
+            kim_minus = tkim - tknoise_im
+        else:
+            kim_plus = kim_minus = tkim
+
+        mom, mom_cov, mom_norm = _measure_moments_fft_numba(
+            kim_plus, tkpsf_im, dim, eff_pad_factor,
+            kernels['fkf'], kernels['fkr'], kernels['fkp'], kernels['fkc'],
+            kernels['fk00'], tot_var,
+        )
+
+        if knoise_im is not None:
+            df2 = 1.0 / dim**2
+            mom[2] = np.sum((kim_minus * kernels['fkp']).real) * df2
+            mom[3] = np.sum((kim_minus * kernels['fkc']).real) * df2
+
+        return make_mom_result(mom, mom_cov, sums_norm=mom_norm)
+
+    def _get_noise_kimage(self, obs, target_dim):
+        """
+        get the transform of the noise image, rotated by 90 degrees
+        """
+        if self.use_noise_image:
+            noise_image = obs.noise
+        else:
+            noise_image = simobs.simulate_obs(
+                gmix=None, obs=obs, rng=self.rng,
+            ).image
+
+        knoise_im, _, _ = _zero_pad_and_compute_fft_maybe_cached(
+            np.rot90(noise_image, k=1),
+            obs.jacobian.row0, obs.jacobian.col0, target_dim,
+            self.ap_rad,
+        )
+        return knoise_im
+
+
+class MetacalKSigmaMom(MetacalPrePSFMom):
+    """
+    Measure pre-psf moments with the 'ksigma' kernel for the metacal sheared
+    images of an observation.  See MetacalPrePSFMom for the parameters
+    """
+    def __init__(self, fwhm, **kw):
+        super().__init__(fwhm, 'ksigma', **kw)
+
+
+class MetacalPGaussMom(MetacalPrePSFMom):
+    """
+    Measure pre-psf moments with a gaussian kernel for the metacal sheared
+    images of an observation.  See MetacalPrePSFMom for the parameters
+    """
+    def __init__(self, fwhm, **kw):
+        super().__init__(fwhm, 'pgauss', **kw)
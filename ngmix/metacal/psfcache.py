@@ -0,0 +1,214 @@
+"""
+a process level cache for the metacal psf products, shared between the
+metacal objects for observations with the same psf, as is common when
+processing objects from a coadd
+
+The cache is keyed by a blake2 digest of the psf image, weight and the
+jacobians, so looking up the products costs little more than reading the
+psf image once
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+__all__ = [
+    'PSFCache',
+    'turn_on_psf_caching',
+    'turn_off_psf_caching',
+    'get_psf_cache',
+    'get_psf_cache_stats',
+]
+
+# default maximum number of psfs for which products are kept.  Each entry
+# holds a few interpolated images and the drawn target psfs, so the memory
+# used is roughly a few times the size of the psf images for each psf
+DEFAULT_MAX_SIZE = 128
+
+DIGEST_SIZE = 16
+
+PSF_CACHE = None
+
+
+def turn_on_psf_caching(max_size=DEFAULT_MAX_SIZE):
+    """
+    share the psf products between metacal objects made for observations
+    with the same psf.  Any existing cache is cleared
+
+    Note the fitgauss target psf is fit only once for each psf, so the random
+    numbers used are not the same as without caching
+
+    Parameters
+    ----------
+    max_size: int, optional
+        Maximum number of psfs to keep, default 128.  The least recently used
+        is removed when the cache is full
+    """
+    global PSF_CACHE
+    PSF_CACHE = PSFCache(max_size=max_size)
+
+
+def turn_off_psf_caching():
+    """
+    turn off and clear the psf cache
+    """
+    global PSF_CACHE
+    PSF_CACHE = None
+
+
+def get_psf_cache():
+    """
+    get the psf cache, or None if caching is off
+    """
+    return PSF_CACHE
+
+
+def get_psf_cache_stats():
+    """
+    get the statistics for the psf cache, or None if caching is off.  See
+    PSFCache.get_stats
+    """
+    if PSF_CACHE is None:
+        return None
+    else:
+        return PSF_CACHE.get_stats()
+
+
+class PSFCache(object):
+    """
+    A bounded least recently used cache of psf products.  Each entry is a
+    dict that the metacal objects fill with their products as they are made
+
+    Parameters
+    ----------
+    max_size: int, optional
+        Maximum number of entries, default 128
+    """
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1, got %s' % max_size)
+
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self.clear()
+
+    def get_products(self, kind, obs):
+        """
+        get the dict of products for the psf of the observation, making an
+        empty one if the psf is not in the cache
+
+        Parameters
+        ----------
+        kind: str
+            The kind of products, e.g. 'gauss' for MetacalGaussPSF
+        obs: ngmix.Observation
+            The observation, with psf set
+
+        Returns
+        -------
+        products: dict
+        """
+        key = get_psf_key(kind, obs)
+
+        with self._lock:
+            products = self._data.get(key)
+            if products is not None:
+                self._data.move_to_end(key)
+                self._hits += 1
+            else:
+                self._misses += 1
+
+                products = {}
+                self._data[key] = products
+                if len(self._data) > self.max_size:
+                    self._data.popitem(last=False)
+                    self._evictions += 1
+
+        return products
+
+    def clear(self):
+        """
+        remove all entries and reset the statistics
+        """
+        with self._lock:
+            self._data = OrderedDict()
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+    def get_stats(self):
+        """
+        get the cache statistics
+
+        Returns
+        -------
+        stats: dict
+            With entries hits, misses, evictions, size and max_size
+        """
+        with self._lock:
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'size': len(self._data),
+                'max_size': self.max_size,
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+
+def get_psf_key(kind, obs):
+    """
+    get the cache key for the psf of the observation.  The products depend
+    on the psf image and weight, the psf jacobian matrix, and the image
+    jacobian matrix through the pixel response
+
+    Parameters
+    ----------
+    kind: str
+        The kind of products, e.g. 'gauss' for MetacalGaussPSF
+    obs: ngmix.Observation
+        The observation, with psf set
+
+    Returns
+    -------
+    key: tuple
+    """
+    psf_obs = obs.psf
+    digest = get_digest(
+        psf_obs.image,
+        psf_obs.weight,
+        _get_jacobian_matrix(psf_obs.jacobian),
+        _get_jacobian_matrix(obs.jacobian),
+    )
+    return (kind, digest)
+
+
+def get_digest(*arrays):
+    """
+    get a blake2 digest of the data, shapes and types of the arrays
+
+    Parameters
+    ----------
+    *arrays: arrays
+        The arrays to hash
+
+    Returns
+    -------
+    digest: bytes
+    """
+    hasher = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        hasher.update(('%s%s' % (array.dtype.str, array.shape)).encode())
+        hasher.update(array.data)
+
+    return hasher.digest()
+
+
+def _get_jacobian_matrix(jacobian):
+    return np.array([
+        jacobian.dudcol, jacobian.dudrow,
+        jacobian.dvdcol, jacobian.dvdrow,
+    ])
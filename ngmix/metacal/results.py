@@ -0,0 +1,192 @@
+"""
+convert metacal results to structured arrays with a row per object
+
+The arrays hold copies of the values, so unlike the result dicts they keep
+no references to the observations, and the rows for many objects can be
+concatenated or written directly to a FITS or npy file
+
+Example
+-------
+
+    dtype = get_metacal_dtype(types=['noshear', '1p', '1m'])
+    data = np.zeros(nobj, dtype=dtype)
+
+    for i, obs in enumerate(obslist):
+        resdict, obsdict = boot.go(obs)
+        get_metacal_array(resdict, dtype=dtype, out=data[i:i+1])
+"""
+import numpy as np
+
+from .defaults import METACAL_MINIMAL_TYPES
+
+__all__ = [
+    'DEFAULT_RESULT_FIELDS',
+    'get_metacal_dtype',
+    'get_metacal_array',
+]
+
+DEFAULT_PREFIX = 'mcal'
+
+# fields copied from the results of the maximum likelihood fitters; the
+# moments measurers use e and e_cov rather than g and g_cov
+DEFAULT_RESULT_FIELDS = [
+    ('s2n', 'f8'),
+    ('g', 'f8', 2),
+    ('g_cov', 'f8', (2, 2)),
+    ('T', 'f8'),
+    ('T_err', 'f8'),
+]
+
+
+def get_metacal_dtype(types=None, fields=None, prefix=DEFAULT_PREFIX):
+    """
+    get the dtype for metacal results
+
+    The dtype has a field {prefix}_flags holding the bitwise or of the flags
+    for all types, and for each type a field {prefix}_flags_{type} and
+    fields {prefix}_{name}_{type} for each of the result fields, e.g.
+    mcal_g_1p and mcal_T_noshear
+
+    Parameters
+    ----------
+    types: list of str, optional
+        The metacal types, default ['noshear', '1p', '1m', '2p', '2m']
+    fields: list, optional
+        The fields to copy from the results, as a list of numpy dtype
+        descriptions (name, type[, shape]).  Default DEFAULT_RESULT_FIELDS,
+        s2n, g, g_cov, T and T_err
+    prefix: str, optional
+        Prefix for the field names, default 'mcal'
+
+    Returns
+    -------
+    dtype: numpy.dtype
+    """
+    if types is None:
+        types = METACAL_MINIMAL_TYPES
+    if fields is None:
+        fields = DEFAULT_RESULT_FIELDS
+
+    descr = [('%s_flags' % prefix, 'i4')]
+    for type in types:
+        descr.append(('%s_flags_%s' % (prefix, type), 'i4'))
+
+        for field in fields:
+            name = '%s_%s_%s' % (prefix, field[0], type)
+            descr.append((name,) + tuple(field[1:]))
+
+    return np.dtype(descr)
+
+
+def get_metacal_array(
+    resdict,
+    types=None,
+    fields=None,
+    prefix=DEFAULT_PREFIX,
+    dtype=None,
+    out=None,
+):
+    """
+    copy metacal results into a structured array with one row
+
+    The fields are only copied for types with flags equal to zero; for
+    other types the floating point fields are nan
+
+    Parameters
+    ----------
+    resdict: dict
+        The results keyed by metacal type, as returned by metacal_bootstrap
+    types: list of str, optional
+        The metacal types to copy, default the keys of resdict
+    fields: list, optional
+        The fields to copy, see get_metacal_dtype
+    prefix: str, optional
+        Prefix for the field names, default 'mcal'
+    dtype: numpy.dtype, optional
+        The dtype from get_metacal_dtype.  If sent, types, fields and prefix
+        are ignored
+    out: array, optional
+        An array of length one with the dtype, e.g. a slice data[i:i+1] of a
+        larger array, to fill rather than making a new array
+
+    Returns
+    -------
+    data: array
+        Structured array of length one, out if it was sent
+    """
+    if dtype is None:
+        if out is not None:
+            dtype = out.dtype
+        else:
+            if types is None:
+                types = list(resdict.keys())
+            dtype = get_metacal_dtype(
+                types=types, fields=fields, prefix=prefix,
+            )
+
+    if out is None:
+        out = np.zeros(1, dtype=dtype)
+    elif out.dtype != dtype:
+        raise ValueError(
+            'out has dtype %s, expected %s' % (out.dtype, dtype)
+        )
+
+    layout = _get_layout(dtype)
+    row = out[0]
+
+    flags = 0
+    for type, flags_name, names in layout['types']:
+        res = resdict[type]
+        type_flags = res['flags']
+
+        flags |= type_flags
+        row[flags_name] = type_flags
+
+        for name, colname in names:
+            if type_flags == 0 and name in res:
+                row[colname] = res[name]
+            elif colname in layout['float_names']:
+                row[colname] = np.nan
+            else:
+                row[colname] = 0
+
+    row[layout['flags_name']] = flags
+    return out
+
+
+def _get_layout(dtype):
+    """
+    get the types and result names for the fields of the dtype, cached for
+    each dtype
+    """
+    layout = _LAYOUTS.get(dtype)
+    if layout is None:
+        flags_name = dtype.names[0]
+        prefix = flags_name[:-len('_flags')]
+
+        types = []
+        for name in dtype.names[1:]:
+            type_flags_prefix = '%s_flags_' % prefix
+            if name.startswith(type_flags_prefix):
+                type = name[len(type_flags_prefix):]
+                types.append((type, name, []))
+            else:
+                type, _, names = types[-1]
+                result_name = name[len(prefix) + 1:-len(type) - 1]
+                names.append((result_name, name))
+
+        float_names = {
+            name for name in dtype.names
+            if dtype[name].base.kind in 'fc'
+        }
+        layout = {
+            'flags_name': flags_name,
+            'types': types,
+            'float_names': float_names,
+        }
+        _LAYOUTS[dtype] = layout
+
+    return layout
+
+
+_LAYOUTS = {}
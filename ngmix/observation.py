@@ -4,11 +4,17 @@ __all__ = [
     'make_kobs', 'get_kmb_obs',
 ]
 import copy
+import itertools
 import numpy as np
 from .jacobian import Jacobian, UnitJacobian, DiagonalJacobian
 from .gmix import GMix
+from .gexceptions import GMixFatalError
 
-from .pixels import make_pixels
+from .pixels import make_pixels, get_pixels_dtype
+from .pixels.pixels_nb import fill_pixels_val
+
+# each change to the pixels of any Observation gets a new version number
+_PIXELS_VERSIONS = itertools.count()
 
 DEFAULT_XINTERP = 'lanczos15'
 
@@ -102,6 +108,11 @@ class Observation(MetadataMixin):
         when constructing the internal pixels array for fitting routines.
         If False, then zero-weight pixels are included in the internal pixels
         array.
+    pixels_layout: str
+        The layout of the internal pixels array, 'full' (the default),
+        'compact', or 'compact_f4' which stores the image values and errors
+        as float32 to reduce memory usage.  See
+        ngmix.pixels.get_pixels_dtype
 
     notes
     -----
@@ -123,12 +134,18 @@ class Observation(MetadataMixin):
                  meta=None,
                  mfrac=None,
                  store_pixels=True,
-                 ignore_zero_weight=True):
+                 ignore_zero_weight=True,
+                 pixels_layout='full'):
 
         self._writeable = False
         self._ignore_zero_weight = ignore_zero_weight
         self._store_pixels = store_pixels
 
+        # check it is valid
+        get_pixels_dtype(pixels_layout)
+        self._pixels_layout = pixels_layout
+        self._pixels = None
+
         # pixels depends on image, weight and jacobian, so delay until all are
         # set
 
@@ -196,9 +213,16 @@ class Observation(MetadataMixin):
         """
         getter for pixels
 
-        this simply returns a reference.  Note the pixels array is *always*
-        read only.  To reset the pixels you must reset the image/weight/jacobian
+        this returns a reference.  Note the pixels array is *always* read
+        only.  To reset the pixels you must reset the image/weight/jacobian
+
+        The pixels are created on first access after a change.  If only the
+        image has changed, the values are filled in a copy of the existing
+        array, which is faster than remaking the coordinates.  Arrays
+        returned earlier are never modified
         """
+        if self._pixels_stale is not None:
+            self._make_pixels()
         return self._pixels
 
     @property
@@ -344,7 +368,7 @@ class Observation(MetadataMixin):
         self._image = image
 
         if update_pixels:
-            self.update_pixels()
+            self._update_pixels_val()
 
     def set_weight(self, weight, update_pixels=True):
         """
@@ -624,6 +648,24 @@ class Observation(MetadataMixin):
         """
         return hasattr(self, '_gmix')
 
+    def has_zero_weight_pixels(self):
+        """
+        does the pixels array hold pixels with zero weight?
+
+        This can only be True if ignore_zero_weight is False.  The result is
+        cached until the pixels are next updated.
+        """
+        pixels = self.pixels
+        if pixels is None:
+            return False
+
+        cache = getattr(self, '_zero_weight_cache', None)
+        if cache is None or cache[0] != self._pixels_version:
+            cache = (self._pixels_version, bool(np.any(pixels['ierr'] <= 0.0)))
+            self._zero_weight_cache = cache
+
+        return cache[1]
+
     def get_s2n(self):
         """
         get the the simple s/n estimator
@@ -712,7 +754,7 @@ class Observation(MetadataMixin):
 
         meta = copy.deepcopy(self._meta, memo=memo)
 
-        return Observation(
+        new_obs = Observation(
             self.image.copy(),
             weight=self.weight.copy(),
             bmask=bmask,
@@ -725,8 +767,18 @@ class Observation(MetadataMixin):
             mfrac=mfrac,
             store_pixels=self._store_pixels,
             ignore_zero_weight=self._ignore_zero_weight,
+            pixels_layout=self._pixels_layout,
         )
 
+        # copying existing pixels is faster than remaking them
+        if self._pixels is not None and self._pixels_stale is None:
+            pixels = self._pixels.copy()
+            pixels.flags['WRITEABLE'] = False
+            new_obs._pixels = pixels
+            new_obs._set_pixels_stale(None)
+
+        return new_obs
+
     def __copy__(self):
         return self.copy()
 
@@ -809,23 +861,85 @@ class Observation(MetadataMixin):
         if do_update:
             self.update_pixels()
 
+    @property
+    def pixels_layout(self):
+        """getter for pixels_layout attribute"""
+        return self._pixels_layout
+
+    @pixels_layout.setter
+    def pixels_layout(self, pixels_layout):
+        """
+        set the pixels_layout attribute
+
+        calls update_pixels after pixels_layout is set if needed
+        """
+        get_pixels_dtype(pixels_layout)
+        do_update = pixels_layout != self._pixels_layout
+        self._pixels_layout = pixels_layout
+        if do_update:
+            self.update_pixels()
+
     def update_pixels(self):
         """
-        create the pixel struct array, for efficient cache usage
+        mark the pixel struct array for recreation, for efficient cache usage.
+        The array is created on the next access of the pixels attribute
+
+        A GMixFatalError is raised if zero weight pixels are ignored and there
+        are no pixels with weight > 0
         """
 
         if not self._store_pixels:
             self._pixels = None
+            self._set_pixels_stale(None)
             return
 
-        pixels = make_pixels(
-            self.image,
-            self.weight,
-            self._jacobian,
-            ignore_zero_weight=self._ignore_zero_weight,
-        )
+        if self._ignore_zero_weight and not np.any(self._weight > 0.0):
+            raise GMixFatalError("no weights > 0")
+
+        self._set_pixels_stale('all')
+
+    def _update_pixels_val(self):
+        """
+        mark the image values in the pixel struct array for update, after
+        only the image has changed
+        """
+        if self._store_pixels and self._pixels is not None:
+            if self._pixels_stale is None:
+                self._set_pixels_stale('val')
+        else:
+            self.update_pixels()
+
+    def _set_pixels_stale(self, stale):
+        self._pixels_stale = stale
+        self._pixels_version = next(_PIXELS_VERSIONS)
+
+    def _make_pixels(self):
+        """
+        create the pixel struct array, or update the image values in a copy
+        of the existing array.  The copy keeps the coordinates, and is made
+        so that references to the old array are not modified
+        """
+
+        if self._pixels_stale == 'val':
+            pixels = self._pixels.copy()
+            fill_pixels_val(
+                pixels,
+                self._image,
+                self._weight,
+                ignore_zero_weight=self._ignore_zero_weight,
+            )
+        else:
+            pixels = make_pixels(
+                self._image,
+                self._weight,
+                self._jacobian,
+                ignore_zero_weight=self._ignore_zero_weight,
+                layout=self._pixels_layout,
+            )
+
         pixels.flags['WRITEABLE'] = False
         self._pixels = pixels
+        self._pixels_stale = None
 
     def _get_view(self, data):
         """return a view of some numpy data.
@@ -1059,6 +1173,86 @@ class MultiBandObsList(list, MetadataMixin):
 
         return Isum, Vsum, Npix
 
+    def get_packed_pixels(self):
+        """
+        get the pixels for all observations packed into a single contiguous
+        array, for use in compiled code that processes all bands and epochs
+        at once
+
+        The result is cached, and recalculated only if an observation is
+        added or replaced or the pixels of any observation are updated
+
+        returns
+        -------
+        pixels: array
+            The pixel struct array for all observations, read only.  The
+            pixels for observation i are pixels[starts[i]:starts[i+1]]
+        starts: array
+            The offsets of the pixels for each observation, with size
+            nobs + 1
+        bands: array
+            The band index for each observation
+        """
+
+        obs_list = []
+        pixels_list = []
+        bands = []
+        for band, obslist in enumerate(self):
+            for obs in obslist:
+                if obs.pixels is None:
+                    raise ValueError(
+                        'pixels must be stored to get packed pixels'
+                    )
+                if obs.pixels.dtype != self[0][0].pixels.dtype:
+                    raise ValueError(
+                        'all observations must have the same pixels_layout '
+                        'to get packed pixels'
+                    )
+                obs_list.append(obs)
+                pixels_list.append(obs.pixels)
+                bands.append(band)
+
+        versions = [obs._pixels_version for obs in obs_list]
+
+        cache = getattr(self, '_packed_pixels_cache', None)
+        if (
+            cache is not None
+            and cache['versions'] == versions
+            and cache['bands'].tolist() == bands
+            and all(
+                cached is obs
+                for cached, obs in zip(cache['obs_list'], obs_list)
+            )
+        ):
+            return cache['pixels'], cache['starts'], cache['bands']
+
+        starts = np.zeros(len(pixels_list) + 1, dtype='i8')
+        starts[1:] = np.cumsum([pixels.size for pixels in pixels_list])
+
+        if len(pixels_list) > 0:
+            dtype = pixels_list[0].dtype
+            # concatenating the raw bytes is much faster than concatenating
+            # structured arrays
+            pixels = np.concatenate(
+                [pixels.view('u1') for pixels in pixels_list]
+            ).view(dtype)
+        else:
+            pixels = np.zeros(0, dtype=get_pixels_dtype())
+
+        bands = np.array(bands, dtype='i8')
+
+        for arr in (pixels, starts, bands):
+            arr.flags['WRITEABLE'] = False
+
+        self._packed_pixels_cache = {
+            'obs_list': obs_list,
+            'versions': versions,
+            'pixels': pixels,
+            'starts': starts,
+            'bands': bands,
+        }
+        return pixels, starts, bands
+
     def copy(self, memo=None):
         """
         copy all the data into a new MultiBandObsList
@@ -0,0 +1,175 @@
+"""
+Control of the threading used for the pixel loops
+
+By default all calculations are done in the calling thread.  After calling
+set_num_threads with nthreads > 1, the log likelihood, fdiff, model s/n and
+weighted moments for images with many pixels are calculated using multiple
+threads, so that a single large object can use all the cores.
+
+The sums over pixels are done in chunks, with the chunks added in order.
+By default there is one chunk per thread, so the results can differ at the
+level of round-off error when the number of threads is changed.  After
+calling turn_on_deterministic_reductions the chunks have a fixed size, so the
+results are bitwise identical for any number of threads.
+
+The numba thread count is a per-thread setting, so it is applied again just
+before each threaded kernel is launched.  The setting therefore also holds
+in threads other than the one that called set_num_threads, for example the
+workers of a ThreadPoolExecutor.
+
+Launching the threaded kernels from several threads at the same time
+requires a thread safe numba threading layer, tbb or omp.  numba's fallback
+workqueue layer aborts the process in that case.  Set the layer with the
+NUMBA_THREADING_LAYER environment variable or numba.config.THREADING_LAYER,
+e.g. to 'threadsafe'.  A warning is issued the first time a kernel is
+launched from a thread other than the main thread with the workqueue layer.
+"""
+__all__ = [
+    'set_num_threads',
+    'get_num_threads',
+    'turn_on_deterministic_reductions',
+    'turn_off_deterministic_reductions',
+]
+import threading
+import warnings
+import numba
+
+# number of threads to use for the pixel loops
+NUM_THREADS = 1
+
+# use threads only for images with at least this many pixels
+MIN_PIXELS = 10_000
+
+# number of pixels in each chunk for deterministic reductions
+CHUNKSIZE = 4096
+
+DETERMINISTIC_REDUCTIONS = False
+
+# set after the threading layer has been checked for a launch from a thread
+# other than the main thread
+_THREADING_LAYER_CHECKED = False
+
+
+def set_num_threads(nthreads, min_pixels=None):
+    """
+    Set the number of threads to use for the pixel loops
+
+    Parameters
+    ----------
+    nthreads: int
+        Number of threads.  Send 1 to do all calculations in the calling
+        thread.  Must be no larger than numba.config.NUMBA_NUM_THREADS, which
+        is the number of cores unless set using the NUMBA_NUM_THREADS
+        environment variable
+    min_pixels: int, optional
+        Threads are only used for images with at least this many pixels; for
+        smaller images the overhead of the threads dominates.  Default 10_000
+
+    The setting applies to calculations run in any thread.  To run them in
+    several threads at the same time, a thread safe numba threading layer
+    is needed, see the documentation of this module.
+    """
+    global NUM_THREADS, MIN_PIXELS
+
+    nthreads = int(nthreads)
+    max_threads = numba.config.NUMBA_NUM_THREADS
+    if nthreads < 1 or nthreads > max_threads:
+        raise ValueError(
+            'nthreads must be in [1, %d], got %d' % (max_threads, nthreads)
+        )
+
+    numba.set_num_threads(nthreads)
+    NUM_THREADS = nthreads
+
+    if min_pixels is not None:
+        MIN_PIXELS = int(min_pixels)
+
+
+def get_num_threads():
+    """
+    Get the number of threads used for the pixel loops
+    """
+    return NUM_THREADS
+
+
+def turn_on_deterministic_reductions():
+    """
+    Use fixed size chunks for the sums over pixels, so that the results are
+    bitwise identical for any number of threads
+    """
+    global DETERMINISTIC_REDUCTIONS
+    DETERMINISTIC_REDUCTIONS = True
+
+
+def turn_off_deterministic_reductions():
+    """
+    Use one chunk per thread for the sums over pixels
+    """
+    global DETERMINISTIC_REDUCTIONS
+    DETERMINISTIC_REDUCTIONS = False
+
+
+def use_parallel(npixels):
+    """
+    Check if the parallel kernels should be used for the given number of
+    pixels.  With deterministic reductions they are also used for a single
+    thread, so the results do not depend on the number of threads
+
+    """
+    if npixels < MIN_PIXELS:
+        return False
+
+    return NUM_THREADS > 1 or DETERMINISTIC_REDUCTIONS
+
+
+def set_launch_threads():
+    """
+    Set the numba thread count for the calling thread to the current number
+    of threads.  numba keeps the count per thread, so this should be called
+    just before launching a parallel kernel
+    """
+    _check_threading_layer()
+    numba.set_num_threads(NUM_THREADS)
+
+
+def _check_threading_layer():
+    """
+    warn once if kernels are launched from a thread other than the main
+    thread with the workqueue threading layer, which is not thread safe
+    """
+    global _THREADING_LAYER_CHECKED
+
+    if _THREADING_LAYER_CHECKED:
+        return
+
+    if threading.current_thread() is threading.main_thread():
+        return
+
+    try:
+        layer = numba.threading_layer()
+    except ValueError:
+        # the layer is chosen when the first parallel kernel is launched
+        return
+
+    _THREADING_LAYER_CHECKED = True
+
+    if layer == 'workqueue':
+        warnings.warn(
+            'parallel kernels are launched from a thread other than the main '
+            'thread with the numba workqueue threading layer, which aborts if '
+            'kernels are launched from several threads at the same time; set '
+            'NUMBA_THREADING_LAYER to tbb or omp',
+            RuntimeWarning,
+        )
+
+
+def get_nchunks(npixels):
+    """
+    Get the number of chunks into which the sums over pixels are split
+    """
+    if DETERMINISTIC_REDUCTIONS:
+        nchunks = (npixels + CHUNKSIZE - 1) // CHUNKSIZE
+    else:
+        nchunks = NUM_THREADS
+
+    return max(nchunks, 1)
@@ -1,9 +1,9 @@
-__all__ = ['make_pixels', 'make_coords']
+__all__ = ['make_pixels', 'make_coords', 'get_pixels_dtype']
 import numpy
 from ..gexceptions import GMixFatalError
 
 
-def make_pixels(image, weight, jacob, ignore_zero_weight=True):
+def make_pixels(image, weight, jacob, ignore_zero_weight=True, layout='full'):
     """
     make a pixel array from the image and weight
 
@@ -24,6 +24,9 @@ def make_pixels(image, weight, jacob, ignore_zero_weight=True):
         If set, zero or negative weight pixels are ignored.  In this case the
         returned pixels array is equal in length to the set of positive weight
         pixels in the weight image.  Default True.
+    layout: str, optional
+        The layout of the pixel structures, see get_pixels_dtype.  Default
+        'full'
 
     returns
     -------
@@ -39,7 +42,7 @@ def make_pixels(image, weight, jacob, ignore_zero_weight=True):
     else:
         npixels = image.size
 
-    pixels = numpy.zeros(npixels, dtype=_pixels_dtype)
+    pixels = numpy.zeros(npixels, dtype=get_pixels_dtype(layout))
 
     fill_pixels(
         pixels,
@@ -52,6 +55,35 @@ def make_pixels(image, weight, jacob, ignore_zero_weight=True):
     return pixels
 
 
+def get_pixels_dtype(layout='full'):
+    """
+    get the dtype of the pixel structures for the given layout
+
+    parameters
+    ----------
+    layout: str, optional
+        'full': u, v, area, val, ierr and fdiff as float64, 48 bytes per
+            pixel.  This is the default.
+        'compact': the unused fdiff is dropped, 40 bytes per pixel
+        'compact_f4': as compact, but area, val and ierr are stored as
+            float32, 28 bytes per pixel
+
+        All fitting and measurement codes accept pixels with any layout
+
+    returns
+    -------
+    numpy dtype
+    """
+    if layout not in _pixels_dtypes:
+        raise ValueError(
+            'layout should be one of %s, got %s' % (
+                list(_pixels_dtypes), layout,
+            )
+        )
+
+    return numpy.dtype(_pixels_dtypes[layout])
+
+
 def make_coords(dims, jacob):
     """
     make a coords array
@@ -79,6 +111,28 @@ _pixels_dtype = [
 ]
 
 
+_compact_pixels_dtype = [
+    ("u", "f8"),
+    ("v", "f8"),
+    ("area", "f8"),
+    ("val", "f8"),
+    ("ierr", "f8"),
+]
+
+_compact_f4_pixels_dtype = [
+    ("u", "f8"),
+    ("v", "f8"),
+    ("area", "f4"),
+    ("val", "f4"),
+    ("ierr", "f4"),
+]
+
+_pixels_dtypes = {
+    'full': _pixels_dtype,
+    'compact': _compact_pixels_dtype,
+    'compact_f4': _compact_f4_pixels_dtype,
+}
+
 _coords_dtype = [
     ("u", "f8"),
     ("v", "f8"),
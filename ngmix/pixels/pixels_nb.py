@@ -3,7 +3,7 @@ from numba import njit
 from ..jacobian.jacobian_nb import jacobian_get_vu, jacobian_get_area
 
 
-@njit
+@njit(nogil=True)
 def fill_pixels(pixels, image, weight, jacob, ignore_zero_weight=True):
     """
     store v,u image value, and 1/err for each pixel
@@ -58,7 +58,7 @@ def fill_pixels(pixels, image, weight, jacob, ignore_zero_weight=True):
         raise RuntimeError('some pixels were not filled')
 
 
-@njit
+@njit(nogil=True)
 def fill_coords(coords, nrow, ncol, jacob):
     """
     store v,u image value, and 1/err for each pixel
@@ -92,3 +92,38 @@ def fill_coords(coords, nrow, ncol, jacob):
             coord['area'] = pixel_area
 
             icoord += 1
+
+
+@njit(nogil=True)
+def fill_pixels_val(pixels, image, weight, ignore_zero_weight=True):
+    """
+    update the image values of an existing pixels array, as filled by
+    fill_pixels, leaving the coordinates and errors unchanged
+
+    parameters
+    ----------
+    pixels: array
+        1-d array of pixel structures, u,v,val,ierr
+    image: 2-d array
+        2-d image array
+    weight: 2-d array
+        2-d image array same shape as image.  This must be the same weight
+        used to fill the pixels
+    ignore_zero_weight: bool
+        If set, zero or negative weight pixels are ignored.  Default True.
+    """
+    nrow, ncol = image.shape
+
+    ipixel = 0
+    for row in range(nrow):
+        for col in range(ncol):
+
+            if ignore_zero_weight and weight[row, col] <= 0.0:
+                continue
+
+            pixels[ipixel]['val'] = image[row, col]
+
+            ipixel += 1
+
+    if ipixel != pixels.size:
+        raise RuntimeError('some pixels were not filled')
@@ -107,14 +107,7 @@ class PrePSFMom(object):
         return self._meas(obs, psf_obs, return_kernels)
 
     def _meas(self, obs, psf_obs, return_kernels):
-        # pick the larger size
-        if psf_obs is not None:
-            if obs.image.shape[0] > psf_obs.image.shape[0]:
-                target_dim = int(obs.image.shape[0] * self.pad_factor)
-            else:
-                target_dim = int(psf_obs.image.shape[0] * self.pad_factor)
-        else:
-            target_dim = int(obs.image.shape[0] * self.pad_factor)
+        target_dim = _get_target_dim(obs, psf_obs, self.pad_factor)
         eff_pad_factor = target_dim / obs.image.shape[0]
 
         # pad image, psf and weight map, get FFTs, apply cen_phases
@@ -161,26 +154,9 @@ class PrePSFMom(object):
         # later in _measure_moments_fft
 
         # now build the kernels
-        if self.kernel == "ksigma":
-            kernels = _ksigma_kernels(
-                int(target_dim),
-                float(self.fwhm),
-                float(obs.jacobian.dvdrow), float(obs.jacobian.dvdcol),
-                float(obs.jacobian.dudrow), float(obs.jacobian.dudcol),
-                float(self.fwhm_smooth),
-            )
-        elif self.kernel in ["gauss", "pgauss"]:
-            kernels = _gauss_kernels(
-                int(target_dim),
-                float(self.fwhm),
-                float(obs.jacobian.dvdrow), float(obs.jacobian.dvdcol),
-                float(obs.jacobian.dudrow), float(obs.jacobian.dudcol),
-                float(self.fwhm_smooth),
-            )
-        else:
-            raise ValueError(
-                "The kernel '%s' for PrePSFMom is not recognized!" % self.kernel
-            )
+        kernels = _get_kernels(
+            self.kernel, target_dim, self.fwhm, obs.jacobian, self.fwhm_smooth,
+        )
 
         # compute the total variance from weight map
         msk = obs.weight > 0
@@ -280,6 +256,41 @@ class PGaussMom(PrePSFMom):
 PrePSFGaussMom = PGaussMom
 
 
+def _get_target_dim(obs, psf_obs, pad_factor):
+    # pick the larger size
+    if psf_obs is not None:
+        if obs.image.shape[0] > psf_obs.image.shape[0]:
+            target_dim = int(obs.image.shape[0] * pad_factor)
+        else:
+            target_dim = int(psf_obs.image.shape[0] * pad_factor)
+    else:
+        target_dim = int(obs.image.shape[0] * pad_factor)
+
+    return target_dim
+
+
+def _get_kernels(kernel, dim, fwhm, jacobian, fwhm_smooth, g1=0.0, g2=0.0):
+    """get the kernels for the named kernel, optionally for measuring the
+    moments of the image sheared by (g1, g2)"""
+    if kernel == "ksigma":
+        kernels_func = _ksigma_kernels
+    elif kernel in ["gauss", "pgauss"]:
+        kernels_func = _gauss_kernels
+    else:
+        raise ValueError(
+            "The kernel '%s' for PrePSFMom is not recognized!" % kernel
+        )
+
+    return kernels_func(
+        int(dim),
+        float(fwhm),
+        float(jacobian.dvdrow), float(jacobian.dvdcol),
+        float(jacobian.dudrow), float(jacobian.dudcol),
+        float(fwhm_smooth),
+        float(g1), float(g2),
+    )
+
+
 def _measure_moments_fft(
     kim, kpsf_im, tot_var, eff_pad_factor, kernels, drow, dcol,
 ):
@@ -315,7 +326,7 @@ def _measure_moments_fft(
     )
 
 
-@njit
+@njit(nogil=True)
 def _measure_moments_fft_numba(
     kim, kpsf_im, dim, eff_pad_factor, fkf, fkr, fkp, fkc, mom_norm, tot_var,
 ):
@@ -365,7 +376,7 @@ def _measure_moments_fft_numba(
     return mom, m_cov, mom_norm
 
 
-@njit
+@njit(nogil=True)
 def _ap_kern_kern(x, m, h):
     # cumulative triweight kernel
     y = (x - m) / h + 3
@@ -384,7 +395,7 @@ def _ap_kern_kern(x, m, h):
         return val
 
 
-@njit
+@njit(nogil=True)
 def _build_square_apodization_mask(ap_rad, ap_mask):
     ap_range = int(6*ap_rad + 0.5)
 
@@ -438,7 +449,7 @@ def _compute_cen_phase_shift(cen_row, cen_col, dim, msk=None):
     return pxy
 
 
-@njit
+@njit(nogil=True)
 def _compute_cen_phase_shift_numba(f, cen_row, cen_col):
     # this reshaping makes sure the arrays broadcast nicely into a grid
     fx = f.reshape(1, -1)
@@ -545,6 +556,19 @@ def _deconvolve_im_psf_inplace(kim, kpsf_im, max_amp, min_psf_frac=1e-5):
     return kim, kpsf_im, msk
 
 
+def _shear_freqs(fu, fv, g1, g2):
+    """get the frequencies at which to evaluate a kernel to measure the
+    moments of the image sheared by (g1, g2).
+
+    The transform of the sheared image is F(A k), for the symmetric shear
+    matrix A with unit determinant, so summing it against the kernel W(k)
+    is the same as summing F(k) against W(A^{-1} k)"""
+    fac = 1.0 / np.sqrt(1.0 - g1**2 - g2**2)
+    sfu = fac * ((1.0 - g1) * fu - g2 * fv)
+    sfv = fac * (-g2 * fu + (1.0 + g1) * fv)
+    return sfu, sfv
+
+
 def _get_fwhm_smooth_profile(fwhm_smooth, fmag2):
     sigma_smooth = fwhm_to_sigma(fwhm_smooth)
     chi2_2_smooth = sigma_smooth * sigma_smooth / 2 * fmag2
@@ -559,6 +583,7 @@ def _ksigma_kernels(
     kernel_size,
     dvdrow, dvdcol, dudrow, dudcol,
     fwhm_smooth,
+    g1=0.0, g2=0.0,
 ):
     if USE_KERNEL_CACHE:
         return _ksigma_kernels_cached(
@@ -566,6 +591,7 @@ def _ksigma_kernels(
             kernel_size,
             dvdrow, dvdcol, dudrow, dudcol,
             fwhm_smooth,
+            g1, g2,
         )
     else:
         return _ksigma_kernels_impl(
@@ -573,6 +599,7 @@ def _ksigma_kernels(
             kernel_size,
             dvdrow, dvdcol, dudrow, dudcol,
             fwhm_smooth,
+            g1, g2,
         )
 
 
@@ -582,12 +609,14 @@ def _ksigma_kernels_cached(
     kernel_size,
     dvdrow, dvdcol, dudrow, dudcol,
     fwhm_smooth,
+    g1=0.0, g2=0.0,
 ):
     return _ksigma_kernels_impl(
         dim,
         kernel_size,
         dvdrow, dvdcol, dudrow, dudcol,
         fwhm_smooth,
+        g1, g2,
     )
 
 
@@ -596,6 +625,7 @@ def _ksigma_kernels_impl(
     kernel_size,
     dvdrow, dvdcol, dudrow, dudcol,
     fwhm_smooth,
+    g1=0.0, g2=0.0,
 ):
     """This function builds a ksigma kernel in Fourier-space.
 
@@ -609,6 +639,8 @@ def _ksigma_kernels_impl(
     Atinv = np.linalg.inv([[dvdrow, dvdcol], [dudrow, dudcol]]).T
     fv = Atinv[0, 0] * fy + Atinv[0, 1] * fx
     fu = Atinv[1, 0] * fy + Atinv[1, 1] * fx
+    if g1 != 0 or g2 != 0:
+        fu, fv = _shear_freqs(fu, fv, g1, g2)
 
     # now draw the kernels
     # we are computing the Bernstein et al., arXiv:1508.05655. ksigma kernel which is
@@ -712,6 +744,7 @@ def _gauss_kernels(
     kernel_size,
     dvdrow, dvdcol, dudrow, dudcol,
     fwhm_smooth,
+    g1=0.0, g2=0.0,
 ):
     if USE_KERNEL_CACHE:
         return _gauss_kernels_cached(
@@ -719,6 +752,7 @@ def _gauss_kernels(
             kernel_size,
             dvdrow, dvdcol, dudrow, dudcol,
             fwhm_smooth,
+            g1, g2,
         )
     else:
         return _gauss_kernels_impl(
@@ -726,6 +760,7 @@ def _gauss_kernels(
             kernel_size,
             dvdrow, dvdcol, dudrow, dudcol,
             fwhm_smooth,
+            g1, g2,
         )
 
 
@@ -735,12 +770,14 @@ def _gauss_kernels_cached(
     kernel_size,
     dvdrow, dvdcol, dudrow, dudcol,
     fwhm_smooth,
+    g1=0.0, g2=0.0,
 ):
     return _gauss_kernels_impl(
         dim,
         kernel_size,
         dvdrow, dvdcol, dudrow, dudcol,
         fwhm_smooth,
+        g1, g2,
     )
 
 
@@ -749,6 +786,7 @@ def _gauss_kernels_impl(
     kernel_size,
     dvdrow, dvdcol, dudrow, dudcol,
     fwhm_smooth,
+    g1=0.0, g2=0.0,
 ):
     """This function builds a Gaussian kernel in Fourier-space.
 
@@ -762,6 +800,8 @@ def _gauss_kernels_impl(
     Atinv = np.linalg.inv([[dvdrow, dvdcol], [dudrow, dudcol]]).T
     fv = Atinv[0, 0] * fy + Atinv[0, 1] * fx
     fu = Atinv[1, 0] * fy + Atinv[1, 1] * fx
+    if g1 != 0 or g2 != 0:
+        fu, fv = _shear_freqs(fu, fv, g1, g2)
 
     # now draw the kernels
     sigma = fwhm_to_sigma(kernel_size)
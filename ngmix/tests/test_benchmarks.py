@@ -0,0 +1,124 @@
+import os
+import copy
+import tempfile
+import pytest
+
+from ngmix import benchmarks
+from ngmix.benchmarks.__main__ import main
+
+
+def _run(names):
+    return benchmarks.run_benchmarks(
+        names=names, quick=True, min_time=0.001, repeat=1,
+    )
+
+
+def test_benchmarks_smoke():
+    results = _run(['gaussmom', 'fitter_gauss'])
+
+    assert results['meta']['results_version'] == benchmarks.core.RESULTS_VERSION
+
+    keys = [res['key'] for res in results['results']]
+    assert keys == [
+        'gaussmom[stamp_size=32]',
+        'fitter_gauss[nepoch=1,stamp_size=32]',
+    ]
+
+    for res in results['results']:
+        assert res['status'] == 'ok'
+        assert res['ncalls'] >= 1
+        assert res['nobj'] == 1
+        assert res['seconds_per_call'] > 0
+        assert res['seconds_per_call_median'] >= res['seconds_per_call']
+        assert res['objects_per_second'] == 1 / res['seconds_per_call']
+
+
+def test_benchmarks_names():
+    names = benchmarks.get_benchmark_names()
+    for name in [
+        'fitter_gauss', 'fitter_exp', 'fitter_dev', 'fitter_bdf',
+        'em', 'admom', 'gaussmom', 'ksigmamom', 'pgaussmom',
+        'metacal', 'meds_read',
+    ]:
+        assert name in names
+
+    # prefixes select all matching benchmarks
+    assert benchmarks.core._match_names(['fitter']) == [
+        'fitter_gauss', 'fitter_exp', 'fitter_dev', 'fitter_bdf',
+    ]
+
+    with pytest.raises(ValueError):
+        _run(['blah'])
+
+
+def test_benchmarks_params():
+    bench = benchmarks.core.BENCHMARKS['fitter_exp']
+
+    psets = bench.get_param_sets()
+    assert len(psets) == 4
+    assert {'stamp_size': 64, 'nepoch': 4} in psets
+
+    assert bench.get_param_sets(quick=True) == [
+        {'nepoch': 1, 'stamp_size': 32},
+    ]
+
+
+def test_benchmarks_skipped():
+    def setup(rng):
+        raise benchmarks.core.BenchmarkSkipped('missing blah')
+
+    bench = benchmarks.core.Benchmark('skipper', setup=setup, params={})
+    res = benchmarks.run_benchmark(bench, {}, rng=None)
+    assert res['status'] == 'skipped'
+    assert res['reason'] == 'missing blah'
+    assert res['key'] == 'skipper[]'
+
+
+def test_benchmarks_io_compare():
+    results = _run(['gaussmom'])
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        fname = os.path.join(tmpdir, 'results.json')
+        benchmarks.write_results(results, fname)
+        rresults = benchmarks.read_results(fname)
+
+        assert rresults == results
+
+        slow = copy.deepcopy(results)
+        for res in slow['results']:
+            res['seconds_per_call'] *= 2
+        slow_fname = os.path.join(tmpdir, 'slow.json')
+        benchmarks.write_results(slow, slow_fname)
+
+        comparison = benchmarks.compare_results(results, slow)
+        assert len(comparison) == 1
+        assert comparison[0]['regressed']
+        assert comparison[0]['ratio'] == pytest.approx(2)
+
+        comparison = benchmarks.compare_results(slow, results)
+        assert not comparison[0]['regressed']
+
+        assert main(['--compare', fname, slow_fname]) == 1
+        assert main(['--compare', slow_fname, fname]) == 0
+
+        bad = copy.deepcopy(results)
+        bad['meta']['results_version'] = -1
+        bad_fname = os.path.join(tmpdir, 'bad.json')
+        benchmarks.write_results(bad, bad_fname)
+        with pytest.raises(ValueError):
+            benchmarks.read_results(bad_fname)
+
+
+def test_benchmarks_meds():
+    try:
+        import meds  # noqa: F401
+        have_meds = True
+    except ImportError:
+        have_meds = False
+
+    res, = _run(['meds_read'])['results']
+    if have_meds:
+        assert res['status'] == 'ok'
+        assert res['nobj'] == 20
+    else:
+        assert res['status'] == 'skipped'
@@ -0,0 +1,159 @@
+import numpy as np
+import pytest
+
+import ngmix
+from ngmix.catalog import run_catalog, iter_catalog, get_object_rng
+from ngmix.flags import PROC_ERROR
+from ._sims import get_model_obs
+
+NOBJ = 9
+BAD_INDEX = 4
+
+DTYPE = [
+    ('flags', 'i4'),
+    ('flux', 'f8'),
+    ('randoms', 'f8', 2),
+]
+
+
+class FakeReader(object):
+    """
+    stand-in for ngmix.medsreaders.MultiBandNGMixMEDS
+    """
+    size = NOBJ
+
+    def get_mbobs(self, iobj, weight_type='weight'):
+        if weight_type != 'weight':
+            raise ValueError('bad weight type')
+
+        data = get_model_obs(
+            rng=np.random.RandomState(iobj),
+            model='gauss',
+            noise=0.01,
+            nband=2,
+        )
+        mbobs = data['obs']
+        mbobs.meta['index'] = iobj
+        return mbobs
+
+
+def make_fake_reader():
+    return FakeReader()
+
+
+class ClosingReader(FakeReader):
+    """
+    counts the readers opened and closed in this process
+    """
+    nopen = 0
+    nclosed = 0
+
+    def __init__(self):
+        ClosingReader.nopen += 1
+
+    def close(self):
+        ClosingReader.nclosed += 1
+
+
+def make_closing_reader():
+    return ClosingReader()
+
+
+def process_object(mbobs, rng):
+    """
+    measures the flux, failing for one of the objects
+    """
+    if mbobs.meta['index'] == BAD_INDEX:
+        raise RuntimeError('bad object')
+
+    res = ngmix.gaussmom.GaussMom(fwhm=1.2).go(mbobs[0][0])
+    return {
+        'flags': res['flags'],
+        'flux': res['flux'],
+        'randoms': rng.uniform(size=2),
+    }
+
+
+@pytest.mark.parametrize('nproc', [1, 2])
+@pytest.mark.parametrize('chunksize', [None, 2])
+def test_catalog(nproc, chunksize):
+    seed = 9119
+
+    data = run_catalog(
+        make_fake_reader, process_object, DTYPE,
+        nproc=nproc, chunksize=chunksize, seed=seed,
+    )
+
+    assert data.size == NOBJ
+    assert np.all(data['index'] == np.arange(NOBJ))
+
+    for i in range(NOBJ):
+        if i == BAD_INDEX:
+            assert data['proc_flags'][i] == PROC_ERROR
+            assert data['flux'][i] == 0
+        else:
+            assert data['proc_flags'][i] == 0
+            assert data['flags'][i] == 0
+            assert data['flux'][i] > 0
+
+            # the random numbers depend only on the seed and index
+            rng = get_object_rng(seed, i)
+            assert np.all(data['randoms'][i] == rng.uniform(size=2))
+
+
+@pytest.mark.parametrize('nproc', [1, 2])
+def test_catalog_close(monkeypatch, nproc):
+    """
+    the readers opened in this process are closed
+    """
+    monkeypatch.setattr(ClosingReader, 'nopen', 0)
+    monkeypatch.setattr(ClosingReader, 'nclosed', 0)
+
+    data = run_catalog(
+        make_closing_reader, process_object, DTYPE, nproc=nproc, seed=3,
+    )
+    assert data.size == NOBJ
+
+    assert ClosingReader.nopen == 1
+    assert ClosingReader.nclosed == 1
+
+
+def test_catalog_indices():
+    indices = [7, 1, 3]  # no bad objects
+
+    chunks = list(iter_catalog(
+        make_fake_reader, process_object, DTYPE,
+        indices=indices, chunksize=2, seed=5,
+    ))
+    assert len(chunks) == 2
+    assert chunks[0].size == 2
+    assert chunks[1].size == 1
+
+    data = np.concatenate(chunks)
+    assert np.all(data['index'] == indices)
+    assert np.all(data['proc_flags'] == 0)
+
+    # results are independent of the processing order
+    data1 = run_catalog(
+        make_fake_reader, process_object, DTYPE, indices=[3], seed=5,
+    )
+    assert data1['flux'][0] == data['flux'][2]
+    assert np.all(data1['randoms'][0] == data['randoms'][2])
+
+
+def test_catalog_errors():
+    # bad weight type gives flags rather than an exception
+    data = run_catalog(
+        make_fake_reader, process_object, DTYPE, weight_type='blah',
+    )
+    assert np.all(data['proc_flags'] == PROC_ERROR)
+
+    data = run_catalog(make_fake_reader, process_object, DTYPE, indices=[])
+    assert data.size == 0
+    assert 'proc_flags' in data.dtype.names
+
+    with pytest.raises(ValueError):
+        run_catalog(make_fake_reader, process_object, DTYPE, nproc=0)
+
+    with pytest.raises(ValueError):
+        run_catalog(make_fake_reader, process_object, DTYPE, chunksize=0)
@@ -291,6 +291,452 @@ def test_em_types(em_type, noise):
         assert abs(fitpars[5]/pars[5]-1) < FRAC_TOL
 
 
+@pytest.mark.parametrize('noise', [0.0, 0.05])
+@pytest.mark.parametrize('em_type', ['full', 'fixcen', 'fixcov', 'fluxonly'])
+def test_em_accelerate(em_type, noise):
+    """
+    the accelerated fitters should find the same solution as the plain EM
+    """
+
+    rng = np.random.RandomState(9132)
+    ngauss = 2
+    data = get_ngauss_obs(rng=rng, ngauss=ngauss, noise=noise)
+
+    obs = data['obs']
+    gm = data['gmix']
+
+    pixel_scale = obs.jacobian.scale
+
+    gm_guess = gm.copy()
+    if em_type in ['full', 'fixcov']:
+        randomize_gmix(rng=rng, gmix=gm_guess, pixel_scale=pixel_scale)
+
+    kw = {
+        'fixcen': em_type == 'fixcen',
+        'fixcov': em_type == 'fixcov',
+        'fluxonly': em_type == 'fluxonly',
+        'tol': 1.0e-8,
+    }
+    res = ngmix.em.run_em(obs=obs, guess=gm_guess, **kw)
+    ares = ngmix.em.run_em(obs=obs, guess=gm_guess, accelerate=True, **kw)
+
+    assert res['flags'] == 0
+    assert ares['flags'] == 0
+
+    pars = res.get_gmix().get_full_pars()
+    apars = ares.get_gmix().get_full_pars()
+    assert np.allclose(apars, pars, rtol=1.0e-3, atol=pixel_scale/1000)
+
+
+@pytest.mark.parametrize('vary_sky', [False, True])
+def test_em_accelerate_numiter(vary_sky):
+    """
+    fit a 3 gaussian model with a poor guess, which converges slowly, and
+    check the accelerated fitter needs fewer passes
+    """
+
+    sky = 0.01
+    dims = (33, 33)
+    jacobian = ngmix.DiagonalJacobian(row=16, col=16, scale=0.263)
+    gm0 = ngmix.GMixModel([0.0, 0.0, 0.02, -0.03, 0.5, 1.0], 'turb')
+    im = gm0.make_image(dims, jacobian=jacobian) + sky
+    obs = ngmix.Observation(im, jacobian=jacobian)
+
+    gm_guess = ngmix.GMix(pars=[
+        0.3, 0.0, 0.0, 0.05, 0.0, 0.05,
+        0.3, 0.0, 0.0, 0.2, 0.0, 0.2,
+        0.4, 0.0, 0.0, 0.8, 0.0, 0.8,
+    ])
+
+    results = []
+    for accelerate in [False, True]:
+        fitter = ngmix.em.EMFitter(
+            maxiter=5000, vary_sky=vary_sky, accelerate=accelerate,
+        )
+        res = fitter.go(obs=obs, guess=gm_guess, sky=sky)
+        assert res['flags'] == 0
+        results.append(res)
+
+    res, ares = results
+    assert ares['numiter'] < res['numiter']/2
+
+    resid = np.abs(res.make_image() + res['sky'] - im).max()
+    aresid = np.abs(ares.make_image() + ares['sky'] - im).max()
+    assert aresid < resid*1.01
+
+
+@pytest.mark.parametrize('parallel', [False, True])
+@pytest.mark.parametrize('accelerate', [False, True])
+@pytest.mark.parametrize('em_type', ['full', 'fixcen', 'fixcov', 'fluxonly'])
+def test_em_go_batch(em_type, accelerate, parallel):
+    """
+    go_batch should give the same results as go
+    """
+    rng = np.random.RandomState(8812)
+
+    obs_list = []
+    guesses = []
+    for i in range(4):
+        data = get_ngauss_obs(
+            rng=rng, ngauss=1 + i % 2, noise=0.01, with_psf=i % 2 == 0,
+        )
+        obs = data['obs']
+        if obs.has_psf():
+            obs.psf.gmix = data['psf_gmix']
+
+        gm_guess = data['gmix'].copy()
+        randomize_gmix(
+            rng=rng, gmix=gm_guess, pixel_scale=obs.jacobian.scale,
+        )
+        obs_list.append(obs)
+        guesses.append(gm_guess)
+
+    # a failure for one of the stamps
+    guesses[1].get_data()['irr'] = -1
+
+    cls = {
+        'full': ngmix.em.EMFitter,
+        'fixcen': ngmix.em.EMFitterFixCen,
+        'fixcov': ngmix.em.EMFitterFixCov,
+        'fluxonly': ngmix.em.EMFitterFluxOnly,
+    }[em_type]
+    fitter = cls(accelerate=accelerate)
+
+    for sky in [None, 0.01]:
+        results = fitter.go_batch(
+            obs_list, guesses, sky=sky, parallel=parallel,
+        )
+        assert len(results) == len(obs_list)
+
+        for obs, guess, bres in zip(obs_list, guesses, results):
+            res = fitter.go(obs, guess, sky=sky)
+            assert bres['flags'] == res['flags']
+
+            if res['flags'] & ngmix.flags.EM_RANGE_ERROR:
+                assert not bres.has_gmix()
+                assert bres['message'] == res['message']
+                continue
+
+            for key in ['numiter', 'fdiff', 'sky']:
+                assert bres[key] == res[key]
+
+            assert np.array_equal(
+                bres.get_gmix().get_full_pars(),
+                res.get_gmix().get_full_pars(),
+            )
+            assert np.array_equal(bres.make_image(), res.make_image())
+
+        assert results[1]['flags'] == ngmix.flags.EM_RANGE_ERROR
+
+
+def test_em_go_batch_errors():
+    rng = np.random.RandomState(23)
+    data = get_ngauss_obs(rng=rng, ngauss=1, noise=0.0)
+    obs = data['obs']
+    gm = data['gmix']
+
+    fitter = ngmix.em.EMFitter()
+    assert fitter.go_batch([], gm) == []
+
+    with pytest.raises(ValueError):
+        fitter.go_batch([obs, obs], [gm])
+
+    with pytest.raises(ValueError):
+        fitter.go_batch([obs, obs], gm, sky=[0.1])
+
+    with pytest.raises(ValueError):
+        fitter.go_batch([obs, None], gm)
+
+    cobs = ngmix.Observation(
+        obs.image, jacobian=obs.jacobian, pixels_layout='compact',
+    )
+    with pytest.raises(ValueError):
+        fitter.go_batch([obs, cobs], gm)
+
+    # only range errors are flagged, others propagate
+    bad_gm = gm.copy()
+    bad_gm.get_data()['irr'] = -1
+
+    def runner(*args, **kw):
+        raise RuntimeError('not a range error')
+
+    fitter._runner = runner
+    with pytest.raises(RuntimeError):
+        fitter.go_batch([obs, obs], [gm, bad_gm])
+
+
+@pytest.mark.parametrize('pixels_layout', ['full', 'compact'])
+@pytest.mark.parametrize('ignore_zero_weight', [False, True])
+def test_em_go_pixels(pixels_layout, ignore_zero_weight):
+    """
+    go uses the observation pixels without modifying them, and gives the
+    same results as fitting the observation from prep_obs
+    """
+    rng = np.random.RandomState(5141)
+    data = get_ngauss_obs(rng=rng, ngauss=2, noise=0.01, with_psf=True)
+    obs = data['obs']
+    obs.psf.gmix = data['psf_gmix']
+
+    weight = obs.weight.copy()
+    weight[2, 3] = 0.0
+    obs = ngmix.Observation(
+        obs.image,
+        weight=weight,
+        jacobian=obs.jacobian,
+        psf=obs.psf,
+        ignore_zero_weight=ignore_zero_weight,
+        pixels_layout=pixels_layout,
+    )
+    pixels = obs.pixels.copy()
+
+    gm_guess = data['gmix'].copy()
+    randomize_gmix(rng=rng, gmix=gm_guess, pixel_scale=obs.jacobian.scale)
+
+    fitter = ngmix.em.EMFitter()
+
+    res = fitter.go(obs, gm_guess)
+    assert np.array_equal(obs.pixels, pixels)
+
+    obs_sky, sky = ngmix.em.prep_obs(obs)
+    sky_res = fitter.go(obs_sky, gm_guess, sky=sky)
+    assert res['flags'] == sky_res['flags'] == 0
+    assert res['numiter'] == sky_res['numiter']
+    assert res['sky'] == sky_res['sky']
+    assert np.array_equal(
+        res.get_gmix().get_full_pars(),
+        sky_res.get_gmix().get_full_pars(),
+    )
+
+    # the zero weight pixels are filled with the model in a copy
+    res = fitter.go(obs, gm_guess, sky=0.0)
+    assert res['flags'] == 0
+    assert np.array_equal(obs.pixels, pixels)
+
+
+def test_em_go_no_stored_pixels():
+    """
+    observations without stored pixels are fit using prep_obs, for go,
+    go_batch and go_warm
+    """
+    rng = np.random.RandomState(7719)
+    data = get_ngauss_obs(rng=rng, ngauss=2, noise=0.01, with_psf=True)
+    obs = data['obs']
+    obs.psf.gmix = data['psf_gmix']
+
+    nopix_obs = ngmix.Observation(
+        obs.image,
+        weight=obs.weight,
+        jacobian=obs.jacobian,
+        psf=obs.psf,
+        store_pixels=False,
+    )
+    assert nopix_obs.pixels is None
+
+    gm_guess = data['gmix'].copy()
+    randomize_gmix(rng=rng, gmix=gm_guess, pixel_scale=obs.jacobian.scale)
+
+    fitter = ngmix.em.EMFitter()
+
+    obs_sky, sky = ngmix.em.prep_obs(obs)
+    sky_res = fitter.go(obs_sky, gm_guess, sky=sky)
+
+    results = [fitter.go(nopix_obs, gm_guess)]
+    results += fitter.go_batch([nopix_obs], gm_guess)
+    results += fitter.go_warm([nopix_obs], gm_guess)
+
+    for res in results:
+        assert res['flags'] == sky_res['flags'] == 0
+        assert res['numiter'] == sky_res['numiter']
+        assert res['sky'] == sky_res['sky']
+        assert np.array_equal(
+            res.get_gmix().get_full_pars(),
+            sky_res.get_gmix().get_full_pars(),
+        )
+
+
+def test_em_chi2_bounds():
+    """
+    the boxes used to skip gaussians in the E step should just hold the
+    region with chi2 < FASTEXP_MAX_CHI2
+    """
+    from ngmix.em.em_nb import set_chi2_bounds, _tau_dtype
+    from ngmix.fastexp_nb import FASTEXP_MAX_CHI2
+
+    gm = ngmix.GMix(pars=[
+        1.0, 0.1, -0.2, 0.5, 0.3, 0.8,
+        1.0, 0.0, 0.0, 0.02, -0.01, 0.04,
+    ])
+    gmdata = gm.get_data()
+
+    taudata = np.zeros(len(gm), dtype=_tau_dtype)
+    set_chi2_bounds(gmdata, taudata)
+
+    theta = np.linspace(0, 2*np.pi, 10000)
+    for gauss, ttau in zip(gmdata, taudata):
+        cov = np.array([
+            [gauss['irr'], gauss['irc']],
+            [gauss['irc'], gauss['icc']],
+        ])
+        lower = np.linalg.cholesky(cov)
+        dv, du = np.sqrt(FASTEXP_MAX_CHI2) * lower.dot(
+            np.vstack([np.cos(theta), np.sin(theta)])
+        )
+
+        assert np.all(dv**2 <= ttau['v2max'] * (1 + 1.0e-12))
+        assert np.all(du**2 <= ttau['u2max'] * (1 + 1.0e-12))
+        assert np.allclose((dv**2).max(), ttau['v2max'], rtol=1.0e-6)
+        assert np.allclose((du**2).max(), ttau['u2max'], rtol=1.0e-6)
+
+
+def test_em_step_raise_errors():
+    """
+    the steps from the extrapolated mixtures in the accelerated fitters
+    report mixtures that are not valid for the data with a log likelihood of
+    -inf rather than raising
+    """
+    from ngmix.em.em import _sums_dtype
+    from ngmix.em.em_nb import em_step, _tau_dtype
+
+    rng = np.random.RandomState(51)
+    data = get_ngauss_obs(rng=rng, ngauss=1, noise=0.0)
+    obs = data['obs']
+
+    gmix_psf = ngmix.GMixModel([0., 0., 0., 0., 0., 1.0], 'gauss')
+
+    # far from the image, so the model is zero in all pixels
+    gm = ngmix.GMixModel([1.0e4, 1.0e4, 0.0, 0.0, 0.1, 1.0], 'gauss')
+    gm_conv = gm.convolve(gmix_psf)
+    pars = gm.get_full_pars()
+
+    sums = np.zeros(len(gm), dtype=_sums_dtype)
+    taudata = np.zeros(len(gm), dtype=_tau_dtype)
+    args = (
+        obs.pixels, sums, gm.get_data(), gmix_psf.get_data(),
+        gm_conv.get_data(), taudata, 0.0, 0.0, False, False,
+    )
+
+    with pytest.raises(ngmix.GMixRangeError):
+        em_step(*args)
+
+    _, loglike, _ = em_step(*args, raise_errors=False)
+    assert loglike == -np.inf
+    assert np.all(gm.get_full_pars() == pars)
+
+
+def _get_psf_grid_obs(rng, nrow, ncol):
+    """
+    psf stamps with two gaussians that vary slowly across a grid
+    """
+    jac = ngmix.DiagonalJacobian(row=12, col=12, scale=0.263)
+
+    obs_list = []
+    positions = []
+    for row in range(nrow):
+        for col in range(ncol):
+            s = 1 + 0.02 * row + 0.01 * col
+            e = 0.005 * col
+            gm = ngmix.GMix(pars=[
+                0.6, 0.0, 0.0, 0.1*s*(1+e), 0.003*row, 0.1*s*(1-e),
+                0.4, 0.0, 0.0, 0.3*s, 0.0, 0.3*s,
+            ])
+            im = gm.make_image((25, 25), jacobian=jac)
+            im += rng.normal(scale=1.0e-6, size=im.shape)
+
+            obs_list.append(
+                ngmix.Observation(
+                    im,
+                    weight=np.full(im.shape, 1.0e12),
+                    jacobian=jac,
+                )
+            )
+            positions.append((row, col))
+
+    return obs_list, positions
+
+
+@pytest.mark.parametrize('use_positions', [False, True])
+def test_em_go_warm(use_positions):
+    """
+    warm starting from the previous stamp should need fewer iterations and
+    give results as good as starting from the guess
+    """
+    rng = np.random.RandomState(9151)
+
+    obs_list, positions = _get_psf_grid_obs(rng, 4, 4)
+    if use_positions:
+        # shuffle the stamps, the positions restore the order
+        ind = rng.permutation(len(obs_list))
+        obs_list = [obs_list[i] for i in ind]
+        positions = [positions[i] for i in ind]
+    else:
+        positions = None
+
+    guess = ngmix.GMix(pars=[
+        0.5, 0.0, 0.0, 0.05, 0.0, 0.05,
+        0.5, 0.0, 0.0, 0.5, 0.0, 0.5,
+    ])
+
+    fitter = ngmix.em.EMFitter(miniter=5, maxiter=2000)
+
+    results = fitter.go_warm(obs_list, guess, positions=positions)
+    assert len(results) == len(obs_list)
+    assert sum(res['warm'] for res in results) == len(obs_list) - 1
+
+    numiter = 0
+    numiter_cold = 0
+    for obs, res in zip(obs_list, results):
+        assert res['flags'] == 0
+
+        cold_res = fitter.go(obs, guess)
+        assert cold_res['flags'] == 0
+
+        numiter += res['numiter']
+        numiter_cold += cold_res['numiter']
+
+        imax = obs.image.max()
+        resid = np.abs(res.make_image() - obs.image).max() / imax
+        cold_resid = np.abs(cold_res.make_image() - obs.image).max() / imax
+        assert resid < max(cold_resid * 1.1, 0.01)
+
+    assert numiter < numiter_cold / 4
+
+
+def test_em_go_warm_fallback():
+    """
+    failed fits are retried from the guess, and the next fit starts from
+    the last successful fit
+    """
+    rng = np.random.RandomState(771)
+
+    obs_list, _ = _get_psf_grid_obs(rng, 1, 4)
+
+    # an empty stamp always fails
+    obs_list[2] = ngmix.Observation(
+        np.zeros(obs_list[2].image.shape),
+        jacobian=obs_list[2].jacobian,
+    )
+
+    guess = ngmix.GMix(pars=[
+        0.5, 0.0, 0.0, 0.05, 0.0, 0.05,
+        0.5, 0.0, 0.0, 0.5, 0.0, 0.5,
+    ])
+    fitter = ngmix.em.EMFitter(miniter=5, maxiter=2000)
+
+    results = fitter.go_warm(obs_list, guess, warm_miniter=2)
+    assert [res['warm'] for res in results] == [False, True, False, True]
+    assert [res['flags'] for res in results] == [
+        0, 0, ngmix.flags.EM_RANGE_ERROR, 0,
+    ]
+
+    assert fitter.go_warm([], guess) == []
+
+    with pytest.raises(ValueError):
+        fitter.go_warm(obs_list, guess, sky=[0.1])
+
+    with pytest.raises(ValueError):
+        fitter.go_warm(obs_list, guess, positions=[(0, 0)])
+
+
 def test_em_errors():
     """
     see if we can recover the input with and without noise to high precision
@@ -324,6 +770,9 @@ def test_em_errors():
     res = ngmix.em.run_em(obs=obs, guess=gm_guess, maxiter=0)
     assert res['flags'] == ngmix.flags.EM_MAXITER
 
+    res = ngmix.em.run_em(obs=obs, guess=gm_guess, maxiter=0, accelerate=True)
+    assert res['flags'] == ngmix.flags.EM_MAXITER
+
     emresult = ngmix.em.EMResult(obs=obs, result={})
     with pytest.raises(RuntimeError):
         emresult.get_gmix()
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+from ngmix.fitting import Fitter, CoellipFitter
+from ngmix.fitting.results import FitModel, CoellipFitModel
+from ._sims import get_model_obs
+from ._priors import get_prior
+
+
+def _get_numerical_jacobian(fit_model, pars):
+    jac = np.zeros((fit_model.fdiff_size, pars.size))
+    for i in range(pars.size):
+        h = 1.0e-6 * max(1.0, abs(pars[i]))
+
+        pars1 = pars.copy()
+        pars1[i] += h
+        pars2 = pars.copy()
+        pars2[i] -= h
+
+        jac[:, i] = (
+            fit_model.calc_fdiff(pars1) - fit_model.calc_fdiff(pars2)
+        ) / (2 * h)
+
+    return jac
+
+
+@pytest.mark.parametrize('model', ['gauss', 'exp', 'dev', 'turb', 'bdf', 'bd'])
+@pytest.mark.parametrize('nband', [None, 2])
+@pytest.mark.parametrize('use_prior', [False, True])
+def test_fitting_jacobian(model, nband, use_prior):
+    rng = np.random.RandomState(5)
+
+    simmodel = 'exp' if model in ['bd', 'bdf'] else model
+    data = get_model_obs(
+        rng=rng, model=simmodel, noise=0.1, set_psf_gmix=True,
+        nband=nband, nepoch=2,
+    )
+
+    nb = 1 if nband is None else nband
+    extra = {'bdf': [0.4], 'bd': [0.1, 0.4]}.get(model, [])
+    pars = np.array([0.01, -0.02, 0.1, 0.05, 0.3] + extra + [100.0]*nb)
+
+    if use_prior:
+        prior = get_prior(fit_model=model, rng=rng, scale=0.263, nband=nband)
+    else:
+        prior = None
+
+    fit_model = FitModel(data['obs'], model, pars, prior=prior)
+
+    jac = fit_model.calc_jacobian(pars)
+    njac = _get_numerical_jacobian(fit_model, pars)
+
+    # the fast exponential limits the agreement; a few pixels can differ
+    # more at the chi^2 cutoff
+    assert np.abs(jac - njac).sum() / np.abs(njac).sum() < 1.0e-3
+
+
+@pytest.mark.parametrize('use_jacobian', [False, True])
+def test_fitting_jacobian_cm(use_jacobian):
+    """
+    the cm model is not supported for fitting
+    """
+    rng = np.random.RandomState(3)
+    data = get_model_obs(rng=rng, model='exp', noise=0.1, set_psf_gmix=True)
+    pars = np.array([0.01, -0.02, 0.1, 0.05, 0.3, 100.0])
+
+    with pytest.raises(ValueError, match='cm'):
+        Fitter('cm', use_jacobian=use_jacobian)
+
+    with pytest.raises(ValueError, match='cm'):
+        FitModel(data['obs'], 'cm', pars)
+
+
+def test_fitting_jacobian_coellip():
+    rng = np.random.RandomState(8)
+
+    data = get_model_obs(
+        rng=rng, model='exp', noise=0.1, set_psf_gmix=True, nepoch=2,
+    )
+    pars = np.array([0.01, -0.02, 0.1, 0.05, 0.1, 0.3, 40.0, 60.0])
+    fit_model = CoellipFitModel(data['obs'], 2, pars)
+
+    jac = fit_model.calc_jacobian(pars)
+    njac = _get_numerical_jacobian(fit_model, pars)
+
+    assert np.abs(jac - njac).sum() / np.abs(njac).sum() < 1.0e-3
+
+
+@pytest.mark.parametrize('model', ['gauss', 'exp', 'bdf', 'coellip'])
+def test_fitting_jacobian_fit(model):
+    """
+    fits with the analytic and numerical jacobian agree
+    """
+    rng = np.random.RandomState(1234)
+
+    simmodel = 'exp' if model in ['bdf', 'coellip'] else model
+    data = get_model_obs(
+        rng=rng, model=simmodel, noise=0.1, set_psf_gmix=True,
+    )
+
+    if model == 'coellip':
+        guess = np.array([0.0, 0.0, 0.0, 0.0, 0.1, 0.3, 50.0, 50.0])
+    else:
+        extra = [0.5] if model == 'bdf' else []
+        guess = np.array([0.0, 0.0, 0.0, 0.0, 0.2] + extra + [100.0])
+
+    guess += rng.uniform(low=-0.01, high=0.01, size=guess.size)
+
+    allres = []
+    for use_jacobian in [True, False]:
+        if model == 'coellip':
+            fitter = CoellipFitter(ngauss=2, use_jacobian=use_jacobian)
+        else:
+            fitter = Fitter(model=model, use_jacobian=use_jacobian)
+
+        res = fitter.go(data['obs'], guess)
+        assert res['flags'] == 0
+        allres.append(res)
+
+    pdiff = allres[0]['pars'] - allres[1]['pars']
+    assert np.all(np.abs(pdiff) < 0.01 * allres[1]['pars_err'])
+    assert np.allclose(
+        allres[0]['pars_err'], allres[1]['pars_err'], rtol=1.0e-3,
+    )
@@ -0,0 +1,155 @@
+import numpy as np
+import pytest
+
+import ngmix
+from ngmix.defaults import LOWVAL
+from ngmix.fitting.results import FitModel, CoellipFitModel
+from ._sims import get_model_obs
+from ._priors import get_prior
+
+
+def _get_expected(fit_model, pars):
+    """
+    calculate fdiff and the log likelihood one observation at a time, with
+    newly created mixtures
+    """
+    fdiff = np.zeros(fit_model.fdiff_size)
+    start = fit_model._fill_priors(pars=pars, fdiff=fdiff)
+
+    loglike = s2n_numer = s2n_denom = 0.0
+    npix = 0
+
+    gmixes = []
+    for band, obs_list in enumerate(fit_model.obs):
+        band_pars = fit_model.get_band_pars(pars=pars, band=band)
+        for obs in obs_list:
+            gm = fit_model._make_model(band_pars)
+            if obs.has_psf_gmix():
+                gm = gm.convolve(obs.psf.gmix)
+
+            npixels = obs.pixels.size
+            gm.fill_fdiff(obs, fdiff[start:start + npixels])
+            start += npixels
+
+            res = gm.get_loglike(obs, more=True)
+            loglike += res['loglike']
+            s2n_numer += res['s2n_numer']
+            s2n_denom += res['s2n_denom']
+            npix += res['npix']
+
+            gmixes.append(gm)
+
+    return fdiff, loglike, s2n_numer, s2n_denom, npix, gmixes
+
+
+@pytest.mark.parametrize('model', ['gauss', 'exp', 'bdf'])
+@pytest.mark.parametrize('nband', [None, 3])
+@pytest.mark.parametrize('nepoch', [None, 2])
+@pytest.mark.parametrize('set_psf_gmix', [False, True])
+@pytest.mark.parametrize('use_prior', [False, True])
+def test_fitting_packed(model, nband, nepoch, set_psf_gmix, use_prior):
+    rng = np.random.RandomState(1234)
+
+    simmodel = 'exp' if model == 'bdf' else model
+    data = get_model_obs(
+        rng=rng, model=simmodel, noise=0.1, set_psf_gmix=set_psf_gmix,
+        nband=nband, nepoch=nepoch,
+    )
+
+    nb = 1 if nband is None else nband
+    extra = [0.4] if model == 'bdf' else []
+    guess = np.array([0.01, -0.02, 0.1, 0.05, 0.3] + extra + [100.0]*nb)
+
+    if use_prior:
+        prior = get_prior(fit_model=model, rng=rng, scale=0.263, nband=nband)
+    else:
+        prior = None
+
+    fit_model = FitModel(data['obs'], model, guess, prior=prior)
+
+    for i in range(3):
+        pars = guess.copy()
+        pars[:2] += rng.uniform(low=-0.1, high=0.1, size=2)
+        pars[-nb:] *= rng.uniform(low=0.9, high=1.1, size=nb)
+
+        fdiff, loglike, s2n_numer, s2n_denom, npix, gmixes = _get_expected(
+            fit_model, pars,
+        )
+
+        assert np.all(fit_model.calc_fdiff(pars) == fdiff)
+
+        # the mixtures held by the fit model are kept up to date
+        iobs = 0
+        for gmix_list in fit_model._gmix_all:
+            for gm in gmix_list:
+                assert np.all(gm.get_data() == gmixes[iobs].get_data())
+                iobs += 1
+
+        out = np.zeros(fit_model.fdiff_size) + 1.0e9
+        fit_model.calc_fdiff(pars, out=out)
+        assert np.all(out == fdiff)
+
+        res = fit_model.calc_lnprob(pars, more=True)
+        assert res['npix'] == npix
+        assert np.allclose(res['s2n_numer'], s2n_numer, rtol=1.0e-12, atol=0)
+        assert np.allclose(res['s2n_denom'], s2n_denom, rtol=1.0e-12, atol=0)
+
+        lnprob = loglike + fit_model._get_priors(pars)
+        assert np.allclose(res['lnprob'], lnprob, rtol=1.0e-12, atol=0)
+
+    # range errors fill the whole array
+    bad_pars = guess.copy()
+    bad_pars[4] = -10.0
+    out = np.zeros(fit_model.fdiff_size)
+    fit_model.calc_fdiff(bad_pars, out=out)
+    assert np.all(out == LOWVAL)
+
+
+def test_fitting_packed_coellip():
+    rng = np.random.RandomState(99)
+
+    data = get_model_obs(
+        rng=rng, model='gauss', noise=0.1, set_psf_gmix=True, nepoch=2,
+    )
+
+    ngauss = 2
+    pars = np.array([0.01, -0.02, 0.1, 0.05, 0.2, 0.6, 40.0, 60.0])
+    fit_model = CoellipFitModel(data['obs'], ngauss, pars)
+
+    fdiff, loglike, _, _, _, _ = _get_expected(fit_model, pars)
+
+    assert np.all(fit_model.calc_fdiff(pars) == fdiff)
+    assert np.allclose(
+        fit_model.calc_lnprob(pars), loglike, rtol=1.0e-12, atol=0,
+    )
+
+
+def test_fitting_packed_parallel(monkeypatch):
+    """
+    the threaded per-observation kernels give the same fdiff
+    """
+    for name in ['NUM_THREADS', 'MIN_PIXELS', 'DETERMINISTIC_REDUCTIONS']:
+        monkeypatch.setattr(
+            ngmix.parallel, name, getattr(ngmix.parallel, name),
+        )
+
+    rng = np.random.RandomState(31)
+    data = get_model_obs(
+        rng=rng, model='exp', noise=0.1, set_psf_gmix=True, nband=2,
+    )
+    pars = np.array([0.01, -0.02, 0.1, 0.05, 0.3, 100.0, 90.0])
+
+    fit_model = FitModel(data['obs'], 'exp', pars)
+    fdiff = fit_model.calc_fdiff(pars)
+    lnprob = fit_model.calc_lnprob(pars, more=True)
+
+    ngmix.parallel.turn_on_deterministic_reductions()
+    ngmix.parallel.set_num_threads(1, min_pixels=0)
+
+    pfdiff = fit_model.calc_fdiff(pars)
+    plnprob = fit_model.calc_lnprob(pars, more=True)
+
+    assert np.all(pfdiff == fdiff)
+    assert plnprob['npix'] == lnprob['npix']
+    for key in ['lnprob', 's2n_numer', 's2n_denom']:
+        assert np.allclose(plnprob[key], lnprob[key], rtol=1.0e-12, atol=0)
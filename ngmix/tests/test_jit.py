@@ -0,0 +1,69 @@
+import os
+import sys
+import subprocess
+import pytest
+
+import ngmix
+
+
+@pytest.mark.parametrize('models', [['gauss'], ['bdf', 'coellip']])
+def test_warmup_smoke(models):
+    ngmix.warmup(models=models)
+
+
+def test_warmup_bad_input():
+    with pytest.raises(ValueError):
+        ngmix.warmup(fitters=['blah'])
+
+    with pytest.raises(ValueError):
+        ngmix.warmup(models=['blah'], fitters=['lm'])
+
+
+def test_get_jit_functions():
+    funcs = ngmix.jit.get_jit_functions()
+    names = [func.__name__ for func in funcs]
+
+    assert 'fill_fdiff' in names
+    assert 'em_run' in names
+    assert 'admom' in names
+
+    # no duplicates from imports between modules
+    assert len(set(names)) == len(names)
+
+
+@pytest.mark.parametrize('fitter, module, name', [
+    ('admom', 'ngmix.admom.admom_nb', 'admom'),
+    # the packed kernels fill the mixture for any model, so must not take
+    # the fill function as an argument, which would prevent caching
+    ('lm', 'ngmix.gmix.gmix_nb', 'fill_fdiff_packed'),
+])
+def test_numba_cache(tmp_path, fitter, module, name):
+    """
+    the cache is written by the first process and loaded by the second
+    """
+    cache_dir = str(tmp_path / 'numba_cache')
+    env = dict(os.environ)
+    env[ngmix.jit.NUMBA_CACHE_ENV] = cache_dir
+
+    code = (
+        "import ngmix\n"
+        "from %s import %s as func\n"
+        "ngmix.warmup(fitters=['%s'], models=['exp'])\n"
+        "print(len(func.stats.cache_hits))\n"
+    ) % (module, name, fitter)
+
+    nhits = []
+    for i in range(2):
+        res = subprocess.run(
+            [sys.executable, '-c', code],
+            env=env, check=True, capture_output=True, text=True,
+        )
+        nhits.append(int(res.stdout.split()[-1]))
+
+    assert nhits[0] == 0
+    assert nhits[1] > 0
+
+    fnames = []
+    for root, dirs, files in os.walk(cache_dir):
+        fnames += files
+    assert any(fname.endswith('.nbi') for fname in fnames)
@@ -211,3 +211,274 @@ def _do_test_low_psf_s2n():
 def test_low_psf_s2n(metacal_caching):
     with pytest.raises(ngmix.BootPSFFailure):
         _do_test_low_psf_s2n()
+
+
+@pytest.mark.parametrize('psf', ['gauss', 'dilate'])
+@pytest.mark.parametrize('n', [None, 32, 33])
+@pytest.mark.parametrize('diagonal', [True, False])
+def test_metacal_kspace(psf, n, diagonal):
+    """
+    the images made by multiplying the shared k space images are the same
+    as drawing each convolution with galsim
+    """
+    rng = np.random.RandomState(seed=8)
+    obs = _get_obs(rng, noise=0.005, n=n)
+
+    if not diagonal:
+        for tobs in [obs, obs.psf]:
+            row, col = tobs.jacobian.get_cen()
+            with tobs.writeable():
+                tobs.jacobian = ngmix.Jacobian(
+                    row=row, col=col,
+                    dudrow=0.26, dudcol=-0.01,
+                    dvdrow=0.02, dvdcol=0.25,
+                )
+
+    if psf == 'dilate':
+        mc = ngmix.metacal.MetacalDilatePSF(obs)
+        types = ngmix.metacal.METACAL_TYPES
+    else:
+        mc = ngmix.metacal.MetacalGaussPSF(obs)
+        types = ngmix.metacal.METACAL_MINIMAL_TYPES
+
+    step = 0.01
+    obs_dict = mc.get_all(step=step, types=list(types))
+
+    shears = {
+        '1p': ngmix.Shape(step, 0.0),
+        '1m': ngmix.Shape(-step, 0.0),
+        '2p': ngmix.Shape(0.0, step),
+        '2m': ngmix.Shape(0.0, -step),
+    }
+
+    ny, nx = obs.image.shape
+    for type in types:
+        if type == 'noshear':
+            shear = None
+            _, psf_obj = mc.get_target_psf(shears['1p'], 'gal_shear')
+        elif 'psf' in type:
+            shear = None
+            _, psf_obj = mc.get_target_psf(shears[type[:2]], 'psf_shear')
+        else:
+            shear = shears[type]
+            _, psf_obj = mc.get_target_psf(shear, 'gal_shear')
+
+        expected = mc._get_target_gal_obj(psf_obj, shear=shear).drawImage(
+            nx=nx, ny=ny, wcs=mc.image.wcs, dtype=np.float64,
+            method='no_pixel',
+        ).array
+
+        assert np.allclose(
+            obs_dict[type].image, expected,
+            rtol=0, atol=1.0e-12 * np.abs(expected).max(),
+        )
+
+    # the target psf is shared between the galaxy shears, and the
+    # deconvolved image is drawn only once for each shear
+    nkeys = len(mc._kdrawer._kimage_cache)
+    if psf == 'dilate':
+        assert nkeys == 10
+    else:
+        assert nkeys == 6
+
+
+@pytest.mark.parametrize('n', [None, 32, 33])
+@pytest.mark.parametrize('diagonal', [True, False])
+def test_metacal_fft(n, diagonal):
+    """
+    the images made with FFTs agree with those made by galsim, when using
+    the same target psf
+    """
+    from ngmix.metacal.metacal import _get_gauss_target_psf
+
+    rng = np.random.RandomState(seed=8)
+    obs = _get_obs(rng, n=n)
+
+    if not diagonal:
+        for tobs in [obs, obs.psf]:
+            row, col = tobs.jacobian.get_cen()
+            with tobs.writeable():
+                tobs.jacobian = ngmix.Jacobian(
+                    row=row, col=col,
+                    dudrow=0.26, dudcol=-0.01,
+                    dvdrow=0.02, dvdcol=0.25,
+                )
+
+    mc = ngmix.metacal.MetacalGaussPSF(obs)
+    mcfft = ngmix.metacal.MetacalFFTGaussPSF(obs)
+
+    # the target sizes differ slightly, because the fft version finds the
+    # size on a different grid
+    target_sigma = _get_gauss_target_psf(mc.psf_int, flux=mc.psf_flux).sigma
+    assert abs(mcfft.target_sigma/target_sigma - 1) < 0.05
+    mcfft.target_sigma = target_sigma
+
+    obs_dict = mc.get_all()
+    fft_obs_dict = mcfft.get_all()
+    assert set(fft_obs_dict) == set(obs_dict)
+
+    for type, mobs in obs_dict.items():
+        fobs = fft_obs_dict[type]
+
+        assert np.allclose(
+            fobs.image, mobs.image,
+            rtol=0, atol=1.0e-5 * np.abs(mobs.image).max(),
+        )
+        assert np.allclose(
+            fobs.psf.image, mobs.psf.image,
+            rtol=0, atol=1.0e-12 * mobs.psf.image.max(),
+        )
+        assert fobs.psf.jacobian.get_cen() == mobs.psf.jacobian.get_cen()
+
+
+@pytest.mark.parametrize('psf', ['gauss', 'fitgauss'])
+@pytest.mark.parametrize('fixnoise', [True, False])
+def test_metacal_fft_smoke(psf, fixnoise):
+    rng = np.random.RandomState(seed=100)
+
+    obs = _get_obs(rng, noise=0.005)
+
+    mdict = ngmix.metacal.get_all_metacal(
+        obs, psf=psf, rng=rng, fixnoise=fixnoise, backend='fft',
+    )
+    assert set(mdict) == set(ngmix.metacal.METACAL_MINIMAL_TYPES)
+
+    for key, mobs in mdict.items():
+        assert mobs.image.shape == obs.image.shape
+        assert np.all(mobs.image != obs.image)
+        assert mobs.psf.image.shape == obs.psf.image.shape
+        assert np.all(mobs.psf.image != obs.psf.image)
+        if fixnoise:
+            assert mobs.weight[0, 0] == obs.weight[0, 0]/2
+        else:
+            assert mobs.weight[0, 0] == obs.weight[0, 0]
+
+
+def test_metacal_fft_errors():
+    rng = np.random.RandomState(seed=100)
+    obs = _get_obs(rng, noise=0.005)
+
+    with pytest.raises(ValueError):
+        ngmix.metacal.get_all_metacal(obs=obs, rng=rng, backend='blah')
+
+    with pytest.raises(ValueError):
+        ngmix.metacal.get_all_metacal(
+            obs=obs, rng=rng, psf='dilate', backend='fft',
+        )
+
+    with pytest.raises(ValueError):
+        ngmix.metacal.MetacalFFTFitGaussPSF(obs=obs, rng=None)
+
+    with obs.psf.writeable():
+        obs.psf.jacobian = ngmix.DiagonalJacobian(row=0, col=0, scale=0.2)
+
+    with pytest.raises(ValueError):
+        ngmix.metacal.MetacalFFTGaussPSF(obs=obs)
+
+
+@pytest.mark.parametrize('psf', ['gauss', 'dilate', 'fft'])
+def test_metacal_noise_obs(psf):
+    """
+    the images for the noise observation, made along with those for the
+    observation, are the same as those made separately
+    """
+    rng = np.random.RandomState(seed=31)
+    obs = _get_obs(rng, noise=0.005)
+    noise_obs = ngmix.simobs.simulate_obs(gmix=None, obs=obs, rng=rng)
+
+    if psf == 'dilate':
+        cls = ngmix.metacal.MetacalDilatePSF
+    elif psf == 'fft':
+        cls = ngmix.metacal.MetacalFFTGaussPSF
+    else:
+        cls = ngmix.metacal.MetacalGaussPSF
+
+    odict, noise_odict = cls(obs, noise_obs=noise_obs).get_all()
+    expected = cls(obs).get_all()
+    noise_expected = cls(noise_obs).get_all()
+
+    assert set(odict) == set(expected)
+    assert set(noise_odict) == set(expected)
+
+    for type in expected:
+        assert np.allclose(
+            odict[type].image, expected[type].image, rtol=0, atol=1.0e-14,
+        )
+        assert np.allclose(
+            noise_odict[type].image, noise_expected[type].image,
+            rtol=0, atol=1.0e-14,
+        )
+        assert np.all(odict[type].psf.image == expected[type].psf.image)
+
+
+@pytest.mark.parametrize('backend', ['galsim', 'fft'])
+def test_metacal_noise_obs_errors(backend):
+    rng = np.random.RandomState(seed=31)
+    obs = _get_obs(rng, noise=0.005)
+
+    if backend == 'fft':
+        cls = ngmix.metacal.MetacalFFTGaussPSF
+    else:
+        cls = ngmix.metacal.MetacalGaussPSF
+
+    noise_obs = ngmix.simobs.simulate_obs(gmix=None, obs=obs, rng=rng)
+    with noise_obs.writeable():
+        noise_obs.jacobian = ngmix.DiagonalJacobian(row=0, col=0, scale=0.2)
+
+    with pytest.raises(ValueError):
+        cls(obs, noise_obs=noise_obs)
+
+    noise_obs = ngmix.Observation(np.zeros((5, 5)))
+    with pytest.raises(ValueError):
+        cls(obs, noise_obs=noise_obs)
+
+
+@pytest.mark.parametrize('psf', ['gauss', 'fitgauss', 'dilate', 'fft'])
+@pytest.mark.parametrize('send_noise_obs', [False, True])
+def test_metacal_get_all_steps(psf, send_noise_obs):
+    """
+    the images for a set of steps are the same as those made for each step
+    separately
+    """
+    rng = np.random.RandomState(seed=88)
+    obs = _get_obs(rng, noise=0.005)
+    if send_noise_obs:
+        noise_obs = ngmix.simobs.simulate_obs(gmix=None, obs=obs, rng=rng)
+    else:
+        noise_obs = None
+
+    if psf == 'dilate':
+        cls = ngmix.metacal.MetacalDilatePSF
+        types = ['noshear', '1p', '1m', '1p_psf']
+    elif psf == 'fitgauss':
+        cls = ngmix.metacal.MetacalFitGaussPSF
+        types = ['noshear', '1p', '2m']
+    elif psf == 'fft':
+        cls = ngmix.metacal.MetacalFFTGaussPSF
+        types = ['noshear', '1p', '2m']
+    else:
+        cls = ngmix.metacal.MetacalGaussPSF
+        types = ['noshear', '1p', '2m']
+
+    def make(seed):
+        kw = {'noise_obs': noise_obs}
+        if psf != 'dilate':
+            kw['rng'] = np.random.RandomState(seed)
+        return cls(obs, **kw)
+
+    steps = [0.01, 0.02, 0.005]
+    stepdicts = make(5).get_all_steps(steps, types=types)
+    if not send_noise_obs:
+        stepdicts = (stepdicts,)
+
+    for step in steps:
+        expected = make(5).get_all(step=step, types=types)
+        if not send_noise_obs:
+            expected = (expected,)
+
+        for stepdict, edict in zip(stepdicts, expected):
+            odict = stepdict[step]
+            assert set(odict) == set(edict)
+            for type in edict:
+                assert np.all(odict[type].image == edict[type].image)
+                assert np.all(odict[type].psf.image == edict[type].psf.image)
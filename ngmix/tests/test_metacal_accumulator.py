@@ -0,0 +1,187 @@
+import numpy as np
+import pytest
+
+import ngmix
+from ngmix.metacal import MetacalAccumulator
+from ngmix.runners import Runner, PSFRunner
+from ngmix.gaussmom import GaussMom
+from ._galsim_sims import _get_obs
+
+TYPES = ['noshear', '1p', '1m', '2p', '2m']
+STEP = 0.01
+
+
+def _get_resdicts(rng, nobj, R=0.4, shear=(0.02, -0.01)):
+    """
+    fake results with a known response, some failures and some objects
+    that fail the selection
+    """
+    resdicts = []
+    for i in range(nobj):
+        g0 = rng.normal(scale=0.2, size=2) + R*np.array(shear)
+        T = rng.uniform(low=0.5, high=1.5)
+
+        resdict = {}
+        for type in TYPES:
+            g = g0.copy()
+            if type != 'noshear':
+                ig = int(type[0]) - 1
+                sign = 1 if type[1] == 'p' else -1
+                g[ig] += sign*R*STEP
+
+            flags = 1 if rng.uniform() < 0.05 else 0
+            resdict[type] = {
+                'flags': flags, 'g': g, 'T': T + rng.normal(scale=0.01),
+            }
+
+        resdicts.append(resdict)
+
+    return resdicts
+
+
+def _select(res, obs):
+    return res['T'] > 0.6
+
+
+def _get_expected(resdicts, keep=None):
+    """
+    get R and shear from the full table of results
+    """
+    if keep is None:
+        keep = np.ones(len(resdicts), dtype=bool)
+
+    gmeans = {}
+    for type in TYPES:
+        gvals = [
+            res[type]['g'] for res, k in zip(resdicts, keep)
+            if k and res[type]['flags'] == 0 and _select(res[type], None)
+        ]
+        gmeans[type] = np.mean(gvals, axis=0)
+
+    R = np.array([
+        (gmeans['1p'][0] - gmeans['1m'][0])/(2*STEP),
+        (gmeans['2p'][1] - gmeans['2m'][1])/(2*STEP),
+    ])
+    return R, gmeans['noshear']/R
+
+
+def test_metacal_accumulator():
+    rng = np.random.RandomState(5512)
+    nobj = 200
+    npatch = 10
+    resdicts = _get_resdicts(rng, nobj)
+    patches = rng.randint(0, npatch, size=nobj)
+
+    acc = MetacalAccumulator(select=_select, step=STEP, npatch=npatch)
+    for resdict, patch in zip(resdicts, patches):
+        acc.add(resdict, patch=patch)
+
+    res = acc.get_result()
+    R, shear = _get_expected(resdicts)
+
+    assert res['nadd'] == nobj
+    assert np.allclose(res['R'], R, rtol=0, atol=1.0e-12)
+    assert np.allclose(res['shear'], shear, rtol=0, atol=1.0e-12)
+
+    # the jackknife from leaving out each patch of the full table
+    jshear = np.array([
+        _get_expected(resdicts, keep=patches != patch)[1]
+        for patch in np.unique(patches)
+    ])
+    n = jshear.shape[0]
+    shear_err = np.sqrt(
+        (n - 1)/n*((jshear - jshear.mean(axis=0))**2).sum(axis=0)
+    )
+    assert np.allclose(res['shear_err'], shear_err, rtol=1.0e-10, atol=0)
+
+    for type in TYPES:
+        nkept = sum(
+            rd[type]['flags'] == 0 and _select(rd[type], None)
+            for rd in resdicts
+        )
+        assert res['nkept'][type] == nkept
+
+
+def test_metacal_accumulator_merge():
+    rng = np.random.RandomState(811)
+    resdicts = _get_resdicts(rng, 100)
+
+    acc = MetacalAccumulator(npatch=7)
+    acc1 = MetacalAccumulator(npatch=7)
+    acc2 = MetacalAccumulator(npatch=7)
+    for i, resdict in enumerate(resdicts):
+        patch = i % 7
+        acc.add(resdict, patch=patch)
+        if i < 40:
+            acc1.add(resdict, patch=patch)
+        else:
+            acc2.add(resdict, patch=patch)
+
+    acc1.merge(acc2)
+    res = acc.get_result()
+    mres = acc1.get_result()
+    for key in ['R', 'g', 'shear', 'shear_err']:
+        assert np.allclose(res[key], mres[key], rtol=1.0e-12, atol=0)
+    assert mres['nkept'] == res['nkept']
+    assert mres['nadd'] == res['nadd']
+
+    with pytest.raises(ValueError):
+        acc.merge(MetacalAccumulator(npatch=8))
+
+    with pytest.raises(ValueError):
+        acc.merge(MetacalAccumulator(npatch=7, step=0.02))
+
+
+def test_metacal_accumulator_bootstrap():
+    """
+    accumulate real metacal results, with a selection using the psf from
+    the observations and only the 1p and 1m sheared types
+    """
+    rng = np.random.RandomState(9)
+    fwhm = 1.2
+    boot = ngmix.metacal.MetacalBootstrapper(
+        runner=Runner(fitter=GaussMom(fwhm=fwhm)),
+        psf_runner=PSFRunner(fitter=GaussMom(fwhm=fwhm)),
+        rng=rng,
+        types=['noshear', '1p', '1m'],
+    )
+
+    def select(res, obs):
+        return res['T']/obs.psf.meta['result']['T'] > 1.2
+
+    acc = MetacalAccumulator(
+        select=select, types=['noshear', '1p', '1m'], gname='e', npatch=3,
+    )
+    for i in range(6):
+        obs = _get_obs(rng=rng, noise=1.0e-6)
+        resdict, obsdict = boot.go(obs)
+        acc.add(resdict, obsdict=obsdict)
+
+    res = acc.get_result()
+    assert res['nadd'] == 6
+    assert np.all(acc.counts.sum(axis=1) > 0)
+    assert 0.2 < res['R'][0] < 0.5
+    assert np.isnan(res['R'][1])
+    assert np.isfinite(res['shear_err'][0])
+
+    acc.reset()
+    assert acc.get_result()['nadd'] == 0
+
+
+def test_metacal_accumulator_errors():
+    with pytest.raises(ValueError):
+        MetacalAccumulator(types=['1p', '1m'])
+
+    with pytest.raises(ValueError):
+        MetacalAccumulator(npatch=0)
+
+    acc = MetacalAccumulator(npatch=2)
+    rng = np.random.RandomState(3)
+    resdict = _get_resdicts(rng, 1)[0]
+    with pytest.raises(ValueError):
+        acc.add(resdict, patch=2)
+
+    # nothing added
+    res = acc.get_result()
+    assert np.all(np.isnan(res['shear']))
+    assert np.all(np.isnan(res['shear_err']))
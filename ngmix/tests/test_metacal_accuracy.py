@@ -4,8 +4,14 @@ import galsim
 import pytest
 
 
-@pytest.mark.parametrize('psf', ['gauss', 'fitgauss', 'galsim_obj'])
-def test_metacal_accuracy(psf):
+@pytest.mark.parametrize('psf, backend', [
+    ('gauss', 'galsim'),
+    ('fitgauss', 'galsim'),
+    ('galsim_obj', 'galsim'),
+    ('gauss', 'fft'),
+    ('fitgauss', 'fft'),
+])
+def test_metacal_accuracy(psf, backend):
 
     ntrial = 100
     seed = 99
@@ -41,6 +47,7 @@ def test_metacal_accuracy(psf):
         rng=rng,
         psf=psf,
         types=['noshear', '1p', '1m'],
+        backend=backend,
     )
     dlist = []
     for i in range(ntrial):
@@ -179,3 +179,106 @@ def test_metacal_bootstrap_gaussmom_response(metacal_caching):
 
     Rmean = Rvals.mean()
     assert abs(Rmean - 0.28159) < 1.0e-4
+
+
+@pytest.mark.parametrize('executor_type', ['thread', 'process'])
+@pytest.mark.parametrize('use_bootstrapper', [False, True])
+def test_metacal_bootstrap_executor(executor_type, use_bootstrapper):
+    """
+    test running the fits for the metacal types concurrently
+    """
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+    rng = np.random.RandomState(1841)
+    obs = _get_obs(rng=rng, noise=0.005)
+
+    fwhm = 1.2
+    psf_runner = PSFRunner(fitter=GaussMom(fwhm=fwhm))
+    runner = Runner(fitter=GaussMom(fwhm=fwhm))
+
+    seed = 31
+    expected_resdict, _ = metacal_bootstrap(
+        obs=obs, runner=runner, psf_runner=psf_runner,
+        rng=np.random.RandomState(seed),
+    )
+
+    if executor_type == 'thread':
+        executor_class = ThreadPoolExecutor
+    else:
+        executor_class = ProcessPoolExecutor
+
+    with executor_class(max_workers=2) as executor:
+        if use_bootstrapper:
+            boot = MetacalBootstrapper(
+                runner=runner, psf_runner=psf_runner,
+                rng=np.random.RandomState(seed),
+                executor=executor,
+            )
+            resdict, obsdict = boot.go(obs)
+        else:
+            resdict, obsdict = metacal_bootstrap(
+                obs=obs, runner=runner, psf_runner=psf_runner,
+                rng=np.random.RandomState(seed),
+                executor=executor,
+            )
+
+    assert list(resdict.keys()) == list(expected_resdict.keys())
+    assert list(obsdict.keys()) == list(expected_resdict.keys())
+
+    for key, res in resdict.items():
+        expected = expected_resdict[key]
+        assert res['flags'] == 0
+        assert np.all(res['e'] == expected['e'])
+        assert np.all(res['T'] == expected['T'])
+
+        # the psf results set as side effects are kept
+        assert 'result' in obsdict[key].psf.meta
+
+
+class _CountingPSFRunner(PSFRunner):
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self.ncalls = 0
+
+    def go(self, obs):
+        self.ncalls += 1
+        return super().go(obs=obs)
+
+
+@pytest.mark.parametrize('psf', ['gauss', 'dilate'])
+def test_metacal_bootstrap_shared_psf_fits(psf):
+    """
+    each distinct psf is fit once and the result is shared between types
+    """
+    rng = np.random.RandomState(9133)
+    obs = _get_obs(rng=rng, noise=0.005)
+
+    fwhm = 1.2
+    psf_runner = _CountingPSFRunner(fitter=GaussMom(fwhm=fwhm))
+    runner = Runner(fitter=GaussMom(fwhm=fwhm))
+
+    # the galaxy shear types share one psf, the psf shear types each have
+    # their own
+    types = ['noshear', '1p', '1m', '2p', '2m']
+    if psf == 'dilate':
+        types += ['1p_psf', '1m_psf']
+        expected_ncalls = 3
+    else:
+        expected_ncalls = 1
+
+    resdict, obsdict = metacal_bootstrap(
+        obs=obs, runner=runner, psf_runner=psf_runner,
+        rng=np.random.RandomState(5), psf=psf, types=types,
+    )
+    assert psf_runner.ncalls == expected_ncalls
+
+    expected_psf_runner = PSFRunner(fitter=GaussMom(fwhm=fwhm))
+    for key, tobs in obsdict.items():
+        tobs_copy = tobs.copy()
+        expected = ngmix.bootstrap.bootstrap(
+            obs=tobs_copy, runner=runner, psf_runner=expected_psf_runner,
+        )
+        assert np.all(resdict[key]['e'] == expected['e'])
+
+        res = tobs.psf.meta['result']
+        assert np.all(res['e'] == tobs_copy.psf.meta['result']['e'])
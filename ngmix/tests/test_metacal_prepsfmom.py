@@ -0,0 +1,138 @@
+import galsim
+import numpy as np
+import pytest
+
+import ngmix
+from ngmix.prepsfmom import PGaussMom, KSigmaMom
+from ngmix.metacal import (
+    MetacalPrePSFMom, MetacalPGaussMom, MetacalKSigmaMom,
+)
+
+SCALE = 0.263
+DIM = 49
+GAL = galsim.Exponential(half_light_radius=0.5).shear(g1=0.05, g2=-0.02)
+PSF = galsim.Gaussian(fwhm=0.9)
+
+
+def _make_obs(g1=0.0, g2=0.0):
+    gal = GAL.shear(g1=g1, g2=g2)
+    im = galsim.Convolve(gal, PSF).drawImage(
+        nx=DIM, ny=DIM, scale=SCALE,
+    ).array
+    psf_im = PSF.drawImage(nx=DIM, ny=DIM, scale=SCALE).array
+
+    cen = (DIM - 1)/2
+    jac = ngmix.DiagonalJacobian(row=cen, col=cen, scale=SCALE)
+    psf_obs = ngmix.Observation(
+        psf_im, weight=psf_im*0 + 1.0e12, jacobian=jac.copy(),
+    )
+    return ngmix.Observation(
+        im, weight=im*0 + 1.0e12, jacobian=jac, psf=psf_obs,
+    )
+
+
+def _get_fitter(kernel, fwhm):
+    if kernel == 'ksigma':
+        return KSigmaMom(fwhm)
+    else:
+        return PGaussMom(fwhm)
+
+
+@pytest.mark.parametrize('kernel', ['pgauss', 'ksigma'])
+def test_metacal_prepsfmom(kernel):
+    """
+    the moments for each type match those of the galaxy sheared before
+    convolution by the psf
+    """
+    fwhm = 1.2
+    step = 0.01
+    fitter = _get_fitter(kernel, fwhm)
+    obs = _make_obs()
+
+    resdict = MetacalPrePSFMom(fwhm, kernel, fixnoise=False).go(obs)
+    assert list(resdict) == ['noshear', '1p', '1m', '2p', '2m']
+
+    # noshear is the same as measuring the original image
+    res = fitter.go(obs)
+    for name in ['e', 'e_cov', 'flux', 'T']:
+        assert np.allclose(
+            resdict['noshear'][name], res[name], rtol=1.0e-12, atol=0,
+        )
+
+    for type, shear in [
+        ('1p', (step, 0)), ('1m', (-step, 0)),
+        ('2p', (0, step)), ('2m', (0, -step)),
+    ]:
+        res = resdict[type]
+        assert res['flags'] == 0
+
+        expected = fitter.go(_make_obs(*shear))
+        assert np.allclose(res['e'], expected['e'], rtol=0, atol=2.0e-6)
+        assert np.allclose(res['T'], expected['T'], rtol=2.0e-6, atol=0)
+
+
+@pytest.mark.parametrize('kernel', ['pgauss', 'ksigma'])
+def test_metacal_prepsfmom_vs_images(kernel):
+    """
+    the response agrees with that from metacal images
+    """
+    fwhm = 1.2
+    step = 0.01
+    fitter = _get_fitter(kernel, fwhm)
+    obs = _make_obs()
+
+    mdict = ngmix.metacal.get_all_metacal(
+        obs, psf='gauss', fixnoise=False, rng=np.random.RandomState(1),
+    )
+    R = (fitter.go(mdict['1p'])['e'][0] - fitter.go(mdict['1m'])['e'][0])
+
+    resdict = MetacalPrePSFMom(fwhm, kernel, fixnoise=False).go(obs)
+    fast_R = resdict['1p']['e'][0] - resdict['1m']['e'][0]
+
+    assert abs(fast_R/R - 1) < 1.0e-3
+    assert abs(R/(2*step) - 1) < 0.15
+
+
+def test_metacal_prepsfmom_fixnoise():
+    """
+    use a noise image that is the image rotated by -90 degrees, so the
+    rotated noise cancels the shear moments and doubles the flux
+    """
+    fwhm = 1.2
+    obs = _make_obs()
+    obs.noise = np.rot90(obs.image, k=-1)
+
+    resdict = MetacalPGaussMom(fwhm, fixnoise=False).go(obs)
+    fix_resdict = MetacalPGaussMom(fwhm, use_noise_image=True).go(obs)
+
+    for type, res in resdict.items():
+        fix_res = fix_resdict[type]
+        assert np.allclose(fix_res['sums'][2:4], 0, rtol=0, atol=1.0e-12)
+        assert np.allclose(fix_res['flux'], 2*res['flux'], rtol=1.0e-12)
+        assert np.allclose(
+            fix_res['sums_cov'][2:, 2:], 2*res['sums_cov'][2:, 2:],
+            rtol=1.0e-12, atol=1.0e-20,
+        )
+
+    # with a generated noise field
+    rng = np.random.RandomState(7)
+    resdict = MetacalKSigmaMom(fwhm, rng=rng).go(obs)
+    for res in resdict.values():
+        assert res['flags'] == 0
+
+
+def test_metacal_prepsfmom_errors():
+    with pytest.raises(ValueError):
+        MetacalPrePSFMom(1.2, 'blah', fixnoise=False)
+
+    with pytest.raises(ValueError):
+        MetacalPGaussMom(1.2)
+
+    with pytest.raises(AssertionError):
+        MetacalPGaussMom(1.2, fixnoise=False, types=['1p_psf'])
+
+    obs = _make_obs()
+    with pytest.raises(RuntimeError):
+        MetacalPGaussMom(1.2, fixnoise=False).go(
+            ngmix.Observation(obs.image, jacobian=obs.jacobian),
+        )
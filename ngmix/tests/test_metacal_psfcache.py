@@ -0,0 +1,159 @@
+import numpy as np
+import pytest
+
+import ngmix
+from ngmix.metacal.psfcache import PSFCache, get_psf_key, get_digest
+from ._galsim_sims import _get_obs
+
+
+@pytest.fixture
+def psf_caching():
+    ngmix.metacal.turn_on_psf_caching()
+    yield
+    ngmix.metacal.turn_off_psf_caching()
+
+
+def _get_obs_list(rng, nobj):
+    """
+    observations of different objects with the same psf
+    """
+    obs0 = _get_obs(rng, noise=0.005)
+
+    obslist = []
+    for i in range(nobj):
+        obs = _get_obs(rng, noise=0.005)
+        with obs.psf.writeable():
+            obs.psf.image[:, :] = obs0.psf.image
+
+        obslist.append(obs)
+
+    return obslist
+
+
+@pytest.mark.parametrize('psf', ['dilate', 'gauss'])
+def test_metacal_psfcache(psf):
+    nobj = 3
+    rng = np.random.RandomState(8)
+    obslist = _get_obs_list(rng, nobj)
+
+    expected = [
+        ngmix.metacal.get_all_metacal(
+            obs, psf=psf, rng=np.random.RandomState(5),
+        )
+        for obs in obslist
+    ]
+
+    ngmix.metacal.turn_on_psf_caching()
+    try:
+        for obs, edict in zip(obslist, expected):
+            mdict = ngmix.metacal.get_all_metacal(
+                obs, psf=psf, rng=np.random.RandomState(5),
+            )
+            for type, mobs in mdict.items():
+                assert np.all(mobs.image == edict[type].image)
+                assert np.all(mobs.psf.image == edict[type].psf.image)
+
+        # one lookup for each object, the noise image reuses the products
+        stats = ngmix.metacal.get_psf_cache_stats()
+        assert stats['misses'] == 1
+        assert stats['hits'] == nobj - 1
+        assert stats['size'] == 1
+        assert stats['evictions'] == 0
+    finally:
+        ngmix.metacal.turn_off_psf_caching()
+
+    assert ngmix.metacal.get_psf_cache_stats() is None
+
+
+def test_metacal_psfcache_fitgauss(psf_caching):
+    rng = np.random.RandomState(8)
+    obslist = _get_obs_list(rng, 2)
+
+    mc1 = ngmix.metacal.MetacalFitGaussPSF(obslist[0], rng=rng)
+    mc2 = ngmix.metacal.MetacalFitGaussPSF(obslist[1], rng=rng)
+    assert mc2._psf_cache is mc1._psf_cache
+    assert mc2.gauss_psf.sigma == mc1.gauss_psf.sigma
+
+    # the products differ for different kinds of target psf
+    mc3 = ngmix.metacal.MetacalGaussPSF(obslist[1], rng=rng)
+    assert mc3._psf_cache is not mc1._psf_cache
+
+    # the analytic psf target depends on the psf object, so is not shared
+    import galsim
+    mc4 = ngmix.metacal.MetacalAnalyticPSF(
+        obslist[1], galsim.Gaussian(fwhm=1.0), rng=rng,
+    )
+    mc5 = ngmix.metacal.MetacalAnalyticPSF(
+        obslist[1], galsim.Gaussian(fwhm=1.0), rng=rng,
+    )
+    assert mc4._psf_cache is not mc5._psf_cache
+
+    stats = ngmix.metacal.get_psf_cache_stats()
+    assert stats['misses'] == 2
+    assert stats['hits'] == 1
+
+
+def test_psfcache_eviction():
+    rng = np.random.RandomState(8)
+    obs1 = _get_obs(rng, noise=0.005)
+    obs2 = _get_obs(rng, noise=0.005, psf_fwhm=1.0)
+
+    cache = PSFCache(max_size=1)
+
+    products = cache.get_products('gauss', obs1)
+    products['x'] = 1
+    assert cache.get_products('gauss', obs1) is products
+
+    cache.get_products('gauss', obs2)
+    assert len(cache) == 1
+    assert cache.get_products('gauss', obs1) is not products
+
+    stats = cache.get_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 3
+    assert stats['evictions'] == 2
+    assert stats['size'] == 1
+    assert stats['max_size'] == 1
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.get_stats()['misses'] == 0
+
+    with pytest.raises(ValueError):
+        PSFCache(max_size=0)
+
+
+def test_psfcache_key():
+    rng = np.random.RandomState(8)
+    obs = _get_obs(rng, noise=0.005)
+
+    key = get_psf_key('gauss', obs)
+    assert get_psf_key('gauss', obs.copy()) == key
+    assert get_psf_key('dilate', obs) != key
+
+    # the psf image, weight, and both jacobians enter the key
+    tobs = obs.copy()
+    with tobs.psf.writeable():
+        tobs.psf.image[0, 0] += 1.0e-12
+    assert get_psf_key('gauss', tobs) != key
+
+    tobs = obs.copy()
+    with tobs.psf.writeable():
+        tobs.psf.weight[0, 0] *= 2
+    assert get_psf_key('gauss', tobs) != key
+
+    tobs = obs.copy()
+    with tobs.writeable():
+        tobs.jacobian = ngmix.DiagonalJacobian(row=0, col=0, scale=0.2)
+    assert get_psf_key('gauss', tobs) != key
+
+    # but not the center of the psf
+    tobs = obs.copy()
+    with tobs.psf.writeable():
+        tobs.psf.jacobian.set_cen(row=0, col=0)
+    assert get_psf_key('gauss', tobs) == key
+
+    # the shape and type matter as well as the data
+    data = np.zeros(4)
+    assert get_digest(data) != get_digest(data.reshape(2, 2))
+    assert get_digest(data) != get_digest(data.astype('f4'))
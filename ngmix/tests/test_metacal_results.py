@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+
+import ngmix
+from ngmix.metacal import (
+    get_metacal_dtype, get_metacal_array, metacal_bootstrap,
+)
+from ngmix.runners import Runner, PSFRunner
+from ngmix.guessers import SimplePSFGuesser, TFluxGuesser
+from ngmix.fitting import Fitter
+from ngmix.gaussmom import GaussMom
+from ._galsim_sims import _get_obs
+
+
+def _get_runners(rng):
+    psf_runner = PSFRunner(
+        fitter=Fitter(model='gauss'),
+        guesser=SimplePSFGuesser(rng=rng),
+        ntry=2,
+    )
+    runner = Runner(
+        fitter=Fitter(model='gauss'),
+        guesser=TFluxGuesser(rng=rng, T=0.5, flux=100.0),
+        ntry=2,
+    )
+    return runner, psf_runner
+
+
+def test_metacal_dtype():
+    dtype = get_metacal_dtype(types=['noshear', '1p_psf'])
+    assert dtype.names == (
+        'mcal_flags',
+        'mcal_flags_noshear',
+        'mcal_s2n_noshear',
+        'mcal_g_noshear',
+        'mcal_g_cov_noshear',
+        'mcal_T_noshear',
+        'mcal_T_err_noshear',
+        'mcal_flags_1p_psf',
+        'mcal_s2n_1p_psf',
+        'mcal_g_1p_psf',
+        'mcal_g_cov_1p_psf',
+        'mcal_T_1p_psf',
+        'mcal_T_err_1p_psf',
+    )
+    assert dtype['mcal_g_cov_noshear'].shape == (2, 2)
+
+    dtype = get_metacal_dtype(
+        types=['noshear'], fields=[('e', 'f4', 2)], prefix='wmom',
+    )
+    assert dtype.names == ('wmom_flags', 'wmom_flags_noshear', 'wmom_e_noshear')
+
+
+def test_metacal_array():
+    rng = np.random.RandomState(1123)
+    obs = _get_obs(rng=rng, noise=0.005)
+    runner, psf_runner = _get_runners(rng)
+
+    resdict, obsdict = metacal_bootstrap(
+        obs=obs, runner=runner, psf_runner=psf_runner,
+        rng=rng, psf='dilate',
+    )
+    # a failure in one type
+    resdict['2m']['flags'] = 4
+
+    data = get_metacal_array(resdict)
+    assert data.size == 1
+    assert data['mcal_flags'][0] == 4
+
+    for type, res in resdict.items():
+        assert data['mcal_flags_%s' % type][0] == res['flags']
+
+        if res['flags'] == 0:
+            assert np.all(data['mcal_g_%s' % type][0] == res['g'])
+            assert np.all(data['mcal_g_cov_%s' % type][0] == res['g_cov'])
+            assert data['mcal_T_%s' % type][0] == res['T']
+            assert data['mcal_s2n_%s' % type][0] == res['s2n']
+        else:
+            assert np.all(np.isnan(data['mcal_g_%s' % type][0]))
+            assert np.isnan(data['mcal_T_%s' % type][0])
+
+    # fill rows of a larger array in place
+    nobj = 3
+    dtype = get_metacal_dtype()
+    out = np.zeros(nobj, dtype=dtype)
+    for i in range(nobj):
+        tdata = get_metacal_array(resdict, out=out[i:i+1])
+        assert np.shares_memory(tdata, out)
+
+    for name in dtype.names:
+        assert np.array_equal(out[name][1], data[name][0], equal_nan=True)
+
+    with pytest.raises(ValueError):
+        get_metacal_array(
+            resdict,
+            out=np.zeros(1, dtype=get_metacal_dtype(types=['noshear'])),
+            dtype=dtype,
+        )
+
+
+@pytest.mark.parametrize('use_bootstrapper', [False, True])
+def test_metacal_bootstrap_as_array(use_bootstrapper):
+    rng = np.random.RandomState(31)
+    obs = _get_obs(rng=rng, noise=0.005)
+
+    fwhm = 1.2
+    psf_runner = PSFRunner(fitter=GaussMom(fwhm=fwhm))
+    runner = Runner(fitter=GaussMom(fwhm=fwhm))
+    fields = [('e', 'f8', 2), ('T', 'f8')]
+    types = ['noshear', '1p', '1m']
+
+    expected, _ = metacal_bootstrap(
+        obs=obs, runner=runner, psf_runner=psf_runner,
+        rng=np.random.RandomState(8), types=types,
+    )
+
+    if use_bootstrapper:
+        boot = ngmix.metacal.MetacalBootstrapper(
+            runner=runner, psf_runner=psf_runner,
+            rng=np.random.RandomState(8), types=types,
+            as_array=True, array_fields=fields,
+        )
+        data, obsdict = boot.go(obs)
+    else:
+        data, obsdict = metacal_bootstrap(
+            obs=obs, runner=runner, psf_runner=psf_runner,
+            rng=np.random.RandomState(8), types=types,
+            as_array=True, array_fields=fields,
+        )
+
+    assert data.dtype == get_metacal_dtype(types=types, fields=fields)
+    assert data['mcal_flags'][0] == 0
+    for type in types:
+        assert np.all(data['mcal_e_%s' % type][0] == expected[type]['e'])
+        assert data['mcal_T_%s' % type][0] == expected[type]['T']
@@ -2,6 +2,7 @@ import copy
 import numpy as np
 import pytest
 
+import ngmix
 from ngmix.observation import (
     Observation, ObsList, MultiBandObsList, get_mb_obs)
 
@@ -192,3 +193,78 @@ def test_get_mbobs():
 
     with pytest.raises(ValueError):
         get_mb_obs(None)
+
+
+def test_multibandobslist_packed_pixels():
+    rng = np.random.RandomState(seed=41)
+    mbobs = MultiBandObsList()
+
+    for _ in range(3):
+        obslist = ObsList()
+        for _ in range(2):
+            weight = rng.uniform(size=(13, 15))
+            weight[3, 4] = 0.0
+            obslist.append(
+                Observation(image=rng.normal(size=(13, 15)), weight=weight)
+            )
+        mbobs.append(obslist)
+
+    def _check(pixels, starts, bands):
+        iobs = 0
+        for band, obslist in enumerate(mbobs):
+            for obs in obslist:
+                assert bands[iobs] == band
+                beg, end = starts[iobs:iobs+2]
+                assert np.all(pixels[beg:end] == obs.pixels)
+                iobs += 1
+
+        assert starts.size == iobs + 1
+        assert starts[-1] == pixels.size
+
+    pixels, starts, bands = mbobs.get_packed_pixels()
+    _check(pixels, starts, bands)
+    assert not pixels.flags['WRITEABLE']
+
+    # cached
+    assert mbobs.get_packed_pixels()[0] is pixels
+
+    # updating the pixels of any observation invalidates the cache
+    with mbobs[1][1].writeable():
+        mbobs[1][1].image[5, 5] += 10
+
+    new_pixels, new_starts, new_bands = mbobs.get_packed_pixels()
+    assert new_pixels is not pixels
+    _check(new_pixels, new_starts, new_bands)
+    assert np.any(new_pixels != pixels)
+
+    # changing only the image updates the pixels of the observation in
+    # place, but the packed pixels must still be updated
+    mbobs[0][1].image = mbobs[0][1].image * 2
+    new_pixels, new_starts, new_bands = mbobs.get_packed_pixels()
+    _check(new_pixels, new_starts, new_bands)
+
+    # as does adding an observation
+    mbobs[2].append(Observation(image=rng.normal(size=(9, 9))))
+    new_pixels, new_starts, new_bands = mbobs.get_packed_pixels()
+    _check(new_pixels, new_starts, new_bands)
+    assert new_bands.tolist() == [0, 0, 1, 1, 2, 2, 2]
+
+    mbobs[0][1].pixels_layout = 'compact'
+    with pytest.raises(ValueError):
+        mbobs.get_packed_pixels()
+
+    for obslist in mbobs:
+        for obs in obslist:
+            obs.pixels_layout = 'compact'
+    new_pixels, new_starts, new_bands = mbobs.get_packed_pixels()
+    _check(new_pixels, new_starts, new_bands)
+    assert new_pixels.dtype == ngmix.pixels.get_pixels_dtype('compact')
+
+    mbobs[0][0].store_pixels = False
+    with pytest.raises(ValueError):
+        mbobs.get_packed_pixels()
+
+    pixels, starts, bands = MultiBandObsList().get_packed_pixels()
+    assert pixels.size == 0
+    assert starts.tolist() == [0]
+    assert bands.size == 0
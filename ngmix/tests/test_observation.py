@@ -6,6 +6,7 @@ from ngmix.observation import Observation
 from ngmix.pixels import make_pixels
 from ngmix.jacobian import DiagonalJacobian
 from ngmix.gmix import GMix
+from ngmix.gexceptions import GMixFatalError
 
 
 @pytest.fixture()
@@ -331,6 +332,104 @@ def test_observation_pixels_update_jacobian(image_data):
     assert np.all(obs.pixels == my_pixels)
 
 
+@pytest.mark.parametrize('ignore_zero_weight', [False, True])
+def test_observation_pixels_lazy(image_data, ignore_zero_weight):
+    rng = np.random.RandomState(seed=55)
+
+    weight = image_data['weight'].copy()
+    weight[:, 3] = 0.0
+
+    obs = Observation(
+        image=image_data['image'],
+        weight=weight,
+        jacobian=image_data['jacobian'],
+        ignore_zero_weight=ignore_zero_weight,
+    )
+
+    # not created until needed
+    assert obs._pixels is None
+    pixels = obs.pixels
+    assert obs.pixels is pixels
+
+    # changing only the image updates the values in a new array, leaving
+    # references to the old one unchanged
+    old_pixels = pixels.copy()
+    new_image = rng.normal(size=obs.image.shape)
+    obs.image = new_image
+    assert obs.pixels is not pixels
+    assert not obs.pixels.flags['WRITEABLE']
+    assert np.all(pixels == old_pixels)
+    pixels = obs.pixels
+
+    my_pixels = make_pixels(
+        new_image, weight, image_data['jacobian'],
+        ignore_zero_weight=ignore_zero_weight,
+    )
+    assert np.all(obs.pixels == my_pixels)
+
+    # other changes remake the array
+    obs.weight = weight * 2
+    assert obs.pixels is not pixels
+
+    my_pixels = make_pixels(
+        new_image, weight * 2, image_data['jacobian'],
+        ignore_zero_weight=ignore_zero_weight,
+    )
+    assert np.all(obs.pixels == my_pixels)
+
+    # the copy gets its own pixels
+    new_obs = obs.copy()
+    assert np.all(new_obs.pixels == obs.pixels)
+    new_obs.image = obs.image + 1
+    assert np.all(new_obs.pixels['val'] == obs.pixels['val'] + 1)
+
+
+def test_observation_pixels_zero_weight(image_data):
+    with pytest.raises(GMixFatalError):
+        Observation(
+            image=image_data['image'],
+            weight=np.zeros_like(image_data['weight']),
+        )
+
+    obs = Observation(image=image_data['image'])
+    with pytest.raises(GMixFatalError):
+        obs.weight = np.zeros_like(image_data['weight'])
+
+    # fine if the zero weight pixels are kept
+    obs = Observation(
+        image=image_data['image'],
+        weight=np.zeros_like(image_data['weight']),
+        ignore_zero_weight=False,
+    )
+    assert obs.pixels.size == obs.image.size
+
+
+@pytest.mark.parametrize('ignore_zero_weight', [False, True])
+def test_observation_has_zero_weight_pixels(image_data, ignore_zero_weight):
+    weight = image_data['weight'].copy()
+    obs = Observation(
+        image=image_data['image'],
+        weight=weight,
+        ignore_zero_weight=ignore_zero_weight,
+    )
+    assert not obs.has_zero_weight_pixels()
+
+    weight[3, 4] = 0.0
+    obs.weight = weight
+    assert obs.has_zero_weight_pixels() == (not ignore_zero_weight)
+
+    # the flag is kept when only the image changes
+    with obs.writeable():
+        obs.image[5, 5] += 1
+    assert obs.has_zero_weight_pixels() == (not ignore_zero_weight)
+
+    obs.weight = image_data['weight']
+    assert not obs.has_zero_weight_pixels()
+
+    obs.store_pixels = False
+    assert not obs.has_zero_weight_pixels()
+
+
 @pytest.mark.parametrize('copy_type', ['copy', 'copy.copy', 'copy.deepcopy'])
 def test_observation_copy(image_data, copy_type):
     obs = Observation(
@@ -578,3 +677,34 @@ def test_observation_set_ignore_zero_weight(image_data):
 
     # final state should be this
     assert len(obs.pixels) == wgt.size
+
+
+def test_observation_pixels_layout(image_data):
+    obs = Observation(
+        image=image_data['image'],
+        weight=image_data['weight'],
+        jacobian=image_data['jacobian'],
+        pixels_layout='compact_f4',
+    )
+    assert obs.pixels_layout == 'compact_f4'
+    assert obs.pixels['val'].dtype == np.float32
+
+    my_pixels = make_pixels(
+        image_data['image'],
+        image_data['weight'],
+        image_data['jacobian'],
+        layout='compact_f4',
+    )
+    assert np.all(obs.pixels == my_pixels)
+
+    assert obs.copy().pixels_layout == 'compact_f4'
+
+    obs.pixels_layout = 'full'
+    assert obs.pixels['val'].dtype == np.float64
+    assert 'fdiff' in obs.pixels.dtype.names
+
+    with pytest.raises(ValueError):
+        obs.pixels_layout = 'blah'
+
+    with pytest.raises(ValueError):
+        Observation(image=image_data['image'], pixels_layout='blah')
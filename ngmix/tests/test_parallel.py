@@ -0,0 +1,218 @@
+import os
+import sys
+import subprocess
+import numpy as np
+import pytest
+
+import ngmix
+from ngmix.gmix.gmix_nb import (
+    get_loglike,
+    get_loglike_parallel,
+    fill_fdiff,
+    fill_fdiff_parallel,
+    get_model_s2n_sum,
+    get_model_s2n_sum_parallel,
+)
+
+
+def _get_obs_and_gmix(rng, dims=(120, 110)):
+    jacobian = ngmix.DiagonalJacobian(
+        row=(dims[0] - 1)/2, col=(dims[1] - 1)/2, scale=0.2,
+    )
+    gm = ngmix.GMixModel([0.1, -0.2, 0.1, 0.05, 8.0, 100.0], 'exp')
+
+    noise = 0.01
+    image = gm.make_image(dims, jacobian=jacobian)
+    image += rng.normal(scale=noise, size=image.shape)
+
+    obs = ngmix.Observation(
+        image,
+        weight=np.zeros(dims) + 1/noise**2,
+        jacobian=jacobian,
+    )
+    return obs, gm
+
+
+@pytest.fixture
+def reset_parallel(monkeypatch):
+    """
+    restore the threading state after the test
+    """
+    for name in ['NUM_THREADS', 'MIN_PIXELS', 'DETERMINISTIC_REDUCTIONS']:
+        monkeypatch.setattr(
+            ngmix.parallel, name, getattr(ngmix.parallel, name),
+        )
+
+
+@pytest.mark.parametrize('nchunks', [1, 3, 8])
+def test_parallel_kernels(nchunks):
+    rng = np.random.RandomState(2245)
+    obs, gm = _get_obs_and_gmix(rng)
+
+    pixels = obs.pixels
+    gmdata = gm.get_data()
+
+    res = get_loglike(gmdata, pixels)
+    pres = get_loglike_parallel(gmdata, pixels, nchunks)
+    assert pres[3] == res[3]
+    assert np.allclose(pres[:3], res[:3], rtol=1.0e-12, atol=0)
+
+    s2n_sum = get_model_s2n_sum(gmdata, pixels)
+    ps2n_sum = get_model_s2n_sum_parallel(gmdata, pixels, nchunks)
+    assert np.allclose(ps2n_sum, s2n_sum, rtol=1.0e-12, atol=0)
+
+    fdiff = np.zeros(pixels.size + 3)
+    pfdiff = np.zeros(pixels.size + 3)
+    fill_fdiff(gmdata, pixels, fdiff, 3)
+    fill_fdiff_parallel(gmdata, pixels, pfdiff, 3)
+    assert np.all(pfdiff == fdiff)
+
+
+def test_parallel_gmix(reset_parallel):
+    rng = np.random.RandomState(881)
+    obs, gm = _get_obs_and_gmix(rng)
+
+    loglike = gm.get_loglike(obs, more=True)
+    s2n = gm.get_model_s2n(obs)
+    moms = gm.get_weighted_moments(obs, maxrad=100)
+    fdiff = np.zeros(obs.pixels.size)
+    gm.fill_fdiff(obs, fdiff)
+
+    # with deterministic reductions the parallel kernels are used even for a
+    # single thread
+    ngmix.parallel.turn_on_deterministic_reductions()
+    ngmix.parallel.set_num_threads(1, min_pixels=0)
+    assert ngmix.parallel.use_parallel(obs.pixels.size)
+    assert ngmix.parallel.get_nchunks(obs.pixels.size) > 1
+
+    ploglike = gm.get_loglike(obs, more=True)
+    ps2n = gm.get_model_s2n(obs)
+    pmoms = gm.get_weighted_moments(obs, maxrad=100)
+    pfdiff = np.zeros(obs.pixels.size)
+    gm.fill_fdiff(obs, pfdiff)
+
+    for key in ['loglike', 's2n_numer', 's2n_denom']:
+        assert np.allclose(ploglike[key], loglike[key], rtol=1.0e-12, atol=0)
+    assert ploglike['npix'] == loglike['npix']
+
+    assert np.allclose(ps2n, s2n, rtol=1.0e-12, atol=0)
+    assert np.all(pfdiff == fdiff)
+
+    assert pmoms['npix'] == moms['npix']
+    for key in ['wsum', 'sums', 'sums_cov', 'e', 'T']:
+        assert np.allclose(pmoms[key], moms[key], rtol=1.0e-12, atol=0)
+
+    ngmix.parallel.turn_off_deterministic_reductions()
+    assert not ngmix.parallel.use_parallel(obs.pixels.size)
+    assert ngmix.parallel.get_nchunks(obs.pixels.size) == 1
+
+    # the check does not change the thread count of the calling thread
+    import numba
+    nthreads = numba.get_num_threads()
+    ngmix.parallel.NUM_THREADS = nthreads + 1
+    assert ngmix.parallel.use_parallel(obs.pixels.size)
+    assert numba.get_num_threads() == nthreads
+
+
+def test_set_num_threads_errors(reset_parallel):
+    with pytest.raises(ValueError):
+        ngmix.set_num_threads(0)
+
+    import numba
+    with pytest.raises(ValueError):
+        ngmix.set_num_threads(numba.config.NUMBA_NUM_THREADS + 1)
+
+
+def test_parallel_deterministic():
+    """
+    results are bitwise identical for any number of threads with
+    deterministic reductions
+    """
+
+    env = dict(os.environ)
+    env['NUMBA_NUM_THREADS'] = '4'
+
+    code = (
+        "import numpy as np\n"
+        "import ngmix\n"
+        "from ngmix.tests.test_parallel import _get_obs_and_gmix\n"
+        "obs, gm = _get_obs_and_gmix(np.random.RandomState(77))\n"
+        "ngmix.parallel.turn_on_deterministic_reductions()\n"
+        "ll = []\n"
+        "for nthreads in [1, 2, 3, 4]:\n"
+        "    ngmix.set_num_threads(nthreads, min_pixels=0)\n"
+        "    ll.append(gm.get_loglike(obs))\n"
+        "print(len(set(ll)))\n"
+    )
+
+    res = subprocess.run(
+        [sys.executable, '-c', code],
+        env=env, check=True, capture_output=True, text=True,
+    )
+    assert int(res.stdout.split()[-1]) == 1
+
+
+def test_parallel_num_threads_in_worker_threads():
+    """
+    the number of threads applies to kernels launched from other threads
+    """
+
+    env = dict(os.environ)
+    env['NUMBA_NUM_THREADS'] = '4'
+
+    code = (
+        "from concurrent.futures import ThreadPoolExecutor\n"
+        "import numba\n"
+        "import numpy as np\n"
+        "import ngmix\n"
+        "from ngmix.tests.test_parallel import _get_obs_and_gmix\n"
+        "obs, gm = _get_obs_and_gmix(np.random.RandomState(8))\n"
+        "ngmix.set_num_threads(3, min_pixels=0)\n"
+        "def work(i):\n"
+        "    gm.get_loglike(obs)\n"
+        "    return numba.get_num_threads()\n"
+        "with ThreadPoolExecutor(2) as executor:\n"
+        "    print(min(executor.map(work, range(4))))\n"
+    )
+
+    res = subprocess.run(
+        [sys.executable, '-c', code],
+        env=env, check=True, capture_output=True, text=True,
+    )
+    assert int(res.stdout.split()[-1]) == 3
+
+
+def test_parallel_workqueue_warning():
+    """
+    launching kernels from other threads with the workqueue threading layer
+    gives a warning
+    """
+
+    env = dict(os.environ)
+    env['NUMBA_NUM_THREADS'] = '2'
+    env['NUMBA_THREADING_LAYER'] = 'workqueue'
+
+    code = (
+        "import threading\n"
+        "import warnings\n"
+        "import numpy as np\n"
+        "import ngmix\n"
+        "from ngmix.tests.test_parallel import _get_obs_and_gmix\n"
+        "obs, gm = _get_obs_and_gmix(np.random.RandomState(8))\n"
+        "ngmix.set_num_threads(2, min_pixels=0)\n"
+        "with warnings.catch_warnings(record=True) as wlist:\n"
+        "    warnings.simplefilter('always')\n"
+        "    gm.get_loglike(obs)\n"
+        "    print(sum('workqueue' in str(w.message) for w in wlist))\n"
+        "    for i in range(2):\n"
+        "        thread = threading.Thread(target=gm.get_loglike, args=(obs,))\n"
+        "        thread.start()\n"
+        "        thread.join()\n"
+        "    print(sum('workqueue' in str(w.message) for w in wlist))\n"
+    )
+
+    res = subprocess.run(
+        [sys.executable, '-c', code],
+        env=env, check=True, capture_output=True, text=True,
+    )
+    assert res.stdout.split() == ['0', '1']
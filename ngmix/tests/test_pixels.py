@@ -86,3 +86,73 @@ def test_pixels_errors():
     with pytest.raises(ngmix.GMixFatalError):
         with obs.writeable():
             obs.weight[:, :] = 0
+
+
+@pytest.mark.parametrize('layout', ['compact', 'compact_f4'])
+def test_pixels_layouts(layout):
+    rng = np.random.RandomState(seed=8)
+
+    obs = _get_obs(rng=rng, noise=0.001)
+    cobs = obs.copy()
+    cobs.pixels_layout = layout
+
+    dtype = ngmix.pixels.get_pixels_dtype(layout)
+    assert cobs.pixels.dtype == dtype
+    assert 'fdiff' not in dtype.names
+    assert dtype.itemsize < obs.pixels.dtype.itemsize
+
+    if layout == 'compact':
+        rtol = 1.0e-12
+    else:
+        rtol = 1.0e-5
+
+    for name in dtype.names:
+        assert np.allclose(
+            cobs.pixels[name], obs.pixels[name], rtol=rtol, atol=0,
+        )
+
+    gm = ngmix.GMixModel([0.01, -0.02, 0.1, 0.05, 0.3, 1.0], 'exp')
+
+    loglike = gm.get_loglike(obs, more=True)
+    closs = gm.get_loglike(cobs, more=True)
+    for key in ['loglike', 's2n_numer', 's2n_denom']:
+        assert np.allclose(closs[key], loglike[key], rtol=rtol, atol=0)
+
+    fdiff = np.zeros(obs.pixels.size)
+    cfdiff = np.zeros(obs.pixels.size)
+    gm.fill_fdiff(obs, fdiff)
+    gm.fill_fdiff(cobs, cfdiff)
+    assert np.allclose(cfdiff, fdiff, rtol=rtol, atol=1.0e-3)
+
+    moms = gm.get_weighted_moments(obs, maxrad=100)
+    cmoms = gm.get_weighted_moments(cobs, maxrad=100)
+    assert np.allclose(cmoms['sums'], moms['sums'], rtol=rtol, atol=0)
+
+    res = ngmix.admom.run_admom(
+        obs, guess=0.5, rng=np.random.RandomState(5),
+    )
+    cres = ngmix.admom.run_admom(
+        cobs, guess=0.5, rng=np.random.RandomState(5),
+    )
+    assert cres['flags'] == res['flags'] == 0
+    assert np.allclose(cres['T'], res['T'], rtol=rtol*10, atol=0)
+
+    em_obs, sky = ngmix.em.prep_obs(obs)
+    cem_obs, csky = ngmix.em.prep_obs(cobs)
+    assert cem_obs.pixels_layout == layout
+
+    guess = ngmix.GMixModel([0.0, 0.0, 0.0, 0.0, 0.5, 1.0], 'gauss')
+    res = ngmix.em.run_em(em_obs, guess, sky=sky)
+    cres = ngmix.em.run_em(cem_obs, guess, sky=csky)
+    assert cres['flags'] == res['flags'] == 0
+    assert np.allclose(
+        cres.get_gmix().get_T(), res.get_gmix().get_T(), rtol=rtol*10, atol=0,
+    )
+
+    fitter = ngmix.fitting.Fitter(model='gauss')
+    res = fitter.go(obs=obs.psf, guess=np.array([0.0, 0.0, 0.0, 0.0, 0.5, 1.0]))
+    cpsf_obs = obs.psf.copy()
+    cpsf_obs.pixels_layout = layout
+    cres = fitter.go(obs=cpsf_obs, guess=np.array([0.0, 0.0, 0.0, 0.0, 0.5, 1.0]))
+    assert cres['flags'] == res['flags'] == 0
+    assert np.allclose(cres['T'], res['T'], rtol=rtol*10, atol=0)
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+import ngmix
+from ngmix.gmix import pack_gmixes, render_batch
+
+
+def _get_gmixes(rng, nobj):
+    psf = ngmix.GMixModel([0.0, 0.0, 0.0, 0.0, 4.0, 1.0], 'gauss')
+
+    gmixes = []
+    for i in range(nobj):
+        model = ['gauss', 'exp', 'dev'][i % 3]
+        pars = [
+            rng.uniform(low=-1, high=1),
+            rng.uniform(low=-1, high=1),
+            rng.uniform(low=-0.2, high=0.2),
+            rng.uniform(low=-0.2, high=0.2),
+            rng.uniform(low=2, high=10),
+            rng.uniform(low=10, high=100),
+        ]
+        gm0 = ngmix.GMixModel(pars, model)
+        if i % 2 == 0:
+            gmixes.append(gm0.convolve(psf))
+        else:
+            gmixes.append(gm0)
+
+    return gmixes
+
+
+@pytest.mark.parametrize('fast_exp', [False, True])
+@pytest.mark.parametrize('parallel', [False, True])
+def test_render_batch(fast_exp, parallel):
+    rng = np.random.RandomState(31415)
+
+    nobj = 10
+    dims = (25, 21)
+    gmixes = _get_gmixes(rng, nobj)
+
+    # mix of repeated and distinct jacobians
+    jacobians = []
+    for i in range(nobj):
+        scale = 0.263 if i < 5 else 0.3
+        jacobians.append(
+            ngmix.DiagonalJacobian(row=12.1, col=10.3, scale=scale)
+        )
+
+    gmix_data, starts = pack_gmixes(gmixes)
+    assert starts.size == nobj + 1
+    assert gmix_data.size == sum(len(gm) for gm in gmixes)
+
+    images = render_batch(
+        gmix_data, starts, dims, jacobians=jacobians,
+        fast_exp=fast_exp, parallel=parallel,
+    )
+    assert images.shape == (nobj, ) + dims
+
+    for i in range(nobj):
+        image = gmixes[i].make_image(
+            dims, jacobian=jacobians[i], fast_exp=fast_exp,
+        )
+        assert np.all(images[i] == image)
+
+    # single jacobian and the default
+    jacobian = ngmix.UnitJacobian(row=12, col=10)
+    images = render_batch(gmix_data, starts, dims, jacobians=jacobian)
+    dimages = render_batch(gmix_data, starts, dims)
+    for i in range(nobj):
+        image = gmixes[i].make_image(dims, jacobian=jacobian)
+        assert np.all(images[i] == image)
+        assert np.all(dimages[i] == image)
+
+
+def test_render_batch_empty():
+    gmix_data, starts = pack_gmixes([])
+    images = render_batch(gmix_data, starts, (5, 6))
+    assert images.shape == (0, 5, 6)
+
+
+def test_render_batch_errors():
+    rng = np.random.RandomState(9)
+    gmixes = _get_gmixes(rng, 3)
+    gmix_data, starts = pack_gmixes(gmixes)
+
+    with pytest.raises(ValueError):
+        render_batch(gmix_data, starts, (5, 6, 7))
+
+    with pytest.raises(ValueError):
+        render_batch(gmix_data, starts[:-1], (5, 6))
+
+    with pytest.raises(ValueError):
+        jac = ngmix.UnitJacobian(row=2, col=2)
+        render_batch(gmix_data, starts, (5, 6), jacobians=[jac, jac])
+
+    with pytest.raises(ValueError):
+        pack_gmixes([gmixes[0], None])
+
+    gmixes[1].get_data()['det'] = 0.0
+    gmix_data, starts = pack_gmixes(gmixes)
+    with pytest.raises(ngmix.GMixRangeError):
+        render_batch(gmix_data, starts, (5, 6))